@@ -1,10 +1,59 @@
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from time import perf_counter
+
+# Taken before the other imports, so the measured cold start includes them
+LAUNCH_TIME = perf_counter()
+
+import argparse
+import asyncio
+import copy
+import csv
+import gzip
+import hashlib
+import itertools
 import json
+import math
 import os
+import sqlite3
+import threading
+from collections import deque
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from functools import wraps
 import random
 
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, vector operations fall back to lists
+    np = None
+
+# PyArrow is optional and imported on first export, history export falls back to CSV only
+pa = pq = None
+
+def import_pyarrow():
+    """Import PyArrow for history export, returns whether it is available"""
+    global pa, pq
+    if pa is None:
+        try:
+            import pyarrow as pa
+            import pyarrow.ipc
+            import pyarrow.parquet as pq
+        except ImportError:
+            pa = pq = None
+            return False
+    return True
+
+# Tk is imported when the GUI starts, so headless commands run without a display
+tk = ttk = messagebox = filedialog = None
+
+def import_tkinter():
+    """Import Tk modules for the GUI"""
+    global tk, ttk, messagebox, filedialog
+    import tkinter as tk
+    from tkinter import ttk, messagebox, filedialog
+
 # Add resolution configuration
 class ResolutionConfig:
     """Resolution configuration class"""
@@ -37,8 +86,60 @@ class ResolutionConfig:
         """Get available resolution list"""
         return list(self.resolutions.keys())
 
+# Engine tick resolutions (minutes per simulation tick)
+TICK_RESOLUTIONS = {
+    "1 minute": 1,
+    "5 minutes": 5,
+    "1 hour": 60
+}
+
+# Fixed-point progress scale: skill efficiency grows in steps of 0.2,
+# so one minute of work by a skill 1 worker is worth 5 progress units
+PROGRESS_SCALE = 5
+
+# Crafting time of every recipe (minutes)
+CRAFTING_TIME = 60
+
+# Buildable units reported for recipes without requirements
+UNLIMITED_UNITS = 2 ** 31 - 1
+
+# Most recent completed orders kept in memory when no history database is attached
+COMPLETED_ORDER_LIMIT = 20
+
+# Engine version recorded in save headers
+ENGINE_VERSION = "2.0"
+
+# Autosave intervals (simulated hours, wall-clock minutes)
+AUTOSAVE_INTERVALS = {
+    "Off": None,
+    "Every simulated hour": (1, None),
+    "Every simulated day": (24, None),
+    "Every 5 minutes": (None, 5)
+}
+
+# Autosave slots written in rotation
+AUTOSAVE_SLOTS = 5
+
+# Directory holding the autosave slots
+AUTOSAVE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".factory_simulator", "autosave")
+
+# Directory caching parameter sweep results
+SWEEP_CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".factory_simulator", "sweep_cache")
+
+# Simulated start time of new factories in command line runs, fixed so seeded runs repeat
+CLI_START_TIME = datetime(2024, 1, 1, 8, 0)
+
+# Default port of the local simulation server
+SIMULATION_SERVER_PORT = 8765
+
+# Seconds the GUI may take from launch to its first drawn frame
+STARTUP_TIME_BUDGET = 1.0
+
 class Product:
     """Product class"""
+    __slots__ = ("name", "production_time", "sale_price", "materials_required", 
+                 "products_required", "is_craftable")
+    
     def __init__(self, name: str, production_time: int, sale_price: float):
         self.name = name
         self.production_time = production_time  # Production time required (minutes)
@@ -116,6 +217,8 @@ class Product:
 
 class Material:
     """Material class"""
+    __slots__ = ("name", "cost", "unit", "is_craftable", "materials_required", "products_required")
+    
     def __init__(self, name: str, cost: float, unit: str):
         self.name = name
         self.cost = cost  # Unit price
@@ -184,6 +287,9 @@ class Material:
 
 class CraftingStation:
     """Crafting station class"""
+    __slots__ = ("station_id", "name", "capacity", "current_recipe", "is_recipe_product", 
+                 "crafting_progress", "assigned_worker", "is_active")
+    
     def __init__(self, station_id: int, name: str, capacity: int):
         self.station_id = station_id
         self.name = name
@@ -194,6 +300,16 @@ class CraftingStation:
         self.assigned_worker = None
         self.is_active = False
         
+    def copy(self, worker=None):
+        """Copy station state for a forked factory, with the fork's copy of the assigned worker"""
+        station = CraftingStation(self.station_id, self.name, self.capacity)
+        station.current_recipe = self.current_recipe
+        station.is_recipe_product = self.is_recipe_product
+        station.crafting_progress = self.crafting_progress
+        station.assigned_worker = worker
+        station.is_active = self.is_active
+        return station
+        
     def assign_worker(self, worker):
         """Assign worker to crafting station"""
         self.assigned_worker = worker
@@ -202,20 +318,33 @@ class CraftingStation:
         
     def assign_recipe(self, recipe_name: str, is_product: bool):
         """Assign crafting recipe to station"""
+        # An idle station keeps the work carried over from its last completion
+        if self.current_recipe is not None:
+            self.crafting_progress = 0
         self.current_recipe = recipe_name
         self.is_recipe_product = is_product
-        self.crafting_progress = 0
         
-    def update_crafting(self):
+    def is_crafting(self):
+        """Check if station is making progress"""
+        return bool(self.is_active and self.current_recipe and self.assigned_worker)
+        
+    def ticks_to_completion(self, tick_minutes: int):
+        """Get number of ticks until the current recipe completes"""
+        remaining = CRAFTING_TIME * PROGRESS_SCALE - self.crafting_progress
+        per_tick = self.assigned_worker.work_rate() * tick_minutes
+        return max(1, -(-remaining // per_tick))
+        
+    def update_crafting(self, minutes: int = 1):
         """Update crafting progress"""
-        if self.is_active and self.current_recipe and self.assigned_worker:
+        if self.is_crafting():
             # Skill level affects crafting efficiency
-            efficiency = 1 + (self.assigned_worker.skill_level - 1) * 0.2
-            self.crafting_progress += efficiency
+            self.crafting_progress += self.assigned_worker.work_rate() * minutes
             
-            if self.crafting_progress >= 60:  # Crafting fixed at 60 minutes
-                # Crafting completed
-                self.crafting_progress = 0
+            required = CRAFTING_TIME * PROGRESS_SCALE
+            if self.crafting_progress >= required:
+                # Crafting completed, work past completion carries over to the next recipe
+                # (less than a whole item, a tick completes at most one)
+                self.crafting_progress = min(self.crafting_progress - required, required - 1)
                 completed_item = self.current_recipe
                 self.current_recipe = None
                 return completed_item, self.is_recipe_product
@@ -223,7 +352,9 @@ class CraftingStation:
         
     def get_progress_percentage(self):
         """Get crafting progress percentage"""
-        return min(100, int((self.crafting_progress / 60) * 100))
+        if self.current_recipe:
+            return min(100, int(self.crafting_progress * 100 / (CRAFTING_TIME * PROGRESS_SCALE)))
+        return 0
         
     def __str__(self):
         status = "Running" if self.is_active else "Stopped"
@@ -236,6 +367,8 @@ class CraftingStation:
 
 class Worker:
     """Worker class"""
+    __slots__ = ("name", "skill_level", "salary", "is_working", "current_task")
+    
     def __init__(self, name: str, skill_level: int, salary: float):
         self.name = name
         self.skill_level = skill_level  # Skill level (1-5)
@@ -243,6 +376,18 @@ class Worker:
         self.is_working = False
         self.current_task = None
         
+    def copy(self):
+        """Copy worker state for a forked factory"""
+        worker = Worker(self.name, self.skill_level, self.salary)
+        worker.is_working = self.is_working
+        worker.current_task = self.current_task
+        return worker
+        
+    def work_rate(self):
+        """Get progress units produced per minute of work"""
+        # Equivalent to efficiency 1 + (skill_level - 1) * 0.2 in fixed point
+        return max(1, PROGRESS_SCALE + self.skill_level - 1)
+        
     def to_dict(self):
         """Convert to dictionary for JSON serialization"""
         return {
@@ -266,6 +411,9 @@ class Worker:
 
 class ProductionLine:
     """Production line class"""
+    __slots__ = ("line_id", "capacity", "current_product", "production_progress", 
+                 "assigned_worker", "is_active")
+    
     def __init__(self, line_id: int, capacity: int):
         self.line_id = line_id
         self.capacity = capacity  # Maximum capacity
@@ -274,6 +422,15 @@ class ProductionLine:
         self.assigned_worker = None
         self.is_active = False
         
+    def copy(self, worker: Worker = None):
+        """Copy line state for a forked factory, with the fork's copy of the assigned worker"""
+        line = ProductionLine(self.line_id, self.capacity)
+        line.current_product = self.current_product
+        line.production_progress = self.production_progress
+        line.assigned_worker = worker
+        line.is_active = self.is_active
+        return line
+        
     def assign_worker(self, worker: Worker):
         """Assign worker to production line"""
         self.assigned_worker = worker
@@ -282,19 +439,36 @@ class ProductionLine:
         
     def assign_product(self, product: Product):
         """Assign product to production line"""
+        # An idle line keeps the work carried over from its last completion
+        if self.current_product is not None:
+            self.production_progress = 0
         self.current_product = product
-        self.production_progress = 0
         
-    def update_production(self):
+    def is_producing(self):
+        """Check if line is making progress"""
+        return bool(self.is_active and self.current_product and self.assigned_worker)
+        
+    def work_required(self):
+        """Get progress units required for the current product"""
+        return max(1, self.current_product.production_time * PROGRESS_SCALE)
+        
+    def ticks_to_completion(self, tick_minutes: int):
+        """Get number of ticks until the current product completes"""
+        remaining = self.work_required() - self.production_progress
+        per_tick = self.assigned_worker.work_rate() * tick_minutes
+        return max(1, -(-remaining // per_tick))
+        
+    def update_production(self, minutes: int = 1):
         """Update production progress"""
-        if self.is_active and self.current_product and self.assigned_worker:
+        if self.is_producing():
             # Skill level affects production efficiency
-            efficiency = 1 + (self.assigned_worker.skill_level - 1) * 0.2
-            self.production_progress += efficiency
+            self.production_progress += self.assigned_worker.work_rate() * minutes
             
-            if self.production_progress >= self.current_product.production_time:
-                # Production completed
-                self.production_progress = 0
+            required = self.work_required()
+            if self.production_progress >= required:
+                # Production completed, work past completion carries over to the next product
+                # (less than a whole unit, a tick completes at most one)
+                self.production_progress = min(self.production_progress - required, required - 1)
                 completed_product = self.current_product
                 self.current_product = None
                 return completed_product
@@ -303,7 +477,7 @@ class ProductionLine:
     def get_progress_percentage(self):
         """Get production progress percentage"""
         if self.current_product:
-            return min(100, int((self.production_progress / self.current_product.production_time) * 100))
+            return min(100, int(self.production_progress * 100 / self.work_required()))
         return 0
         
     def __str__(self):
@@ -316,6 +490,8 @@ class ProductionLine:
 
 class Order:
     """Order class"""
+    __slots__ = ("order_id", "product", "quantity", "deadline", "completed_quantity", "is_completed")
+    
     def __init__(self, order_id: int, product: Product, quantity: int, deadline: datetime):
         self.order_id = order_id
         self.product = product
@@ -324,6 +500,13 @@ class Order:
         self.completed_quantity = 0
         self.is_completed = False
         
+    def copy(self):
+        """Copy order progress for a forked factory"""
+        order = Order(self.order_id, self.product, self.quantity, self.deadline)
+        order.completed_quantity = self.completed_quantity
+        order.is_completed = self.is_completed
+        return order
+        
     def complete_quantity(self, amount: int):
         """Complete a certain quantity of products"""
         self.completed_quantity += amount
@@ -405,9 +588,1157 @@ class Mod:
             data = json.load(f)
             return cls.from_dict(data)
 
+class ItemRegistry:
+    """Item registry interning material and product names as integer IDs"""
+    __slots__ = ("ids", "names", "kinds")
+    
+    MATERIAL = 0
+    PRODUCT = 1
+    
+    def __init__(self):
+        self.ids = {}  # {(kind, name): item_id}
+        self.names = []  # Item names indexed by ID
+        self.kinds = []  # Item kinds indexed by ID
+        
+    def intern(self, kind: int, name: str):
+        """Get item ID, registering the item if needed"""
+        key = (kind, name)
+        item_id = self.ids.get(key)
+        if item_id is None:
+            item_id = len(self.names)
+            self.ids[key] = item_id
+            self.names.append(name)
+            self.kinds.append(kind)
+        return item_id
+        
+    def copy(self):
+        """Copy registry for a forked factory"""
+        registry = ItemRegistry()
+        registry.ids = dict(self.ids)
+        registry.names = list(self.names)
+        registry.kinds = list(self.kinds)
+        return registry
+        
+    def get_id(self, kind: int, name: str):
+        """Get item ID, or None if not registered"""
+        return self.ids.get((kind, name))
+        
+    def get_name(self, item_id: int):
+        """Get item name for display and serialization"""
+        return self.names[item_id]
+        
+    def __len__(self):
+        return len(self.names)
+
+class RequirementVector:
+    """Sparse requirement vector of a compiled recipe"""
+    __slots__ = ("item_ids", "quantities")
+    
+    def __init__(self, pairs):
+        pairs = [(item_id, quantity) for item_id, quantity in pairs if quantity > 0]
+        if np is not None:
+            self.item_ids = np.array([item_id for item_id, _ in pairs], dtype=np.intp)
+            self.quantities = np.array([quantity for _, quantity in pairs], dtype=np.int64)
+        else:
+            self.item_ids = [item_id for item_id, _ in pairs]
+            self.quantities = [quantity for _, quantity in pairs]
+            
+    def __iter__(self):
+        """Iterate over (item_id, quantity) pairs"""
+        return zip([int(item_id) for item_id in self.item_ids], 
+                   [int(quantity) for quantity in self.quantities])
+        
+    def __len__(self):
+        return len(self.item_ids)
+
+class Inventory:
+    """Dense stock vector of all items indexed by item ID"""
+    __slots__ = ("registry", "counts", "version")
+    
+    def __init__(self, registry: ItemRegistry):
+        self.registry = registry
+        # Stock quantities indexed by item ID
+        self.counts = np.zeros(16, dtype=np.int64) if np is not None else []
+        self.version = 0  # Incremented on every stock change
+        
+    def copy(self, registry: ItemRegistry):
+        """Copy stock for a forked factory"""
+        inventory = Inventory(registry)
+        inventory.counts = self.counts.copy() if np is not None else list(self.counts)
+        inventory.version = self.version
+        return inventory
+        
+    def slot(self, kind: int, name: str):
+        """Get item ID, allocating a stock slot if needed"""
+        item_id = self.registry.intern(kind, name)
+        if item_id >= len(self.counts):
+            self.grow(item_id + 1)
+        return item_id
+        
+    def grow(self, size: int):
+        """Grow stock vector to hold at least size items"""
+        if np is not None:
+            counts = np.zeros(max(size, 2 * len(self.counts)), dtype=np.int64)
+            counts[:len(self.counts)] = self.counts
+            self.counts = counts
+        else:
+            self.counts.extend([0] * (size - len(self.counts)))
+            
+    def get_quantity(self, item_id: int):
+        """Get stock quantity of an item"""
+        return int(self.counts[item_id])
+        
+    def find_shortage(self, requirements: RequirementVector, units: int = 1):
+        """Find first requirement not covered by stock, returns (item_id, quantity) or None"""
+        if np is not None:
+            needed = requirements.quantities * units
+            short = self.counts[requirements.item_ids] < needed
+            if short.any():
+                index = int(short.argmax())
+                return int(requirements.item_ids[index]), int(needed[index])
+            return None
+        counts = self.counts
+        for item_id, quantity in zip(requirements.item_ids, requirements.quantities):
+            if counts[item_id] < quantity * units:
+                return item_id, quantity * units
+        return None
+        
+    def max_units(self, requirements: RequirementVector):
+        """Get how many units of a recipe the stock covers"""
+        if not len(requirements):
+            return UNLIMITED_UNITS
+        if np is not None:
+            return int((self.counts[requirements.item_ids] // requirements.quantities).min())
+        counts = self.counts
+        return min(counts[item_id] // quantity 
+                   for item_id, quantity in zip(requirements.item_ids, requirements.quantities))
+        
+    def consume(self, requirements: RequirementVector, units: int = 1):
+        """Remove required quantities from stock"""
+        self.version += 1
+        if np is not None:
+            self.counts[requirements.item_ids] -= requirements.quantities * units
+            return
+        counts = self.counts
+        for item_id, quantity in zip(requirements.item_ids, requirements.quantities):
+            counts[item_id] -= quantity * units
+            
+    def restore(self, requirements: RequirementVector, units: int = 1):
+        """Return required quantities to stock"""
+        self.consume(requirements, -units)
+
+class InventoryView(MutableMapping):
+    """Name keyed view of one item kind in an inventory"""
+    __slots__ = ("inventory", "kind", "item_ids")
+    
+    def __init__(self, inventory: Inventory, kind: int):
+        self.inventory = inventory
+        self.kind = kind
+        self.item_ids = {}  # {name: item_id} of items listed in this view
+        
+    def copy(self, inventory: Inventory):
+        """Copy view onto the inventory of a forked factory"""
+        view = InventoryView(inventory, self.kind)
+        view.item_ids = dict(self.item_ids)
+        return view
+        
+    def get_id(self, name: str):
+        """Get item ID of a listed item, or None"""
+        return self.item_ids.get(name)
+        
+    def add(self, name: str, quantity: int):
+        """Add quantity to a listed item"""
+        self.inventory.counts[self.item_ids[name]] += quantity
+        self.inventory.version += 1
+        
+    def replace(self, quantities):
+        """Replace all listed items with the given quantities"""
+        self.clear()
+        self.update(quantities)
+        
+    def clear(self):
+        counts = self.inventory.counts
+        for item_id in self.item_ids.values():
+            counts[item_id] = 0
+        self.item_ids.clear()
+        self.inventory.version += 1
+        
+    def __getitem__(self, name):
+        return int(self.inventory.counts[self.item_ids[name]])
+        
+    def __setitem__(self, name, quantity):
+        item_id = self.item_ids.get(name)
+        if item_id is None:
+            item_id = self.inventory.slot(self.kind, name)
+            self.item_ids[name] = item_id
+        self.inventory.counts[item_id] = quantity
+        self.inventory.version += 1
+        
+    def __delitem__(self, name):
+        item_id = self.item_ids.pop(name)
+        self.inventory.counts[item_id] = 0
+        self.inventory.version += 1
+        
+    def __contains__(self, name):
+        return name in self.item_ids
+        
+    def __iter__(self):
+        return iter(self.item_ids)
+        
+    def __len__(self):
+        return len(self.item_ids)
+        
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+class SimEvent:
+    """Simulation event"""
+    __slots__ = ("event_type", "time", "data")
+    
+    # Event types
+    PRODUCTION_COMPLETED = "production_completed"
+    CRAFT_COMPLETED = "craft_completed"
+    ORDER_COMPLETED = "order_completed"
+    ORDER_OVERDUE = "order_overdue"
+    STOCK_LOW = "stock_low"
+    PAYROLL_FAILED = "payroll_failed"
+    ORDER_CREATED = "order_created"
+    MATERIAL_PURCHASED = "material_purchased"
+    WORKER_HIRED = "worker_hired"
+    LINE_ADDED = "line_added"
+    STATION_ADDED = "station_added"
+    DAY_STARTED = "day_started"
+    PRODUCT_SOLD = "product_sold"
+    PAYROLL_PAID = "payroll_paid"
+    
+    def __init__(self, event_type: str, time: datetime, data: dict):
+        self.event_type = event_type
+        self.time = time  # Simulation time of the event
+        self.data = data  # Event payload
+        
+    def __repr__(self):
+        return f"SimEvent({self.event_type}, {self.time.strftime('%Y-%m-%d %H:%M')}, {self.data})"
+
+class Subscription:
+    """Event bus subscription"""
+    __slots__ = ("callback", "event_types", "event_filter", "batch")
+    
+    def __init__(self, callback, event_types=None, event_filter=None, batch: bool = False):
+        self.callback = callback
+        self.event_types = frozenset(event_types) if event_types else None  # None: all types
+        self.event_filter = event_filter  # Optional predicate on events
+        self.batch = batch  # True: callback receives a list of events
+        
+    def matches(self, event: SimEvent):
+        """Check if subscription wants an event"""
+        if self.event_types is not None and event.event_type not in self.event_types:
+            return False
+        return self.event_filter is None or self.event_filter(event)
+
+class EventBus:
+    """Event bus delivering simulation events to subscribers"""
+    def __init__(self):
+        self.subscriptions = []
+        self.pending = []  # Events waiting for delivery
+        self.batch_depth = 0
+        self.dispatching = False
+        
+    def subscribe(self, callback, event_types=None, event_filter=None, batch: bool = False):
+        """Subscribe to events, returns the subscription"""
+        subscription = Subscription(callback, event_types, event_filter, batch)
+        self.subscriptions.append(subscription)
+        return subscription
+        
+    def unsubscribe(self, subscription: Subscription):
+        """Cancel a subscription"""
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+            
+    def publish(self, event_type: str, time: datetime, **data):
+        """Publish an event, delivered immediately unless inside a batch"""
+        self.pending.append(SimEvent(event_type, time, data))
+        if self.batch_depth == 0:
+            self.flush()
+            
+    @contextmanager
+    def batch(self):
+        """Collect events published inside the block and deliver them together"""
+        self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            self.batch_depth -= 1
+            if self.batch_depth == 0:
+                self.flush()
+                
+    def flush(self):
+        """Deliver pending events to subscribers"""
+        # Events published by subscribers are delivered by the outer loop
+        if self.dispatching:
+            return
+        self.dispatching = True
+        try:
+            while self.pending:
+                events, self.pending = self.pending, []
+                for subscription in list(self.subscriptions):
+                    matching = [event for event in events if subscription.matches(event)]
+                    if not matching:
+                        continue
+                    if subscription.batch:
+                        subscription.callback(matching)
+                    else:
+                        for event in matching:
+                            subscription.callback(event)
+        finally:
+            self.dispatching = False
+
+class AssignmentSolver:
+    """Maximum-profit assignment of workers to slots (Hungarian algorithm, O(n²m))"""
+    
+    @staticmethod
+    def solve(profit):
+        """Solve a workers × slots profit matrix, returns the slot index per worker (-1: none)"""
+        rows = len(profit)
+        cols = len(profit[0]) if rows else 0
+        if rows == 0 or cols == 0:
+            return [-1] * rows
+            
+        # The algorithm needs no more rows than columns
+        if rows > cols:
+            transposed = [[profit[i][j] for i in range(rows)] for j in range(cols)]
+            slot_workers = AssignmentSolver.solve(transposed)
+            assignment = [-1] * rows
+            for slot, worker in enumerate(slot_workers):
+                if worker >= 0:
+                    assignment[worker] = slot
+            return assignment
+            
+        if np is not None:
+            return AssignmentSolver.solve_numpy(profit, rows, cols)
+        return AssignmentSolver.solve_lists(profit, rows, cols)
+        
+    @staticmethod
+    def solve_numpy(profit, rows, cols):
+        """Hungarian algorithm with the column scan vectorized"""
+        cost = -np.asarray(profit, dtype=np.float64)
+        u = np.zeros(rows + 1)
+        v = np.zeros(cols + 1)
+        p = np.zeros(cols + 1, dtype=np.int64)  # Row matched to each column (0: none)
+        way = np.zeros(cols + 1, dtype=np.int64)
+        for i in range(1, rows + 1):
+            p[0] = i
+            j0 = 0
+            minv = np.full(cols + 1, np.inf)
+            used = np.zeros(cols + 1, dtype=bool)
+            while True:
+                used[j0] = True
+                i0 = p[j0]
+                free = ~used[1:]
+                cur = cost[i0 - 1] - u[i0] - v[1:]
+                better = free & (cur < minv[1:])
+                minv[1:][better] = cur[better]
+                way[1:][better] = j0
+                candidates = np.where(free, minv[1:], np.inf)
+                j1 = int(np.argmin(candidates)) + 1
+                delta = candidates[j1 - 1]
+                u[p[used]] += delta
+                v[used] -= delta
+                minv[~used] -= delta
+                j0 = j1
+                if p[j0] == 0:
+                    break
+            # Augment along the alternating path
+            while j0:
+                j1 = way[j0]
+                p[j0] = p[j1]
+                j0 = j1
+        assignment = [-1] * rows
+        for j in range(1, cols + 1):
+            if p[j]:
+                assignment[p[j] - 1] = j - 1
+        return assignment
+        
+    @staticmethod
+    def solve_lists(profit, rows, cols):
+        """Hungarian algorithm on plain lists"""
+        inf = float("inf")
+        u = [0.0] * (rows + 1)
+        v = [0.0] * (cols + 1)
+        p = [0] * (cols + 1)  # Row matched to each column (0: none)
+        way = [0] * (cols + 1)
+        for i in range(1, rows + 1):
+            p[0] = i
+            j0 = 0
+            minv = [inf] * (cols + 1)
+            used = [False] * (cols + 1)
+            while True:
+                used[j0] = True
+                i0 = p[j0]
+                row = profit[i0 - 1]
+                delta = inf
+                j1 = 0
+                for j in range(1, cols + 1):
+                    if not used[j]:
+                        cur = -row[j - 1] - u[i0] - v[j]
+                        if cur < minv[j]:
+                            minv[j] = cur
+                            way[j] = j0
+                        if minv[j] < delta:
+                            delta = minv[j]
+                            j1 = j
+                for j in range(cols + 1):
+                    if used[j]:
+                        u[p[j]] += delta
+                        v[j] -= delta
+                    else:
+                        minv[j] -= delta
+                j0 = j1
+                if p[j0] == 0:
+                    break
+            # Augment along the alternating path
+            while j0:
+                j1 = way[j0]
+                p[j0] = p[j1]
+                j0 = j1
+        assignment = [-1] * rows
+        for j in range(1, cols + 1):
+            if p[j]:
+                assignment[p[j] - 1] = j - 1
+        return assignment
+
+class RingBuffer:
+    """Fixed-capacity buffer of the most recent samples"""
+    __slots__ = ("data", "capacity", "start", "size")
+    
+    def __init__(self, capacity: int):
+        # Storage is allocated once, new samples overwrite the oldest
+        self.data = np.zeros(capacity) if np is not None else [0.0] * capacity
+        self.capacity = capacity
+        self.start = 0  # Index of the oldest sample
+        self.size = 0
+        
+    def copy(self):
+        """Copy buffer contents"""
+        buffer = RingBuffer.__new__(RingBuffer)
+        buffer.data = self.data.copy() if np is not None else list(self.data)
+        buffer.capacity = self.capacity
+        buffer.start = self.start
+        buffer.size = self.size
+        return buffer
+        
+    def append(self, value: float):
+        """Add a sample, dropping the oldest when full"""
+        if self.size < self.capacity:
+            self.data[(self.start + self.size) % self.capacity] = value
+            self.size += 1
+        else:
+            self.data[self.start] = value
+            self.start = (self.start + 1) % self.capacity
+            
+    def last(self, count: int):
+        """Get the most recent samples, oldest first"""
+        count = min(count, self.size)
+        begin = (self.start + self.size - count) % self.capacity
+        if begin + count <= self.capacity:
+            values = self.data[begin:begin + count]
+        elif np is not None:
+            values = np.concatenate((self.data[begin:], self.data[:begin + count - self.capacity]))
+        else:
+            values = self.data[begin:] + self.data[:begin + count - self.capacity]
+        return values.tolist() if np is not None else values
+        
+    def values(self):
+        """Get all samples, oldest first"""
+        return self.last(self.size)
+        
+    def __len__(self):
+        return self.size
+
+class MetricSeries:
+    """Hourly metric with automatic downsampling into coarser ring buffers"""
+    __slots__ = ("aggregate", "levels", "pending", "pending_counts")
+    
+    # (Hours per sample, samples kept) of each resolution
+    LEVELS = ((1, 168), (24, 365), (168, 520))
+    
+    def __init__(self, aggregate: str):
+        self.aggregate = aggregate  # "sum" for counters, "mean" for gauges
+        self.levels = [RingBuffer(capacity) for _, capacity in self.LEVELS]
+        self.pending = [0.0] * len(self.LEVELS)  # Partial aggregate of each coarser level
+        self.pending_counts = [0] * len(self.LEVELS)
+        
+    def copy(self):
+        """Copy series contents"""
+        series = MetricSeries.__new__(MetricSeries)
+        series.aggregate = self.aggregate
+        series.levels = [buffer.copy() for buffer in self.levels]
+        series.pending = list(self.pending)
+        series.pending_counts = list(self.pending_counts)
+        return series
+        
+    def append(self, value: float):
+        """Add an hourly sample, rolling it up into coarser levels"""
+        self.levels[0].append(value)
+        for level in range(1, len(self.LEVELS)):
+            self.pending[level] += value
+            self.pending_counts[level] += 1
+            factor = self.LEVELS[level][0] // self.LEVELS[level - 1][0]
+            if self.pending_counts[level] < factor:
+                break
+            value = self.pending[level] if self.aggregate == "sum" else self.pending[level] / factor
+            self.levels[level].append(value)
+            self.pending[level] = 0.0
+            self.pending_counts[level] = 0
+            
+    def extend(self, value: float, count: int, level: int = 0):
+        """Add count identical samples to a level, rolling them up without appending each one"""
+        buffer = self.levels[level]
+        # Older samples would be overwritten, so a full buffer is enough
+        for _ in range(min(count, buffer.capacity)):
+            buffer.append(value)
+        if level + 1 == len(self.LEVELS):
+            return
+        next_level = level + 1
+        factor = self.LEVELS[next_level][0] // self.LEVELS[level][0]
+        needed = factor - self.pending_counts[next_level]
+        if count < needed:
+            self.pending[next_level] += value * count
+            self.pending_counts[next_level] += count
+            return
+        # Complete the partial coarser sample, then add whole coarser samples
+        first = self.pending[next_level] + value * needed
+        full, rest = divmod(count - needed, factor)
+        self.pending[next_level] = value * rest
+        self.pending_counts[next_level] = rest
+        self.extend(first if self.aggregate == "sum" else first / factor, 1, next_level)
+        if full:
+            self.extend(value * factor if self.aggregate == "sum" else value, full, next_level)
+            
+    def get_values(self, hours_per_sample: int = 1, count: int = None):
+        """Get samples at a resolution, oldest first"""
+        level = next(i for i, (hours, _) in enumerate(self.LEVELS) if hours == hours_per_sample)
+        buffer = self.levels[level]
+        return buffer.last(len(buffer) if count is None else count)
+
+class MetricsStore:
+    """Per-hour time series of production, consumption and factory state"""
+    
+    def __init__(self, start_time: datetime):
+        self.origin = start_time.replace(minute=0, second=0, microsecond=0)
+        self.hours_closed = 0  # Number of completed hours
+        self.series = {}
+        self.counters = {}  # Counts accumulated in the current hour
+        
+    def copy(self):
+        """Copy all series for a forked factory"""
+        store = MetricsStore(self.origin)
+        store.hours_closed = self.hours_closed
+        store.series = {name: series.copy() for name, series in self.series.items()}
+        store.counters = dict(self.counters)
+        return store
+        
+    def get_series(self, name: str, aggregate: str):
+        """Get a series, creating it if needed"""
+        series = self.series.get(name)
+        if series is None:
+            series = MetricSeries(aggregate)
+            self.series[name] = series
+        return series
+        
+    def count(self, name: str, amount: float = 1):
+        """Add to a counter series for the current hour"""
+        self.get_series(name, "sum")
+        self.counters[name] = self.counters.get(name, 0) + amount
+        
+    def close_hours(self, now: datetime, gauges):
+        """Record every hour completed before now; gauges is a callable returning current gauge values"""
+        hours_due = int((now - self.origin).total_seconds() // 3600)
+        if hours_due <= self.hours_closed:
+            return
+        values = gauges()
+        hours = hours_due - self.hours_closed
+        for name, value in values.items():
+            self.get_series(name, "mean").extend(value, hours)
+        # Counts belong to the first hour, the rest of a gap is empty
+        for name, series in self.series.items():
+            if series.aggregate == "sum":
+                series.extend(self.counters.get(name, 0), 1)
+                if hours > 1:
+                    series.extend(0, hours - 1)
+        self.counters = {}
+        self.hours_closed = hours_due
+            
+    def get_rate(self, name: str, hours: int = 24):
+        """Get per-hour rate of a counter over the last hours (hours before it existed count as zero)"""
+        series = self.series.get(name)
+        if series is None:
+            return 0.0
+        return sum(series.get_values(1, hours)) / max(1, hours)
+        
+    def get_mean(self, name: str, hours: int = 24):
+        """Get mean of a gauge over the last hours"""
+        series = self.series.get(name)
+        if series is None:
+            return 0.0
+        values = series.get_values(1, hours)
+        return sum(values) / len(values) if values else 0.0
+
+class HistoryExporter:
+    """Streams simulation events as columnar records to CSV, Parquet or Arrow files"""
+    
+    COLUMNS = ("time", "day", "event", "item", "slot", "order_id", "quantity", "amount")
+    FORMATS = {".csv": "csv", ".parquet": "parquet", ".arrow": "arrow"}
+    
+    # Column receiving each event data field
+    FIELD_COLUMNS = {
+        "product": "item", "item": "item", "material": "item", "worker": "item",
+        "line_id": "slot", "station_id": "slot",
+        "order_id": "order_id",
+        "quantity": "quantity",
+        "income": "amount", "cost": "amount", "amount": "amount"
+    }
+    
+    def __init__(self, factory, path: str, file_format: str = None, batch_size: int = 1024):
+        file_format = file_format or self.FORMATS.get(os.path.splitext(path)[1].lower())
+        if file_format not in self.FORMATS.values():
+            raise ValueError(f"Unsupported export format: {path}")
+        if file_format != "csv" and not import_pyarrow():
+            raise ValueError(f"{file_format} export requires pyarrow")
+            
+        self.factory = factory
+        self.path = path
+        self.file_format = file_format
+        self.batch_size = batch_size  # Records buffered before each write
+        self.columns = {name: [] for name in self.COLUMNS}
+        self.rows_written = 0
+        
+        if file_format == "csv":
+            self.file = open(path, 'w', encoding='utf-8', newline='')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.COLUMNS)
+        else:
+            self.file = None
+            self.schema = pa.schema([
+                ("time", pa.timestamp("us")), ("day", pa.int64()), ("event", pa.string()), 
+                ("item", pa.string()), ("slot", pa.int64()), ("order_id", pa.int64()), 
+                ("quantity", pa.int64()), ("amount", pa.float64())
+            ])
+            if file_format == "parquet":
+                self.writer = pq.ParquetWriter(path, self.schema)
+            else:
+                self.writer = pa.ipc.new_stream(path, self.schema)
+            
+        self.subscription = factory.events.subscribe(self.on_events, batch=True)
+        
+    def on_events(self, events):
+        """Buffer records of delivered events"""
+        for event in events:
+            row = dict.fromkeys(self.COLUMNS)
+            row["time"] = event.time
+            row["day"] = self.factory.day
+            row["event"] = event.event_type
+            for key, value in event.data.items():
+                column = self.FIELD_COLUMNS.get(key)
+                if column and row[column] is None:
+                    row[column] = value
+            for name in self.COLUMNS:
+                self.columns[name].append(row[name])
+                
+        if len(self.columns["event"]) >= self.batch_size:
+            self.flush()
+            
+    def flush(self):
+        """Write buffered records as one batch"""
+        count = len(self.columns["event"])
+        if count == 0:
+            return
+            
+        if self.file_format == "csv":
+            times = [event_time.isoformat() for event_time in self.columns["time"]]
+            self.writer.writerows(zip(times, *(self.columns[name] for name in self.COLUMNS[1:])))
+            self.file.flush()
+        else:
+            amounts = self.columns["amount"]
+            self.columns["amount"] = [None if amount is None else float(amount) for amount in amounts]
+            self.writer.write_table(pa.table(self.columns, schema=self.schema))
+            
+        self.rows_written += count
+        self.columns = {name: [] for name in self.COLUMNS}
+        
+    def close(self):
+        """Stop recording and finish the file, returns number of records written"""
+        self.factory.events.unsubscribe(self.subscription)
+        self.flush()
+        if self.file_format == "csv":
+            self.file.close()
+        else:
+            self.writer.close()
+        return self.rows_written
+
+class HistoryStore:
+    """SQLite database of completed orders, production and financial transactions"""
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS orders (
+            order_id INTEGER PRIMARY KEY, product TEXT, quantity INTEGER, 
+            created_time TEXT, created_day INTEGER, deadline TEXT, 
+            completed_time TEXT, completed_day INTEGER, income REAL, overdue INTEGER DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS production (
+            time TEXT, day INTEGER, item TEXT, is_product INTEGER, slot_kind TEXT, slot INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS transactions (
+            time TEXT, day INTEGER, kind TEXT, item TEXT, quantity INTEGER, amount REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_orders_product ON orders (product);
+        CREATE INDEX IF NOT EXISTS idx_orders_completed_day ON orders (completed_day);
+        CREATE INDEX IF NOT EXISTS idx_production_day ON production (day);
+        CREATE INDEX IF NOT EXISTS idx_production_item ON production (item, day);
+        CREATE INDEX IF NOT EXISTS idx_transactions_day ON transactions (day);
+        CREATE INDEX IF NOT EXISTS idx_transactions_item ON transactions (item, day);
+    """
+    
+    # Buffered statements, executed in this order on flush
+    STATEMENTS = {
+        "order_created": "INSERT OR REPLACE INTO orders (order_id, product, quantity, created_time, "
+                         "created_day, deadline) VALUES (?, ?, ?, ?, ?, ?)",
+        "order_completed": "UPDATE orders SET completed_time = ?, completed_day = ?, income = ? WHERE order_id = ?",
+        "order_overdue": "UPDATE orders SET overdue = 1 WHERE order_id = ?",
+        "production": "INSERT INTO production VALUES (?, ?, ?, ?, ?, ?)",
+        "transaction": "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)",
+    }
+    
+    def __init__(self, factory, path: str, batch_size: int = 500):
+        self.factory = factory
+        self.path = path
+        self.batch_size = batch_size  # Rows buffered before each transaction
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(self.SCHEMA)
+        self.pending = {name: [] for name in self.STATEMENTS}
+        self.pending_count = 0
+        self.record_orders()
+        self.subscription = factory.events.subscribe(self.on_events, batch=True)
+        
+    def record_orders(self):
+        """Record orders in memory that the database has not seen, as of the current time"""
+        factory = self.factory
+        time_text = factory.current_time.isoformat()
+        rows = []
+        for order in factory.orders:
+            completion = ((time_text, factory.day, order.product.sale_price * order.quantity) 
+                          if order.is_completed else (None, None, None))
+            rows.append((order.order_id, order.product.name, order.quantity, time_text, factory.day, 
+                         order.deadline.isoformat()) + completion)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO orders (order_id, product, quantity, created_time, created_day, deadline, "
+                "completed_time, completed_day, income) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        
+    def on_events(self, events):
+        """Buffer rows for delivered events"""
+        day = self.factory.day
+        for event in events:
+            data = event.data
+            time_text = event.time.isoformat()
+            if event.event_type == SimEvent.PRODUCTION_COMPLETED:
+                self.add("production", (time_text, day, data["product"], 1, "line", data["line_id"]))
+            elif event.event_type == SimEvent.CRAFT_COMPLETED:
+                self.add("production", (time_text, day, data["item"], int(data["is_product"]), 
+                                        "station", data["station_id"]))
+            elif event.event_type == SimEvent.ORDER_CREATED:
+                self.add("order_created", (data["order_id"], data["product"], data["quantity"], 
+                                           time_text, day, data["deadline"].isoformat()))
+            elif event.event_type == SimEvent.ORDER_COMPLETED:
+                self.add("order_completed", (time_text, day, data["income"], data["order_id"]))
+                self.add("transaction", (time_text, day, "order", data["product"], data["quantity"], data["income"]))
+            elif event.event_type == SimEvent.ORDER_OVERDUE:
+                self.add("order_overdue", (data["order_id"],))
+            elif event.event_type == SimEvent.PRODUCT_SOLD:
+                self.add("transaction", (time_text, day, "sale", data["product"], data["quantity"], data["income"]))
+            elif event.event_type == SimEvent.MATERIAL_PURCHASED:
+                self.add("transaction", (time_text, day, "purchase", data["material"], data["quantity"], -data["cost"]))
+            elif event.event_type == SimEvent.PAYROLL_PAID:
+                self.add("transaction", (time_text, day, "payroll", None, None, -data["amount"]))
+                
+        if self.pending_count >= self.batch_size:
+            self.flush()
+            
+    def add(self, statement: str, row: tuple):
+        """Buffer one row"""
+        self.pending[statement].append(row)
+        self.pending_count += 1
+        
+    def flush(self):
+        """Write buffered rows in one transaction"""
+        if self.pending_count == 0:
+            return
+        with self.connection:
+            for name, sql in self.STATEMENTS.items():
+                if self.pending[name]:
+                    self.connection.executemany(sql, self.pending[name])
+        self.pending = {name: [] for name in self.STATEMENTS}
+        self.pending_count = 0
+        
+    def query(self, sql: str, params: tuple = ()):
+        """Run a query over flushed and buffered history"""
+        self.flush()
+        return self.connection.execute(sql, params).fetchall()
+        
+    def get_revenue_by_product(self, days: int = 30):
+        """Get revenue per product over the last days"""
+        return self.query(
+            "SELECT item, SUM(amount) FROM transactions WHERE kind IN ('order', 'sale') AND day > ? "
+            "GROUP BY item ORDER BY SUM(amount) DESC", (self.factory.day - days,))
+        
+    def get_production_by_item(self, days: int = 30):
+        """Get units made per item over the last days"""
+        return self.query(
+            "SELECT item, COUNT(*) FROM production WHERE day > ? GROUP BY item ORDER BY COUNT(*) DESC", 
+            (self.factory.day - days,))
+        
+    def get_cash_flow(self, days: int = 30):
+        """Get total amount per transaction kind over the last days"""
+        return self.query(
+            "SELECT kind, SUM(amount) FROM transactions WHERE day > ? GROUP BY kind", 
+            (self.factory.day - days,))
+        
+    def get_completed_order_count(self):
+        """Get number of completed orders"""
+        return self.query("SELECT COUNT(*) FROM orders WHERE completed_day IS NOT NULL")[0][0]
+        
+    def close(self):
+        """Write remaining rows and close the database"""
+        self.factory.events.unsubscribe(self.subscription)
+        self.flush()
+        self.connection.close()
+
+class SaveFile:
+    """Reading and atomic writing of save files"""
+    
+    # Layout: magic, header length (4 bytes little endian), JSON header, plain or gzip JSON body
+    MAGIC = b"FSAV"
+    GZIP_MAGIC = b"\x1f\x8b"
+    
+    @staticmethod
+    def get_header(factory, kind: str):
+        """Get the metadata stored in front of a save body"""
+        return {
+            "name": factory.name,
+            "day": factory.day,
+            "balance": factory.balance,
+            "mod": factory.mod_name,
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+            "engine_version": ENGINE_VERSION,
+            "kind": kind
+        }
+        
+    @staticmethod
+    def write(path: str, game_state: dict, compress: bool = False, header: dict = None):
+        """Write a save file through a temporary file so it is never left half written"""
+        body = json.dumps(game_state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if compress:
+            body = gzip.compress(body, compresslevel=6)
+        header_data = json.dumps(dict(header or {}, compressed=compress), ensure_ascii=False, 
+                                 separators=(",", ":")).encode("utf-8")
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(SaveFile.MAGIC + len(header_data).to_bytes(4, "little") + header_data)
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        
+    @staticmethod
+    def read_header(path: str):
+        """Read the header of a save file without decoding its body"""
+        with open(path, 'rb') as f:
+            prefix = f.read(8)
+            if prefix[:4] == SaveFile.MAGIC:
+                return json.loads(f.read(int.from_bytes(prefix[4:], "little")).decode("utf-8"))
+                
+        # Saves of older versions have no header, summarize their body once
+        factory_data = SaveFile.read(path)["factory"]
+        return {
+            "name": factory_data["name"],
+            "day": factory_data["day"],
+            "balance": factory_data["balance"],
+            "mod": factory_data.get("mod_name"),
+            "saved_at": None,
+            "engine_version": None,
+            "kind": "manual"
+        }
+        
+    @staticmethod
+    def read(path: str):
+        """Read a plain or compressed save file"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] == SaveFile.MAGIC:
+            header_size = int.from_bytes(data[4:8], "little")
+            data = data[8 + header_size:]
+        if data[:2] == SaveFile.GZIP_MAGIC:
+            data = gzip.decompress(data)
+        return json.loads(data.decode("utf-8"))
+
+class SaveIndex:
+    """Cached save headers of a directory, refreshed only for files that changed"""
+    
+    INDEX_FILE = "save_index.json"
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, self.INDEX_FILE)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)  # {filename: {"mtime", "size", "header"}}
+        except (OSError, ValueError):
+            self.entries = {}
+            
+    def list_saves(self):
+        """Get (path, header) of all saves in the directory, newest first"""
+        entries = {}
+        changed = False
+        for item in os.scandir(self.directory):
+            if not item.name.endswith(".factorysave") or not item.is_file():
+                continue
+            stat = item.stat()
+            cached = self.entries.get(item.name)
+            if cached and cached["mtime"] == stat.st_mtime and cached["size"] == stat.st_size:
+                entries[item.name] = cached
+                continue
+            try:
+                header = SaveFile.read_header(item.path)
+            except (OSError, ValueError, KeyError):
+                continue  # Unreadable or not a save
+            entries[item.name] = {"mtime": stat.st_mtime, "size": stat.st_size, "header": header}
+            changed = True
+            
+        if changed or len(entries) != len(self.entries):
+            self.entries = entries
+            self.save()
+        names = sorted(entries, key=lambda name: entries[name]["mtime"], reverse=True)
+        return [(os.path.join(self.directory, name), entries[name]["header"]) for name in names]
+        
+    def save(self):
+        """Write the index, skipped if the directory is read-only"""
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+class AutoSaver:
+    """Periodic autosave that encodes and writes snapshots on a background thread"""
+    
+    def __init__(self, factory, directory: str, slots: int = AUTOSAVE_SLOTS, 
+                 interval_hours: float = 24, interval_minutes: float = None):
+        os.makedirs(directory, exist_ok=True)
+        self.factory = factory
+        self.directory = directory
+        self.slots = slots
+        self.interval_hours = interval_hours  # Simulated hours between saves
+        self.interval_minutes = interval_minutes  # Wall-clock minutes between saves
+        self.last_save_time = factory.current_time
+        self.last_save_clock = perf_counter()
+        self.next_slot = self.find_next_slot()
+        self.pending = None  # (path, game_state, header) waiting for the writer thread
+        self.running = True
+        self.saves_written = 0
+        self.last_error = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="autosave", daemon=True)
+        self.thread.start()
+        self.subscription = factory.events.subscribe(self.on_events, batch=True)
+        
+    def get_slot_path(self, slot: int):
+        """Get file path of an autosave slot"""
+        return os.path.join(self.directory, f"autosave_{slot + 1}.factorysave")
+        
+    def find_next_slot(self):
+        """Get the slot after the most recently written one"""
+        newest_slot, newest_time = -1, -1.0
+        for slot in range(self.slots):
+            path = self.get_slot_path(slot)
+            if os.path.exists(path) and os.path.getmtime(path) > newest_time:
+                newest_slot, newest_time = slot, os.path.getmtime(path)
+        return (newest_slot + 1) % self.slots
+        
+    def on_events(self, events):
+        """Save when an interval has passed"""
+        if self.is_due():
+            self.save_now()
+            
+    def is_due(self):
+        """Check if an autosave interval has passed"""
+        if (self.interval_hours is not None and 
+                self.factory.current_time - self.last_save_time >= timedelta(hours=self.interval_hours)):
+            return True
+        if (self.interval_minutes is not None and 
+                perf_counter() - self.last_save_clock >= self.interval_minutes * 60):
+            return True
+        return False
+        
+    def save_now(self):
+        """Capture the current state and queue it for writing, returns the slot path"""
+        # Capturing is cheap, encoding, compression and disk I/O run on the writer thread
+        game_state = {"factory": self.factory.to_dict()}
+        header = SaveFile.get_header(self.factory, "autosave")
+        self.last_save_time = self.factory.current_time
+        self.last_save_clock = perf_counter()
+        with self.condition:
+            # A snapshot still waiting for the writer is replaced in its slot
+            if self.pending is not None:
+                path = self.pending[0]
+            else:
+                path = self.get_slot_path(self.next_slot)
+                self.next_slot = (self.next_slot + 1) % self.slots
+            self.pending = (path, game_state, header)
+            self.condition.notify()
+        return path
+        
+    def run(self):
+        """Writer thread loop"""
+        while True:
+            with self.condition:
+                while self.pending is None and self.running:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                path, game_state, header = self.pending
+                self.pending = None
+            try:
+                SaveFile.write(path, game_state, compress=True, header=header)
+                self.saves_written += 1
+            except (OSError, TypeError, ValueError) as e:
+                self.last_error = str(e)
+                
+    def close(self):
+        """Finish the queued save and stop the writer thread"""
+        self.factory.events.unsubscribe(self.subscription)
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+
+class Journal:
+    """Append-only journal of engine commands with atomic snapshots for crash recovery"""
+    
+    COMMANDS = set()  # Factory methods recorded in the journal
+    SNAPSHOT_FILE = "snapshot.json"
+    JOURNAL_FILE = "journal.jsonl"
+    
+    def __init__(self, factory, directory: str, sync_every: int = 32, sync_interval: float = 1.0, 
+                 snapshot_every: int = 500):
+        self.factory = factory
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_path = os.path.join(directory, self.SNAPSHOT_FILE)
+        self.journal_path = os.path.join(directory, self.JOURNAL_FILE)
+        self.sync_every = sync_every  # Entries written before each fsync
+        self.sync_interval = sync_interval  # Longest time between fsyncs while recording (seconds)
+        self.snapshot_every = snapshot_every  # Entries written before compacting into a snapshot
+        self.sequence = 0  # Sequence number of the last recorded command
+        self.entries = 0  # Entries written since the last snapshot
+        self.unsynced = 0
+        self.last_sync = perf_counter()
+        self.snapshot_due = False  # Set when a change cannot be expressed as a command
+        self.file = None
+        self.write_snapshot()
+        
+    @staticmethod
+    def command(method):
+        """Decorator recording calls of a Factory method in the attached journal"""
+        Journal.COMMANDS.add(method.__name__)
+        
+        @wraps(method)
+        def run_command(factory, *args, **kwargs):
+            # Commands issued by other commands are replayed by their caller
+            if factory.journal is None or factory.command_depth:
+                return method(factory, *args, **kwargs)
+            # Subscribers react after the command is recorded, so their own
+            # commands follow it in the journal
+            with factory.events.batch():
+                factory.command_depth += 1
+                try:
+                    result = method(factory, *args, **kwargs)
+                finally:
+                    factory.command_depth -= 1
+                factory.journal.record(method.__name__, args, kwargs)
+            return result
+        return run_command
+        
+    def record(self, command: str, args: tuple, kwargs: dict):
+        """Append an executed command"""
+        self.sequence += 1
+        if self.snapshot_due or self.entries >= self.snapshot_every:
+            # The snapshot already contains the effect of this command
+            self.write_snapshot()
+            return
+            
+        entry = {"seq": self.sequence, "command": command, "args": args}
+        if kwargs:
+            entry["kwargs"] = kwargs
+        self.file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=int) + "\n")
+        self.entries += 1
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every or perf_counter() - self.last_sync >= self.sync_interval:
+            self.sync()
+            
+    def sync(self):
+        """Force written entries to disk"""
+        if self.unsynced:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+        self.last_sync = perf_counter()
+        
+    def write_snapshot(self):
+        """Atomically replace the snapshot with the current state and start an empty journal"""
+        SaveFile.write(self.snapshot_path, {"sequence": self.sequence, "factory": self.factory.to_dict()}, 
+                       header=SaveFile.get_header(self.factory, "journal"))
+        
+        # Entries up to the snapshot sequence are no longer needed
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.journal_path, 'w', encoding='utf-8')
+        self.entries = 0
+        self.unsynced = 0
+        self.snapshot_due = False
+        self.last_sync = perf_counter()
+        
+    def close(self):
+        """Compact the journal into a final snapshot and close it"""
+        self.write_snapshot()
+        self.file.close()
+        
+    @staticmethod
+    def recover(factory, directory: str):
+        """Restore the last snapshot and replay the journal written after it, returns replayed entries"""
+        snapshot = SaveFile.read(os.path.join(directory, Journal.SNAPSHOT_FILE))
+        factory.restore_state(snapshot["factory"])
+        
+        replayed = 0
+        journal_path = os.path.join(directory, Journal.JOURNAL_FILE)
+        if not os.path.exists(journal_path):
+            return replayed
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Last entry was torn by the crash
+                if entry["seq"] <= snapshot["sequence"]:
+                    continue
+                if entry["command"] not in Journal.COMMANDS:
+                    raise ValueError(f"Unknown journal command {entry['command']}")
+                getattr(factory, entry["command"])(*entry["args"], **entry.get("kwargs", {}))
+                replayed += 1
+        return replayed
+
 class Factory:
     """Factory class"""
-    def __init__(self, name: str, initial_balance: float):
+    def __init__(self, name: str, initial_balance: float, start_time: datetime = None):
         self.name = name
         self.balance = initial_balance
         self.production_lines = []
@@ -415,65 +1746,401 @@ class Factory:
         self.workers = []
         self.products = {}
         self.materials = {}
-        self.material_inventory = {}
-        self.product_inventory = {}
+        self.reset_inventory()
         self.orders = []
-        self.current_time = datetime.now()
+        self.current_time = start_time or datetime.now()
         self.day = 1
         self.daily_costs = 0
         self.daily_income = 0
+        self.tick_minutes = 1  # Engine resolution (minutes per tick)
+        self.tick_remainder = 0  # Minutes short of a whole tick, run with the next advance
+        self.events = EventBus()
+        self.low_stock_threshold = 50  # Material stock reported as low below this
+        self.overdue_reported = set()  # IDs of orders already reported overdue
+        self.metrics = MetricsStore(self.current_time)
+        self.exporter = None  # Active history exporter
+        self.history = None  # Attached history database
+        self.next_order_id = 1
+        self.completed_order_count = 0  # Completed orders no longer kept in memory
+        self.journal = None  # Attached crash recovery journal
+        self.command_depth = 0  # Nesting depth of running journaled commands
+        self.autosaver = None  # Active autosave
+        self.mod_name = None  # Name of the loaded mod
+        self.catalog_shared = False  # Products and materials dicts are shared with a fork
+        
+    def reset_inventory(self):
+        """Rebuild item ID registry and empty all inventories"""
+        self.registry = ItemRegistry()
+        self.inventory = Inventory(self.registry)
+        self.material_inventory = InventoryView(self.inventory, ItemRegistry.MATERIAL)
+        self.product_inventory = InventoryView(self.inventory, ItemRegistry.PRODUCT)
+        self.requirements = {}  # Compiled recipes {item_id: RequirementVector}
+        self.recipe_matrix = None  # Requirement matrix of the whole catalog
+        self.buildable_cache = {}  # {item_id: (stock version, buildable units)}
+        self.reservations = {}  # Units with reserved inputs {item_id: units}
+        
+    def get_requirements(self, recipe, is_product: bool = True):
+        """Get recipe requirements compiled to a sparse requirement vector"""
+        kind = ItemRegistry.PRODUCT if is_product else ItemRegistry.MATERIAL
+        recipe_id = self.inventory.slot(kind, recipe.name)
+        requirements = self.requirements.get(recipe_id)
+        if requirements is None:
+            requirements = RequirementVector(
+                [(self.inventory.slot(ItemRegistry.MATERIAL, name), quantity)
+                 for name, quantity in recipe.materials_required.items()] +
+                [(self.inventory.slot(ItemRegistry.PRODUCT, name), quantity)
+                 for name, quantity in recipe.products_required.items()]
+            )
+            self.requirements[recipe_id] = requirements
+        return requirements
+        
+    def get_recipe_matrix(self):
+        """Get requirement matrix of all products and craftable materials"""
+        if self.recipe_matrix is None:
+            recipes = [(name, True) for name in self.products]
+            recipes += [(name, False) for name, material in self.materials.items() if material.is_craftable]
+            vectors = [self.get_requirements(self.products[name] if is_product else self.materials[name], is_product)
+                       for name, is_product in recipes]
+            if np is not None:
+                matrix = np.zeros((len(recipes), len(self.registry)), dtype=np.int64)
+                for row, vector in enumerate(vectors):
+                    matrix[row, vector.item_ids] = vector.quantities
+            else:
+                matrix = vectors
+            self.recipe_matrix = (recipes, matrix)
+        return self.recipe_matrix
+        
+    def own_catalog(self):
+        """Take a private copy of the catalog shared with forks before changing it"""
+        if self.catalog_shared:
+            self.products = dict(self.products)
+            self.materials = dict(self.materials)
+            self.catalog_shared = False
+            
+    def fork(self):
+        """Create an independent copy of the simulation for what-if runs"""
+        fork = copy.copy(self)
+        
+        # Catalog and compiled recipes are shared until either side changes them
+        self.catalog_shared = fork.catalog_shared = True
+        fork.requirements = dict(self.requirements)
+        fork.buildable_cache = {}
+        
+        # Mutable state is copied
+        fork.registry = self.registry.copy()
+        fork.inventory = self.inventory.copy(fork.registry)
+        fork.material_inventory = self.material_inventory.copy(fork.inventory)
+        fork.product_inventory = self.product_inventory.copy(fork.inventory)
+        fork.reservations = dict(self.reservations)
+        workers = {id(worker): worker.copy() for worker in self.workers}
+        fork.workers = list(workers.values())
+        fork.production_lines = [line.copy(workers.get(id(line.assigned_worker))) 
+                                 for line in self.production_lines]
+        fork.crafting_stations = [station.copy(workers.get(id(station.assigned_worker))) 
+                                  for station in self.crafting_stations]
+        fork.orders = [order.copy() for order in self.orders]
+        fork.overdue_reported = set(self.overdue_reported)
+        fork.metrics = self.metrics.copy()
+        
+        # Forks run silently and record nothing
+        fork.events = EventBus()
+        fork.exporter = None
+        fork.history = None
+        fork.journal = None
+        fork.autosaver = None
+        fork.command_depth = 0
+        return fork
+        
+    def invalidate_recipes(self):
+        """Discard compiled recipes after requirements were edited"""
+        self.requirements.clear()
+        self.recipe_matrix = None
+        self.buildable_cache.clear()
+        # Catalog edits are not journaled, the next snapshot records them
+        if self.journal is not None:
+            self.journal.snapshot_due = True
+        
+    def can_make(self, name: str, is_product: bool = True):
+        """Check if current stock covers one unit of a recipe"""
+        recipe = self.products.get(name) if is_product else self.materials.get(name)
+        if recipe is None:
+            return False
+        return self.inventory.find_shortage(self.get_requirements(recipe, is_product)) is None
+        
+    def get_buildable_counts(self):
+        """Get units of every recipe current stock covers {(name, is_product): units}"""
+        recipes, matrix = self.get_recipe_matrix()
+        if np is not None:
+            stock = self.inventory.counts[:matrix.shape[1]]
+            units = np.where(matrix > 0, stock // np.maximum(matrix, 1), UNLIMITED_UNITS)
+            return dict(zip(recipes, units.min(axis=1, initial=UNLIMITED_UNITS).tolist()))
+        return {recipe: self.inventory.max_units(vector) for recipe, vector in zip(recipes, matrix)}
+        
+    def get_recipe(self, name: str, is_product: bool = True):
+        """Get product or craftable material by name, or None"""
+        if is_product:
+            return self.products.get(name)
+        material = self.materials.get(name)
+        return material if material and material.is_craftable else None
+        
+    def get_build_order(self, item_id: int):
+        """Get craftable items reachable from an item, parents before components"""
+        order, visiting, done = [], set(), set()
+        
+        def visit(current_id):
+            visiting.add(current_id)
+            is_product = self.registry.kinds[current_id] == ItemRegistry.PRODUCT
+            recipe = self.get_recipe(self.registry.get_name(current_id), is_product)
+            if recipe is not None:
+                for component_id, _ in self.get_requirements(recipe, is_product):
+                    # Components on a recipe cycle are treated as purchase only
+                    if component_id not in visiting and component_id not in done:
+                        visit(component_id)
+            visiting.discard(current_id)
+            done.add(current_id)
+            if recipe is not None:
+                order.append(current_id)
+                
+        visit(item_id)
+        order.reverse()
+        return order
+        
+    def can_build(self, item_id: int, units: int, build_order):
+        """Check if stock covers units of an item, crafting missing components"""
+        counts = self.inventory.counts
+        gross = {item_id: units}
+        for current_id in build_order:
+            needed = gross.pop(current_id, 0)
+            if current_id != item_id:
+                needed -= int(counts[current_id])
+            if needed <= 0:
+                continue
+            is_product = self.registry.kinds[current_id] == ItemRegistry.PRODUCT
+            recipe = self.get_recipe(self.registry.get_name(current_id), is_product)
+            for component_id, quantity in self.get_requirements(recipe, is_product):
+                gross[component_id] = gross.get(component_id, 0) + needed * quantity
+        # Remaining requirements can only come from stock
+        return all(int(counts[component_id]) >= needed for component_id, needed in gross.items())
+        
+    def get_max_buildable(self, name: str, is_product: bool = True, include_components: bool = True):
+        """Get maximum units of an item buildable from current stock"""
+        recipe = self.get_recipe(name, is_product)
+        if recipe is None:
+            return 0
+        requirements = self.get_requirements(recipe, is_product)
+        if not include_components:
+            return self.inventory.max_units(requirements)
+            
+        item_id = self.inventory.slot(ItemRegistry.PRODUCT if is_product else ItemRegistry.MATERIAL, name)
+        cached = self.buildable_cache.get(item_id)
+        if cached and cached[0] == self.inventory.version:
+            return cached[1]
+            
+        # Exponential then binary search on the number of units
+        build_order = self.get_build_order(item_id)
+        low, high = 0, 1
+        while high < UNLIMITED_UNITS and self.can_build(item_id, high, build_order):
+            low, high = high, min(high * 2, UNLIMITED_UNITS)
+        if high == UNLIMITED_UNITS and self.can_build(item_id, high, build_order):
+            low = high
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.can_build(item_id, middle, build_order):
+                low = middle
+            else:
+                high = middle
+                
+        self.buildable_cache[item_id] = (self.inventory.version, low)
+        return low
+        
+    @Journal.command
+    def reserve_inputs(self, name: str, quantity: int, is_product: bool = True):
+        """Reserve inputs for several units of a recipe in one step"""
+        recipe = self.get_recipe(name, is_product)
+        if recipe is None:
+            if not is_product and name in self.materials:
+                return False, f"Error: {name} is not craftable!"
+            return False, f"Error: {name} does not exist!"
+        if quantity <= 0:
+            return False, "Error: Quantity must be positive!"
+            
+        requirements = self.get_requirements(recipe, is_product)
+        shortage = self.inventory.find_shortage(requirements, quantity)
+        if shortage:
+            return False, self.get_shortage_message(shortage)
+            
+        self.consume_inputs(requirements, quantity)
+        item_id = self.inventory.slot(ItemRegistry.PRODUCT if is_product else ItemRegistry.MATERIAL, name)
+        self.reservations[item_id] = self.reservations.get(item_id, 0) + quantity
+        return True, f"Reserved inputs for {quantity} units of {name}"
+        
+    @Journal.command
+    def release_reservation(self, name: str, is_product: bool = True):
+        """Return reserved inputs of a recipe to stock"""
+        kind = ItemRegistry.PRODUCT if is_product else ItemRegistry.MATERIAL
+        item_id = self.registry.get_id(kind, name)
+        units = self.reservations.pop(item_id, 0)
+        if not units:
+            return False, f"Error: No inputs reserved for {name}!"
+        self.inventory.restore(self.get_requirements(self.get_recipe(name, is_product), is_product), units)
+        return True, f"Released inputs for {units} units of {name}"
+        
+    def take_reserved_unit(self, name: str, is_product: bool = True):
+        """Use one reserved unit of a recipe, returns False if none is reserved"""
+        kind = ItemRegistry.PRODUCT if is_product else ItemRegistry.MATERIAL
+        item_id = self.registry.get_id(kind, name)
+        units = self.reservations.get(item_id, 0)
+        if not units:
+            return False
+        if units == 1:
+            del self.reservations[item_id]
+        else:
+            self.reservations[item_id] = units - 1
+        return True
+        
+    def get_makeable_items(self):
+        """Get (name, is_product) of every recipe whose inputs are all in stock"""
+        recipes, matrix = self.get_recipe_matrix()
+        if np is not None:
+            makeable = (matrix <= self.inventory.counts[:matrix.shape[1]]).all(axis=1)
+            return [recipe for recipe, ok in zip(recipes, makeable.tolist()) if ok]
+        return [recipe for recipe, vector in zip(recipes, matrix) 
+                if self.inventory.find_shortage(vector) is None]
+        
+    def setup_default(self):
+        """Set up the default catalog, equipment and workers"""
+        # Add materials
+        self.add_material("Wood", cost=1, unit="unit", initial_quantity=100)
+        self.add_material("Metal", cost=2, unit="unit", initial_quantity=50)
+        self.add_material("Plastic", cost=0.5, unit="unit", initial_quantity=200)
+        self.add_material("Screws", cost=0.1, unit="pcs", initial_quantity=500)
+        
+        # Add products
+        chair = Product("Wooden Chair", production_time=60, sale_price=20)
+        chair.add_material_requirement("Wood", 5)
+        self.add_product(chair)
         
+        table = Product("Wooden Table", production_time=120, sale_price=40)
+        table.add_material_requirement("Wood", 10)
+        self.add_product(table)
+        
+        cabinet = Product("Wooden Cabinet", production_time=180, sale_price=60)
+        cabinet.add_material_requirement("Wood", 15)
+        cabinet.add_material_requirement("Metal", 2)
+        self.add_product(cabinet)
+        
+        # Add craftable products and materials
+        # Crafted material: Metal Plate (crafted from 2 Metal)
+        metal_plate = Material("Metal Plate", cost=3, unit="sheet")
+        metal_plate.add_material_requirement("Metal", 2)
+        self.add_material(metal_plate.name, metal_plate.cost, metal_plate.unit, 0)
+        self.materials["Metal Plate"].is_craftable = True
+        self.materials["Metal Plate"].materials_required = metal_plate.materials_required.copy()
+        
+        # Crafted product: Premium Chair (crafted from Wooden Chair and Metal Plate)
+        premium_chair = Product("Premium Chair", production_time=90, sale_price=50)
+        premium_chair.add_product_requirement("Wooden Chair", 1)
+        premium_chair.add_material_requirement("Metal Plate", 1)
+        premium_chair.add_material_requirement("Screws", 4)
+        self.add_product(premium_chair)
+        
+        # Add production lines
+        self.add_production_line(capacity=10)
+        self.add_production_line(capacity=10)
+        
+        # Add crafting stations
+        self.add_crafting_station("Basic Crafting Station", capacity=5)
+        self.add_crafting_station("Advanced Crafting Station", capacity=3)
+        
+        # Hire workers
+        self.hire_worker("Worker A", 3, 100)
+        self.hire_worker("Worker B", 2, 80)
+        self.hire_worker("Worker C", 4, 120)
+        self.hire_worker("Worker D", 3, 100)
+        
+    def run_days(self, days: int, work_hours: int = 8):
+        """Run whole days: a work shift followed by the move to the next day, returns daily profits"""
+        profits = []
+        for _ in range(days):
+            self.advance_time(work_hours)
+            success, message, daily_profit = self.next_day()
+            profits.append(daily_profit)
+        return profits
+        
+    @Journal.command
+    def set_tick_resolution(self, minutes: int):
+        """Set engine tick resolution"""
+        if minutes in TICK_RESOLUTIONS.values():
+            self.tick_minutes = minutes
+            return True
+        return False
+        
+    @Journal.command
     def add_production_line(self, capacity: int):
         """Add production line"""
         line_id = len(self.production_lines) + 1
         new_line = ProductionLine(line_id, capacity)
         self.production_lines.append(new_line)
+        self.events.publish(SimEvent.LINE_ADDED, self.current_time, line_id=line_id)
         return new_line
         
+    @Journal.command
     def add_crafting_station(self, name: str, capacity: int):
         """Add crafting station"""
         station_id = len(self.crafting_stations) + 1
         new_station = CraftingStation(station_id, name, capacity)
         self.crafting_stations.append(new_station)
+        self.events.publish(SimEvent.STATION_ADDED, self.current_time, station_id=station_id)
         return new_station
         
+    @Journal.command
     def hire_worker(self, name: str, skill_level: int, salary: float):
         """Hire worker"""
         new_worker = Worker(name, skill_level, salary)
         self.workers.append(new_worker)
+        self.events.publish(SimEvent.WORKER_HIRED, self.current_time, worker=name)
         return new_worker
         
     def add_product(self, product: Product):
         """Add product"""
+        self.own_catalog()
         self.products[product.name] = product
         self.product_inventory[product.name] = 0
+        self.invalidate_recipes()
         return product
         
     def remove_product(self, name: str):
         """Remove product"""
+        self.own_catalog()
         if name in self.products:
             del self.products[name]
             if name in self.product_inventory:
                 del self.product_inventory[name]
+            self.invalidate_recipes()
             return True
         return False
         
     def add_material(self, name: str, cost: float, unit: str, initial_quantity: int = 0):
         """Add material"""
+        self.own_catalog()
         new_material = Material(name, cost, unit)
         self.materials[name] = new_material
         self.material_inventory[name] = initial_quantity
+        self.invalidate_recipes()
         return new_material
         
     def remove_material(self, name: str):
         """Remove material"""
+        self.own_catalog()
         if name in self.materials:
             del self.materials[name]
             if name in self.material_inventory:
                 del self.material_inventory[name]
+            self.invalidate_recipes()
             return True
         return False
         
+    @Journal.command
     def purchase_material(self, material_name: str, quantity: int):
         """Purchase material"""
         if material_name not in self.materials:
@@ -488,8 +2155,27 @@ class Factory:
         self.balance -= cost
         self.material_inventory[material_name] += quantity
         self.daily_costs += cost
+        self.events.publish(SimEvent.MATERIAL_PURCHASED, self.current_time, 
+                            material=material_name, quantity=quantity, cost=cost)
         return True, f"Purchased {quantity}{material.unit} {material_name}, cost ¥{cost}"
         
+    @Journal.command
+    def purchase_materials(self, purchases: dict):
+        """Purchase several materials in one transaction"""
+        for material_name in purchases:
+            if material_name not in self.materials:
+                return False, f"Error: Material {material_name} does not exist!"
+                
+        cost = sum(self.materials[name].cost * quantity for name, quantity in purchases.items())
+        if cost > self.balance:
+            return False, f"Error: Insufficient funds! Need ¥{cost}, current balance ¥{self.balance}"
+            
+        with self.events.batch():
+            for material_name, quantity in purchases.items():
+                self.purchase_material(material_name, quantity)
+        return True, f"Purchased {len(purchases)} materials, cost ¥{cost}"
+        
+    @Journal.command
     def create_order(self, product_name: str, quantity: int, days_until_deadline: int):
         """Create order"""
         if product_name not in self.products:
@@ -497,11 +2183,15 @@ class Factory:
             
         product = self.products[product_name]
         deadline = self.current_time + timedelta(days=days_until_deadline)
-        order_id = len(self.orders) + 1
+        order_id = self.next_order_id
+        self.next_order_id += 1
         new_order = Order(order_id, product, quantity, deadline)
         self.orders.append(new_order)
+        self.events.publish(SimEvent.ORDER_CREATED, self.current_time, 
+                            order_id=order_id, product=product_name, quantity=quantity, deadline=deadline)
         return new_order, f"Created new order: {new_order}"
         
+    @Journal.command
     def assign_worker_to_line(self, worker_name: str, line_id: int):
         """Assign worker to production line"""
         worker = next((w for w in self.workers if w.name == worker_name), None)
@@ -522,6 +2212,7 @@ class Factory:
         line.assign_worker(worker)
         return True, f"Worker {worker_name} assigned to production line {line_id}"
         
+    @Journal.command
     def assign_worker_to_station(self, worker_name: str, station_id: int):
         """Assign worker to crafting station"""
         worker = next((w for w in self.workers if w.name == worker_name), None)
@@ -542,6 +2233,31 @@ class Factory:
         station.assign_worker(worker)
         return True, f"Worker {worker_name} assigned to crafting station {station_id}"
         
+    @Journal.command
+    def unassign_worker(self, worker_name: str):
+        """Remove worker from any production line or crafting station"""
+        worker = next((w for w in self.workers if w.name == worker_name), None)
+        if not worker:
+            return False, f"Error: Worker {worker_name} does not exist!"
+            
+        for slot in self.production_lines + self.crafting_stations:
+            if slot.assigned_worker == worker:
+                slot.assigned_worker = None
+                slot.is_active = False
+        worker.is_working = False
+        return True, f"Worker {worker_name} unassigned"
+        
+    def get_unit_margin(self, name: str, is_product: bool = True):
+        """Get value added by making one unit (sale value minus input cost)"""
+        recipe = self.get_recipe(name, is_product)
+        if recipe is None:
+            return 0
+        value = recipe.sale_price if is_product else recipe.cost
+        input_cost = sum(self.materials[m].cost * q for m, q in recipe.materials_required.items() if m in self.materials)
+        input_cost += sum(self.products[p].sale_price * q for p, q in recipe.products_required.items() if p in self.products)
+        return max(0, value - input_cost)
+        
+    @Journal.command
     def assign_product_to_line(self, product_name: str, line_id: int):
         """Assign product to production line"""
         if product_name not in self.products:
@@ -556,27 +2272,22 @@ class Factory:
             
         product = self.products[product_name]
         
-        # Check if all required materials are sufficient
-        for material_name, quantity in product.materials_required.items():
-            if self.material_inventory.get(material_name, 0) < quantity:
-                return False, f"Error: {material_name} insufficient! Need {quantity}, current stock {self.material_inventory.get(material_name, 0)}"
-            
-        # Check if all required products are sufficient
-        for product_name_req, quantity in product.products_required.items():
-            if self.product_inventory.get(product_name_req, 0) < quantity:
-                return False, f"Error: {product_name_req} insufficient! Need {quantity}, current stock {self.product_inventory.get(product_name_req, 0)}"
+        # Inputs reserved in bulk were already taken from stock
+        if not self.take_reserved_unit(product_name):
+            requirements = self.get_requirements(product)
             
-        # Consume all required materials
-        for material_name, quantity in product.materials_required.items():
-            self.material_inventory[material_name] -= quantity
-            
-        # Consume all required products
-        for product_name_req, quantity in product.products_required.items():
-            self.product_inventory[product_name_req] -= quantity
+            # Check if all required materials and products are sufficient
+            shortage = self.inventory.find_shortage(requirements)
+            if shortage:
+                return False, self.get_shortage_message(shortage)
+                
+            # Consume all required materials and products
+            self.consume_inputs(requirements)
             
         line.assign_product(product)
         return True, f"Production line {line_id} started producing {product_name}"
         
+    @Journal.command
     def assign_recipe_to_station(self, recipe_name: str, is_product: bool, station_id: int):
         """Assign crafting recipe to station"""
         station = next((s for s in self.crafting_stations if s.station_id == station_id), None)
@@ -600,37 +2311,56 @@ class Factory:
         if not recipe.is_craftable:
             return False, f"Error: {recipe_name} is not craftable!"
             
-        # Check if all required materials are sufficient
-        for material_name, quantity in recipe.materials_required.items():
-            if self.material_inventory.get(material_name, 0) < quantity:
-                return False, f"Error: {material_name} insufficient! Need {quantity}, current stock {self.material_inventory.get(material_name, 0)}"
-            
-        # Check if all required products are sufficient
-        for product_name, quantity in recipe.products_required.items():
-            if self.product_inventory.get(product_name, 0) < quantity:
-                return False, f"Error: {product_name} insufficient! Need {quantity}, current stock {self.product_inventory.get(product_name, 0)}"
-            
-        # Consume all required materials
-        for material_name, quantity in recipe.materials_required.items():
-            self.material_inventory[material_name] -= quantity
+        # Inputs reserved in bulk were already taken from stock
+        if not self.take_reserved_unit(recipe_name, is_product):
+            requirements = self.get_requirements(recipe, is_product)
             
-        # Consume all required products
-        for product_name, quantity in recipe.products_required.items():
-            self.product_inventory[product_name] -= quantity
+            # Check if all required materials and products are sufficient
+            shortage = self.inventory.find_shortage(requirements)
+            if shortage:
+                return False, self.get_shortage_message(shortage)
+                
+            # Consume all required materials and products
+            self.consume_inputs(requirements)
             
         station.assign_recipe(recipe_name, is_product)
         return True, f"Crafting station {station_id} started crafting {recipe_name}"
         
-    def update_production(self):
+    def consume_inputs(self, requirements: RequirementVector, units: int = 1):
+        """Consume recipe inputs, reporting materials that fall below the stock threshold"""
+        before = [(item_id, self.inventory.get_quantity(item_id)) for item_id, _ in requirements]
+        self.inventory.consume(requirements, units)
+        for item_id, quantity in before:
+            remaining = self.inventory.get_quantity(item_id)
+            if self.registry.kinds[item_id] == ItemRegistry.MATERIAL:
+                self.metrics.count(f"consumed:{self.registry.get_name(item_id)}", quantity - remaining)
+            if (self.registry.kinds[item_id] == ItemRegistry.MATERIAL and 
+                    quantity >= self.low_stock_threshold > remaining):
+                self.events.publish(SimEvent.STOCK_LOW, self.current_time, 
+                                    item=self.registry.get_name(item_id), quantity=remaining, 
+                                    threshold=self.low_stock_threshold)
+        
+    def get_shortage_message(self, shortage):
+        """Get error message for an unmet requirement"""
+        item_id, quantity = shortage
+        return f"Error: {self.registry.get_name(item_id)} insufficient! Need {quantity}, current stock {self.inventory.get_quantity(item_id)}"
+        
+    def update_production(self, minutes: int = 1):
         """Update all production lines progress"""
         completed_products = []
         for line in self.production_lines:
-            if line.is_active and line.current_product:
-                completed_product = line.update_production()
+            if not line.current_product:
+                # Work carried over is lost once the line stays idle for a step
+                line.production_progress = 0
+            elif line.is_active:
+                completed_product = line.update_production(minutes)
                 if completed_product:
                     # Production completed, add to inventory
-                    self.product_inventory[completed_product.name] += 1
+                    self.product_inventory.add(completed_product.name, 1)
                     completed_products.append(completed_product.name)
+                    self.metrics.count(f"produced:{completed_product.name}")
+                    self.events.publish(SimEvent.PRODUCTION_COMPLETED, self.current_time, 
+                                        product=completed_product.name, line_id=line.line_id)
                     
                     # Check if any orders need completion
                     for order in self.orders:
@@ -641,23 +2371,46 @@ class Factory:
                                 income = order.product.sale_price * order.quantity
                                 self.balance += income
                                 self.daily_income += income
+                                self.events.publish(SimEvent.ORDER_COMPLETED, self.current_time, 
+                                                    order_id=order.order_id, product=order.product.name, 
+                                                    quantity=order.quantity, income=income)
+                                
+        # With a history database attached, completed orders live there instead of in memory,
+        # otherwise only the most recent ones are kept and older ones just counted
+        limit = 0 if self.history is not None else COMPLETED_ORDER_LIMIT
+        completed_orders = [order for order in self.orders if order.is_completed]
+        if len(completed_orders) > limit:
+            evicted = completed_orders[:len(completed_orders) - limit]
+            for order in evicted:
+                self.overdue_reported.discard(order.order_id)
+            self.completed_order_count += len(evicted)
+            evicted_ids = {order.order_id for order in evicted}
+            self.orders = [order for order in self.orders if order.order_id not in evicted_ids]
         return completed_products
         
-    def update_crafting(self):
+    def update_crafting(self, minutes: int = 1):
         """Update all crafting stations progress"""
         completed_items = []
         for station in self.crafting_stations:
-            if station.is_active and station.current_recipe:
-                completed_item, is_product = station.update_crafting()
+            if not station.current_recipe:
+                # Work carried over is lost once the station stays idle for a step
+                station.crafting_progress = 0
+            elif station.is_active:
+                completed_item, is_product = station.update_crafting(minutes)
                 if completed_item:
                     # Crafting completed, add to inventory
                     if is_product:
-                        self.product_inventory[completed_item] += 1
+                        self.product_inventory.add(completed_item, 1)
                     else:
-                        self.material_inventory[completed_item] += 1
+                        self.material_inventory.add(completed_item, 1)
                     completed_items.append((completed_item, is_product))
+                    self.metrics.count(f"crafted:{completed_item}")
+                    self.events.publish(SimEvent.CRAFT_COMPLETED, self.current_time, 
+                                        item=completed_item, is_product=is_product, 
+                                        station_id=station.station_id)
         return completed_items
                             
+    @Journal.command
     def sell_from_inventory(self, product_name: str, quantity: int):
         """Sell from inventory"""
         if product_name not in self.product_inventory:
@@ -671,44 +2424,206 @@ class Factory:
         self.product_inventory[product_name] -= quantity
         self.balance += income
         self.daily_income += income
+        self.events.publish(SimEvent.PRODUCT_SOLD, self.current_time, 
+                            product=product_name, quantity=quantity, income=income)
         return True, f"Sold {quantity} units of {product_name}, earned ¥{income}"
         
+    @Journal.command
     def pay_workers(self):
         """Pay worker salaries"""
         total_salary = sum(worker.salary for worker in self.workers)
         if total_salary > self.balance:
+            self.events.publish(SimEvent.PAYROLL_FAILED, self.current_time, 
+                                amount=total_salary, balance=self.balance)
             return False, f"Warning: Insufficient funds to pay worker salaries! Need ¥{total_salary}, current balance ¥{self.balance}"
             
         self.balance -= total_salary
         self.daily_costs += total_salary
+        self.events.publish(SimEvent.PAYROLL_PAID, self.current_time, amount=total_salary)
         return True, f"Paid worker salaries ¥{total_salary}"
         
+    def ticks_to_next_completion(self, max_ticks: int):
+        """Get number of ticks until the next line or station completes"""
+        ticks = max_ticks
+        for line in self.production_lines:
+            if line.is_producing():
+                ticks = min(ticks, line.ticks_to_completion(self.tick_minutes))
+        for station in self.crafting_stations:
+            if station.is_crafting():
+                ticks = min(ticks, station.ticks_to_completion(self.tick_minutes))
+        return ticks
+        
+    def start_journal(self, directory: str):
+        """Record commands into a crash recovery journal"""
+        self.stop_journal()
+        try:
+            self.journal = Journal(self, directory)
+        except OSError as e:
+            return False, f"Error: Cannot start journal: {str(e)}"
+        return True, f"Journaling to {directory}"
+        
+    def stop_journal(self):
+        """Compact and close the crash recovery journal"""
+        if self.journal is None:
+            return False, "No journal running"
+        self.journal.close()
+        self.journal = None
+        return True, "Journal closed"
+        
+    def checkpoint(self):
+        """Write a journal snapshot of the current state"""
+        if self.journal is not None:
+            self.journal.write_snapshot()
+            
+    def recover_journal(self, directory: str):
+        """Restore the state recorded in a journal directory"""
+        self.stop_journal()
+        start = perf_counter()
+        # Replayed commands must not reach subscribers a second time
+        events = self.events
+        self.events = EventBus()
+        try:
+            replayed = Journal.recover(self, directory)
+        except (OSError, ValueError, KeyError) as e:
+            return False, f"Error: Cannot recover from journal: {str(e)}"
+        finally:
+            self.events = events
+        elapsed = (perf_counter() - start) * 1000
+        return True, f"Recovered snapshot and {replayed} journal entries in {elapsed:.1f} ms"
+        
+    def start_autosave(self, directory: str, interval_hours: float = 24, interval_minutes: float = None):
+        """Save periodically into rotating autosave slots"""
+        self.stop_autosave()
+        try:
+            self.autosaver = AutoSaver(self, directory, AUTOSAVE_SLOTS, interval_hours, interval_minutes)
+        except OSError as e:
+            return False, f"Error: Cannot start autosave: {str(e)}"
+        return True, f"Autosaving to {directory}"
+        
+    def stop_autosave(self):
+        """Stop autosaving after the queued save is written"""
+        if self.autosaver is None:
+            return False, "Autosave is not running"
+        self.autosaver.close()
+        self.autosaver = None
+        return True, "Autosave stopped"
+        
+    def open_history(self, path: str):
+        """Record history into a SQLite database"""
+        self.close_history()
+        try:
+            self.history = HistoryStore(self, path)
+        except sqlite3.Error as e:
+            return False, f"Error: Cannot open history database: {str(e)}"
+        return True, f"Recording history to {path}"
+        
+    def close_history(self):
+        """Close the history database"""
+        if self.history is None:
+            return False, "No history database open"
+        self.history.close()
+        self.history = None
+        return True, "History database closed"
+        
+    def start_export(self, path: str, file_format: str = None):
+        """Start streaming simulation events to a history file"""
+        self.stop_export()
+        try:
+            self.exporter = HistoryExporter(self, path, file_format)
+        except (ValueError, OSError) as e:
+            return False, f"Error: Cannot export history: {str(e)}"
+        return True, f"Exporting history to {path}"
+        
+    def stop_export(self):
+        """Finish the running history export"""
+        if self.exporter is None:
+            return False, "No history export running"
+        rows = self.exporter.close()
+        self.exporter = None
+        return True, f"History export finished, {rows} records written"
+        
+    def get_open_order_count(self):
+        """Get number of orders not yet completed"""
+        return sum(1 for order in self.orders if not order.is_completed)
+        
+    def get_gauges(self):
+        """Get current values of the sampled factory state metrics"""
+        lines = self.production_lines
+        busy = sum(1 for line in lines if line.is_producing())
+        backlog = sum(order.quantity - order.completed_quantity for order in self.orders if not order.is_completed)
+        return {
+            "balance": self.balance,
+            "line_utilization": busy / len(lines) if lines else 0.0,
+            "order_backlog": backlog
+        }
+        
     def advance_time(self, hours: int = 1):
         """Advance time"""
-        self.current_time += timedelta(hours=hours)
-        
-        # Update production and crafting hourly
+        # The period runs as one step per completion tick, so subscribers react to each
+        # completion (e.g. refill a finished line) before the rest of the period runs
+        minutes = int(round(hours * 60))
         completed_products = []
         completed_crafting = []
-        for _ in range(hours):
-            completed = self.update_production()
-            completed_products.extend(completed)
-            
-            completed = self.update_crafting()
-            completed_crafting.extend(completed)
+        while True:
+            elapsed, products, crafting, overdue_orders = self.run_ticks(minutes)
+            completed_products.extend(products)
+            completed_crafting.extend(crafting)
+            minutes -= elapsed
+            if minutes <= 0:
+                return completed_products, completed_crafting, overdue_orders
+                
+    @Journal.command
+    def run_ticks(self, minutes: int):
+        """Run ticks until the next completion tick or for a number of minutes, returns the minutes run"""
+        # Subscribers receive the events of the step together
+        with self.events.batch():
+            start_time = self.current_time
+            # Ticks started with the minutes the last period left over
+            tick_start = start_time - timedelta(minutes=self.tick_remainder)
+            available = self.tick_remainder + minutes
+            # Fast path: nothing can complete before the next completion tick,
+            # so skip all intermediate ticks in a single update
+            total_ticks = available // self.tick_minutes
+            ticks = self.ticks_to_next_completion(total_ticks)
             
-        # Check overdue orders
-        overdue_orders = []
-        for order in self.orders:
-            if order.is_overdue(self.current_time):
-                overdue_orders.append(order.order_id)
+            completed_products = []
+            completed_crafting = []
+            if ticks > 0:
+                self.current_time = tick_start + timedelta(minutes=ticks * self.tick_minutes)
+                # Hours passed during the jump are recorded before its completions
+                self.metrics.close_hours(self.current_time, self.get_gauges)
+                completed_products = self.update_production(ticks * self.tick_minutes)
+                completed_crafting = self.update_crafting(ticks * self.tick_minutes)
+                
+            if ticks == total_ticks:
+                # Minutes short of a whole tick wait for the next period
+                elapsed = minutes
+                self.tick_remainder = available - ticks * self.tick_minutes
+                self.current_time = start_time + timedelta(minutes=minutes)
+                self.metrics.close_hours(self.current_time, self.get_gauges)
+            else:
+                elapsed = ticks * self.tick_minutes - self.tick_remainder
+                self.tick_remainder = 0
                 
-        return completed_products, completed_crafting, overdue_orders
+            # Check overdue orders
+            overdue_orders = []
+            for order in self.orders:
+                if order.is_overdue(self.current_time):
+                    overdue_orders.append(order.order_id)
+                    if order.order_id not in self.overdue_reported:
+                        self.overdue_reported.add(order.order_id)
+                        self.events.publish(SimEvent.ORDER_OVERDUE, self.current_time, 
+                                            order_id=order.order_id, product=order.product.name)
+        return elapsed, completed_products, completed_crafting, overdue_orders
                 
+    @Journal.command
     def next_day(self):
         """Move to next day"""
         self.day += 1
-        self.current_time = self.current_time.replace(hour=8, minute=0) + timedelta(days=1)
+        new_time = self.current_time.replace(hour=8, minute=0) + timedelta(days=1)
+        # Hours skipped overnight are recorded with the current state and no production
+        self.metrics.close_hours(new_time, lambda: dict(self.get_gauges(), line_utilization=0.0))
+        self.current_time = new_time
         
         # Pay worker salaries
         success, message = self.pay_workers()
@@ -719,6 +2634,7 @@ class Factory:
         self.daily_income = 0
         self.daily_costs = 0
         
+        self.events.publish(SimEvent.DAY_STARTED, self.current_time, day=self.day)
         return success, message, daily_profit
         
     def get_status_text(self):
@@ -748,7 +2664,14 @@ class Factory:
         for product, quantity in self.product_inventory.items():
             status_text += f"  {product}: {quantity} units\n"
             
+        if self.reservations:
+            status_text += "\n--- Reserved Inputs ---\n"
+            for item_id, units in self.reservations.items():
+                status_text += f"  {self.registry.get_name(item_id)}: {units} units\n"
+            
         status_text += "\n--- Orders ---\n"
+        if self.completed_order_count:
+            status_text += f"  Earlier completed orders: {self.completed_order_count}\n"
         for order in self.orders:
             status = "Completed" if order.is_completed else "In Progress"
             overdue = " (Overdue!)" if order.is_overdue(self.current_time) else ""
@@ -758,16 +2681,24 @@ class Factory:
 
     def load_mod(self, mod):
         """Load mod"""
-        # Clear existing data
+        # Clear existing data and rebuild item ID registry
+        self.own_catalog()
         self.products.clear()
         self.materials.clear()
-        self.product_inventory.clear()
-        self.material_inventory.clear()
+        self.reset_inventory()
         self.workers.clear()
         self.crafting_stations.clear()
         
+        # Lines lose their workers and the work in progress of the old catalog
+        for line in self.production_lines:
+            line.assigned_worker = None
+            line.is_active = False
+            line.current_product = None
+            line.production_progress = 0
+        
         # Set initial balance
         self.balance = mod.initial_balance
+        self.mod_name = mod.name
         
         # Add materials
         for material in mod.materials:
@@ -787,6 +2718,9 @@ class Factory:
         for product in mod.products:
             self.add_product(product)
             
+        # Orders for products the mod does not define can never be filled
+        self.orders = [order for order in self.orders if order.product.name in self.products]
+        
         # Add workers
         for worker_data in mod.initial_workers:
             self.hire_worker(
@@ -798,308 +2732,2303 @@ class Factory:
         # Add crafting stations
         for station_data in mod.crafting_stations:
             self.add_crafting_station(station_data["name"], station_data["capacity"])
+            
+        # Material recipes were copied after registration
+        self.invalidate_recipes()
+        self.checkpoint()
+        
+    def to_dict(self):
+        """Convert complete simulation state to dictionary for JSON serialization"""
+        worker_index = {id(worker): index for index, worker in enumerate(self.workers)}
+        
+        def get_worker_index(worker):
+            # A worker no longer on the payroll is saved as unassigned
+            return worker_index.get(id(worker)) if worker else None
+            
+        return {
+            "name": self.name,
+            "balance": self.balance,
+            "day": self.day,
+            "current_time": self.current_time.isoformat(),
+            "daily_costs": self.daily_costs,
+            "daily_income": self.daily_income,
+            "tick_minutes": self.tick_minutes,
+            "tick_remainder": self.tick_remainder,
+            "low_stock_threshold": self.low_stock_threshold,
+            "next_order_id": self.next_order_id,
+            "completed_order_count": self.completed_order_count,
+            "mod_name": self.mod_name,
+            "materials": [material.to_dict() for material in self.materials.values()],
+            "products": [product.to_dict() for product in self.products.values()],
+            "material_inventory": dict(self.material_inventory),
+            "product_inventory": dict(self.product_inventory),
+            "reservations": [[self.registry.kinds[item_id] == ItemRegistry.PRODUCT, 
+                              self.registry.get_name(item_id), units]
+                             for item_id, units in self.reservations.items()],
+            "workers": [dict(worker.to_dict(), is_working=worker.is_working) for worker in self.workers],
+            "production_lines": [{
+                "line_id": line.line_id,
+                "capacity": line.capacity,
+                "current_product": line.current_product.name if line.current_product else None,
+                "production_progress": line.production_progress,
+                "assigned_worker": get_worker_index(line.assigned_worker),
+                "is_active": line.is_active
+            } for line in self.production_lines],
+            "crafting_stations": [{
+                "station_id": station.station_id,
+                "name": station.name,
+                "capacity": station.capacity,
+                "current_recipe": station.current_recipe,
+                "is_recipe_product": station.is_recipe_product,
+                "crafting_progress": station.crafting_progress,
+                "assigned_worker": get_worker_index(station.assigned_worker),
+                "is_active": station.is_active
+            } for station in self.crafting_stations],
+            "orders": [{
+                "order_id": order.order_id,
+                "product": order.product.name,
+                "quantity": order.quantity,
+                "deadline": order.deadline.isoformat(),
+                "completed_quantity": order.completed_quantity
+            } for order in self.orders],
+            "overdue_reported": sorted(self.overdue_reported)
+        }
+        
+    def restore_state(self, data):
+        """Replace the simulation state with one created by to_dict"""
+        self.name = data["name"]
+        self.balance = data["balance"]
+        self.day = data["day"]
+        self.current_time = datetime.fromisoformat(data["current_time"])
+        self.daily_costs = data["daily_costs"]
+        self.daily_income = data["daily_income"]
+        self.tick_minutes = data["tick_minutes"]
+        self.tick_remainder = data.get("tick_remainder", 0)
+        self.low_stock_threshold = data["low_stock_threshold"]
+        self.next_order_id = data["next_order_id"]
+        self.completed_order_count = data["completed_order_count"]
+        self.mod_name = data.get("mod_name")
+        
+        self.materials = {item["name"]: Material.from_dict(item) for item in data["materials"]}
+        self.products = {item["name"]: Product.from_dict(item) for item in data["products"]}
+        self.catalog_shared = False
+        self.reset_inventory()
+        self.material_inventory.replace(data["material_inventory"])
+        self.product_inventory.replace(data["product_inventory"])
+        for is_product, name, units in data["reservations"]:
+            kind = ItemRegistry.PRODUCT if is_product else ItemRegistry.MATERIAL
+            self.reservations[self.inventory.slot(kind, name)] = units
+            
+        self.workers = []
+        for item in data["workers"]:
+            worker = Worker.from_dict(item)
+            worker.is_working = item["is_working"]
+            self.workers.append(worker)
+            
+        self.production_lines = []
+        for item in data["production_lines"]:
+            line = ProductionLine(item["line_id"], item["capacity"])
+            line.current_product = self.products[item["current_product"]] if item["current_product"] else None
+            line.production_progress = item["production_progress"]
+            if item["assigned_worker"] is not None:
+                line.assigned_worker = self.workers[item["assigned_worker"]]
+            line.is_active = item["is_active"]
+            self.production_lines.append(line)
+            
+        self.crafting_stations = []
+        for item in data["crafting_stations"]:
+            station = CraftingStation(item["station_id"], item["name"], item["capacity"])
+            station.current_recipe = item["current_recipe"]
+            station.is_recipe_product = item["is_recipe_product"]
+            station.crafting_progress = item["crafting_progress"]
+            if item["assigned_worker"] is not None:
+                station.assigned_worker = self.workers[item["assigned_worker"]]
+            station.is_active = item["is_active"]
+            self.crafting_stations.append(station)
+            
+        self.orders = []
+        for item in data["orders"]:
+            order = Order(item["order_id"], self.products[item["product"]], item["quantity"], 
+                          datetime.fromisoformat(item["deadline"]))
+            order.complete_quantity(item["completed_quantity"])
+            self.orders.append(order)
+        self.overdue_reported = set(data["overdue_reported"])
+        self.metrics = MetricsStore(self.current_time)
+        
+    @classmethod
+    def from_dict(cls, data):
+        """Create factory from dictionary"""
+        factory = cls(data["name"], data["balance"])
+        factory.restore_state(data)
+        return factory
+
+class PurchasingEngine:
+    """Material purchasing from measured demand, reorder points and economic order quantities"""
+    
+    def __init__(self, factory: Factory):
+        self.factory = factory
+        self.order_cost = 5.0  # Fixed cost of placing one purchase (¥)
+        self.holding_rate = 0.02  # Daily holding cost as a fraction of unit cost
+        self.lead_time_hours = 1  # Hours between ordering and needing the stock
+        self.safety_hours = 8  # Hours of demand kept as safety stock
+        self.max_cover_hours = 72  # Hours of demand the stock may cover after a purchase
+        self.min_demand_hours = 24  # Shortest window demand is averaged over
+            
+    def explode(self, product_name: str, units: float, depth: int = 0):
+        """Get materials needed for units of a product, including its components"""
+        needs = {}
+        product = self.factory.products.get(product_name)
+        # Depth limit stops recipe cycles
+        if product is None or depth > len(self.factory.products):
+            return needs
+        for name, quantity in product.materials_required.items():
+            needs[name] = needs.get(name, 0) + quantity * units
+        for name, quantity in product.products_required.items():
+            for material_name, material_quantity in self.explode(name, quantity * units, depth + 1).items():
+                needs[material_name] = needs.get(material_name, 0) + material_quantity
+        return needs
+        
+    def get_demand_rates(self):
+        """Get material demand per hour, from the usage of completed work or open orders if higher"""
+        now = self.factory.current_time
+        metrics = self.factory.metrics
+        window = self.min_demand_hours
+        # Materials used by the production and crafting completed over the recent window; assignment
+        # consumes a whole unit's inputs up front, so counting at completion follows actual output
+        completions = [(product, metrics.get_rate(f"produced:{name}", window) 
+                        + metrics.get_rate(f"crafted:{name}", window)) 
+                       for name, product in self.factory.products.items()]
+        completions += [(material, metrics.get_rate(f"crafted:{name}", window)) 
+                        for name, material in self.factory.materials.items() if material.is_craftable]
+        rates = {}
+        for recipe, completed in completions:
+            if completed:
+                for name, quantity in recipe.materials_required.items():
+                    rates[name] = rates.get(name, 0) + quantity * completed
+        
+        # Open orders spread their bill of materials over the time to deadline
+        order_rates = {}
+        for order in self.factory.orders:
+            if order.is_completed:
+                continue
+            remaining = order.quantity - order.completed_quantity
+            # A short window would let an urgent order inflate the rate
+            hours_left = max(self.min_demand_hours, (order.deadline - now).total_seconds() / 3600)
+            for name, quantity in self.explode(order.product.name, remaining).items():
+                order_rates[name] = order_rates.get(name, 0) + quantity / hours_left
+                
+        for name, rate in order_rates.items():
+            rates[name] = max(rates.get(name, 0), rate)
+        return rates
+        
+    def get_reorder_point(self, rate: float):
+        """Get stock level at which to reorder"""
+        return rate * (self.lead_time_hours + self.safety_hours)
+        
+    def get_order_quantity(self, material: Material, rate: float):
+        """Get economic order quantity sqrt(2DS/H) for a daily demand D"""
+        holding_cost = max(material.cost * self.holding_rate, 0.0001)
+        return math.ceil(math.sqrt(2 * rate * 24 * self.order_cost / holding_cost))
+        
+    def plan_purchases(self, cash_fraction: float = 0.5):
+        """Plan one batch of purchases, most urgent materials first, within a share of the balance"""
+        candidates = []
+        for name, rate in self.get_demand_rates().items():
+            material = self.factory.materials.get(name)
+            if material is None or rate <= 0:
+                continue
+            stock = self.factory.material_inventory.get(name, 0)
+            reorder_point = self.get_reorder_point(rate)
+            if stock > reorder_point:
+                continue
+            # Economic quantity, limited to the cover cap but at least back to the reorder point
+            quantity = min(self.get_order_quantity(material, rate), math.floor(rate * self.max_cover_hours - stock))
+            quantity = max(quantity, math.ceil(reorder_point - stock))
+            hours_of_cover = stock / rate
+            candidates.append((hours_of_cover, name, quantity, material.cost))
+            
+        candidates.sort()
+        budget = self.factory.balance * cash_fraction
+        purchases = {}
+        for hours_of_cover, name, quantity, cost in candidates:
+            affordable = min(quantity, int(budget // cost)) if cost > 0 else quantity
+            if affordable > 0:
+                purchases[name] = affordable
+                budget -= affordable * cost
+        return purchases
+
+class PlanNode:
+    """Node of the rollout planner's search tree, one per action sequence"""
+    __slots__ = ("visits", "total", "children")
+    
+    def __init__(self):
+        self.visits = 0
+        self.total = 0.0  # Sum of rollout values through this node
+        self.children = {}  # Action -> PlanNode
+        
+    def get_mean(self):
+        """Get mean rollout value"""
+        return self.total / self.visits if self.visits else 0.0
+
+class RolloutPlanner:
+    """Monte Carlo tree search over daily expansion actions using forked simulations"""
+    
+    # Actions considered at the start of each day: (action, argument)
+    ACTIONS = (
+        ("none", None),
+        ("hire_worker", 3),
+        ("add_line", 10),
+        ("add_station", 5),
+        ("buy_stock", 50),
+    )
+    
+    def __init__(self, rollout_budget: int = 48, time_budget: float = 0.25, horizon_days: int = 3, 
+                 seed: int = None):
+        self.rollout_budget = rollout_budget  # Max rollouts per decision
+        self.time_budget = time_budget  # Max seconds of rollouts per timed decision
+        self.horizon_days = horizon_days  # Simulated days per rollout
+        self.work_hours = 8  # Hours simulated each day before moving to the next
+        self.exploration = 1.4  # UCB1 exploration weight, in units of the observed value spread
+        self.rng = random.Random(seed)
+        self.root = None
+        self.start_state = None  # Forked factory rollouts start from
+        self.start_value = 0.0
+        self.low = self.high = None  # Observed range of rollout values
+        self.rollouts = 0  # Rollouts of the current decision
+        self.elapsed = 0.0  # Seconds spent on rollouts of the current decision
+        self.stats = {"decisions": 0, "rollouts": 0, "reused_visits": 0, "total_time": 0.0}
+        
+    @staticmethod
+    def get_value(factory: Factory):
+        """Get balance plus raw material stock at cost"""
+        return factory.balance + sum(quantity * factory.materials[name].cost 
+                                     for name, quantity in factory.material_inventory.items() 
+                                     if name in factory.materials and not factory.materials[name].is_craftable)
+        
+    @staticmethod
+    def get_legal_actions(factory: Factory):
+        """Get actions that are possible and affordable"""
+        actions = []
+        for action, argument in RolloutPlanner.ACTIONS:
+            if action == "hire_worker" and factory.balance < 40 * argument:
+                continue
+            elif action == "add_line" and len(factory.production_lines) >= len(factory.workers):
+                continue
+            elif action == "add_station" and len(factory.crafting_stations) >= len(factory.workers):
+                continue
+            elif action == "buy_stock":
+                cost = sum(material.cost * argument for material in factory.materials.values() 
+                           if not material.is_craftable)
+                if factory.balance < cost:
+                    continue
+            actions.append((action, argument))
+        return actions
+        
+    @staticmethod
+    def apply_action(factory: Factory, action: str, argument):
+        """Apply an action, returns (success, message)"""
+        if action == "hire_worker":
+            name = f"AI Worker{len(factory.workers) + 1}"
+            factory.hire_worker(name, argument, 40 * argument)
+            return True, f"hired {name}"
+        elif action == "add_line":
+            factory.add_production_line(argument)
+            return True, "added a production line"
+        elif action == "add_station":
+            factory.add_crafting_station("AI Crafting Station", argument)
+            return True, "added a crafting station"
+        elif action == "buy_stock":
+            purchases = {name: argument for name, material in factory.materials.items() if not material.is_craftable}
+            return factory.purchase_materials(purchases)
+        return True, "kept the current plan"
+        
+    def begin(self, factory: Factory, last_action=None):
+        """Start a decision, reusing the subtree below the last committed action"""
+        if self.root is not None and last_action in self.root.children:
+            self.root = self.root.children[last_action]
+            self.stats["reused_visits"] += self.root.visits
+        else:
+            self.root = PlanNode()
+        self.start_state = factory.fork()
+        self.start_value = self.get_value(factory)
+        self.rollouts = 0
+        self.elapsed = 0.0
+        
+    def is_done(self, timed: bool = True):
+        """Check if the rollout budget, or when timed the time budget, of the decision is used up"""
+        return self.rollouts >= self.rollout_budget or (timed and self.elapsed >= self.time_budget)
+        
+    def abandon(self):
+        """Drop an unfinished decision"""
+        self.root = None
+        self.start_state = None
+        
+    def select(self, node: PlanNode, actions):
+        """Choose an untried action, otherwise the best by UCB1"""
+        untried = [action for action in actions if action not in node.children]
+        if untried:
+            return self.rng.choice(untried)
+        spread = max(self.high - self.low, 1.0) if self.low is not None else 1.0
+        log_visits = math.log(node.visits)
+        return max(actions, key=lambda action: node.children[action].get_mean() + self.exploration * spread 
+                   * math.sqrt(log_visits / node.children[action].visits))
+        
+    def run_rollout(self):
+        """Simulate one action sequence from the decision state and back up its value"""
+        start = perf_counter()
+        factory = self.start_state.fork()
+        # Salaries that could not be paid still count against the plan
+        unpaid = []
+        factory.events.subscribe(lambda event: unpaid.append(event.data["amount"]), 
+                                 event_types=(SimEvent.PAYROLL_FAILED,))
+        ai = FactoryAI(HeadlessApp(factory, log_limit=1))
+        ai.rng = random.Random(self.rng.random())
+        # Without a scheduler the nested AI runs each pass to completion, never cut short by the clock
+        ai.time_budget = math.inf
+        
+        # Follow the tree while it has statistics, expand one node, then keep the current plan
+        path = [self.root]
+        node = self.root
+        for day in range(self.horizon_days):
+            if node is not None:
+                action = self.select(node, self.get_legal_actions(factory))
+                if action not in node.children:
+                    node.children[action] = PlanNode()
+                    expanded = True
+                else:
+                    expanded = False
+                node = node.children[action]
+                path.append(node)
+                self.apply_action(factory, *action)
+                if expanded:
+                    node = None
+            if day == 0:
+                ai.start()
+            factory.run_days(1, self.work_hours)
+        ai.stop()
+        
+        value = self.get_value(factory) - sum(unpaid) - self.start_value
+        for visited in path:
+            visited.visits += 1
+            visited.total += value
+        if self.low is None:
+            self.low = self.high = value
+        else:
+            self.low = min(self.low, value)
+            self.high = max(self.high, value)
+        
+        self.rollouts += 1
+        self.elapsed += perf_counter() - start
+        self.stats["rollouts"] += 1
+        self.stats["total_time"] += perf_counter() - start
+        
+    def commit(self):
+        """Finish the decision, returns the most visited action"""
+        self.stats["decisions"] += 1
+        self.start_state = None
+        if not self.root.children:
+            return ("none", None)
+        return max(self.root.children, key=lambda action: self.root.children[action].visits)
 
 class FactoryAI:
     """AI Player class for automatic factory management"""
     
+    # Sub-policies of each strategy, in execution order
+    STRATEGY_POLICIES = {
+        "balanced": ("line_workers", "products", "station_workers", "recipes", "purchases", "orders"),
+        "aggressive": ("expansion", "line_workers", "products", "station_workers", "recipes", "purchases", "orders"),
+        "conservative": ("line_workers", "products", "critical_purchases"),
+        "planning": ("line_workers", "products", "station_workers", "recipes", "lookahead", "purchases", "orders"),
+    }
+    
+    # Method implementing each sub-policy
+    POLICY_METHODS = {
+        "expansion": "expand_factory",
+        "lookahead": "plan_expansion",
+        "line_workers": "assign_workers_to_lines",
+        "products": "assign_products_to_lines",
+        "station_workers": "assign_workers_to_stations",
+        "recipes": "assign_recipes_to_stations",
+        "purchases": "purchase_needed_materials",
+        "critical_purchases": "purchase_critical_materials",
+        "orders": "maintain_orders",
+    }
+    
+    # Sub-policies affected by each simulation event
+    EVENT_POLICIES = {
+        SimEvent.PRODUCTION_COMPLETED: {"products", "purchases", "critical_purchases"},  # Line became idle
+        SimEvent.CRAFT_COMPLETED: {"recipes", "products", "purchases", "critical_purchases"},
+        SimEvent.ORDER_CREATED: {"products", "purchases", "critical_purchases"},
+        SimEvent.ORDER_COMPLETED: {"expansion", "orders"},
+        SimEvent.STOCK_LOW: {"purchases", "critical_purchases"},
+        SimEvent.MATERIAL_PURCHASED: {"products", "recipes"},
+        SimEvent.WORKER_HIRED: {"line_workers", "products", "station_workers", "recipes"},
+        SimEvent.LINE_ADDED: {"line_workers", "products"},
+        SimEvent.STATION_ADDED: {"station_workers", "recipes"},
+    }
+    
+    # Tunable decision parameters
+    DEFAULT_PARAMS = {
+        "max_workers": 5,  # Workforce expansion stops at this size
+        "hire_balance": 500,  # Min balance before hiring
+        "hire_skill": 3,  # Skill level of hired workers
+        "max_lines": 4,  # Production line expansion stops at this count
+        "line_balance": 1000,  # Min balance before adding a production line
+        "max_stations": 3,  # Crafting station expansion stops at this count
+        "station_balance": 800,  # Min balance before adding a crafting station
+        "min_open_orders": 2,  # Orders created while fewer are open
+        "purchase_cash_fraction": 0.5,  # Share of the balance a purchase may spend
+        "critical_cash_fraction": 0.25,  # Share of the balance the conservative strategy may spend
+        "reassign_threshold": 0.1,  # Min relative profit gain before moving busy workers
+        "safety_hours": 8,  # Hours of demand kept as safety stock
+        "max_cover_hours": 72,  # Hours of demand the stock may cover after a purchase
+    }
+    
     def __init__(self, app):
         self.app = app
         self.factory = app.factory
         self.running = False
-        self.strategy = "balanced"  # balanced, aggressive, conservative
+        self.strategy = "balanced"  # balanced, aggressive, conservative, planning
         self.last_decision_day = 0
-        self.decision_interval = 1  # Decision interval (hours)
-        self.last_decision_time = self.factory.current_time
+        self.subscription = None
+        self.purchasing = PurchasingEngine(self.factory)
+        self.params = {}
+        self.set_params(self.DEFAULT_PARAMS)
+        self.rng = random  # Random source for created orders
+        self.planner = RolloutPlanner()  # Expansion planner of the planning strategy
+        self.last_plan_action = None
+        
+        # Decision passes with a scheduler run under a time and step budget and resume where they stopped
+        self.time_budget = 0.005  # Max seconds per pass
+        self.step_budget = 50  # Max policy steps per pass
+        self.pending_policies = []  # Queued sub-policies, in execution order
+        self.current_task = None  # (policy name, step generator) of the interrupted policy
+        self.scheduler = None  # Optional callable(delay_ms, callback) used to resume unfinished work
+        self.resume_delay = 10  # Milliseconds before resuming unfinished work
+        self.resume_scheduled = False
+        self.pass_stats = {"passes": 0, "interrupted": 0, "steps": 0, 
+                           "total_time": 0.0, "max_time": 0.0, "last_time": 0.0, "last_steps": 0}
+        
+    def set_params(self, params: dict):
+        """Set decision parameters, unknown names are ignored"""
+        self.params.update((name, value) for name, value in params.items() if name in self.DEFAULT_PARAMS)
+        self.reassign_threshold = self.params["reassign_threshold"]
+        self.purchasing.safety_hours = self.params["safety_hours"]
+        self.purchasing.max_cover_hours = self.params["max_cover_hours"]
         
     def start(self):
         """Start AI player"""
         self.running = True
-        self.last_decision_time = self.factory.current_time
+        self.subscription = self.factory.events.subscribe(
+            self.on_simulation_events,
+            event_types=set(self.EVENT_POLICIES) | {SimEvent.DAY_STARTED},
+            batch=True
+        )
         self.app.log_event("AI Player started")
         # Immediately make one decision
-        self.make_continuous_decisions()
+        self.make_decisions()
         
     def stop(self):
         """Stop AI player"""
         self.running = False
+        if self.subscription:
+            self.factory.events.unsubscribe(self.subscription)
+            self.subscription = None
+        self.pending_policies = []
+        self.current_task = None
         self.app.log_event("AI Player stopped")
         
-    def make_continuous_decisions(self):
-        """Make continuous decisions"""
+    def on_simulation_events(self, events):
+        """React to simulation events"""
         if not self.running:
             return
             
-        current_time = self.factory.current_time
-        time_diff = (current_time - self.last_decision_time).total_seconds() / 3600  # Convert to hours
-        
-        # Make decisions at regular intervals
-        if time_diff >= self.decision_interval:
-            self.last_decision_time = current_time
-            self.app.log_event(f"AI Player made decisions at {current_time.strftime('%H:%M')}")
+        if any(event.event_type == SimEvent.DAY_STARTED for event in events):
+            # A new day gets a full decision pass
+            self.make_daily_decisions()
+            return
             
-            try:
-                # Make decisions based on strategy
-                if self.strategy == "balanced":
-                    self.balanced_strategy()
-                elif self.strategy == "aggressive":
-                    self.aggressive_strategy()
-                elif self.strategy == "conservative":
-                    self.conservative_strategy()
-                    
-                self.app.update_display()
-            except Exception as e:
-                self.app.log_event(f"AI decision error: {str(e)}")
-        
-        # Schedule next decision check
-        if self.running:
-            # Check every 5 seconds if decisions need to be made
-            self.app.root.after(5000, self.make_continuous_decisions)
+        policies = set()
+        for event in events:
+            policies |= self.EVENT_POLICIES.get(event.event_type, set())
+        self.queue_policies(name for name in self.STRATEGY_POLICIES[self.strategy] if name in policies)
+        self.run_pass()
+        
+    def queue_policies(self, policies):
+        """Queue sub-policies for the next decision passes"""
+        for name in policies:
+            if name not in self.pending_policies:
+                self.pending_policies.append(name)
+                
+    def has_pending_work(self):
+        """Check if queued or interrupted decisions remain"""
+        return bool(self.pending_policies) or self.current_task is not None
+        
+    def run_pass(self):
+        """Run queued sub-policies until the pass budget is used up"""
+        self.resume_scheduled = False
+        start = perf_counter()
+        steps = 0
+        # Without a scheduler to resume it, the pass runs until no work remains
+        budgeted = self.running and self.scheduler is not None
+        try:
+            # Events caused by these decisions are handled after the pass
+            with self.factory.events.batch():
+                while self.has_pending_work():
+                    if self.current_task is None:
+                        name = self.pending_policies.pop(0)
+                        self.current_task = (name, getattr(self, self.POLICY_METHODS[name])())
+                    try:
+                        next(self.current_task[1])
+                        steps += 1
+                    except StopIteration:
+                        self.current_task = None
+                        continue
+                    if budgeted and (steps >= self.step_budget or perf_counter() - start >= self.time_budget):
+                        break
+        except Exception as e:
+            self.current_task = None
+            self.app.log_event(f"AI decision error: {str(e)}")
+            
+        # Record pass timing
+        elapsed = perf_counter() - start
+        stats = self.pass_stats
+        stats["passes"] += 1
+        stats["steps"] += steps
+        stats["total_time"] += elapsed
+        stats["max_time"] = max(stats["max_time"], elapsed)
+        stats["last_time"] = elapsed
+        stats["last_steps"] = steps
+        
+        if self.has_pending_work():
+            stats["interrupted"] += 1
+            if self.running and self.scheduler and not self.resume_scheduled:
+                self.resume_scheduled = True
+                self.scheduler(self.resume_delay, self.run_pass)
+        return steps
+        
+    def get_pass_stats(self):
+        """Get decision pass timing statistics"""
+        stats = dict(self.pass_stats)
+        stats["avg_time"] = stats["total_time"] / stats["passes"] if stats["passes"] else 0.0
+        stats["pending"] = len(self.pending_policies) + (1 if self.current_task else 0)
+        return stats
+        
+    def make_decisions(self):
+        """Make a full decision pass with the current strategy"""
+        # Queue decisions based on strategy
+        if self.strategy == "balanced":
+            self.balanced_strategy()
+        elif self.strategy == "aggressive":
+            self.aggressive_strategy()
+        elif self.strategy == "conservative":
+            self.conservative_strategy()
+        elif self.strategy == "planning":
+            self.planning_strategy()
+            
+        self.run_pass()
+        if self.has_pending_work():
+            self.app.log_event("AI decisions paused, remaining work continues next pass")
+        else:
+            self.app.log_event("AI decisions executed")
         
     def make_daily_decisions(self):
         """Make daily decisions (compatible with existing interface)"""
-        if not self.running or self.factory.day <= self.last_decision_day:
+        if self.factory.day <= self.last_decision_day:
             return
             
         self.last_decision_day = self.factory.day
         self.app.log_event(f"AI Player made decisions on Day {self.factory.day}")
-        
-        try:
-            # Make decisions based on strategy
-            if self.strategy == "balanced":
-                self.balanced_strategy()
-            elif self.strategy == "aggressive":
-                self.aggressive_strategy()
-            elif self.strategy == "conservative":
-                self.conservative_strategy()
-                
-            self.app.update_display()
-            self.app.log_event("AI decisions executed")
-        except Exception as e:
-            self.app.log_event(f"AI decision error: {str(e)}")
+        self.make_decisions()
         
     def balanced_strategy(self):
         """Balanced development strategy"""
         self.app.log_event("Executing balanced development strategy")
         
-        # 1. Assign workers to idle production lines
-        self.assign_workers_to_lines()
-        
-        # 2. Assign products to staffed production lines
-        self.assign_products_to_lines()
-        
-        # 3. Assign workers to idle crafting stations
-        self.assign_workers_to_stations()
-        
-        # 4. Assign recipes to crafting stations
-        self.assign_recipes_to_stations()
-        
-        # 5. Purchase necessary materials
-        self.purchase_needed_materials()
-        
-        # 6. Create some orders
-        if len(self.factory.orders) < 2:
-            self.create_random_orders()
+        # Staff lines and stations, keep them busy, restock and create orders
+        self.queue_policies(self.STRATEGY_POLICIES["balanced"])
             
     def aggressive_strategy(self):
         """Aggressive expansion strategy"""
         self.app.log_event("Executing aggressive expansion strategy")
         
+        # Expand workforce and equipment, then the balanced strategy decisions
+        self.queue_policies(self.STRATEGY_POLICIES["aggressive"])
+        
+    def expand_factory(self):
+        """Expand workforce and equipment while funds allow"""
+        params = self.params
         # 1. Hire as many workers as possible
-        if len(self.factory.workers) < 5 and self.factory.balance > 500:
-            self.hire_worker(f"AI Worker{len(self.factory.workers)+1}", 3, 120)
+        if len(self.factory.workers) < params["max_workers"] and self.factory.balance > params["hire_balance"]:
+            self.hire_worker(f"AI Worker{len(self.factory.workers)+1}", params["hire_skill"], 40 * params["hire_skill"])
+        yield
             
         # 2. Add more production lines
-        if len(self.factory.production_lines) < 4 and self.factory.balance > 1000:
+        if len(self.factory.production_lines) < params["max_lines"] and self.factory.balance > params["line_balance"]:
             self.factory.add_production_line(10)
             self.app.log_event("AI added new production line")
             self.app.update_progress_bars()
+        yield
             
         # 3. Add more crafting stations
-        if len(self.factory.crafting_stations) < 3 and self.factory.balance > 800:
+        if len(self.factory.crafting_stations) < params["max_stations"] and self.factory.balance > params["station_balance"]:
             self.factory.add_crafting_station("AI Crafting Station", 5)
             self.app.log_event("AI added new crafting station")
             self.app.update_progress_bars()
-            
-        # 4. Basic decisions from balanced strategy
-        self.balanced_strategy()
+        yield
+        
+    def planning_strategy(self):
+        """Rollout planning strategy"""
+        self.app.log_event("Executing rollout planning strategy")
+        
+        # Balanced strategy decisions, choosing the day's expansion by simulating ahead before restocking
+        self.queue_policies(self.STRATEGY_POLICIES["planning"])
+        
+    def plan_expansion(self):
+        """Choose and apply the expansion action with the best simulated outcome"""
+        planner = self.planner
+        planner.rng.seed(self.rng.random())
+        planner.begin(self.factory, self.last_plan_action)
+        day = self.factory.day
+        # With a scheduler the search stops at the time budget and each rollout is a step, so passes
+        # stay within their budget; headless runs search by rollout count only and repeat when seeded
+        timed = self.scheduler is not None
+        while not planner.is_done(timed):
+            planner.run_rollout()
+            yield
+            if self.factory.day != day:
+                # The next day gets its own decision
+                planner.abandon()
+                return
+                
+        action, argument = self.last_plan_action = planner.commit()
+        if action != "none":
+            success, message = planner.apply_action(self.factory, action, argument)
+            if success:
+                self.app.log_event(f"AI plan: {message} ({planner.rollouts} rollouts, {planner.elapsed * 1000:.0f}ms)")
+                self.app.update_progress_bars()
         
     def conservative_strategy(self):
         """Conservative operation strategy"""
         self.app.log_event("Executing conservative operation strategy")
         
-        # Only ensure basic operations
-        self.assign_workers_to_lines()
-        self.assign_products_to_lines()
-        
-        # Only purchase most necessary materials
-        critical_materials = ["Wood", "Metal", "Screws"]
-        for material in critical_materials:
-            if material in self.factory.materials:
-                current_stock = self.factory.material_inventory.get(material, 0)
-                if current_stock < 50 and self.factory.balance > 100:
-                    # Purchase enough materials
-                    needed = 100 - current_stock
-                    affordable = min(needed, int(self.factory.balance / self.factory.materials[material].cost / 2))
-                    if affordable > 0:
-                        success, message = self.factory.purchase_material(material, affordable)
-                        if success:
-                            self.app.log_event(message)
+        # Only ensure basic operations and purchase most necessary materials
+        self.queue_policies(self.STRATEGY_POLICIES["conservative"])
+        
+    def purchase_critical_materials(self):
+        """Purchase only the most necessary materials"""
+        # Spend at most a quarter of the balance by default
+        yield from self.purchase_planned_materials(self.params["critical_cash_fraction"])
+        
+    def purchase_planned_materials(self, cash_fraction: float):
+        """Purchase the materials planned by the purchasing engine in one batch"""
+        purchases = self.purchasing.plan_purchases(cash_fraction)
+        yield
+        if purchases:
+            success, message = self.factory.purchase_materials(purchases)
+            if success:
+                items = ", ".join(f"{quantity} {name}" for name, quantity in purchases.items())
+                self.app.log_event(f"AI purchased {items}")
                 
     def assign_workers_to_lines(self):
         """Assign workers to production lines"""
-        available_workers = [w for w in self.factory.workers if not w.is_working]
-        unstaffed_lines = [l for l in self.factory.production_lines if not l.assigned_worker]
-        
-        for worker, line in zip(available_workers, unstaffed_lines):
-            success, message = self.factory.assign_worker_to_line(worker.name, line.line_id)
-            if success:
-                self.app.log_event(f"AI assigned {worker.name} to production line {line.line_id}")
+        yield from self.assign_workers_to_slots(self.factory.production_lines, True)
                 
     def assign_workers_to_stations(self):
         """Assign workers to crafting stations"""
-        available_workers = [w for w in self.factory.workers if not w.is_working]
-        unstaffed_stations = [s for s in self.factory.crafting_stations if not s.assigned_worker]
-        
-        for worker, station in zip(available_workers, unstaffed_stations):
-            success, message = self.factory.assign_worker_to_station(worker.name, station.station_id)
-            if success:
-                self.app.log_event(f"AI assigned {worker.name} to crafting station {station.station_id}")
+        yield from self.assign_workers_to_slots(self.factory.crafting_stations, False)
+        
+    def choose_product(self, craftable_only: bool = False):
+        """Choose the product to start on an idle production line or crafting station"""
+        makeable = self.factory.get_makeable_items()
+        return next((name for name, is_product in makeable 
+                     if is_product and (not craftable_only or self.factory.products[name].is_craftable)), None)
+        
+    def get_slot_value(self, slot, is_line: bool):
+        """Get profit per progress unit of the work a line or station is running or would run"""
+        if is_line:
+            product = slot.current_product
+            if product is None:
+                product = self.factory.products.get(self.choose_product())
+            if product is None:
+                return 0
+            return self.factory.get_unit_margin(product.name) / max(1, product.production_time * PROGRESS_SCALE)
+            
+        if slot.current_recipe:
+            name, is_product = slot.current_recipe, slot.is_recipe_product
+        else:
+            name, is_product = self.choose_product(craftable_only=True), True
+        if name is None:
+            return 0
+        return self.factory.get_unit_margin(name, is_product) / (CRAFTING_TIME * PROGRESS_SCALE)
+        
+    def assign_workers_to_slots(self, slots, is_line: bool):
+        """Match workers to production lines or crafting stations maximizing profit per hour"""
+        if not slots:
+            return
+            
+        # Candidates: idle workers and workers already on this kind of slot
+        current = {slot.assigned_worker.name: index for index, slot in enumerate(slots) if slot.assigned_worker}
+        workers = [w for w in self.factory.workers if not w.is_working or w.name in current]
+        if not workers:
+            return
+            
+        # Expected profit per hour of each worker on each slot
+        values = [self.get_slot_value(slot, is_line) for slot in slots]
+        profit = [[worker.work_rate() * 60 * value for value in values] for worker in workers]
+        yield
+        
+        assignment = AssignmentSolver.solve(profit)
+        current_profit = sum(profit[i][current[w.name]] for i, w in enumerate(workers) if w.name in current)
+        best_profit = sum(profit[i][j] for i, j in enumerate(assignment) if j >= 0)
+        
+        if best_profit - current_profit <= self.reassign_threshold * current_profit:
+            # Gain too small to move busy workers: only match idle workers to unstaffed slots
+            idle = [i for i, w in enumerate(workers) if w.name not in current]
+            open_slots = [j for j, slot in enumerate(slots) if not slot.assigned_worker]
+            sub_assignment = AssignmentSolver.solve([[profit[i][j] for j in open_slots] for i in idle])
+            assignment = [current.get(w.name, -1) for w in workers]
+            for i, j in zip(idle, sub_assignment):
+                if j >= 0:
+                    assignment[i] = open_slots[j]
+        yield
+        
+        # Free moved workers and the slots they take over before assigning
+        moves = [(workers[i], slots[j]) for i, j in enumerate(assignment) 
+                 if j >= 0 and slots[j].assigned_worker is not workers[i]]
+        for i, worker in enumerate(workers):
+            if worker.name in current and assignment[i] != current[worker.name]:
+                self.factory.unassign_worker(worker.name)
+                
+        for worker, slot in moves:
+            if is_line:
+                success, message = self.factory.assign_worker_to_line(worker.name, slot.line_id)
+                if success:
+                    self.app.log_event(f"AI assigned {worker.name} to production line {slot.line_id}")
+            else:
+                success, message = self.factory.assign_worker_to_station(worker.name, slot.station_id)
+                if success:
+                    self.app.log_event(f"AI assigned {worker.name} to crafting station {slot.station_id}")
+            yield
                 
     def assign_products_to_lines(self):
         """Assign products to production lines"""
         staffed_lines = [l for l in self.factory.production_lines if l.assigned_worker and not l.current_product]
         
         for line in staffed_lines:
-            # Try to assign different products
-            for product_name, product in self.factory.products.items():
-                can_produce = True
-                
-                # Check if materials are sufficient
-                for material, quantity in product.materials_required.items():
-                    if material not in self.factory.material_inventory or self.factory.material_inventory[material] < quantity:
-                        can_produce = False
-                        break
-                        
-                # Check if required products are sufficient
-                for prod_req, quantity in product.products_required.items():
-                    if prod_req not in self.factory.product_inventory or self.factory.product_inventory[prod_req] < quantity:
-                        can_produce = False
-                        break
-                        
-                if can_produce:
-                    success, message = self.factory.assign_product_to_line(product_name, line.line_id)
-                    if success:
-                        self.app.log_event(f"AI started producing {product_name} on production line {line.line_id}")
-                        break
+            if line.current_product or not line.assigned_worker:
+                continue  # Changed since the pass was interrupted
+            # Assign the first product whose inputs are all in stock
+            product_name = self.choose_product()
+            if product_name:
+                success, message = self.factory.assign_product_to_line(product_name, line.line_id)
+                if success:
+                    self.app.log_event(f"AI started producing {product_name} on production line {line.line_id}")
+            yield
                         
     def assign_recipes_to_stations(self):
         """Assign recipes to crafting stations"""
         staffed_stations = [s for s in self.factory.crafting_stations if s.assigned_worker and not s.current_recipe]
         
         for station in staffed_stations:
-            # Try to assign craftable products
-            for product_name, product in self.factory.products.items():
-                if product.is_craftable:
-                    can_craft = True
-                    
-                    # Check if materials are sufficient
-                    for material, quantity in product.materials_required.items():
-                        if material not in self.factory.material_inventory or self.factory.material_inventory[material] < quantity:
-                            can_craft = False
-                            break
-                            
-                    # Check if required products are sufficient
-                    for prod_req, quantity in product.products_required.items():
-                        if prod_req not in self.factory.product_inventory or self.factory.product_inventory[prod_req] < quantity:
-                            can_craft = False
-                            break
-                            
-                    if can_craft:
-                        success, message = self.factory.assign_recipe_to_station(product_name, True, station.station_id)
-                        if success:
-                            self.app.log_event(f"AI started crafting {product_name} on crafting station {station.station_id}")
-                            break
+            if station.current_recipe or not station.assigned_worker:
+                continue  # Changed since the pass was interrupted
+            # Assign the first craftable product whose inputs are all in stock
+            product_name = self.choose_product(craftable_only=True)
+            if product_name:
+                success, message = self.factory.assign_recipe_to_station(product_name, True, station.station_id)
+                if success:
+                    self.app.log_event(f"AI started crafting {product_name} on crafting station {station.station_id}")
+            yield
                     
     def purchase_needed_materials(self):
         """Purchase needed materials"""
-        for material_name, material in self.factory.materials.items():
-            current_stock = self.factory.material_inventory.get(material_name, 0)
+        # Spend at most half of the balance by default
+        yield from self.purchase_planned_materials(self.params["purchase_cash_fraction"])
+                    
+    def maintain_orders(self):
+        """Keep some orders open"""
+        if self.factory.get_open_order_count() < self.params["min_open_orders"]:
+            self.create_random_orders()
+        yield
+            
+    def create_random_orders(self):
+        """Create random orders"""
+        available_products = list(self.factory.products.keys())
+        if available_products:
+            product = self.rng.choice(available_products)
+            quantity = self.rng.randint(3, 10)
+            days = self.rng.randint(2, 5)
+            
+            order, message = self.factory.create_order(product, quantity, days)
+            if order:
+                self.app.log_event(f"AI created order: {product} x{quantity}, deliver within {days} days")
+                
+    def hire_worker(self, name, skill_level, salary):
+        """Hire worker"""
+        if self.factory.balance >= salary:
+            worker = self.factory.hire_worker(name, skill_level, salary)
+            self.app.log_event(f"AI hired worker {name}")
+            return worker
+        return None
+        
+    def analyze_factory(self):
+        """Analyze factory status"""
+        analysis = "=== AI Analysis Report ===\n\n"
+        
+        # Financial analysis
+        analysis += f"Financial Status: ¥{self.factory.balance}\n"
+        if self.factory.balance < 200:
+            analysis += "Warning: Insufficient funds!\n"
+        elif self.factory.balance > 1000:
+            analysis += "Good: Sufficient funds\n"
+        else:
+            analysis += "Normal: Good financial status\n"
+            
+        analysis += "\n"
+        
+        # Production line analysis
+        active_lines = sum(1 for line in self.factory.production_lines if line.is_active)
+        total_lines = len(self.factory.production_lines)
+        analysis += f"Production Lines: {active_lines}/{total_lines} running\n"
+        
+        if active_lines < total_lines:
+            analysis += "Suggestion: Assign more workers to production lines\n"
+            
+        analysis += "\n"
+        
+        # Inventory analysis
+        low_stock_materials = []
+        for material, quantity in self.factory.material_inventory.items():
+            if quantity < 50:
+                low_stock_materials.append(material)
+                
+        if low_stock_materials:
+            analysis += f"Low stock materials: {', '.join(low_stock_materials)}\n"
+            analysis += "Suggestion: Restock inventory\n"
+        else:
+            analysis += "Material inventory: Sufficient\n"
+            
+        analysis += "\n"
+        
+        # Buildable quantity analysis (including crafted components)
+        analysis += "Buildable from current stock:\n"
+        for product_name in self.factory.products:
+            units = self.factory.get_max_buildable(product_name)
+            units_text = "Unlimited" if units >= UNLIMITED_UNITS else str(units)
+            analysis += f"  {product_name}: {units_text}\n"
+            
+        analysis += "\n"
+        
+        # Order analysis
+        active_orders = self.factory.get_open_order_count()
+        analysis += f"Active orders: {active_orders}\n"
+        
+        if active_orders < 2:
+            analysis += "Suggestion: Create more orders\n"
+            
+        analysis += "\n"
+        
+        # Recent throughput from the metrics store
+        metrics = self.factory.metrics
+        analysis += "Last 24 hours:\n"
+        for product_name in self.factory.products:
+            rate = metrics.get_rate(f"produced:{product_name}", 24)
+            if rate:
+                analysis += f"  {product_name}: {rate * 24:.0f} produced\n"
+        analysis += f"  Line utilization: {metrics.get_mean('line_utilization', 24):.0%}\n"
+        analysis += f"  Order backlog: {metrics.get_mean('order_backlog', 24):.1f} units\n"
+        
+        analysis += "\n"
+        
+        # Decision pass cost
+        stats = self.get_pass_stats()
+        analysis += f"Decision passes: {stats['passes']} (interrupted {stats['interrupted']})\n"
+        analysis += f"Pass time: avg {stats['avg_time'] * 1000:.2f}ms, max {stats['max_time'] * 1000:.2f}ms, "
+        analysis += f"budget {self.time_budget * 1000:.1f}ms / {self.step_budget} steps\n"
+        if self.planner.stats["decisions"]:
+            planner_stats = self.planner.stats
+            analysis += f"Planning: {planner_stats['decisions']} decisions, "
+            analysis += f"{planner_stats['rollouts'] / planner_stats['decisions']:.0f} rollouts / "
+            analysis += f"{planner_stats['total_time'] / planner_stats['decisions'] * 1000:.0f}ms each, "
+            analysis += f"{planner_stats['reused_visits']} rollouts reused\n"
+        if stats["pending"]:
+            analysis += f"Pending sub-policies: {stats['pending']}\n"
+            
+        return analysis
+
+class HeadlessApp:
+    """Stand-in for the GUI so FactoryAI can run without a display"""
+    def __init__(self, factory: Factory, log_limit: int = 200):
+        self.factory = factory
+        self.logs = deque(maxlen=log_limit)  # Most recent log messages
+        
+    def log_event(self, message, time=None):
+        """Keep log message"""
+        self.logs.append(message)
+        
+    def update_display(self):
+        """Nothing to display"""
+        
+    def update_progress_bars(self):
+        """Nothing to display"""
+
+class ScenarioAnalyzer:
+    """Ranks candidate actions by simulating each on a copy of the factory in a process pool"""
+    
+    # Candidate actions offered by default: (action, argument)
+    DEFAULT_CANDIDATES = (
+        ("none", None),
+        ("hire_worker", 3),
+        ("add_line", 10),
+        ("add_station", 5),
+        ("buy_stock", 100),
+        ("strategy", "aggressive"),
+        ("strategy", "conservative"),
+    )
+    
+    def __init__(self, factory: Factory, strategy: str = "balanced", horizon_days: int = 7, 
+                 runs: int = 4, seed: int = 0, max_workers: int = None):
+        self.factory = factory
+        self.strategy = strategy  # AI strategy driving every candidate
+        self.horizon_days = horizon_days
+        self.runs = runs  # Simulations per candidate, each with its own order seed
+        self.seed = seed
+        self.max_workers = max_workers
+        self.work_hours = 8  # Hours simulated each day before moving to the next
+        self.candidates = []
+        self.futures = []
+        self.results = None
+        self.executor = None
+        
+    @staticmethod
+    def describe(action: str, argument):
+        """Get display text of a candidate action"""
+        if action == "hire_worker":
+            return f"Hire a skill {argument} worker"
+        elif action == "add_line":
+            return f"Add a production line (capacity {argument})"
+        elif action == "add_station":
+            return f"Add a crafting station (capacity {argument})"
+        elif action == "buy_stock":
+            return f"Buy {argument} units of each raw material"
+        elif action == "strategy":
+            return f"Switch to {argument} strategy"
+        return "Keep current plan"
+        
+    @staticmethod
+    def apply_action(factory: Factory, action: str, argument, strategy: str):
+        """Apply a candidate action, returns (success, strategy to run)"""
+        success = True
+        if action == "hire_worker":
+            factory.hire_worker(f"Candidate Worker {len(factory.workers) + 1}", argument, 40 * argument)
+        elif action == "add_line":
+            factory.add_production_line(argument)
+        elif action == "add_station":
+            factory.add_crafting_station("Candidate Station", argument)
+        elif action == "buy_stock":
+            purchases = {name: argument for name, material in factory.materials.items() if not material.is_craftable}
+            success, message = factory.purchase_materials(purchases)
+        elif action == "strategy":
+            strategy = argument
+        return success, strategy
+        
+    @staticmethod
+    def simulate(state: dict, action: str, argument, strategy: str, horizon_days: int, 
+                 work_hours: int, seed: int):
+        """Simulate one candidate from a factory state, runs in worker processes"""
+        factory = Factory.from_dict(state)
+        start_balance = factory.balance
+        counts = {SimEvent.PRODUCTION_COMPLETED: 0, SimEvent.CRAFT_COMPLETED: 0, 
+                  SimEvent.ORDER_COMPLETED: 0, SimEvent.ORDER_OVERDUE: 0}
+        
+        def count_events(events):
+            for event in events:
+                counts[event.event_type] += 1
+                
+        factory.events.subscribe(count_events, event_types=tuple(counts), batch=True)
+        success, strategy = ScenarioAnalyzer.apply_action(factory, action, argument, strategy)
+        ai = FactoryAI(HeadlessApp(factory))
+        # The AI is the only random source, a seed of its own keeps the module generator untouched
+        ai.rng = random.Random(seed)
+        ai.strategy = strategy
+        ai.start()
+        factory.run_days(horizon_days, work_hours)
+        ai.stop()
+        return {
+            "applied": success,
+            "balance": factory.balance,
+            "profit": factory.balance - start_balance,
+            "throughput": counts[SimEvent.PRODUCTION_COMPLETED] + counts[SimEvent.CRAFT_COMPLETED],
+            "orders_completed": counts[SimEvent.ORDER_COMPLETED],
+            "late_orders": counts[SimEvent.ORDER_OVERDUE]
+        }
+        
+    def start(self, candidates=None):
+        """Start simulating candidates in worker processes"""
+        self.candidates = list(candidates or self.DEFAULT_CANDIDATES)
+        self.results = None
+        state = self.factory.to_dict()
+        # Every candidate sees the same order seeds, so differences come from the action
+        tasks = [(state, action, argument, self.strategy, self.horizon_days, self.work_hours, self.seed + run)
+                 for action, argument in self.candidates for run in range(self.runs)]
+        try:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            self.futures = [self.executor.submit(ScenarioAnalyzer.simulate, *task) for task in tasks]
+        except (OSError, NotImplementedError, BrokenProcessPool):
+            # No process pool on this platform, simulate in this process
+            self.close()
+            self.collect([ScenarioAnalyzer.simulate(*task) for task in tasks])
+            
+    def is_done(self):
+        """Check if all simulations finished"""
+        return self.results is not None or all(future.done() for future in self.futures)
+        
+    def get_results(self):
+        """Wait for all simulations, returns candidate results ranked by projected balance"""
+        if self.results is None:
+            try:
+                outcomes = [future.result() for future in self.futures]
+            except BrokenProcessPool:
+                # A worker died, repeat the work in this process
+                state = self.factory.to_dict()
+                outcomes = [ScenarioAnalyzer.simulate(state, action, argument, self.strategy, self.horizon_days, 
+                                                      self.work_hours, self.seed + run)
+                            for action, argument in self.candidates for run in range(self.runs)]
+            finally:
+                self.close()
+            self.collect(outcomes)
+        return self.results
+        
+    def collect(self, outcomes):
+        """Average the runs of each candidate and rank candidates"""
+        self.results = []
+        for index, (action, argument) in enumerate(self.candidates):
+            runs = outcomes[index * self.runs:(index + 1) * self.runs]
+            result = {key: sum(run[key] for run in runs) / len(runs) 
+                      for key in ("balance", "profit", "throughput", "orders_completed", "late_orders")}
+            result["applied"] = all(run["applied"] for run in runs)
+            result["action"] = action
+            result["argument"] = argument
+            result["description"] = self.describe(action, argument)
+            self.results.append(result)
+        self.results.sort(key=lambda result: (-result["balance"], result["late_orders"]))
+        
+    def run(self, candidates=None):
+        """Simulate candidates and wait for the ranked results"""
+        self.start(candidates)
+        return self.get_results()
+        
+    def close(self):
+        """Shut down the worker processes"""
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+        self.futures = []
+        
+    def format_table(self):
+        """Get ranked results as a text table"""
+        lines = [f"{'Rank':<5}{'Candidate':<44}{'Balance':>12}{'Profit':>12}{'Output':>9}{'Orders':>8}{'Late':>7}"]
+        for rank, result in enumerate(self.results or [], 1):
+            note = "" if result["applied"] else " (not affordable)"
+            lines.append(f"{rank:<5}{(result['description'] + note)[:43]:<44}{result['balance']:>12.2f}"
+                         f"{result['profit']:>12.2f}{result['throughput']:>9.1f}"
+                         f"{result['orders_completed']:>8.1f}{result['late_orders']:>7.1f}")
+        return "\n".join(lines)
+
+class ParameterTuner:
+    """Genetic search over FactoryAI decision parameters using seeded simulations in a process pool"""
+    
+    # Search range of each parameter: (low, high, is integer)
+    PARAM_SPACE = {
+        "max_workers": (3, 10, True),
+        "hire_balance": (100, 2000, True),
+        "hire_skill": (1, 5, True),
+        "max_lines": (1, 8, True),
+        "line_balance": (200, 4000, True),
+        "max_stations": (1, 6, True),
+        "station_balance": (200, 4000, True),
+        "min_open_orders": (1, 6, True),
+        "purchase_cash_fraction": (0.1, 0.9, False),
+        "critical_cash_fraction": (0.05, 0.5, False),
+        "reassign_threshold": (0.0, 0.5, False),
+        "safety_hours": (0, 48, True),
+        "max_cover_hours": (24, 168, True),
+    }
+    
+    def __init__(self, factory: Factory, strategy: str = "aggressive", days: int = 14, seeds: int = 4, 
+                 population: int = 16, generations: int = 10, seed: int = 0, max_workers: int = None, 
+                 cache_path: str = None):
+        self.factory = factory
+        self.strategy = strategy
+        self.days = days  # Simulated days per evaluation
+        self.seeds = seeds  # Seeded simulations averaged per evaluation
+        self.population = population
+        self.generations = generations
+        self.max_workers = max_workers
+        self.work_hours = 8  # Hours simulated each day before moving to the next
+        self.mutation_rate = 0.2  # Chance of mutating each parameter of a child
+        self.elite = 2  # Best candidates carried over unchanged
+        self.rng = random.Random(seed)
+        self.cache_path = cache_path
+        self.cache = {}  # Evaluation key -> score
+        self.history = []  # (generation, best score, best parameters)
+        self.evaluations = 0  # Simulations run, cache hits excluded
+        self.state = factory.to_dict()
+        # Evaluations only match for the same starting state and settings
+        self.context = hashlib.sha256(json.dumps([self.state, strategy, days, seeds, self.work_hours], 
+                                                 sort_keys=True, default=str).encode()).hexdigest()
+        self.load_cache()
+        
+    def load_cache(self):
+        """Load cached evaluations"""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                self.cache.update(json.load(f))
+        except (OSError, ValueError):
+            pass  # An unreadable cache only costs evaluations
+            
+    def save_cache(self):
+        """Save cached evaluations"""
+        if self.cache_path:
+            temp_path = self.cache_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f)
+            os.replace(temp_path, self.cache_path)
+            
+    def get_key(self, params: dict):
+        """Get cache key of a parameter set"""
+        return hashlib.sha256((self.context + json.dumps(params, sort_keys=True)).encode()).hexdigest()
+        
+    @staticmethod
+    def evaluate(state: dict, params: dict, strategy: str, days: int, work_hours: int, seed: int):
+        """Simulate the AI with a parameter set, runs in worker processes"""
+        factory = Factory.from_dict(state)
+        start_value = RolloutPlanner.get_value(factory)
+        unpaid = []
+        factory.events.subscribe(lambda event: unpaid.append(event.data["amount"]), 
+                                 event_types=(SimEvent.PAYROLL_FAILED,))
+        ai = FactoryAI(HeadlessApp(factory, log_limit=1))
+        ai.rng = random.Random(seed)
+        ai.strategy = strategy
+        ai.set_params(params)
+        ai.start()
+        factory.run_days(days, work_hours)
+        ai.stop()
+        return RolloutPlanner.get_value(factory) - sum(unpaid) - start_value
+        
+    def evaluate_all(self, candidates):
+        """Score candidates, simulating only those not in the cache"""
+        missing = {}
+        for params in candidates:
+            key = self.get_key(params)
+            if key not in self.cache:
+                missing[key] = params
+                
+        tasks = [(key, (self.state, params, self.strategy, self.days, self.work_hours, seed)) 
+                 for key, params in missing.items() for seed in range(self.seeds)]
+        scores = {key: 0.0 for key in missing}
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [(key, executor.submit(ParameterTuner.evaluate, *task)) for key, task in tasks]
+                for key, future in futures:
+                    scores[key] += future.result()
+        except (OSError, NotImplementedError, BrokenProcessPool):
+            # No usable process pool, simulate in this process
+            scores = {key: 0.0 for key in missing}
+            for key, task in tasks:
+                scores[key] += ParameterTuner.evaluate(*task)
+                
+        self.evaluations += len(tasks)
+        for key, score in scores.items():
+            self.cache[key] = score / self.seeds
+        return [self.cache[self.get_key(params)] for params in candidates]
+        
+    def random_params(self):
+        """Get a random parameter set"""
+        return {name: self.clip(name, self.rng.uniform(low, high)) for name, (low, high, is_int) in self.PARAM_SPACE.items()}
+        
+    def clip(self, name: str, value: float):
+        """Limit a parameter to its range"""
+        low, high, is_int = self.PARAM_SPACE[name]
+        value = min(high, max(low, value))
+        return int(round(value)) if is_int else round(value, 3)
+        
+    def breed(self, ranked):
+        """Get a child of two tournament-selected parents with uniform crossover and gaussian mutation"""
+        parents = [min(self.rng.sample(range(len(ranked)), min(3, len(ranked)))) for _ in range(2)]
+        child = {}
+        for name, (low, high, is_int) in self.PARAM_SPACE.items():
+            value = ranked[self.rng.choice(parents)][1][name]
+            if self.rng.random() < self.mutation_rate:
+                value += self.rng.gauss(0, 0.15 * (high - low))
+            child[name] = self.clip(name, value)
+        return child
+        
+    def run(self, progress=None):
+        """Search parameters, returns (best score, best parameters)"""
+        # The current defaults compete with random parameter sets
+        defaults = {name: FactoryAI.DEFAULT_PARAMS[name] for name in self.PARAM_SPACE}
+        candidates = [defaults] + [self.random_params() for _ in range(self.population - 1)]
+        ranked = []
+        for generation in range(self.generations):
+            scores = self.evaluate_all(candidates)
+            ranked = sorted(zip(scores, candidates), key=lambda pair: -pair[0])
+            self.history.append((generation, ranked[0][0], ranked[0][1]))
+            self.save_cache()
+            if progress:
+                progress(generation, ranked[0][0])
+            candidates = [params for score, params in ranked[:self.elite]]
+            candidates += [self.breed(ranked) for _ in range(self.population - len(candidates))]
+        return ranked[0]
+
+class FactoryEnv:
+    """Reinforcement learning environment with reset()/step(action) on forks of a factory"""
+    
+    def __init__(self, factory: Factory = None, seed: int = None, step_minutes: int = 30, work_hours: int = 8, 
+                 max_days: int = 30, min_open_orders: int = 2):
+        if factory is None:
+            factory = Factory("Efficient Factory", initial_balance=420, start_time=CLI_START_TIME)
+            factory.setup_default()
+        self.template = factory.fork()  # State every episode starts from
+        self.step_minutes = step_minutes  # Simulated minutes per step
+        self.steps_per_day = max(1, work_hours * 60 // step_minutes)  # Steps before moving to the next day
+        self.max_days = max_days  # Episodes are truncated after this many days
+        self.min_open_orders = min_open_orders  # Orders created each day while fewer are open
+        self.purchase_quantity = 50  # Units bought by a purchase action
+        self.sell_quantity = 5  # Max units sold by a sell action
+        self.hire_skill = 3  # Skill level of hired workers
+        self.rng = random.Random(seed)
+        
+        # Catalog and equipment are fixed for all episodes
+        template = self.template
+        self.material_names = list(template.materials)
+        self.product_names = list(template.products)
+        self.recipes = ([(name, True) for name, product in template.products.items() if product.is_craftable] + 
+                        [(name, False) for name, material in template.materials.items() if material.is_craftable])
+        self.product_index = {name: index + 1 for index, name in enumerate(self.product_names)}
+        self.recipe_index = {recipe: index + 1 for index, recipe in enumerate(self.recipes)}
+        stock_ids = ([template.inventory.slot(ItemRegistry.MATERIAL, name) for name in self.material_names] + 
+                     [template.inventory.slot(ItemRegistry.PRODUCT, name) for name in self.product_names])
+        self.stock_ids = np.array(stock_ids, dtype=np.intp) if np is not None else stock_ids
+        self.actions = self.build_actions()
+        
+        # Observation: balance, day, step of the day, idle workers, stock of each material and product,
+        # open order backlog of each product, (staffed, product, progress) of each line, 
+        # (staffed, recipe, progress) of each station
+        self.stock_offset = 4
+        self.backlog_offset = self.stock_offset + len(stock_ids)
+        self.line_offset = self.backlog_offset + len(self.product_names)
+        self.station_offset = self.line_offset + 3 * len(template.production_lines)
+        self.observation_size = self.station_offset + 3 * len(template.crafting_stations)
+        # Reused every step, copy an observation to keep it
+        if np is not None:
+            self.observation = np.zeros(self.observation_size, dtype=np.float32)
+            self.stock_buffer = np.zeros(len(stock_ids), dtype=np.int64)
+        else:
+            self.observation = [0.0] * self.observation_size
+            
+        self.factory = None
+        self.step_of_day = 0
+        self.episode_steps = 0
+        
+    def build_actions(self):
+        """Get the discrete action table: (action, arguments)"""
+        template = self.template
+        actions = [("wait", ())]
+        actions += [("staff_line", (line.line_id,)) for line in template.production_lines]
+        actions += [("staff_station", (station.station_id,)) for station in template.crafting_stations]
+        actions += [("produce", (name, line.line_id)) 
+                    for line in template.production_lines for name in self.product_names]
+        actions += [("craft", (name, is_product, station.station_id)) 
+                    for station in template.crafting_stations for name, is_product in self.recipes]
+        actions += [("purchase", (name,)) for name in self.material_names if not template.materials[name].is_craftable]
+        actions += [("hire", ())]
+        actions += [("sell", (name,)) for name in self.product_names]
+        return actions
+        
+    def describe_action(self, action: int):
+        """Get display text of an action"""
+        name, arguments = self.actions[action]
+        return f"{name}({', '.join(str(argument) for argument in arguments)})"
+        
+    def reset(self, seed: int = None):
+        """Start a new episode, returns (observation, info)"""
+        if seed is not None:
+            self.rng.seed(seed)
+        self.factory = self.template.fork()
+        self.step_of_day = 0
+        self.episode_steps = 0
+        self.create_orders()
+        return self.encode(), {}
+        
+    def create_orders(self):
+        """Create random orders while too few are open"""
+        factory = self.factory
+        while factory.get_open_order_count() < self.min_open_orders and self.product_names:
+            factory.create_order(self.rng.choice(self.product_names), self.rng.randint(3, 10), self.rng.randint(2, 5))
+            
+    def apply_action(self, action: int):
+        """Apply an action, returns whether it succeeded"""
+        name, arguments = self.actions[action]
+        factory = self.factory
+        if name == "wait":
+            return True
+        elif name == "staff_line" or name == "staff_station":
+            worker = next((w for w in factory.workers if not w.is_working), None)
+            if worker is None:
+                return False
+            if name == "staff_line":
+                return factory.assign_worker_to_line(worker.name, *arguments)[0]
+            return factory.assign_worker_to_station(worker.name, *arguments)[0]
+        elif name == "produce":
+            return factory.assign_product_to_line(*arguments)[0]
+        elif name == "craft":
+            return factory.assign_recipe_to_station(*arguments)[0]
+        elif name == "purchase":
+            return factory.purchase_material(arguments[0], self.purchase_quantity)[0]
+        elif name == "hire":
+            salary = 40 * self.hire_skill
+            if factory.balance < salary:
+                return False
+            factory.hire_worker(f"AI Worker{len(factory.workers) + 1}", self.hire_skill, salary)
+            return True
+        elif name == "sell":
+            quantity = min(self.sell_quantity, factory.product_inventory[arguments[0]])
+            return quantity > 0 and factory.sell_from_inventory(arguments[0], quantity)[0]
+        return False
+        
+    def step(self, action: int):
+        """Apply an action and advance the simulation, returns (observation, reward, terminated, truncated, info)"""
+        factory = self.factory
+        start_balance = factory.balance
+        valid = self.apply_action(action)
+        factory.advance_time(self.step_minutes / 60)
+        self.episode_steps += 1
+        self.step_of_day += 1
+        
+        terminated = False
+        reward = 0.0
+        if self.step_of_day >= self.steps_per_day:
+            self.step_of_day = 0
+            success, message, daily_profit = factory.next_day()
+            if not success:
+                # Bankrupt: salaries could not be paid
+                terminated = True
+                reward -= sum(worker.salary for worker in factory.workers)
+            self.create_orders()
+        reward += factory.balance - start_balance
+        truncated = not terminated and factory.day > self.max_days
+        return self.encode(), reward, terminated, truncated, {"action_valid": valid}
+        
+    def encode(self):
+        """Write the factory state into the observation buffer"""
+        factory = self.factory
+        observation = self.observation
+        observation[0] = factory.balance
+        observation[1] = factory.day
+        observation[2] = self.step_of_day
+        observation[3] = sum(1 for worker in factory.workers if not worker.is_working)
+        
+        # Stock straight from the inventory vector
+        offset = self.stock_offset
+        if np is not None:
+            np.take(factory.inventory.counts, self.stock_ids, out=self.stock_buffer)
+            observation[offset:self.backlog_offset] = self.stock_buffer
+        else:
+            counts = factory.inventory.counts
+            for index, item_id in enumerate(self.stock_ids):
+                observation[offset + index] = counts[item_id]
+                
+        offset = self.backlog_offset
+        for index in range(len(self.product_names)):
+            observation[offset + index] = 0
+        for order in factory.orders:
+            if not order.is_completed:
+                observation[offset + self.product_index[order.product.name] - 1] += order.quantity - order.completed_quantity
+                
+        offset = self.line_offset
+        for line in factory.production_lines:
+            product = line.current_product
+            observation[offset] = 1.0 if line.assigned_worker else 0.0
+            observation[offset + 1] = self.product_index.get(product.name, 0) if product else 0
+            observation[offset + 2] = line.production_progress / line.work_required() if product else 0.0
+            offset += 3
+            
+        work = CRAFTING_TIME * PROGRESS_SCALE
+        for station in factory.crafting_stations:
+            recipe = station.current_recipe
+            observation[offset] = 1.0 if station.assigned_worker else 0.0
+            observation[offset + 1] = self.recipe_index.get((recipe, station.is_recipe_product), 0) if recipe else 0
+            observation[offset + 2] = station.crafting_progress / work
+            offset += 3
+        return observation
+
+class BatchFactoryEnv(FactoryEnv):
+    """Batch of independent factory environments stepped together on stacked NumPy arrays"""
+    
+    # Action kinds of the discrete action table, in array code order
+    ACTION_KINDS = ("wait", "staff_line", "staff_station", "produce", "craft", "purchase", "hire", "sell")
+    
+    def __init__(self, factory: Factory = None, num_envs: int = 64, seed: int = None, step_minutes: int = 30, 
+                 work_hours: int = 8, max_days: int = 30, min_open_orders: int = 2, max_workers: int = 16, 
+                 max_orders: int = 8):
+        if np is None:
+            raise ValueError("Batch environment requires numpy")
+        super().__init__(factory, seed, step_minutes, work_hours, max_days, min_open_orders)
+        self.num_envs = num_envs
+        self.max_workers = max_workers  # Worker slots per factory, hiring stops when full
+        self.max_orders = max(max_orders, min_open_orders)  # Order slots per factory
+        self.np_rng = np.random.default_rng(seed)
+        self.rows = np.arange(num_envs)
+        self.compile_catalog()
+        self.compile_actions()
+        self.compile_template()
+        
+        # Observations of all factories, reused every step
+        self.observations = np.zeros((num_envs, self.observation_size), dtype=np.float32)
+        self.final_observations = np.zeros((num_envs, self.observation_size), dtype=np.float32)
+        
+    def compile_catalog(self):
+        """Build recipe matrices over the stock vector: materials, then products"""
+        template = self.template
+        material_count = len(self.material_names)
+        self.stock_index = {(ItemRegistry.MATERIAL, name): index for index, name in enumerate(self.material_names)}
+        self.stock_index.update({(ItemRegistry.PRODUCT, name): material_count + index 
+                                 for index, name in enumerate(self.product_names)})
+        
+        def compile_recipe(recipe):
+            vector = np.zeros(len(self.stock_index), dtype=np.int64)
+            for name, quantity in recipe.materials_required.items():
+                vector[self.stock_index[(ItemRegistry.MATERIAL, name)]] += quantity
+            for name, quantity in recipe.products_required.items():
+                vector[self.stock_index[(ItemRegistry.PRODUCT, name)]] += quantity
+            return vector
+            
+        products = [template.products[name] for name in self.product_names]
+        self.requirements = np.array([compile_recipe(product) for product in products], dtype=np.int64)
+        self.work = np.array([max(1, product.production_time * PROGRESS_SCALE) for product in products], dtype=np.int64)
+        self.prices = np.array([product.sale_price for product in products], dtype=np.float64)
+        self.costs = np.array([template.materials[name].cost for name in self.material_names] + [0.0] * len(products))
+        recipes = [template.products[name] if is_product else template.materials[name] for name, is_product in self.recipes]
+        self.craft_requirements = np.array([compile_recipe(recipe) for recipe in recipes], 
+                                           dtype=np.int64).reshape(len(recipes), len(self.stock_index))
+        kinds = {True: ItemRegistry.PRODUCT, False: ItemRegistry.MATERIAL}
+        self.craft_outputs = np.array([self.stock_index[(kinds[is_product], name)] for name, is_product in self.recipes], 
+                                      dtype=np.intp)
+        
+    def compile_actions(self):
+        """Encode the action table as (kind, target slot, item) arrays"""
+        line_index = {line.line_id: index for index, line in enumerate(self.template.production_lines)}
+        station_index = {station.station_id: index for index, station in enumerate(self.template.crafting_stations)}
+        product_index = {name: index for index, name in enumerate(self.product_names)}
+        recipe_index = {recipe: index for index, recipe in enumerate(self.recipes)}
+        kinds, targets, items = [], [], []
+        for name, arguments in self.actions:
+            target = item = 0
+            if name == "staff_line":
+                target = line_index[arguments[0]]
+            elif name == "staff_station":
+                target = station_index[arguments[0]]
+            elif name == "produce":
+                item, target = product_index[arguments[0]], line_index[arguments[1]]
+            elif name == "craft":
+                item, target = recipe_index[(arguments[0], arguments[1])], station_index[arguments[2]]
+            elif name == "purchase":
+                item = self.stock_index[(ItemRegistry.MATERIAL, arguments[0])]
+            elif name == "sell":
+                item = product_index[arguments[0]]
+            kinds.append(self.ACTION_KINDS.index(name))
+            targets.append(target)
+            items.append(item)
+        self.action_kinds = np.array(kinds, dtype=np.int64)
+        self.action_targets = np.array(targets, dtype=np.intp)
+        self.action_items = np.array(items, dtype=np.intp)
+        
+    def compile_template(self):
+        """Convert the template factory into the initial row of every state array"""
+        template = self.template
+        if len(template.workers) > self.max_workers:
+            raise ValueError(f"Factory has more than {self.max_workers} workers")
+        workers = {id(worker): index for index, worker in enumerate(template.workers)}
+        product_index = {name: index for index, name in enumerate(self.product_names)}
+        recipe_index = {recipe: index for index, recipe in enumerate(self.recipes)}
+        
+        def worker_slot(slot):
+            return workers.get(id(slot.assigned_worker), -1) if slot.is_active else -1
+            
+        rates = [worker.work_rate() for worker in template.workers]
+        padding = [0] * (self.max_workers - len(rates))
+        orders = [order for order in template.orders if not order.is_completed][:self.max_orders]
+        order_padding = [0] * (self.max_orders - len(orders))
+        self.initial_state = {
+            "balance": np.float64(template.balance),
+            "day": template.day,
+            "step_of_day": 0,
+            "stock": np.array([template.inventory.get_quantity(template.inventory.slot(kind, name)) 
+                               for (kind, name) in self.stock_index], dtype=np.int64),
+            "worker_count": len(rates),
+            "worker_rate": np.array(rates + padding, dtype=np.int64),
+            "worker_salary": np.array([worker.salary for worker in template.workers] + padding, dtype=np.float64),
+            "worker_working": np.array([worker.is_working for worker in template.workers] + padding, dtype=bool),
+            "line_worker": np.array([worker_slot(line) for line in template.production_lines], dtype=np.intp),
+            "line_product": np.array([product_index[line.current_product.name] if line.current_product else -1 
+                                      for line in template.production_lines], dtype=np.intp),
+            "line_progress": np.array([line.production_progress for line in template.production_lines], dtype=np.int64),
+            "station_worker": np.array([worker_slot(station) for station in template.crafting_stations], dtype=np.intp),
+            "station_recipe": np.array([recipe_index.get((station.current_recipe, station.is_recipe_product), -1) 
+                                        for station in template.crafting_stations], dtype=np.intp),
+            "station_progress": np.array([station.crafting_progress for station in template.crafting_stations], 
+                                         dtype=np.int64),
+            "order_product": np.array([product_index[order.product.name] for order in orders] + order_padding, 
+                                      dtype=np.intp),
+            "order_quantity": np.array([order.quantity for order in orders] + order_padding, dtype=np.int64),
+            "order_done": np.array([order.completed_quantity for order in orders] + order_padding, dtype=np.int64),
+            "order_active": np.array([True] * len(orders) + order_padding, dtype=bool),
+        }
+        # One stacked array per state field, first axis is the factory
+        self.state = {name: np.zeros((self.num_envs,) + np.shape(value), dtype=np.asarray(value).dtype) 
+                      for name, value in self.initial_state.items()}
+        
+    def reset(self, seed: int = None):
+        """Reset all factories, returns (observations, info)"""
+        if seed is not None:
+            self.rng.seed(seed)
+            self.np_rng = np.random.default_rng(seed)
+        self.reset_envs(np.ones(self.num_envs, dtype=bool))
+        return self.encode(), {}
+        
+    def reset_envs(self, mask):
+        """Reset the factories selected by a boolean mask"""
+        for name, value in self.initial_state.items():
+            self.state[name][mask] = value
+        self.create_orders(mask)
+        
+    def create_orders(self, mask):
+        """Create random orders in the selected factories while too few are open"""
+        state = self.state
+        active = state["order_active"]
+        for _ in range(self.min_open_orders):
+            needed = mask & (active.sum(axis=1) < self.min_open_orders) & ~active.all(axis=1)
+            count = int(needed.sum())
+            if not count or not self.product_names:
+                return
+            rows = self.rows[needed]
+            slots = (~active[rows]).argmax(axis=1)
+            state["order_product"][rows, slots] = self.np_rng.integers(0, len(self.product_names), count)
+            state["order_quantity"][rows, slots] = self.np_rng.integers(3, 11, count)
+            state["order_done"][rows, slots] = 0
+            active[rows, slots] = True
+            
+    def step(self, actions):
+        """Step every factory with its action and reset finished ones, returns stacked (observations, rewards, terminated, truncated, info)"""
+        state = self.state
+        rows = self.rows
+        actions = np.asarray(actions, dtype=np.intp)
+        kinds = self.action_kinds[actions]
+        targets = self.action_targets[actions]
+        items = self.action_items[actions]
+        balance = state["balance"]
+        start_balance = balance.copy()
+        valid = kinds == 0
+        
+        valid |= self.apply_staffing(kinds == 1, targets, state["line_worker"])
+        valid |= self.apply_staffing(kinds == 2, targets, state["station_worker"])
+        valid |= self.apply_assignment(kinds == 3, targets, items, self.requirements, 
+                                       state["line_worker"], state["line_product"], state["line_progress"])
+        valid |= self.apply_assignment(kinds == 4, targets, items, self.craft_requirements, 
+                                       state["station_worker"], state["station_recipe"], state["station_progress"])
+        
+        # Purchases
+        cost = self.costs[items] * self.purchase_quantity
+        bought = (kinds == 5) & (balance >= cost)
+        balance[bought] -= cost[bought]
+        state["stock"][rows[bought], items[bought]] += self.purchase_quantity
+        valid |= bought
+        
+        # Hiring into the next free worker slot
+        count = state["worker_count"]
+        salary = 40 * self.hire_skill
+        hired = (kinds == 6) & (balance >= salary) & (count < self.max_workers)
+        hired_rows = rows[hired]
+        state["worker_rate"][hired_rows, count[hired]] = max(1, PROGRESS_SCALE + self.hire_skill - 1)
+        state["worker_salary"][hired_rows, count[hired]] = salary
+        state["worker_working"][hired_rows, count[hired]] = False
+        count[hired] += 1
+        valid |= hired
+        
+        # Sales from stock
+        stock_items = items + len(self.material_names)
+        quantity = np.minimum(self.sell_quantity, state["stock"][rows, np.minimum(stock_items, state["stock"].shape[1] - 1)])
+        sold = (kinds == 7) & (quantity > 0)
+        state["stock"][rows[sold], stock_items[sold]] -= quantity[sold]
+        balance[sold] += self.prices[items[sold]] * quantity[sold]
+        valid |= sold
+        
+        self.advance(self.step_minutes)
+        
+        # End of the work shift: pay salaries and create orders
+        state["step_of_day"] += 1
+        day_end = state["step_of_day"] >= self.steps_per_day
+        rewards = np.zeros(self.num_envs)
+        terminated = np.zeros(self.num_envs, dtype=bool)
+        if day_end.any():
+            state["step_of_day"][day_end] = 0
+            state["day"][day_end] += 1
+            payroll = state["worker_salary"].sum(axis=1)
+            paid = day_end & (balance >= payroll)
+            balance[paid] -= payroll[paid]
+            # Bankrupt: salaries could not be paid
+            terminated = day_end & ~paid
+            rewards[terminated] -= payroll[terminated]
+            self.create_orders(day_end)
+        rewards += balance - start_balance
+        truncated = ~terminated & (state["day"] > self.max_days)
+        
+        observations = self.encode()
+        done = terminated | truncated
+        if done.any():
+            self.final_observations[done] = observations[done]
+            self.reset_envs(done)
+            observations = self.encode()
+        info = {"action_valid": valid, "final_observation": self.final_observations, "_final_observation": done}
+        return observations, rewards, terminated, truncated, info
+        
+    def apply_staffing(self, selected, targets, slot_workers):
+        """Assign the first idle worker to the target line or station, returns the applied mask"""
+        state = self.state
+        idle = ~state["worker_working"] & (np.arange(self.max_workers) < state["worker_count"][:, None])
+        applied = selected & idle.any(axis=1)
+        rows = self.rows[applied]
+        workers = idle[rows].argmax(axis=1)
+        slot_workers[rows, targets[applied]] = workers
+        state["worker_working"][rows, workers] = True
+        return applied
+        
+    def apply_assignment(self, selected, targets, items, requirements, slot_workers, slot_recipes, slot_progress):
+        """Start a recipe on the target line or station if staffed and stocked, returns the applied mask"""
+        if not selected.any() or not len(requirements):
+            return selected & False
+        rows = self.rows[selected]
+        targets = targets[selected]
+        needed = requirements[items[selected]]
+        stock = self.state["stock"]
+        ok = (slot_workers[rows, targets] >= 0) & (stock[rows] >= needed).all(axis=1)
+        rows, targets = rows[ok], targets[ok]
+        stock[rows] -= needed[ok]
+        # Idle slots keep the work carried over from their last completion
+        switched = slot_recipes[rows, targets] >= 0
+        slot_progress[rows[switched], targets[switched]] = 0
+        slot_recipes[rows, targets] = items[selected][ok]
+        applied = np.zeros(self.num_envs, dtype=bool)
+        applied[rows] = True
+        return applied
+        
+    def advance(self, minutes: int):
+        """Advance production and crafting of all factories"""
+        state = self.state
+        rows = self.rows[:, None]
+        stock = state["stock"]
+        rates = state["worker_rate"]
+        
+        # Production lines, completed units also count toward every open order of the product
+        workers, products, progress = state["line_worker"], state["line_product"], state["line_progress"]
+        producing = (workers >= 0) & (products >= 0)
+        # Work carried over is lost on lines left idle
+        progress[products < 0] = 0
+        line_rates = rates[rows, np.maximum(workers, 0)]
+        progress += np.where(producing, line_rates * minutes, 0)
+        # Work past completion carries over only if the last minute completed it, as with one-minute ticks
+        work = self.work[np.maximum(products, 0)]
+        overflow = progress - work
+        done = producing & (overflow >= 0)
+        if done.any():
+            material_count = len(self.material_names)
+            order_product, order_active = state["order_product"], state["order_active"]
+            for line in range(products.shape[1]):
+                completed = done[:, line]
+                if not completed.any():
+                    continue
+                product = products[:, line]
+                np.add.at(stock, (self.rows[completed], material_count + product[completed]), 1)
+                matched = order_active & (order_product == product[:, None]) & completed[:, None]
+                state["order_done"] += matched
+                finished = matched & (state["order_done"] >= state["order_quantity"])
+                state["balance"] += (self.prices[order_product] * state["order_quantity"] * finished).sum(axis=1)
+                order_active &= ~finished
+            products[done] = -1
+            progress[done] = np.where(overflow < line_rates, np.minimum(overflow, work - 1), 0)[done]
+            
+        # Crafting stations
+        workers, recipes, progress = state["station_worker"], state["station_recipe"], state["station_progress"]
+        crafting = (workers >= 0) & (recipes >= 0)
+        progress[recipes < 0] = 0
+        station_rates = rates[rows, np.maximum(workers, 0)]
+        progress += np.where(crafting, station_rates * minutes, 0)
+        overflow = progress - CRAFTING_TIME * PROGRESS_SCALE
+        done = crafting & (overflow >= 0)
+        if done.any():
+            env_rows, stations = np.nonzero(done)
+            np.add.at(stock, (env_rows, self.craft_outputs[recipes[env_rows, stations]]), 1)
+            recipes[done] = -1
+            progress[done] = np.where(overflow < station_rates, 
+                                      np.minimum(overflow, CRAFTING_TIME * PROGRESS_SCALE - 1), 0)[done]
+            
+    def encode(self):
+        """Write the state of all factories into the observation buffer"""
+        state = self.state
+        observations = self.observations
+        observations[:, 0] = state["balance"]
+        observations[:, 1] = state["day"]
+        observations[:, 2] = state["step_of_day"]
+        observations[:, 3] = (~state["worker_working"] & 
+                              (np.arange(self.max_workers) < state["worker_count"][:, None])).sum(axis=1)
+        observations[:, self.stock_offset:self.backlog_offset] = state["stock"]
+        
+        remaining = (state["order_quantity"] - state["order_done"]) * state["order_active"]
+        for index in range(len(self.product_names)):
+            observations[:, self.backlog_offset + index] = (remaining * (state["order_product"] == index)).sum(axis=1)
             
-            # If stock below threshold and sufficient funds, purchase
-            if current_stock < 100 and self.factory.balance > material.cost * 50:
-                quantity = min(200, int(self.factory.balance / material.cost / 2))
-                success, message = self.factory.purchase_material(material_name, quantity)
-                if success:
-                    self.app.log_event(f"AI purchased {quantity} units of {material_name}")
-                    
-    def create_random_orders(self):
-        """Create random orders"""
-        import random
-        available_products = list(self.factory.products.keys())
-        if available_products:
-            product = random.choice(available_products)
-            quantity = random.randint(3, 10)
-            days = random.randint(2, 5)
+        for offset, end, workers, recipes, progress, work in (
+                (self.line_offset, self.station_offset, state["line_worker"], state["line_product"], 
+                 state["line_progress"], self.work[np.maximum(state["line_product"], 0)]),
+                (self.station_offset, self.observation_size, state["station_worker"], state["station_recipe"], 
+                 state["station_progress"], CRAFTING_TIME * PROGRESS_SCALE)):
+            observations[:, offset:end:3] = workers >= 0
+            observations[:, offset + 1:end:3] = recipes + 1
+            observations[:, offset + 2:end:3] = np.where(recipes >= 0, progress / work, 0.0)
+        return observations
+
+class SweepRunner:
+    """Runs every cell of an experiment grid in a process pool, caching each result by content hash"""
+    
+    # Grid dimensions and their values when the grid leaves them out
+    DEFAULTS = {"mod": None, "strategy": "balanced", "initial_balance": None, "workers": None, "seed": 0, "days": 30}
+    
+    # Result columns of each cell
+    METRICS = ("balance", "profit", "produced", "orders_completed", "late_orders", "payroll_failures")
+    
+    def __init__(self, grid: dict, cache_directory: str = SWEEP_CACHE_DIRECTORY, max_workers: int = None):
+        unknown = set(grid) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown grid dimensions: {', '.join(sorted(unknown))}")
+        # Every dimension is a list of values
+        self.grid = {name: grid.get(name, default) for name, default in self.DEFAULTS.items()}
+        self.grid = {name: values if isinstance(values, list) else [values] for name, values in self.grid.items()}
+        self.cache_directory = cache_directory
+        self.max_workers = max_workers
+        self.mod_hashes = {}  # Mod path -> content hash
+        self.computed = 0  # Cells simulated, cache hits excluded
+        
+    @staticmethod
+    def load_grid(path: str):
+        """Load a grid from a JSON file, mod paths are relative to the file"""
+        with open(path, "r", encoding="utf-8") as f:
+            grid = json.load(f)
+        if not isinstance(grid, dict):
+            raise ValueError("Grid file must contain a JSON object")
+        mods = grid.get("mod")
+        if mods is not None:
+            base = os.path.dirname(os.path.abspath(path))
+            resolve = lambda mod: os.path.join(base, mod) if mod else None
+            grid["mod"] = [resolve(mod) for mod in mods] if isinstance(mods, list) else resolve(mods)
+        return grid
+        
+    def get_cells(self):
+        """Get every combination of grid values"""
+        names = list(self.grid)
+        return [dict(zip(names, values)) for values in itertools.product(*(self.grid[name] for name in names))]
+        
+    def get_key(self, cell: dict):
+        """Get cache key of a cell from its settings, mod file content and the engine version"""
+        mod = cell["mod"]
+        if mod and mod not in self.mod_hashes:
+            with open(mod, "rb") as f:
+                self.mod_hashes[mod] = hashlib.sha256(f.read()).hexdigest()
+        scenario = dict(cell, mod=self.mod_hashes.get(mod), engine_version=ENGINE_VERSION)
+        return hashlib.sha256(json.dumps(scenario, sort_keys=True).encode()).hexdigest()
+        
+    def get_cache_path(self, key: str):
+        """Get cache file of a result"""
+        return os.path.join(self.cache_directory, f"{key}.json")
+        
+    def read_cached(self, key: str):
+        """Get a cached result, or None"""
+        try:
+            with open(self.get_cache_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
             
-            order, message = self.factory.create_order(product, quantity, days)
-            if order:
-                self.app.log_event(f"AI created order: {product} x{quantity}, deliver within {days} days")
+    def write_cached(self, key: str, result: dict):
+        """Cache a result, written atomically so parallel sweeps never read a partial file"""
+        os.makedirs(self.cache_directory, exist_ok=True)
+        path = self.get_cache_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        os.replace(temp_path, path)
+        
+    @staticmethod
+    def run_cell(cell: dict):
+        """Simulate one cell, runs in worker processes"""
+        factory = create_cli_factory(mod_path=cell["mod"])
+        if cell["initial_balance"] is not None:
+            factory.balance = cell["initial_balance"]
+        workers = cell["workers"]
+        if workers is not None:
+            while len(factory.workers) < workers:
+                factory.hire_worker(f"Worker {len(factory.workers) + 1}", 3, 100)
+            for worker in factory.workers[workers:]:
+                factory.unassign_worker(worker.name)
+            del factory.workers[workers:]
+            
+        summary = simulate_headless(factory, cell["strategy"], cell["days"], cell["seed"])
+        return {metric: summary[metric] for metric in SweepRunner.METRICS + ("seconds",)}
+        
+    def run(self, progress=None):
+        """Run the sweep, simulating only cells missing from the cache, returns one row per cell"""
+        cells = self.get_cells()
+        keys = [self.get_key(cell) for cell in cells]
+        results = {key: self.read_cached(key) for key in set(keys)}
+        missing = {key: cell for key, cell in zip(keys, cells) if results[key] is None}
+        
+        def store(key, result):
+            results[key] = result
+            self.write_cached(key, result)
+            self.computed += 1
+            if progress:
+                progress(self.computed, len(missing))
                 
-    def hire_worker(self, name, skill_level, salary):
-        """Hire worker"""
-        if self.factory.balance >= salary:
-            worker = self.factory.hire_worker(name, skill_level, salary)
-            self.app.log_event(f"AI hired worker {name}")
-            return worker
-        return None
-        
-    def analyze_factory(self):
-        """Analyze factory status"""
-        analysis = "=== AI Analysis Report ===\n\n"
-        
-        # Financial analysis
-        analysis += f"Financial Status: ¥{self.factory.balance}\n"
-        if self.factory.balance < 200:
-            analysis += "Warning: Insufficient funds!\n"
-        elif self.factory.balance > 1000:
-            analysis += "Good: Sufficient funds\n"
-        else:
-            analysis += "Normal: Good financial status\n"
+        if missing:
+            try:
+                with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = {executor.submit(SweepRunner.run_cell, cell): key for key, cell in missing.items()}
+                    for future, key in futures.items():
+                        store(key, future.result())
+            except (OSError, NotImplementedError, BrokenProcessPool):
+                # No usable process pool, simulate the remaining cells in this process
+                for key, cell in missing.items():
+                    if results[key] is None:
+                        store(key, SweepRunner.run_cell(cell))
+                        
+        return [dict(cell, **results[key], cached=key not in missing) for key, cell in zip(keys, cells)]
+        
+    def aggregate(self, rows):
+        """Average rows over seeds, returns one row per combination of the other dimensions"""
+        dimensions = [name for name in self.grid if name != "seed"]
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row[name] for name in dimensions), []).append(row)
+        table = []
+        for values, group in groups.items():
+            entry = dict(zip(dimensions, values))
+            entry.update({metric: sum(row[metric] for row in group) / len(group) for metric in self.METRICS})
+            entry["runs"] = len(group)
+            table.append(entry)
+        return table
+        
+    def format_table(self, rows):
+        """Get aggregated rows as a text table, showing only dimensions with several values"""
+        dimensions = [name for name in self.grid if name != "seed" and len(self.grid[name]) > 1]
+        columns = dimensions + list(self.METRICS) + ["runs"]
+        
+        def format_value(name, value):
+            if name == "mod":
+                return os.path.basename(value) if value else "default"
+            return f"{value:.2f}" if isinstance(value, float) else str(value)
             
-        analysis += "\n"
+        cells = [[format_value(name, row[name]) for name in columns] for row in self.aggregate(rows)]
+        widths = [max([len(name)] + [len(cell[index]) for cell in cells]) for index, name in enumerate(columns)]
+        lines = ["  ".join(name.rjust(width) for name, width in zip(columns, widths))]
+        lines += ["  ".join(value.rjust(width) for value, width in zip(cell, widths)) for cell in cells]
+        return "\n".join(lines)
+        
+    @staticmethod
+    def write_csv(path: str, rows):
+        """Write one row per cell to a CSV file"""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else [])
+            writer.writeheader()
+            writer.writerows(rows)
+
+class SimulationSession:
+    """Factory hosted by the simulation server"""
+    def __init__(self, session_id: int, factory: Factory, strategy: str = None, seed: int = 0):
+        self.session_id = session_id
+        self.factory = factory
+        self.strategy = strategy
+        self.ai = None
+        if strategy:
+            self.ai = FactoryAI(HeadlessApp(factory, log_limit=50))
+            self.ai.rng = random.Random(seed)
+            self.ai.strategy = strategy
+            self.ai.start()
+        self.steps = deque()  # Queued step requests: (future, work)
+        self.queued = False  # Whether the session waits in the server's run queue
+        
+    def run_step(self, hours: int, days: int, work_hours: int):
+        """Advance the factory one hour at a time, yielding after each so other sessions can run"""
+        for _ in range(hours):
+            self.factory.advance_time(1)
+            yield True
+        for _ in range(days):
+            for _ in range(work_hours):
+                self.factory.advance_time(1)
+                yield True
+            self.factory.next_day()
+            yield True
+            
+    def run_slice(self, deadline: float):
+        """Run queued steps until the deadline, returns whether work remains"""
+        while self.steps:
+            future, work = self.steps[0]
+            try:
+                finished = not next(work, False)
+            except Exception as e:
+                finished = True
+                if not future.done():
+                    future.set_exception(RuntimeError(f"Step failed: {str(e)}"))
+            if finished:
+                self.steps.popleft()
+                if not future.done():
+                    future.set_result(self.get_summary())
+            if perf_counter() >= deadline:
+                break
+        return bool(self.steps)
+        
+    def close(self):
+        """Stop the AI and fail queued steps"""
+        if self.ai:
+            self.ai.stop()
+        for future, work in self.steps:
+            if not future.done():
+                future.set_exception(RuntimeError(f"Session {self.session_id} was closed"))
+        self.steps.clear()
+        
+    def get_summary(self):
+        """Get session summary"""
+        return {
+            "session": self.session_id,
+            "day": self.factory.day,
+            "time": self.factory.current_time.isoformat(),
+            "balance": self.factory.balance,
+            "strategy": self.strategy,
+            "orders": self.factory.get_open_order_count(),
+            "queued_steps": len(self.steps)
+        }
+
+class SimulationServer:
+    """Hosts many independent factories behind a local JSON-RPC 2.0 endpoint, one message per line"""
+    
+    # Factory commands callers may run, time only moves through step
+    COMMANDS = frozenset(Journal.COMMANDS - {"run_ticks", "next_day"})
+    
+    # JSON-RPC error codes
+    PARSE_ERROR = -32700
+    INVALID_REQUEST = -32600
+    METHOD_NOT_FOUND = -32601
+    INVALID_PARAMS = -32602
+    SERVER_ERROR = -32000
+    
+    # Longest message line in bytes
+    LINE_LIMIT = 16 * 1024 * 1024
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = SIMULATION_SERVER_PORT, max_sessions: int = 10000, 
+                 slice_seconds: float = 0.002):
+        self.host = host
+        self.port = port  # Actual port once started, when 0 asks for any free port
+        self.max_sessions = max_sessions
+        self.slice_seconds = slice_seconds  # Time a session runs before the next one gets its turn
+        self.sessions = {}  # Session id -> SimulationSession
+        self.next_session_id = 1
+        self.ready = deque()  # Sessions with queued steps, in turn order
+        self.wakeup = None  # Set when a session joins the run queue
+        self.server = None
+        self.scheduler = None
+        self.connections = {}  # Writer -> task answering the connection
+        self.methods = {
+            "create": self.create_session,
+            "step": self.step_session,
+            "query": self.query_session,
+            "command": self.run_command,
+            "close": self.close_session,
+            "list": self.list_sessions
+        }
         
-        # Production line analysis
-        active_lines = sum(1 for line in self.factory.production_lines if line.is_active)
-        total_lines = len(self.factory.production_lines)
-        analysis += f"Production Lines: {active_lines}/{total_lines} running\n"
+    async def start(self):
+        """Start listening and scheduling"""
+        self.wakeup = asyncio.Event()
+        self.scheduler = asyncio.create_task(self.run_scheduler())
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port, limit=self.LINE_LIMIT)
+        self.port = self.server.sockets[0].getsockname()[1]
         
-        if active_lines < total_lines:
-            analysis += "Suggestion: Assign more workers to production lines\n"
+    async def serve_forever(self):
+        """Serve until cancelled"""
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
             
-        analysis += "\n"
-        
-        # Inventory analysis
-        low_stock_materials = []
-        for material, quantity in self.factory.material_inventory.items():
-            if quantity < 50:
-                low_stock_materials.append(material)
-                
-        if low_stock_materials:
-            analysis += f"Low stock materials: {', '.join(low_stock_materials)}\n"
-            analysis += "Suggestion: Restock inventory\n"
+    async def stop(self):
+        """Stop listening and close every session"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.scheduler:
+            self.scheduler.cancel()
+            self.scheduler = None
+        for session in self.sessions.values():
+            session.close()
+        self.sessions.clear()
+        self.ready.clear()
+        for writer in self.connections:
+            writer.close()
+        if self.connections:
+            await asyncio.gather(*self.connections.values(), return_exceptions=True)
+        
+    async def run_scheduler(self):
+        """Give each session with queued steps a time slice in turn"""
+        while True:
+            if not self.ready:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            session = self.ready.popleft()
+            if session.run_slice(perf_counter() + self.slice_seconds):
+                self.ready.append(session)
+            else:
+                session.queued = False
+            # Let connections read requests and send responses between slices
+            await asyncio.sleep(0)
+            
+    async def handle_connection(self, reader, writer):
+        """Answer requests of one connection, each in its own task so long steps do not block others"""
+        self.connections[writer] = asyncio.current_task()
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(self.handle_line(line, writer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            del self.connections[writer]
+            writer.close()
+            
+    async def handle_line(self, line: bytes, writer):
+        """Answer one request line"""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            response = self.get_error(None, self.PARSE_ERROR, "Parse error")
         else:
-            analysis += "Material inventory: Sufficient\n"
+            response = await self.handle_request(request)
+        if response is None or writer.is_closing():
+            return
+        writer.write(json.dumps(response, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8") + b"\n")
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
             
-        analysis += "\n"
-        
-        # Order analysis
-        active_orders = sum(1 for order in self.factory.orders if not order.is_completed)
-        analysis += f"Active orders: {active_orders}\n"
-        
-        if active_orders < 2:
-            analysis += "Suggestion: Create more orders\n"
+    async def handle_request(self, request):
+        """Run one JSON-RPC request, returns the response or None for notifications"""
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or not isinstance(request.get("method"), str):
+            return self.get_error(None, self.INVALID_REQUEST, "Invalid request")
+        request_id = request.get("id")
+        method = self.methods.get(request["method"])
+        params = request.get("params", {})
+        if method is None:
+            response = self.get_error(request_id, self.METHOD_NOT_FOUND, f"Method not found: {request['method']}")
+        elif not isinstance(params, dict):
+            response = self.get_error(request_id, self.INVALID_PARAMS, "Parameters must be named")
+        else:
+            try:
+                response = {"jsonrpc": "2.0", "id": request_id, "result": await method(params)}
+            except ValueError as e:
+                response = self.get_error(request_id, self.INVALID_PARAMS, str(e))
+            except Exception as e:
+                response = self.get_error(request_id, self.SERVER_ERROR, str(e))
+        return response if "id" in request else None
+        
+    @staticmethod
+    def get_error(request_id, code: int, message: str):
+        """Create an error response"""
+        return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+        
+    @staticmethod
+    def check_params(params: dict, allowed):
+        """Reject unknown parameters"""
+        unknown = set(params) - set(allowed)
+        if unknown:
+            raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
             
-        return analysis
+    @staticmethod
+    def get_count(params: dict, name: str, default: int = 0):
+        """Get a non-negative integer parameter"""
+        value = params.get(name, default)
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"{name} must be a non-negative integer")
+        return value
+        
+    def get_session(self, params: dict):
+        """Get the session named by the parameters"""
+        session = self.sessions.get(params.get("session"))
+        if session is None:
+            raise ValueError(f"Unknown session: {params.get('session')}")
+        return session
+        
+    async def create_session(self, params: dict):
+        """Create a factory, new or from a save file or mod, optionally run by the AI"""
+        self.check_params(params, ("save", "mod", "strategy", "seed", "initial_balance"))
+        if len(self.sessions) >= self.max_sessions:
+            raise RuntimeError(f"Session limit of {self.max_sessions} reached")
+        strategy = params.get("strategy")
+        if strategy is not None and strategy not in FactoryAI.STRATEGY_POLICIES:
+            raise ValueError(f"Unknown strategy: {strategy}")
+        try:
+            factory = create_cli_factory(params.get("save"), params.get("mod"))
+        except (OSError, KeyError) as e:
+            raise ValueError(f"Cannot create factory: {str(e)}")
+        if params.get("initial_balance") is not None:
+            factory.balance = params["initial_balance"]
+        session = SimulationSession(self.next_session_id, factory, strategy, self.get_count(params, "seed"))
+        self.sessions[session.session_id] = session
+        self.next_session_id += 1
+        return session.get_summary()
+        
+    async def step_session(self, params: dict):
+        """Advance a factory by hours and whole days, answers once the time has passed"""
+        self.check_params(params, ("session", "hours", "days", "work_hours"))
+        session = self.get_session(params)
+        work = session.run_step(self.get_count(params, "hours"), self.get_count(params, "days"), 
+                                self.get_count(params, "work_hours", 8))
+        future = asyncio.get_running_loop().create_future()
+        session.steps.append((future, work))
+        if not session.queued:
+            session.queued = True
+            self.ready.append(session)
+            self.wakeup.set()
+        return await future
+        
+    async def query_session(self, params: dict):
+        """Get factory state, all of it or the named fields"""
+        self.check_params(params, ("session", "fields"))
+        state = self.get_session(params).factory.to_dict()
+        fields = params.get("fields")
+        if fields is None:
+            return state
+        if not isinstance(fields, list):
+            raise ValueError("fields must be a list")
+        unknown = [field for field in fields if field not in state]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(map(str, unknown))}")
+        return {field: state[field] for field in fields}
+        
+    async def run_command(self, params: dict):
+        """Run a factory command such as hire_worker or purchase_material"""
+        self.check_params(params, ("session", "name", "args", "kwargs"))
+        session = self.get_session(params)
+        name = params.get("name")
+        if name not in self.COMMANDS:
+            raise ValueError(f"Unknown command: {name}")
+        args, kwargs = params.get("args", []), params.get("kwargs", {})
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            raise ValueError("args must be a list and kwargs an object")
+        try:
+            return getattr(session.factory, name)(*args, **kwargs)
+        except TypeError as e:
+            raise ValueError(f"Invalid arguments for {name}: {str(e)}")
+            
+    async def close_session(self, params: dict):
+        """Close a session"""
+        self.check_params(params, ("session",))
+        session = self.get_session(params)
+        del self.sessions[session.session_id]
+        if session.queued:
+            self.ready.remove(session)
+        session.close()
+        return True
+        
+    async def list_sessions(self, params: dict):
+        """Get the summary of every session"""
+        self.check_params(params, ())
+        return [session.get_summary() for session in self.sessions.values()]
+
+class SimulationClient:
+    """Asyncio client of the simulation server, calls may run concurrently"""
+    def __init__(self, host: str = "127.0.0.1", port: int = SIMULATION_SERVER_PORT):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.receiver = None
+        self.next_id = 1
+        self.pending = {}  # Request id -> future of the response
+        
+    async def __aenter__(self):
+        await self.connect()
+        return self
+        
+    async def __aexit__(self, *exc_info):
+        await self.close()
+        
+    async def connect(self):
+        """Connect to the server"""
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, 
+                                                                 limit=SimulationServer.LINE_LIMIT)
+        self.receiver = asyncio.create_task(self.receive())
+        
+    async def close(self):
+        """Close the connection"""
+        if self.writer:
+            self.writer.close()
+            await self.receiver
+            self.writer = None
+            
+    async def receive(self):
+        """Deliver responses to their calls"""
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self.pending.pop(response.get("id"), None)
+                if future and not future.done():
+                    future.set_result(response)
+        except (ValueError, ConnectionError):
+            pass
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Connection to simulation server lost"))
+        self.pending.clear()
+        
+    async def call(self, method: str, **params):
+        """Call a server method, returns its result"""
+        request_id = self.next_id
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        request = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+        self.writer.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        await self.writer.drain()
+        response = await future
+        if "error" in response:
+            raise RuntimeError(f"{response['error']['message']} (code {response['error']['code']})")
+        return response["result"]
 
 class SettingsDialog:
     """Settings Dialog"""
@@ -1107,7 +5036,7 @@ class SettingsDialog:
         self.app = app
         self.window = tk.Toplevel(parent)
         self.window.title("Settings")
-        self.window.geometry("400x410")
+        self.window.geometry("400x560")
         self.window.transient(parent)
         self.window.grab_set()
         self.window.resizable(False, False)
@@ -1187,6 +5116,34 @@ class SettingsDialog:
         
         self.scale_var.trace('w', update_scale_label)
         
+        # Simulation resolution
+        tick_frame = ttk.LabelFrame(main_frame, text="Simulation Resolution", padding="10")
+        tick_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        current_tick = next((name for name, minutes in TICK_RESOLUTIONS.items() 
+                             if minutes == self.app.factory.tick_minutes), "1 minute")
+        self.tick_var = tk.StringVar(value=current_tick)
+        tick_combo = ttk.Combobox(
+            tick_frame,
+            textvariable=self.tick_var,
+            values=list(TICK_RESOLUTIONS.keys()),
+            state="readonly"
+        )
+        tick_combo.pack(fill=tk.X, pady=5)
+        
+        # Autosave
+        autosave_frame = ttk.LabelFrame(main_frame, text="Autosave", padding="10")
+        autosave_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        self.autosave_var = tk.StringVar(value=self.app.autosave_interval)
+        autosave_combo = ttk.Combobox(
+            autosave_frame,
+            textvariable=self.autosave_var,
+            values=list(AUTOSAVE_INTERVALS.keys()),
+            state="readonly"
+        )
+        autosave_combo.pack(fill=tk.X, pady=5)
+        
         # Button frame
         button_frame = ttk.Frame(main_frame)
         button_frame.pack(fill=tk.X, pady=(10, 0))
@@ -1227,6 +5184,16 @@ class SettingsDialog:
         if new_scale != self.app.scale_factor:
             self.app.set_scale_factor(new_scale)
         
+        # Update simulation resolution
+        new_tick = TICK_RESOLUTIONS[self.tick_var.get()]
+        if new_tick != self.app.factory.tick_minutes:
+            self.app.factory.set_tick_resolution(new_tick)
+            self.app.log_event(f"Simulation resolution set to {self.tick_var.get()}")
+            
+        # Update autosave
+        if self.autosave_var.get() != self.app.autosave_interval:
+            self.app.set_autosave_interval(self.autosave_var.get())
+        
         messagebox.showinfo("Success", "Settings applied. Some settings require restart to take full effect.")
         self.window.destroy()
         
@@ -1235,6 +5202,172 @@ class SettingsDialog:
         self.resolution_var.set("1920x1080")
         self.window_mode_var.set("windowed")
         self.scale_var.set(1.0)
+        self.tick_var.set("1 minute")
+        self.autosave_var.set("Off")
+
+class ScenarioDialog:
+    """What-if analysis comparing candidate actions"""
+    def __init__(self, parent, app):
+        self.app = app
+        self.analyzer = None
+        self.window = tk.Toplevel(parent)
+        self.window.title("What-If Analysis")
+        self.window.geometry("860x520")
+        self.window.transient(parent)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        self.create_widgets()
+        
+    def create_widgets(self):
+        """Create what-if analysis interface"""
+        main_frame = ttk.Frame(self.window, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        candidate_frame = ttk.LabelFrame(main_frame, text="Candidate Actions", padding="10")
+        candidate_frame.pack(fill=tk.X, pady=(0, 10))
+        self.candidate_vars = []
+        for index, (action, argument) in enumerate(ScenarioAnalyzer.DEFAULT_CANDIDATES):
+            var = tk.BooleanVar(value=True)
+            ttk.Checkbutton(candidate_frame, text=ScenarioAnalyzer.describe(action, argument), 
+                            variable=var).grid(row=index // 2, column=index % 2, sticky=tk.W, padx=5)
+            self.candidate_vars.append(((action, argument), var))
+            
+        option_frame = ttk.Frame(main_frame)
+        option_frame.pack(fill=tk.X, pady=(0, 10))
+        ttk.Label(option_frame, text="Horizon (days):").pack(side=tk.LEFT)
+        self.days_var = tk.IntVar(value=7)
+        ttk.Spinbox(option_frame, from_=1, to=60, textvariable=self.days_var, width=5).pack(side=tk.LEFT, padx=5)
+        ttk.Label(option_frame, text="Runs per candidate:").pack(side=tk.LEFT, padx=(10, 0))
+        self.runs_var = tk.IntVar(value=4)
+        ttk.Spinbox(option_frame, from_=1, to=20, textvariable=self.runs_var, width=5).pack(side=tk.LEFT, padx=5)
+        self.run_button = ttk.Button(option_frame, text="Run Analysis", command=self.run_analysis)
+        self.run_button.pack(side=tk.LEFT, padx=10)
+        self.status_label = ttk.Label(option_frame, text="")
+        self.status_label.pack(side=tk.LEFT)
+        
+        columns = ("rank", "candidate", "balance", "profit", "throughput", "orders", "late")
+        headings = ("Rank", "Candidate", "Balance", "Profit", "Output", "Orders", "Late Orders")
+        self.tree = ttk.Treeview(main_frame, columns=columns, show="headings")
+        for column, heading in zip(columns, headings):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=300 if column == "candidate" else 80)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        
+    def run_analysis(self):
+        """Start simulating the selected candidates"""
+        candidates = [candidate for candidate, var in self.candidate_vars if var.get()]
+        if not candidates:
+            messagebox.showwarning("Warning", "Please select at least one candidate action!")
+            return
+            
+        self.analyzer = ScenarioAnalyzer(self.app.factory, self.app.ai_strategy_var.get(), 
+                                         self.days_var.get(), self.runs_var.get())
+        self.run_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Simulating...")
+        self.analyzer.start(candidates)
+        self.poll_results()
+        
+    def poll_results(self):
+        """Show results once all simulations finished"""
+        if self.analyzer is None:
+            return
+        if not self.analyzer.is_done():
+            self.window.after(100, self.poll_results)
+            return
+            
+        self.tree.delete(*self.tree.get_children())
+        for rank, result in enumerate(self.analyzer.get_results(), 1):
+            note = "" if result["applied"] else " (not affordable)"
+            self.tree.insert("", tk.END, values=(
+                rank, result["description"] + note, f"¥{result['balance']:.2f}", f"¥{result['profit']:.2f}",
+                f"{result['throughput']:.1f}", f"{result['orders_completed']:.1f}", f"{result['late_orders']:.1f}"
+            ))
+        self.run_button.config(state=tk.NORMAL)
+        self.status_label.config(text="Done")
+        
+    def close(self):
+        """Stop running simulations and close"""
+        if self.analyzer is not None:
+            self.analyzer.close()
+            self.analyzer = None
+        self.window.destroy()
+
+class SaveBrowserDialog:
+    """Save browser listing saves from their headers"""
+    def __init__(self, parent, app):
+        self.app = app
+        self.directory = AUTOSAVE_DIRECTORY
+        self.saves = []
+        self.window = tk.Toplevel(parent)
+        self.window.title("Browse Saves")
+        self.window.geometry("820x460")
+        self.window.transient(parent)
+        
+        self.create_widgets()
+        self.refresh()
+        
+    def create_widgets(self):
+        """Create save browser interface"""
+        main_frame = ttk.Frame(self.window, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        directory_frame = ttk.Frame(main_frame)
+        directory_frame.pack(fill=tk.X, pady=(0, 5))
+        self.directory_label = ttk.Label(directory_frame, text="")
+        self.directory_label.pack(side=tk.LEFT)
+        ttk.Button(directory_frame, text="Change Folder", command=self.change_directory).pack(side=tk.RIGHT)
+        
+        columns = ("factory", "day", "balance", "mod", "saved_at", "kind", "version")
+        headings = ("Factory", "Day", "Balance", "Mod", "Saved At", "Type", "Version")
+        self.tree = ttk.Treeview(main_frame, columns=columns, show="headings")
+        for column, heading in zip(columns, headings):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=150 if column in ("factory", "saved_at", "mod") else 70)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.tree.bind("<Double-1>", lambda e: self.load_selected())
+        
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill=tk.X, pady=(10, 0))
+        ttk.Button(button_frame, text="Load", command=self.load_selected).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="Refresh", command=self.refresh).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Close", command=self.window.destroy).pack(side=tk.RIGHT)
+        
+    def change_directory(self):
+        """Select folder to browse"""
+        directory = filedialog.askdirectory(title="Select Save Folder")
+        if directory:
+            self.directory = directory
+            self.refresh()
+            
+    def refresh(self):
+        """List saves of the current folder"""
+        self.directory_label.config(text=f"Folder: {self.directory}")
+        self.tree.delete(*self.tree.get_children())
+        if not os.path.isdir(self.directory):
+            self.saves = []
+            return
+            
+        self.saves = SaveIndex(self.directory).list_saves()
+        for index, (path, header) in enumerate(self.saves):
+            self.tree.insert("", tk.END, iid=str(index), values=(
+                header.get("name", ""),
+                header.get("day", ""),
+                f"¥{header.get('balance', 0):.2f}",
+                header.get("mod") or "",
+                header.get("saved_at") or "",
+                header.get("kind", ""),
+                header.get("engine_version") or ""
+            ))
+            
+    def load_selected(self):
+        """Load selected save"""
+        selection = self.tree.selection()
+        if not selection:
+            messagebox.showwarning("Warning", "Please select a save first!")
+            return
+        path, header = self.saves[int(selection[0])]
+        self.window.destroy()
+        self.app.load_game_file(path)
 
 class FactorySimulatorGUI:
     """Factory Simulator GUI"""
@@ -1246,6 +5379,7 @@ class FactorySimulatorGUI:
         self.resolution_config = ResolutionConfig()
         self.window_mode = "windowed"  # windowed or fullscreen
         self.scale_factor = 1.0
+        self.autosave_interval = "Off"
         
         # Set window initial size and position
         self.setup_window()
@@ -1254,14 +5388,26 @@ class FactorySimulatorGUI:
         self.factory = Factory("Efficient Factory", initial_balance=420)
         self.setup_factory()
         
+        # Log simulation events
+        self.factory.events.subscribe(
+            self.on_simulation_events,
+            event_types=(SimEvent.PRODUCTION_COMPLETED, SimEvent.CRAFT_COMPLETED, 
+                         SimEvent.ORDER_COMPLETED, SimEvent.ORDER_OVERDUE, SimEvent.STOCK_LOW),
+            batch=True
+        )
+        
         # Current mod
         self.current_mod = None
         
         # Whether simulation is running
         self.simulation_running = False
+        
+        # Seconds from launch to the first drawn frame, set once it is drawn
+        self.startup_time = None
 
         # Create AI player
         self.ai_player = FactoryAI(self)
+        self.ai_player.scheduler = self.root.after
         
         # Create GUI
         self.create_widgets()
@@ -1269,11 +5415,6 @@ class FactorySimulatorGUI:
         # Start periodic update
         self.update_display()
 
-    def check_ai_decision(self):
-        """Check and execute AI decisions"""
-        if hasattr(self, 'ai_player') and self.ai_player.running:
-            self.ai_player.make_daily_decisions()
-
     def toggle_ai_player(self):
         """Toggle AI player running status"""
         if self.ai_player.running:
@@ -1283,6 +5424,7 @@ class FactorySimulatorGUI:
         else:
             self.ai_player.strategy = self.ai_strategy_var.get()
             self.ai_player.start()
+            self.update_display()
             self.ai_start_button.config(text="Stop AI Player")
             self.ai_status_label.config(text="AI Status: Running", foreground="green")
 
@@ -1296,10 +5438,21 @@ class FactorySimulatorGUI:
         """AI single step execution"""
         if not self.ai_player.running:
             self.ai_player.strategy = self.ai_strategy_var.get()
-            self.ai_player.make_daily_decisions()
+            self.ai_player.make_decisions()
             self.update_display()
             self.log_event("AI executed single step decision")
 
+    def report_startup_time(self, start: float):
+        """Log time from launch to the first drawn frame"""
+        self.startup_time = perf_counter() - start
+        self.log_event(f"Started in {self.startup_time:.2f} s")
+        if self.startup_time > STARTUP_TIME_BUDGET:
+            self.log_event(f"Warning: startup exceeded the {STARTUP_TIME_BUDGET:.1f} s budget")
+
+    def show_scenario_analysis(self):
+        """Open what-if analysis"""
+        ScenarioDialog(self.root, self)
+        
     def show_ai_analysis(self):
         """Show AI analysis"""
         analysis = self.ai_player.analyze_factory()
@@ -1369,54 +5522,7 @@ class FactorySimulatorGUI:
 
     def setup_factory(self):
         """Initialize factory data"""
-        # Add materials
-        self.factory.add_material("Wood", cost=1, unit="unit", initial_quantity=100)
-        self.factory.add_material("Metal", cost=2, unit="unit", initial_quantity=50)
-        self.factory.add_material("Plastic", cost=0.5, unit="unit", initial_quantity=200)
-        self.factory.add_material("Screws", cost=0.1, unit="pcs", initial_quantity=500)
-        
-        # Add products
-        chair = Product("Wooden Chair", production_time=60, sale_price=20)
-        chair.add_material_requirement("Wood", 5)
-        self.factory.add_product(chair)
-        
-        table = Product("Wooden Table", production_time=120, sale_price=40)
-        table.add_material_requirement("Wood", 10)
-        self.factory.add_product(table)
-        
-        cabinet = Product("Wooden Cabinet", production_time=180, sale_price=60)
-        cabinet.add_material_requirement("Wood", 15)
-        cabinet.add_material_requirement("Metal", 2)
-        self.factory.add_product(cabinet)
-        
-        # Add craftable products and materials
-        # Crafted material: Metal Plate (crafted from 2 Metal)
-        metal_plate = Material("Metal Plate", cost=3, unit="sheet")
-        metal_plate.add_material_requirement("Metal", 2)
-        self.factory.add_material(metal_plate.name, metal_plate.cost, metal_plate.unit, 0)
-        self.factory.materials["Metal Plate"].is_craftable = True
-        self.factory.materials["Metal Plate"].materials_required = metal_plate.materials_required.copy()
-        
-        # Crafted product: Premium Chair (crafted from Wooden Chair and Metal Plate)
-        premium_chair = Product("Premium Chair", production_time=90, sale_price=50)
-        premium_chair.add_product_requirement("Wooden Chair", 1)
-        premium_chair.add_material_requirement("Metal Plate", 1)
-        premium_chair.add_material_requirement("Screws", 4)
-        self.factory.add_product(premium_chair)
-        
-        # Add production lines
-        self.factory.add_production_line(capacity=10)
-        self.factory.add_production_line(capacity=10)
-        
-        # Add crafting stations
-        self.factory.add_crafting_station("Basic Crafting Station", capacity=5)
-        self.factory.add_crafting_station("Advanced Crafting Station", capacity=3)
-        
-        # Hire workers
-        self.factory.hire_worker("Worker A", 3, 100)
-        self.factory.hire_worker("Worker B", 2, 80)
-        self.factory.hire_worker("Worker C", 4, 120)
-        self.factory.hire_worker("Worker D", 3, 100)
+        self.factory.setup_default()
         
         # Assign workers to production lines and crafting stations
         
@@ -1435,6 +5541,7 @@ class FactorySimulatorGUI:
         """Create GUI components"""
         # Create menu bar
         self.create_menu()
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_app)
         
         # Create main frame
         main_frame = ttk.Frame(self.root, padding="10")
@@ -1487,8 +5594,16 @@ class FactorySimulatorGUI:
         menubar.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="Save Game", command=self.save_game)
         file_menu.add_command(label="Load Game", command=self.load_game)
+        file_menu.add_command(label="Browse Saves", command=self.browse_saves)
+        file_menu.add_command(label="Start Crash Journal", command=self.start_crash_journal)
+        file_menu.add_command(label="Recover From Journal", command=self.recover_from_journal)
+        file_menu.add_separator()
+        file_menu.add_command(label="Start History Export", command=self.start_history_export)
+        file_menu.add_command(label="Stop History Export", command=self.stop_history_export)
+        file_menu.add_command(label="Open History Database", command=self.open_history_database)
+        file_menu.add_command(label="History Report", command=self.show_history_report)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Exit", command=self.exit_app)
         
         # Settings menu
         settings_menu = tk.Menu(menubar, tearoff=0)
@@ -1548,25 +5663,16 @@ class FactorySimulatorGUI:
             try:
                 # Save game state to file
                 game_state = {
-                    "factory": {
-                        "name": self.factory.name,
-                        "balance": self.factory.balance,
-                        "day": self.factory.day,
-                        "current_time": self.factory.current_time.isoformat(),
-                        "material_inventory": self.factory.material_inventory,
-                        "product_inventory": self.factory.product_inventory,
-                        "daily_costs": self.factory.daily_costs,
-                        "daily_income": self.factory.daily_income
-                    },
+                    "factory": self.factory.to_dict(),
                     "settings": {
                         "resolution": self.resolution_config.current_resolution,
                         "window_mode": self.window_mode,
-                        "scale_factor": self.scale_factor
+                        "scale_factor": self.scale_factor,
+                        "tick_minutes": self.factory.tick_minutes
                     }
                 }
                 
-                with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(game_state, f, indent=4, ensure_ascii=False)
+                SaveFile.write(filename, game_state, header=SaveFile.get_header(self.factory, "manual"))
                     
                 messagebox.showinfo("Success", f"Game saved to: {filename}")
             except Exception as e:
@@ -1580,31 +5686,146 @@ class FactorySimulatorGUI:
         )
         
         if filename:
-            try:
-                with open(filename, 'r', encoding='utf-8') as f:
-                    game_state = json.load(f)
-                
-                # Restore factory state
-                factory_data = game_state["factory"]
+            self.load_game_file(filename)
+            
+    def browse_saves(self):
+        """Open save browser"""
+        SaveBrowserDialog(self.root, self)
+        
+    def load_game_file(self, filename):
+        """Load game from a save file"""
+        try:
+            game_state = SaveFile.read(filename)
+            
+            # Restore factory state
+            factory_data = game_state["factory"]
+            if "production_lines" in factory_data:
+                self.factory.restore_state(factory_data)
+            else:
+                # Saves of older versions only hold balance, time and inventories
                 self.factory.name = factory_data["name"]
                 self.factory.balance = factory_data["balance"]
                 self.factory.day = factory_data["day"]
                 self.factory.current_time = datetime.fromisoformat(factory_data["current_time"])
-                self.factory.material_inventory = factory_data["material_inventory"]
-                self.factory.product_inventory = factory_data["product_inventory"]
+                self.factory.material_inventory.replace(factory_data["material_inventory"])
+                self.factory.product_inventory.replace(factory_data["product_inventory"])
                 self.factory.daily_costs = factory_data["daily_costs"]
                 self.factory.daily_income = factory_data["daily_income"]
-                
-                # Restore settings
-                settings_data = game_state["settings"]
+            
+            # Restore settings, autosaves have none
+            settings_data = game_state.get("settings")
+            if settings_data:
                 self.resolution_config.set_resolution(settings_data["resolution"])
                 self.set_window_mode(settings_data["window_mode"])
                 self.set_scale_factor(settings_data["scale_factor"])
+                self.factory.set_tick_resolution(settings_data.get("tick_minutes", 1))
+            self.factory.checkpoint()
+            
+            self.update_display()
+            messagebox.showinfo("Success", f"Game loaded from {filename}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load game: {str(e)}")
+            
+    def set_autosave_interval(self, interval_name):
+        """Set autosave interval"""
+        self.autosave_interval = interval_name
+        interval = AUTOSAVE_INTERVALS[interval_name]
+        if interval is None:
+            success, message = self.factory.stop_autosave()
+        else:
+            success, message = self.factory.start_autosave(AUTOSAVE_DIRECTORY, *interval)
+        self.log_event(message)
+        
+    def start_crash_journal(self):
+        """Journal all commands so the game can be recovered after a crash"""
+        directory = filedialog.askdirectory(title="Select Journal Directory")
+        if directory:
+            success, message = self.factory.start_journal(directory)
+            if success:
+                self.log_event(message)
+            else:
+                messagebox.showerror("Error", message)
                 
+    def recover_from_journal(self):
+        """Restore the game recorded in a journal directory"""
+        directory = filedialog.askdirectory(title="Select Journal Directory")
+        if directory:
+            success, message = self.factory.recover_journal(directory)
+            if success:
                 self.update_display()
-                messagebox.showinfo("Success", f"Game loaded from {filename}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load game: {str(e)}")
+                self.log_event(message)
+            else:
+                messagebox.showerror("Error", message)
+                
+    def start_history_export(self):
+        """Start streaming simulation history to a file"""
+        filetypes = [("CSV Files", "*.csv")]
+        if import_pyarrow():
+            filetypes += [("Parquet Files", "*.parquet"), ("Arrow Stream Files", "*.arrow")]
+        filename = filedialog.asksaveasfilename(
+            title="Export History",
+            defaultextension=".csv",
+            filetypes=filetypes
+        )
+        
+        if filename:
+            success, message = self.factory.start_export(filename)
+            if success:
+                self.log_event(message)
+            else:
+                messagebox.showerror("Error", message)
+                
+    def stop_history_export(self):
+        """Stop streaming simulation history"""
+        success, message = self.factory.stop_export()
+        self.log_event(message)
+        
+    def open_history_database(self):
+        """Record history into a SQLite database"""
+        filename = filedialog.asksaveasfilename(
+            title="Open History Database",
+            defaultextension=".db",
+            filetypes=[("SQLite Database", "*.db")],
+            confirmoverwrite=False
+        )
+        
+        if filename:
+            success, message = self.factory.open_history(filename)
+            if success:
+                self.log_event(message)
+            else:
+                messagebox.showerror("Error", message)
+                
+    def show_history_report(self):
+        """Show revenue and production of the last 30 days"""
+        history = self.factory.history
+        if history is None:
+            messagebox.showwarning("Warning", "No history database open!")
+            return
+            
+        report = "=== Last 30 Days ===\n\nRevenue by product:\n"
+        for product, revenue in history.get_revenue_by_product(30):
+            report += f"  {product}: ¥{revenue:.2f}\n"
+        report += "\nUnits made:\n"
+        for item, units in history.get_production_by_item(30):
+            report += f"  {item}: {units}\n"
+        report += "\nCash flow:\n"
+        for kind, amount in history.get_cash_flow(30):
+            report += f"  {kind}: ¥{amount:.2f}\n"
+        report += f"\nCompleted orders (all time): {history.get_completed_order_count()}\n"
+        messagebox.showinfo("History Report", report)
+        
+    def exit_app(self):
+        """Finish pending output and exit"""
+        if self.factory.exporter is not None:
+            self.factory.stop_export()
+        if self.factory.history is not None:
+            self.factory.close_history()
+        if self.factory.journal is not None:
+            self.factory.stop_journal()
+        if self.factory.autosaver is not None:
+            self.factory.stop_autosave()
+        self.root.quit()
     
     def create_control_panel(self, parent):
         """Create control panel"""
@@ -1638,7 +5859,8 @@ class FactorySimulatorGUI:
         ttk.Label(strategy_frame, text="AI Strategy:").pack(side=tk.LEFT)
         
         self.ai_strategy_var = tk.StringVar(value="balanced")
-        strategies = [("Balanced Development", "balanced"), ("Aggressive Expansion", "aggressive"), ("Conservative Operation", "conservative")]
+        strategies = [("Balanced Development", "balanced"), ("Aggressive Expansion", "aggressive"), ("Conservative Operation", "conservative"), 
+                      ("Rollout Planning", "planning")]
         
         for text, value in strategies:
             ttk.Radiobutton(strategy_frame, text=text, variable=self.ai_strategy_var, 
@@ -1653,6 +5875,7 @@ class FactorySimulatorGUI:
         
         ttk.Button(button_frame, text="Single Step", command=self.ai_single_step).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="AI Analysis", command=self.show_ai_analysis).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="What-If Analysis", command=self.show_scenario_analysis).pack(side=tk.LEFT, padx=5)
     
         # Status display
         status_frame = ttk.Frame(ai_frame)
@@ -1788,48 +6011,36 @@ class FactorySimulatorGUI:
             delay = int(1000 / speed)  # Convert to milliseconds
             self.root.after(delay, self.auto_advance_time)
     
-    def log_event(self, message):
+    def log_event(self, message, time=None):
         """Log event to log"""
-        self.log_text.insert(tk.END, f"{self.factory.current_time.strftime('%H:%M')} - {message}\n")
+        time = time or self.factory.current_time
+        self.log_text.insert(tk.END, f"{time.strftime('%H:%M')} - {message}\n")
         self.log_text.see(tk.END)
+        
+    def on_simulation_events(self, events):
+        """Log a batch of simulation events"""
+        for event in events:
+            data = event.data
+            if event.event_type == SimEvent.PRODUCTION_COMPLETED:
+                self.log_event(f"Completed production of {data['product']}!", event.time)
+            elif event.event_type == SimEvent.CRAFT_COMPLETED:
+                item_type = "Product" if data["is_product"] else "Material"
+                self.log_event(f"Crafted {data['item']} {item_type}!", event.time)
+            elif event.event_type == SimEvent.ORDER_COMPLETED:
+                self.log_event(f"Order {data['order_id']} completed, earned ¥{data['income']}", event.time)
+            elif event.event_type == SimEvent.ORDER_OVERDUE:
+                self.log_event(f"Warning: Order {data['order_id']} is overdue!", event.time)
+            elif event.event_type == SimEvent.STOCK_LOW:
+                self.log_event(f"Warning: {data['item']} stock low, {data['quantity']} left", event.time)
     
     def advance_one_hour(self):
         """Advance 1 hour"""
-        completed_products, completed_crafting, overdue_orders = self.factory.advance_time(1)
-        
-        for product in completed_products:
-            self.log_event(f"Completed production of {product}!")
-            
-        for item, is_product in completed_crafting:
-            item_type = "Product" if is_product else "Material"
-            self.log_event(f"Crafted {item} {item_type}!")
-            
-        for order_id in overdue_orders:
-            self.log_event(f"Warning: Order {order_id} is overdue!")
-            
-        # Check AI decisions
-        self.check_ai_decision()
-            
+        self.factory.advance_time(1)
         self.update_display()
     
     def advance_eight_hours(self):
         """Advance 8 hours"""
-        for _ in range(8):
-            completed_products, completed_crafting, overdue_orders = self.factory.advance_time(1)
-            
-            for product in completed_products:
-                self.log_event(f"Completed production of {product}!")
-                
-            for item, is_product in completed_crafting:
-                item_type = "Product" if is_product else "Material"
-                self.log_event(f"Crafted {item} {item_type}!")
-                
-            for order_id in overdue_orders:
-                self.log_event(f"Warning: Order {order_id} is overdue!")
-                
-        # Check AI decisions
-        self.check_ai_decision()
-                
+        self.factory.advance_time(8)
         self.update_display()
     
     def next_day(self):
@@ -1837,10 +6048,6 @@ class FactorySimulatorGUI:
         success, message, daily_profit = self.factory.next_day()
         self.log_event(message)
         self.log_event(f"Yesterday's Profit: ¥{daily_profit}")
-        
-        # Trigger AI decisions
-        self.check_ai_decision()
-        
         self.update_display()
     
     def toggle_auto_simulation(self):
@@ -2307,25 +6514,15 @@ class ModCreator:
         notebook.add(info_tab, text="Basic Info")
         self.create_info_tab(info_tab)
         
-        # Materials tab
-        material_tab = ttk.Frame(notebook)
-        notebook.add(material_tab, text="Materials")
-        self.create_material_tab(material_tab)
-        
-        # Products tab
-        product_tab = ttk.Frame(notebook)
-        notebook.add(product_tab, text="Products")
-        self.create_product_tab(product_tab)
-        
-        # Crafting recipes tab
-        recipe_tab = ttk.Frame(notebook)
-        notebook.add(recipe_tab, text="Crafting Recipes")
-        self.create_recipe_tab(recipe_tab)
-        
-        # Workers tab
-        worker_tab = ttk.Frame(notebook)
-        notebook.add(worker_tab, text="Workers")
-        self.create_worker_tab(worker_tab)
+        # Materials, products, crafting recipes and workers tabs are built when first shown
+        self.material_listbox = self.product_listbox = self.recipe_tree = self.worker_listbox = None
+        self.pending_tabs = {}  # Tab widget name -> (builder, tab)
+        for text, builder in (("Materials", self.create_material_tab), ("Products", self.create_product_tab), 
+                              ("Crafting Recipes", self.create_recipe_tab), ("Workers", self.create_worker_tab)):
+            tab = ttk.Frame(notebook)
+            notebook.add(tab, text=text)
+            self.pending_tabs[str(tab)] = (builder, tab)
+        notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         
         # Action buttons
         action_frame = ttk.Frame(self.window)
@@ -2336,6 +6533,13 @@ class ModCreator:
         ttk.Button(action_frame, text="Apply Mod", command=self.apply_mod).pack(side=tk.LEFT, padx=5)
         ttk.Button(action_frame, text="Close", command=self.window.destroy).pack(side=tk.RIGHT, padx=5)
         
+    def on_tab_changed(self, event):
+        """Build a tab the first time it is selected"""
+        pending = self.pending_tabs.pop(event.widget.select(), None)
+        if pending:
+            builder, tab = pending
+            builder(tab)
+            
     def create_info_tab(self, parent):
         """Create basic info tab"""
         info_frame = ttk.LabelFrame(parent, text="Mod Basic Info", padding="10")
@@ -2492,24 +6696,32 @@ class ModCreator:
     
     def update_material_list(self):
         """Update materials list"""
+        if self.material_listbox is None:  # Tab not built yet
+            return
         self.material_listbox.delete(0, tk.END)
         for material in self.mod.materials:
             self.material_listbox.insert(tk.END, str(material))
     
     def update_product_list(self):
         """Update products list"""
+        if self.product_listbox is None:  # Tab not built yet
+            return
         self.product_listbox.delete(0, tk.END)
         for product in self.mod.products:
             self.product_listbox.insert(tk.END, str(product))
     
     def update_worker_list(self):
         """Update workers list"""
+        if self.worker_listbox is None:  # Tab not built yet
+            return
         self.worker_listbox.delete(0, tk.END)
         for worker in self.mod.initial_workers:
             self.worker_listbox.insert(tk.END, str(worker))
     
     def update_recipe_list(self):
         """Update recipes list"""
+        if self.recipe_tree is None:  # Tab not built yet
+            return
         self.recipe_tree.delete(*self.recipe_tree.get_children())
         
         # Add craftable materials
@@ -3172,11 +7384,225 @@ class ModCreator:
         messagebox.showinfo("Success", "Mod applied to game!")
         self.window.destroy()
 
+def create_cli_factory(save_path: str = None, mod_path: str = None):
+    """Create the factory a command starts from"""
+    factory = Factory("Efficient Factory", initial_balance=420, start_time=CLI_START_TIME)
+    if save_path:
+        factory.restore_state(SaveFile.read(save_path)["factory"])
+    else:
+        factory.setup_default()
+    if mod_path:
+        factory.load_mod(Mod.load_from_file(mod_path))
+    return factory
+
+def simulate_headless(factory: Factory, strategy: str, days: int, seed: int = 0):
+    """Let the AI run the factory for whole days without a display, returns summary metrics"""
+    start = perf_counter()
+    start_balance = factory.balance
+    counts = {SimEvent.PRODUCTION_COMPLETED: 0, SimEvent.ORDER_COMPLETED: 0, 
+              SimEvent.ORDER_OVERDUE: 0, SimEvent.PAYROLL_FAILED: 0}
+    produced = {}  # Units completed per product
+    
+    def count_events(events):
+        for event in events:
+            counts[event.event_type] += 1
+            if event.event_type == SimEvent.PRODUCTION_COMPLETED:
+                produced[event.data["product"]] = produced.get(event.data["product"], 0) + 1
+                
+    subscription = factory.events.subscribe(count_events, event_types=tuple(counts), batch=True)
+    ai = FactoryAI(HeadlessApp(factory, log_limit=1))
+    ai.rng = random.Random(seed)
+    ai.strategy = strategy
+    ai.start()
+    daily_profits = factory.run_days(days)
+    ai.stop()
+    factory.events.unsubscribe(subscription)
+    return {
+        "balance": factory.balance,
+        "profit": factory.balance - start_balance,
+        "produced": counts[SimEvent.PRODUCTION_COMPLETED],
+        "produced_by_product": produced,
+        "orders_completed": counts[SimEvent.ORDER_COMPLETED],
+        "late_orders": counts[SimEvent.ORDER_OVERDUE],
+        "payroll_failures": counts[SimEvent.PAYROLL_FAILED],
+        "workers": len(factory.workers),
+        "production_lines": len(factory.production_lines),
+        "daily_profits": daily_profits,
+        "seconds": perf_counter() - start
+    }
+
+def run_what_if(args):
+    """Run what-if analysis from the command line"""
+    factory = create_cli_factory(args.save)
+    analyzer = ScenarioAnalyzer(factory, args.strategy, args.days, args.runs, args.seed, args.workers)
+    start = perf_counter()
+    analyzer.run()
+    print(analyzer.format_table())
+    print(f"\n{len(analyzer.candidates) * analyzer.runs} simulations of {args.days} days in {perf_counter() - start:.2f} s")
+
+def run_tune(args):
+    """Tune AI parameters from the command line"""
+    factory = create_cli_factory(args.save)
+    tuner = ParameterTuner(factory, args.strategy, args.days, args.seeds, args.population, args.generations, 
+                           args.seed, args.workers, args.cache)
+    start = perf_counter()
+    score, params = tuner.run(lambda generation, best: print(f"Generation {generation + 1}: best score {best:.2f}"))
+    print(f"\nBest parameters ({tuner.evaluations} simulations in {perf_counter() - start:.2f} s):")
+    for name, value in params.items():
+        print(f"  {name}: {value}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(params, f, indent=2)
+
+def run_simulate(args):
+    """Run one headless simulation from the command line"""
+    factory = create_cli_factory(args.save, args.mod)
+    summary = simulate_headless(factory, args.strategy, args.days, args.seed)
+    days_per_second = args.days / summary["seconds"] if summary["seconds"] else float("inf")
+    print(f"Simulated {args.days} days with the {args.strategy} strategy in {summary['seconds']:.2f} s "
+          f"({days_per_second:.1f} days/s)")
+    print(f"  Final balance: {summary['balance']:.2f}")
+    print(f"  Profit: {summary['profit']:.2f}")
+    print(f"  Units produced: {summary['produced']}")
+    print(f"  Orders completed: {summary['orders_completed']}")
+    print(f"  Late orders: {summary['late_orders']}")
+    print(f"  Payroll failures: {summary['payroll_failures']}")
+    print(f"  Workers: {summary['workers']}, production lines: {summary['production_lines']}")
+    if args.out:
+        settings = {"save": args.save, "mod": args.mod, "strategy": args.strategy, "days": args.days, "seed": args.seed}
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "engine_version": ENGINE_VERSION, **summary}, f, indent=2)
+
+def run_serve(args):
+    """Serve simulation sessions from the command line"""
+    async def serve():
+        server = SimulationServer(args.host, args.port, args.max_sessions)
+        await server.start()
+        print(f"Serving simulations on {server.host}:{server.port}, press Ctrl+C to stop", flush=True)
+        await server.serve_forever()
+        
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+def run_call(args):
+    """Call a simulation server method from the command line"""
+    async def call():
+        async with SimulationClient(args.host, args.port) as client:
+            return await client.call(args.method, **params)
+            
+    params = json.loads(args.params) if args.params else {}
+    if not isinstance(params, dict):
+        raise SystemExit("Error: parameters must be a JSON object")
+    try:
+        result = asyncio.run(call())
+    except (RuntimeError, OSError) as e:
+        raise SystemExit(f"Error: {str(e)}")
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+def run_sweep(args):
+    """Run a parameter sweep from the command line"""
+    runner = SweepRunner(SweepRunner.load_grid(args.grid), args.cache, args.workers)
+    start = perf_counter()
+    rows = runner.run(lambda done, total: print(f"Simulated {done}/{total}", end="\r"))
+    if runner.computed:
+        print()
+    print(runner.format_table(rows))
+    print(f"\n{len(rows)} cells, {runner.computed} simulated, {len(rows) - runner.computed} from cache, "
+          f"{perf_counter() - start:.2f} s")
+    if args.out:
+        SweepRunner.write_csv(args.out, rows)
+
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Factory Simulator")
+    parser.add_argument("--measure-startup", action="store_true", 
+                        help="Open the GUI, print its cold-start time and exit, failing if over budget")
+    subparsers = parser.add_subparsers(dest="command")
+    what_if_parser = subparsers.add_parser("what-if", help="Compare candidate actions by simulating them in parallel")
+    what_if_parser.add_argument("--save", help="Save file to start from (default: new factory)")
+    what_if_parser.add_argument("--days", type=int, default=7, help="Simulated days per candidate")
+    what_if_parser.add_argument("--strategy", default="balanced", choices=list(FactoryAI.STRATEGY_POLICIES), 
+                                help="AI strategy driving the simulations")
+    what_if_parser.add_argument("--runs", type=int, default=4, help="Simulations per candidate")
+    what_if_parser.add_argument("--seed", type=int, default=0, help="First random seed")
+    what_if_parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    tune_parser = subparsers.add_parser("tune", help="Search AI decision parameters with a genetic algorithm")
+    tune_parser.add_argument("--save", help="Save file to start from (default: new factory)")
+    tune_parser.add_argument("--days", type=int, default=14, help="Simulated days per evaluation")
+    tune_parser.add_argument("--strategy", default="aggressive", choices=list(FactoryAI.STRATEGY_POLICIES), 
+                             help="AI strategy to tune")
+    tune_parser.add_argument("--seeds", type=int, default=4, help="Seeded simulations per evaluation")
+    tune_parser.add_argument("--population", type=int, default=16, help="Parameter sets per generation")
+    tune_parser.add_argument("--generations", type=int, default=10, help="Generations to search")
+    tune_parser.add_argument("--seed", type=int, default=0, help="Random seed of the search")
+    tune_parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    tune_parser.add_argument("--cache", help="JSON file caching evaluations between runs")
+    tune_parser.add_argument("--out", help="JSON file to write the best parameters to")
+    sweep_parser = subparsers.add_parser("sweep", help="Run every cell of a JSON experiment grid")
+    sweep_parser.add_argument("grid", help="JSON file mapping mod, strategy, initial_balance, workers, seed and days to values")
+    sweep_parser.add_argument("--cache", default=SWEEP_CACHE_DIRECTORY, help="Directory caching cell results")
+    sweep_parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    sweep_parser.add_argument("--out", help="CSV file to write one row per cell to")
+    simulate_parser = subparsers.add_parser("simulate", help="Run the AI on one factory without the GUI")
+    simulate_parser.add_argument("--save", help="Save file to start from (default: new factory)")
+    simulate_parser.add_argument("--mod", help="Mod file to load into the factory")
+    simulate_parser.add_argument("--days", type=int, default=30, help="Simulated days")
+    simulate_parser.add_argument("--strategy", default="balanced", choices=list(FactoryAI.STRATEGY_POLICIES), 
+                                 help="AI strategy running the factory")
+    simulate_parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    simulate_parser.add_argument("--out", help="JSON file to write the results to")
+    serve_parser = subparsers.add_parser("serve", help="Host many factories behind a local JSON-RPC server")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    serve_parser.add_argument("--port", type=int, default=SIMULATION_SERVER_PORT, help="Port to listen on")
+    serve_parser.add_argument("--max-sessions", type=int, default=10000, help="Most factories hosted at once")
+    call_parser = subparsers.add_parser("call", help="Call a method of a running simulation server")
+    call_parser.add_argument("method", choices=["create", "step", "query", "command", "close", "list"], 
+                             help="Server method")
+    call_parser.add_argument("params", nargs="?", help='JSON object of parameters, e.g. \'{"session": 1, "days": 7}\'')
+    call_parser.add_argument("--host", default="127.0.0.1", help="Server address")
+    call_parser.add_argument("--port", type=int, default=SIMULATION_SERVER_PORT, help="Server port")
+    args = parser.parse_args()
+    
+    if args.command == "what-if":
+        run_what_if(args)
+        return
+    if args.command == "tune":
+        run_tune(args)
+        return
+    if args.command == "sweep":
+        run_sweep(args)
+        return
+    if args.command == "simulate":
+        run_simulate(args)
+        return
+    if args.command == "serve":
+        run_serve(args)
+        return
+    if args.command == "call":
+        run_call(args)
+        return
+        
+    import_tkinter()
     root = tk.Tk()
     app = FactorySimulatorGUI(root)
+    
+    def on_map(event):
+        # The first frame is drawn once the main window is mapped and its pending redraws have run
+        if event.widget is not root or app.startup_time is not None:
+            return
+        root.update_idletasks()
+        app.report_startup_time(LAUNCH_TIME)
+        if args.measure_startup:
+            root.quit()
+            
+    root.bind("<Map>", on_map, add="+")
     root.mainloop()
+    if args.measure_startup:
+        root.destroy()
+        parser.exit(int(app.startup_time > STARTUP_TIME_BUDGET), 
+                    f"Cold start: {app.startup_time:.3f} s (budget {STARTUP_TIME_BUDGET:.1f} s)\n")
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,59 @@
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from time import perf_counter
+
+# 在其他导入之前记录，因此测得的冷启动时间包含导入耗时
+LAUNCH_TIME = perf_counter()
+
+import argparse
+import asyncio
+import copy
+import csv
+import gzip
+import hashlib
+import itertools
 import json
+import math
 import os
+import sqlite3
+import threading
+from collections import deque
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from functools import wraps
 import random
 
+try:
+    import numpy as np
+except ImportError:  # NumPy为可选依赖，缺失时向量运算回退到列表
+    np = None
+
+# PyArrow 是可选的，首次导出时才导入，历史导出回退为仅支持 CSV
+pa = pq = None
+
+def import_pyarrow():
+    """为历史导出导入PyArrow，返回是否可用"""
+    global pa, pq
+    if pa is None:
+        try:
+            import pyarrow as pa
+            import pyarrow.ipc
+            import pyarrow.parquet as pq
+        except ImportError:
+            pa = pq = None
+            return False
+    return True
+
+# Tk在图形界面启动时才导入，无界面命令无需显示器即可运行
+tk = ttk = messagebox = filedialog = None
+
+def import_tkinter():
+    """为图形界面导入Tk模块"""
+    global tk, ttk, messagebox, filedialog
+    import tkinter as tk
+    from tkinter import ttk, messagebox, filedialog
+
 # 添加分辨率配置
 class ResolutionConfig:
     """分辨率配置类"""
@@ -37,8 +86,60 @@ class ResolutionConfig:
         """获取可用的分辨率列表"""
         return list(self.resolutions.keys())
 
+# 引擎时间精度（每个模拟刻度的分钟数）
+TICK_RESOLUTIONS = {
+    "1分钟": 1,
+    "5分钟": 5,
+    "1小时": 60
+}
+
+# 定点进度缩放：技能效率以0.2为步长增长，
+# 因此1级工人工作一分钟相当于5个进度单位
+PROGRESS_SCALE = 5
+
+# 所有配方的合成时间（分钟）
+CRAFTING_TIME = 60
+
+# 无需求配方报告的可制造数量
+UNLIMITED_UNITS = 2 ** 31 - 1
+
+# 未连接历史数据库时保留在内存中的最近已完成订单数
+COMPLETED_ORDER_LIMIT = 20
+
+# 记录在存档头中的引擎版本
+ENGINE_VERSION = "2.0"
+
+# 自动保存间隔（模拟小时数，实际分钟数）
+AUTOSAVE_INTERVALS = {
+    "关闭": None,
+    "每模拟小时": (1, None),
+    "每模拟天": (24, None),
+    "每5分钟": (None, 5)
+}
+
+# 轮换写入的自动保存槽位数
+AUTOSAVE_SLOTS = 5
+
+# 存放自动保存槽位的目录
+AUTOSAVE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".factory_simulator", "autosave")
+
+# 缓存参数扫描结果的目录
+SWEEP_CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".factory_simulator", "sweep_cache")
+
+# 命令行运行中新工厂的模拟起始时间，固定以便相同种子的运行可以重复
+CLI_START_TIME = datetime(2024, 1, 1, 8, 0)
+
+# 本地模拟服务器的默认端口
+SIMULATION_SERVER_PORT = 8765
+
+# 图形界面从启动到绘制第一帧允许的秒数
+STARTUP_TIME_BUDGET = 1.0
+
 class Product:
     """产品类"""
+    __slots__ = ("name", "production_time", "sale_price", "materials_required", 
+                 "products_required", "is_craftable")
+    
     def __init__(self, name: str, production_time: int, sale_price: float):
         self.name = name
         self.production_time = production_time  # 生产所需时间(分钟)
@@ -116,6 +217,8 @@ class Product:
 
 class Material:
     """原材料类"""
+    __slots__ = ("name", "cost", "unit", "is_craftable", "materials_required", "products_required")
+    
     def __init__(self, name: str, cost: float, unit: str):
         self.name = name
         self.cost = cost  # 单价
@@ -184,6 +287,9 @@ class Material:
 
 class CraftingStation:
     """合成站类"""
+    __slots__ = ("station_id", "name", "capacity", "current_recipe", "is_recipe_product", 
+                 "crafting_progress", "assigned_worker", "is_active")
+    
     def __init__(self, station_id: int, name: str, capacity: int):
         self.station_id = station_id
         self.name = name
@@ -194,6 +300,16 @@ class CraftingStation:
         self.assigned_worker = None
         self.is_active = False
         
+    def copy(self, worker=None):
+        """为分叉工厂复制合成站状态，使用分叉中对应的工人副本"""
+        station = CraftingStation(self.station_id, self.name, self.capacity)
+        station.current_recipe = self.current_recipe
+        station.is_recipe_product = self.is_recipe_product
+        station.crafting_progress = self.crafting_progress
+        station.assigned_worker = worker
+        station.is_active = self.is_active
+        return station
+        
     def assign_worker(self, worker):
         """分配工人到合成站"""
         self.assigned_worker = worker
@@ -202,20 +318,33 @@ class CraftingStation:
         
     def assign_recipe(self, recipe_name: str, is_product: bool):
         """分配合成配方到合成站"""
+        # 空闲的合成站保留上次完成时结转的工作量
+        if self.current_recipe is not None:
+            self.crafting_progress = 0
         self.current_recipe = recipe_name
         self.is_recipe_product = is_product
-        self.crafting_progress = 0
         
-    def update_crafting(self):
+    def is_crafting(self):
+        """检查合成站是否正在推进进度"""
+        return bool(self.is_active and self.current_recipe and self.assigned_worker)
+        
+    def ticks_to_completion(self, tick_minutes: int):
+        """获取当前配方完成前剩余的刻度数"""
+        remaining = CRAFTING_TIME * PROGRESS_SCALE - self.crafting_progress
+        per_tick = self.assigned_worker.work_rate() * tick_minutes
+        return max(1, -(-remaining // per_tick))
+        
+    def update_crafting(self, minutes: int = 1):
         """更新合成进度"""
-        if self.is_active and self.current_recipe and self.assigned_worker:
+        if self.is_crafting():
             # 技能等级影响合成效率
-            efficiency = 1 + (self.assigned_worker.skill_level - 1) * 0.2
-            self.crafting_progress += efficiency
+            self.crafting_progress += self.assigned_worker.work_rate() * minutes
             
-            if self.crafting_progress >= 60:  # 合成固定需要60分钟
-                # 合成完成
-                self.crafting_progress = 0
+            required = CRAFTING_TIME * PROGRESS_SCALE
+            if self.crafting_progress >= required:
+                # 合成完成，超出完成所需的工作量结转到下一个配方
+                # （少于一整件，每个刻度最多完成一件）
+                self.crafting_progress = min(self.crafting_progress - required, required - 1)
                 completed_item = self.current_recipe
                 self.current_recipe = None
                 return completed_item, self.is_recipe_product
@@ -223,7 +352,9 @@ class CraftingStation:
         
     def get_progress_percentage(self):
         """获取合成进度百分比"""
-        return min(100, int((self.crafting_progress / 60) * 100))
+        if self.current_recipe:
+            return min(100, int(self.crafting_progress * 100 / (CRAFTING_TIME * PROGRESS_SCALE)))
+        return 0
         
     def __str__(self):
         status = "运行中" if self.is_active else "停止"
@@ -236,6 +367,8 @@ class CraftingStation:
 
 class Worker:
     """工人类"""
+    __slots__ = ("name", "skill_level", "salary", "is_working", "current_task")
+    
     def __init__(self, name: str, skill_level: int, salary: float):
         self.name = name
         self.skill_level = skill_level  # 技能等级(1-5)
@@ -243,6 +376,18 @@ class Worker:
         self.is_working = False
         self.current_task = None
         
+    def copy(self):
+        """为分叉工厂复制工人状态"""
+        worker = Worker(self.name, self.skill_level, self.salary)
+        worker.is_working = self.is_working
+        worker.current_task = self.current_task
+        return worker
+        
+    def work_rate(self):
+        """获取每分钟工作产生的进度单位"""
+        # 等价于定点表示的效率 1 + (技能等级 - 1) * 0.2
+        return max(1, PROGRESS_SCALE + self.skill_level - 1)
+        
     def to_dict(self):
         """转换为字典，用于JSON序列化"""
         return {
@@ -266,6 +411,9 @@ class Worker:
 
 class ProductionLine:
     """生产线类"""
+    __slots__ = ("line_id", "capacity", "current_product", "production_progress", 
+                 "assigned_worker", "is_active")
+    
     def __init__(self, line_id: int, capacity: int):
         self.line_id = line_id
         self.capacity = capacity  # 最大产能
@@ -274,6 +422,15 @@ class ProductionLine:
         self.assigned_worker = None
         self.is_active = False
         
+    def copy(self, worker: Worker = None):
+        """为分叉工厂复制生产线状态，使用分叉中对应的工人副本"""
+        line = ProductionLine(self.line_id, self.capacity)
+        line.current_product = self.current_product
+        line.production_progress = self.production_progress
+        line.assigned_worker = worker
+        line.is_active = self.is_active
+        return line
+        
     def assign_worker(self, worker: Worker):
         """分配工人到生产线"""
         self.assigned_worker = worker
@@ -282,19 +439,36 @@ class ProductionLine:
         
     def assign_product(self, product: Product):
         """分配产品到生产线"""
+        # 空闲的生产线保留上次完成时结转的工作量
+        if self.current_product is not None:
+            self.production_progress = 0
         self.current_product = product
-        self.production_progress = 0
         
-    def update_production(self):
+    def is_producing(self):
+        """检查生产线是否正在推进进度"""
+        return bool(self.is_active and self.current_product and self.assigned_worker)
+        
+    def work_required(self):
+        """获取当前产品所需的进度单位"""
+        return max(1, self.current_product.production_time * PROGRESS_SCALE)
+        
+    def ticks_to_completion(self, tick_minutes: int):
+        """获取当前产品完成前剩余的刻度数"""
+        remaining = self.work_required() - self.production_progress
+        per_tick = self.assigned_worker.work_rate() * tick_minutes
+        return max(1, -(-remaining // per_tick))
+        
+    def update_production(self, minutes: int = 1):
         """更新生产进度"""
-        if self.is_active and self.current_product and self.assigned_worker:
+        if self.is_producing():
             # 技能等级影响生产效率
-            efficiency = 1 + (self.assigned_worker.skill_level - 1) * 0.2
-            self.production_progress += efficiency
+            self.production_progress += self.assigned_worker.work_rate() * minutes
             
-            if self.production_progress >= self.current_product.production_time:
-                # 生产完成
-                self.production_progress = 0
+            required = self.work_required()
+            if self.production_progress >= required:
+                # 生产完成，超出完成所需的工作量结转到下一个产品
+                # （少于一整件，每个刻度最多完成一件）
+                self.production_progress = min(self.production_progress - required, required - 1)
                 completed_product = self.current_product
                 self.current_product = None
                 return completed_product
@@ -303,7 +477,7 @@ class ProductionLine:
     def get_progress_percentage(self):
         """获取生产进度百分比"""
         if self.current_product:
-            return min(100, int((self.production_progress / self.current_product.production_time) * 100))
+            return min(100, int(self.production_progress * 100 / self.work_required()))
         return 0
         
     def __str__(self):
@@ -316,6 +490,8 @@ class ProductionLine:
 
 class Order:
     """订单类"""
+    __slots__ = ("order_id", "product", "quantity", "deadline", "completed_quantity", "is_completed")
+    
     def __init__(self, order_id: int, product: Product, quantity: int, deadline: datetime):
         self.order_id = order_id
         self.product = product
@@ -324,6 +500,13 @@ class Order:
         self.completed_quantity = 0
         self.is_completed = False
         
+    def copy(self):
+        """为分叉工厂复制订单进度"""
+        order = Order(self.order_id, self.product, self.quantity, self.deadline)
+        order.completed_quantity = self.completed_quantity
+        order.is_completed = self.is_completed
+        return order
+        
     def complete_quantity(self, amount: int):
         """完成一定数量的产品"""
         self.completed_quantity += amount
@@ -405,9 +588,1157 @@ class Mod:
             data = json.load(f)
             return cls.from_dict(data)
 
+class ItemRegistry:
+    """物品注册表，将原材料和产品名称驻留为整数ID"""
+    __slots__ = ("ids", "names", "kinds")
+    
+    MATERIAL = 0
+    PRODUCT = 1
+    
+    def __init__(self):
+        self.ids = {}  # {(kind, name): item_id}
+        self.names = []  # 按ID索引的物品名称
+        self.kinds = []  # 按ID索引的物品类型
+        
+    def intern(self, kind: int, name: str):
+        """获取物品ID，必要时注册该物品"""
+        key = (kind, name)
+        item_id = self.ids.get(key)
+        if item_id is None:
+            item_id = len(self.names)
+            self.ids[key] = item_id
+            self.names.append(name)
+            self.kinds.append(kind)
+        return item_id
+        
+    def copy(self):
+        """为分叉工厂复制注册表"""
+        registry = ItemRegistry()
+        registry.ids = dict(self.ids)
+        registry.names = list(self.names)
+        registry.kinds = list(self.kinds)
+        return registry
+        
+    def get_id(self, kind: int, name: str):
+        """获取物品ID，未注册时返回None"""
+        return self.ids.get((kind, name))
+        
+    def get_name(self, item_id: int):
+        """获取用于显示和序列化的物品名称"""
+        return self.names[item_id]
+        
+    def __len__(self):
+        return len(self.names)
+
+class RequirementVector:
+    """已编译配方的稀疏需求向量"""
+    __slots__ = ("item_ids", "quantities")
+    
+    def __init__(self, pairs):
+        pairs = [(item_id, quantity) for item_id, quantity in pairs if quantity > 0]
+        if np is not None:
+            self.item_ids = np.array([item_id for item_id, _ in pairs], dtype=np.intp)
+            self.quantities = np.array([quantity for _, quantity in pairs], dtype=np.int64)
+        else:
+            self.item_ids = [item_id for item_id, _ in pairs]
+            self.quantities = [quantity for _, quantity in pairs]
+            
+    def __iter__(self):
+        """遍历 (物品ID, 数量) 对"""
+        return zip([int(item_id) for item_id in self.item_ids], 
+                   [int(quantity) for quantity in self.quantities])
+        
+    def __len__(self):
+        return len(self.item_ids)
+
+class Inventory:
+    """按物品ID索引的全部物品稠密库存向量"""
+    __slots__ = ("registry", "counts", "version")
+    
+    def __init__(self, registry: ItemRegistry):
+        self.registry = registry
+        # 按物品ID索引的库存数量
+        self.counts = np.zeros(16, dtype=np.int64) if np is not None else []
+        self.version = 0  # 每次库存变化时递增
+        
+    def copy(self, registry: ItemRegistry):
+        """为分叉工厂复制库存"""
+        inventory = Inventory(registry)
+        inventory.counts = self.counts.copy() if np is not None else list(self.counts)
+        inventory.version = self.version
+        return inventory
+        
+    def slot(self, kind: int, name: str):
+        """获取物品ID，必要时分配库存槽位"""
+        item_id = self.registry.intern(kind, name)
+        if item_id >= len(self.counts):
+            self.grow(item_id + 1)
+        return item_id
+        
+    def grow(self, size: int):
+        """扩展库存向量使其至少容纳size个物品"""
+        if np is not None:
+            counts = np.zeros(max(size, 2 * len(self.counts)), dtype=np.int64)
+            counts[:len(self.counts)] = self.counts
+            self.counts = counts
+        else:
+            self.counts.extend([0] * (size - len(self.counts)))
+            
+    def get_quantity(self, item_id: int):
+        """获取物品库存数量"""
+        return int(self.counts[item_id])
+        
+    def find_shortage(self, requirements: RequirementVector, units: int = 1):
+        """查找第一个库存不足的需求，返回 (物品ID, 数量) 或 None"""
+        if np is not None:
+            needed = requirements.quantities * units
+            short = self.counts[requirements.item_ids] < needed
+            if short.any():
+                index = int(short.argmax())
+                return int(requirements.item_ids[index]), int(needed[index])
+            return None
+        counts = self.counts
+        for item_id, quantity in zip(requirements.item_ids, requirements.quantities):
+            if counts[item_id] < quantity * units:
+                return item_id, quantity * units
+        return None
+        
+    def max_units(self, requirements: RequirementVector):
+        """获取库存可满足的配方单位数"""
+        if not len(requirements):
+            return UNLIMITED_UNITS
+        if np is not None:
+            return int((self.counts[requirements.item_ids] // requirements.quantities).min())
+        counts = self.counts
+        return min(counts[item_id] // quantity 
+                   for item_id, quantity in zip(requirements.item_ids, requirements.quantities))
+        
+    def consume(self, requirements: RequirementVector, units: int = 1):
+        """从库存中扣除所需数量"""
+        self.version += 1
+        if np is not None:
+            self.counts[requirements.item_ids] -= requirements.quantities * units
+            return
+        counts = self.counts
+        for item_id, quantity in zip(requirements.item_ids, requirements.quantities):
+            counts[item_id] -= quantity * units
+            
+    def restore(self, requirements: RequirementVector, units: int = 1):
+        """将所需数量退回库存"""
+        self.consume(requirements, -units)
+
+class InventoryView(MutableMapping):
+    """库存中某一类物品的按名称访问视图"""
+    __slots__ = ("inventory", "kind", "item_ids")
+    
+    def __init__(self, inventory: Inventory, kind: int):
+        self.inventory = inventory
+        self.kind = kind
+        self.item_ids = {}  # {name: item_id} of items listed in this view
+        
+    def copy(self, inventory: Inventory):
+        """在分叉工厂的库存上复制视图"""
+        view = InventoryView(inventory, self.kind)
+        view.item_ids = dict(self.item_ids)
+        return view
+        
+    def get_id(self, name: str):
+        """获取已列出物品的ID，不存在时返回None"""
+        return self.item_ids.get(name)
+        
+    def add(self, name: str, quantity: int):
+        """为已列出的物品增加数量"""
+        self.inventory.counts[self.item_ids[name]] += quantity
+        self.inventory.version += 1
+        
+    def replace(self, quantities):
+        """用给定数量替换所有已列出的物品"""
+        self.clear()
+        self.update(quantities)
+        
+    def clear(self):
+        counts = self.inventory.counts
+        for item_id in self.item_ids.values():
+            counts[item_id] = 0
+        self.item_ids.clear()
+        self.inventory.version += 1
+        
+    def __getitem__(self, name):
+        return int(self.inventory.counts[self.item_ids[name]])
+        
+    def __setitem__(self, name, quantity):
+        item_id = self.item_ids.get(name)
+        if item_id is None:
+            item_id = self.inventory.slot(self.kind, name)
+            self.item_ids[name] = item_id
+        self.inventory.counts[item_id] = quantity
+        self.inventory.version += 1
+        
+    def __delitem__(self, name):
+        item_id = self.item_ids.pop(name)
+        self.inventory.counts[item_id] = 0
+        self.inventory.version += 1
+        
+    def __contains__(self, name):
+        return name in self.item_ids
+        
+    def __iter__(self):
+        return iter(self.item_ids)
+        
+    def __len__(self):
+        return len(self.item_ids)
+        
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+class SimEvent:
+    """模拟事件"""
+    __slots__ = ("event_type", "time", "data")
+    
+    # 事件类型
+    PRODUCTION_COMPLETED = "production_completed"
+    CRAFT_COMPLETED = "craft_completed"
+    ORDER_COMPLETED = "order_completed"
+    ORDER_OVERDUE = "order_overdue"
+    STOCK_LOW = "stock_low"
+    PAYROLL_FAILED = "payroll_failed"
+    ORDER_CREATED = "order_created"
+    MATERIAL_PURCHASED = "material_purchased"
+    WORKER_HIRED = "worker_hired"
+    LINE_ADDED = "line_added"
+    STATION_ADDED = "station_added"
+    DAY_STARTED = "day_started"
+    PRODUCT_SOLD = "product_sold"
+    PAYROLL_PAID = "payroll_paid"
+    
+    def __init__(self, event_type: str, time: datetime, data: dict):
+        self.event_type = event_type
+        self.time = time  # 事件发生的模拟时间
+        self.data = data  # 事件数据
+        
+    def __repr__(self):
+        return f"SimEvent({self.event_type}, {self.time.strftime('%Y-%m-%d %H:%M')}, {self.data})"
+
+class Subscription:
+    """事件总线订阅"""
+    __slots__ = ("callback", "event_types", "event_filter", "batch")
+    
+    def __init__(self, callback, event_types=None, event_filter=None, batch: bool = False):
+        self.callback = callback
+        self.event_types = frozenset(event_types) if event_types else None  # None: 所有类型
+        self.event_filter = event_filter  # 可选的事件过滤函数
+        self.batch = batch  # True: 回调接收事件列表
+        
+    def matches(self, event: SimEvent):
+        """检查订阅是否接收该事件"""
+        if self.event_types is not None and event.event_type not in self.event_types:
+            return False
+        return self.event_filter is None or self.event_filter(event)
+
+class EventBus:
+    """向订阅者分发模拟事件的事件总线"""
+    def __init__(self):
+        self.subscriptions = []
+        self.pending = []  # 等待分发的事件
+        self.batch_depth = 0
+        self.dispatching = False
+        
+    def subscribe(self, callback, event_types=None, event_filter=None, batch: bool = False):
+        """订阅事件，返回订阅对象"""
+        subscription = Subscription(callback, event_types, event_filter, batch)
+        self.subscriptions.append(subscription)
+        return subscription
+        
+    def unsubscribe(self, subscription: Subscription):
+        """取消订阅"""
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+            
+    def publish(self, event_type: str, time: datetime, **data):
+        """发布事件，批处理之外立即分发"""
+        self.pending.append(SimEvent(event_type, time, data))
+        if self.batch_depth == 0:
+            self.flush()
+            
+    @contextmanager
+    def batch(self):
+        """收集代码块内发布的事件并一起分发"""
+        self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            self.batch_depth -= 1
+            if self.batch_depth == 0:
+                self.flush()
+                
+    def flush(self):
+        """向订阅者分发待处理事件"""
+        # 订阅者发布的事件由外层循环分发
+        if self.dispatching:
+            return
+        self.dispatching = True
+        try:
+            while self.pending:
+                events, self.pending = self.pending, []
+                for subscription in list(self.subscriptions):
+                    matching = [event for event in events if subscription.matches(event)]
+                    if not matching:
+                        continue
+                    if subscription.batch:
+                        subscription.callback(matching)
+                    else:
+                        for event in matching:
+                            subscription.callback(event)
+        finally:
+            self.dispatching = False
+
+class AssignmentSolver:
+    """工人到岗位的最大利润分配（匈牙利算法，O(n²m)）"""
+    
+    @staticmethod
+    def solve(profit):
+        """求解工人×岗位利润矩阵，返回每个工人的岗位索引（-1: 无）"""
+        rows = len(profit)
+        cols = len(profit[0]) if rows else 0
+        if rows == 0 or cols == 0:
+            return [-1] * rows
+            
+        # 算法要求行数不多于列数
+        if rows > cols:
+            transposed = [[profit[i][j] for i in range(rows)] for j in range(cols)]
+            slot_workers = AssignmentSolver.solve(transposed)
+            assignment = [-1] * rows
+            for slot, worker in enumerate(slot_workers):
+                if worker >= 0:
+                    assignment[worker] = slot
+            return assignment
+            
+        if np is not None:
+            return AssignmentSolver.solve_numpy(profit, rows, cols)
+        return AssignmentSolver.solve_lists(profit, rows, cols)
+        
+    @staticmethod
+    def solve_numpy(profit, rows, cols):
+        """列扫描向量化的匈牙利算法"""
+        cost = -np.asarray(profit, dtype=np.float64)
+        u = np.zeros(rows + 1)
+        v = np.zeros(cols + 1)
+        p = np.zeros(cols + 1, dtype=np.int64)  # 每列匹配的行（0: 无）
+        way = np.zeros(cols + 1, dtype=np.int64)
+        for i in range(1, rows + 1):
+            p[0] = i
+            j0 = 0
+            minv = np.full(cols + 1, np.inf)
+            used = np.zeros(cols + 1, dtype=bool)
+            while True:
+                used[j0] = True
+                i0 = p[j0]
+                free = ~used[1:]
+                cur = cost[i0 - 1] - u[i0] - v[1:]
+                better = free & (cur < minv[1:])
+                minv[1:][better] = cur[better]
+                way[1:][better] = j0
+                candidates = np.where(free, minv[1:], np.inf)
+                j1 = int(np.argmin(candidates)) + 1
+                delta = candidates[j1 - 1]
+                u[p[used]] += delta
+                v[used] -= delta
+                minv[~used] -= delta
+                j0 = j1
+                if p[j0] == 0:
+                    break
+            # 沿交错路径增广
+            while j0:
+                j1 = way[j0]
+                p[j0] = p[j1]
+                j0 = j1
+        assignment = [-1] * rows
+        for j in range(1, cols + 1):
+            if p[j]:
+                assignment[p[j] - 1] = j - 1
+        return assignment
+        
+    @staticmethod
+    def solve_lists(profit, rows, cols):
+        """基于普通列表的匈牙利算法"""
+        inf = float("inf")
+        u = [0.0] * (rows + 1)
+        v = [0.0] * (cols + 1)
+        p = [0] * (cols + 1)  # 每列匹配的行（0: 无）
+        way = [0] * (cols + 1)
+        for i in range(1, rows + 1):
+            p[0] = i
+            j0 = 0
+            minv = [inf] * (cols + 1)
+            used = [False] * (cols + 1)
+            while True:
+                used[j0] = True
+                i0 = p[j0]
+                row = profit[i0 - 1]
+                delta = inf
+                j1 = 0
+                for j in range(1, cols + 1):
+                    if not used[j]:
+                        cur = -row[j - 1] - u[i0] - v[j]
+                        if cur < minv[j]:
+                            minv[j] = cur
+                            way[j] = j0
+                        if minv[j] < delta:
+                            delta = minv[j]
+                            j1 = j
+                for j in range(cols + 1):
+                    if used[j]:
+                        u[p[j]] += delta
+                        v[j] -= delta
+                    else:
+                        minv[j] -= delta
+                j0 = j1
+                if p[j0] == 0:
+                    break
+            # 沿交错路径增广
+            while j0:
+                j1 = way[j0]
+                p[j0] = p[j1]
+                j0 = j1
+        assignment = [-1] * rows
+        for j in range(1, cols + 1):
+            if p[j]:
+                assignment[p[j] - 1] = j - 1
+        return assignment
+
+class RingBuffer:
+    """保存最近样本的固定容量缓冲区"""
+    __slots__ = ("data", "capacity", "start", "size")
+    
+    def __init__(self, capacity: int):
+        # 存储只分配一次，新样本覆盖最旧的样本
+        self.data = np.zeros(capacity) if np is not None else [0.0] * capacity
+        self.capacity = capacity
+        self.start = 0  # 最旧样本的索引
+        self.size = 0
+        
+    def copy(self):
+        """复制缓冲区内容"""
+        buffer = RingBuffer.__new__(RingBuffer)
+        buffer.data = self.data.copy() if np is not None else list(self.data)
+        buffer.capacity = self.capacity
+        buffer.start = self.start
+        buffer.size = self.size
+        return buffer
+        
+    def append(self, value: float):
+        """添加样本，满时丢弃最旧的样本"""
+        if self.size < self.capacity:
+            self.data[(self.start + self.size) % self.capacity] = value
+            self.size += 1
+        else:
+            self.data[self.start] = value
+            self.start = (self.start + 1) % self.capacity
+            
+    def last(self, count: int):
+        """获取最近的样本，按从旧到新排列"""
+        count = min(count, self.size)
+        begin = (self.start + self.size - count) % self.capacity
+        if begin + count <= self.capacity:
+            values = self.data[begin:begin + count]
+        elif np is not None:
+            values = np.concatenate((self.data[begin:], self.data[:begin + count - self.capacity]))
+        else:
+            values = self.data[begin:] + self.data[:begin + count - self.capacity]
+        return values.tolist() if np is not None else values
+        
+    def values(self):
+        """获取所有样本，按从旧到新排列"""
+        return self.last(self.size)
+        
+    def __len__(self):
+        return self.size
+
+class MetricSeries:
+    """按小时记录的指标，自动降采样到更粗粒度的环形缓冲区"""
+    __slots__ = ("aggregate", "levels", "pending", "pending_counts")
+    
+    # 各分辨率的（每个样本的小时数, 保留样本数）
+    LEVELS = ((1, 168), (24, 365), (168, 520))
+    
+    def __init__(self, aggregate: str):
+        self.aggregate = aggregate  # 计数器为 "sum"，状态量为 "mean"
+        self.levels = [RingBuffer(capacity) for _, capacity in self.LEVELS]
+        self.pending = [0.0] * len(self.LEVELS)  # 各粗粒度级别的部分聚合值
+        self.pending_counts = [0] * len(self.LEVELS)
+        
+    def copy(self):
+        """复制序列内容"""
+        series = MetricSeries.__new__(MetricSeries)
+        series.aggregate = self.aggregate
+        series.levels = [buffer.copy() for buffer in self.levels]
+        series.pending = list(self.pending)
+        series.pending_counts = list(self.pending_counts)
+        return series
+        
+    def append(self, value: float):
+        """添加每小时样本，并汇总到更粗粒度的级别"""
+        self.levels[0].append(value)
+        for level in range(1, len(self.LEVELS)):
+            self.pending[level] += value
+            self.pending_counts[level] += 1
+            factor = self.LEVELS[level][0] // self.LEVELS[level - 1][0]
+            if self.pending_counts[level] < factor:
+                break
+            value = self.pending[level] if self.aggregate == "sum" else self.pending[level] / factor
+            self.levels[level].append(value)
+            self.pending[level] = 0.0
+            self.pending_counts[level] = 0
+            
+    def extend(self, value: float, count: int, level: int = 0):
+        """向某一级别添加count个相同样本，无需逐个追加即可汇总到更粗的级别"""
+        buffer = self.levels[level]
+        # 更早的样本会被覆盖，填满缓冲区即可
+        for _ in range(min(count, buffer.capacity)):
+            buffer.append(value)
+        if level + 1 == len(self.LEVELS):
+            return
+        next_level = level + 1
+        factor = self.LEVELS[next_level][0] // self.LEVELS[level][0]
+        needed = factor - self.pending_counts[next_level]
+        if count < needed:
+            self.pending[next_level] += value * count
+            self.pending_counts[next_level] += count
+            return
+        # 先补全未完成的粗粒度样本，再添加完整的粗粒度样本
+        first = self.pending[next_level] + value * needed
+        full, rest = divmod(count - needed, factor)
+        self.pending[next_level] = value * rest
+        self.pending_counts[next_level] = rest
+        self.extend(first if self.aggregate == "sum" else first / factor, 1, next_level)
+        if full:
+            self.extend(value * factor if self.aggregate == "sum" else value, full, next_level)
+            
+    def get_values(self, hours_per_sample: int = 1, count: int = None):
+        """获取指定分辨率的样本，按从旧到新排列"""
+        level = next(i for i, (hours, _) in enumerate(self.LEVELS) if hours == hours_per_sample)
+        buffer = self.levels[level]
+        return buffer.last(len(buffer) if count is None else count)
+
+class MetricsStore:
+    """生产、消耗和工厂状态的每小时时间序列"""
+    
+    def __init__(self, start_time: datetime):
+        self.origin = start_time.replace(minute=0, second=0, microsecond=0)
+        self.hours_closed = 0  # 已完成的小时数
+        self.series = {}
+        self.counters = {}  # 当前小时累计的计数
+        
+    def copy(self):
+        """为分叉工厂复制所有序列"""
+        store = MetricsStore(self.origin)
+        store.hours_closed = self.hours_closed
+        store.series = {name: series.copy() for name, series in self.series.items()}
+        store.counters = dict(self.counters)
+        return store
+        
+    def get_series(self, name: str, aggregate: str):
+        """获取序列，必要时创建"""
+        series = self.series.get(name)
+        if series is None:
+            series = MetricSeries(aggregate)
+            self.series[name] = series
+        return series
+        
+    def count(self, name: str, amount: float = 1):
+        """为当前小时的计数器序列累加"""
+        self.get_series(name, "sum")
+        self.counters[name] = self.counters.get(name, 0) + amount
+        
+    def close_hours(self, now: datetime, gauges):
+        """记录当前时间之前完成的每个小时；gauges 是返回当前状态量的可调用对象"""
+        hours_due = int((now - self.origin).total_seconds() // 3600)
+        if hours_due <= self.hours_closed:
+            return
+        values = gauges()
+        hours = hours_due - self.hours_closed
+        for name, value in values.items():
+            self.get_series(name, "mean").extend(value, hours)
+        # 计数属于第一个小时，间隔中的其余小时为空
+        for name, series in self.series.items():
+            if series.aggregate == "sum":
+                series.extend(self.counters.get(name, 0), 1)
+                if hours > 1:
+                    series.extend(0, hours - 1)
+        self.counters = {}
+        self.hours_closed = hours_due
+            
+    def get_rate(self, name: str, hours: int = 24):
+        """获取计数器在最近若干小时内的每小时速率（序列存在之前的小时按零计算）"""
+        series = self.series.get(name)
+        if series is None:
+            return 0.0
+        return sum(series.get_values(1, hours)) / max(1, hours)
+        
+    def get_mean(self, name: str, hours: int = 24):
+        """获取状态量在最近若干小时内的平均值"""
+        series = self.series.get(name)
+        if series is None:
+            return 0.0
+        values = series.get_values(1, hours)
+        return sum(values) / len(values) if values else 0.0
+
+class HistoryExporter:
+    """将模拟事件以列式记录流式写入 CSV、Parquet 或 Arrow 文件"""
+    
+    COLUMNS = ("time", "day", "event", "item", "slot", "order_id", "quantity", "amount")
+    FORMATS = {".csv": "csv", ".parquet": "parquet", ".arrow": "arrow"}
+    
+    # 各事件数据字段写入的列
+    FIELD_COLUMNS = {
+        "product": "item", "item": "item", "material": "item", "worker": "item",
+        "line_id": "slot", "station_id": "slot",
+        "order_id": "order_id",
+        "quantity": "quantity",
+        "income": "amount", "cost": "amount", "amount": "amount"
+    }
+    
+    def __init__(self, factory, path: str, file_format: str = None, batch_size: int = 1024):
+        file_format = file_format or self.FORMATS.get(os.path.splitext(path)[1].lower())
+        if file_format not in self.FORMATS.values():
+            raise ValueError(f"不支持的导出格式: {path}")
+        if file_format != "csv" and not import_pyarrow():
+            raise ValueError(f"{file_format} 导出需要 pyarrow")
+            
+        self.factory = factory
+        self.path = path
+        self.file_format = file_format
+        self.batch_size = batch_size  # 每次写入前缓冲的记录数
+        self.columns = {name: [] for name in self.COLUMNS}
+        self.rows_written = 0
+        
+        if file_format == "csv":
+            self.file = open(path, 'w', encoding='utf-8', newline='')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.COLUMNS)
+        else:
+            self.file = None
+            self.schema = pa.schema([
+                ("time", pa.timestamp("us")), ("day", pa.int64()), ("event", pa.string()), 
+                ("item", pa.string()), ("slot", pa.int64()), ("order_id", pa.int64()), 
+                ("quantity", pa.int64()), ("amount", pa.float64())
+            ])
+            if file_format == "parquet":
+                self.writer = pq.ParquetWriter(path, self.schema)
+            else:
+                self.writer = pa.ipc.new_stream(path, self.schema)
+            
+        self.subscription = factory.events.subscribe(self.on_events, batch=True)
+        
+    def on_events(self, events):
+        """缓冲已分发事件的记录"""
+        for event in events:
+            row = dict.fromkeys(self.COLUMNS)
+            row["time"] = event.time
+            row["day"] = self.factory.day
+            row["event"] = event.event_type
+            for key, value in event.data.items():
+                column = self.FIELD_COLUMNS.get(key)
+                if column and row[column] is None:
+                    row[column] = value
+            for name in self.COLUMNS:
+                self.columns[name].append(row[name])
+                
+        if len(self.columns["event"]) >= self.batch_size:
+            self.flush()
+            
+    def flush(self):
+        """将缓冲的记录作为一批写入"""
+        count = len(self.columns["event"])
+        if count == 0:
+            return
+            
+        if self.file_format == "csv":
+            times = [event_time.isoformat() for event_time in self.columns["time"]]
+            self.writer.writerows(zip(times, *(self.columns[name] for name in self.COLUMNS[1:])))
+            self.file.flush()
+        else:
+            amounts = self.columns["amount"]
+            self.columns["amount"] = [None if amount is None else float(amount) for amount in amounts]
+            self.writer.write_table(pa.table(self.columns, schema=self.schema))
+            
+        self.rows_written += count
+        self.columns = {name: [] for name in self.COLUMNS}
+        
+    def close(self):
+        """停止记录并完成文件，返回写入的记录数"""
+        self.factory.events.unsubscribe(self.subscription)
+        self.flush()
+        if self.file_format == "csv":
+            self.file.close()
+        else:
+            self.writer.close()
+        return self.rows_written
+
+class HistoryStore:
+    """保存已完成订单、生产记录和财务交易的SQLite数据库"""
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS orders (
+            order_id INTEGER PRIMARY KEY, product TEXT, quantity INTEGER, 
+            created_time TEXT, created_day INTEGER, deadline TEXT, 
+            completed_time TEXT, completed_day INTEGER, income REAL, overdue INTEGER DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS production (
+            time TEXT, day INTEGER, item TEXT, is_product INTEGER, slot_kind TEXT, slot INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS transactions (
+            time TEXT, day INTEGER, kind TEXT, item TEXT, quantity INTEGER, amount REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_orders_product ON orders (product);
+        CREATE INDEX IF NOT EXISTS idx_orders_completed_day ON orders (completed_day);
+        CREATE INDEX IF NOT EXISTS idx_production_day ON production (day);
+        CREATE INDEX IF NOT EXISTS idx_production_item ON production (item, day);
+        CREATE INDEX IF NOT EXISTS idx_transactions_day ON transactions (day);
+        CREATE INDEX IF NOT EXISTS idx_transactions_item ON transactions (item, day);
+    """
+    
+    # 缓冲的语句，写入时按此顺序执行
+    STATEMENTS = {
+        "order_created": "INSERT OR REPLACE INTO orders (order_id, product, quantity, created_time, "
+                         "created_day, deadline) VALUES (?, ?, ?, ?, ?, ?)",
+        "order_completed": "UPDATE orders SET completed_time = ?, completed_day = ?, income = ? WHERE order_id = ?",
+        "order_overdue": "UPDATE orders SET overdue = 1 WHERE order_id = ?",
+        "production": "INSERT INTO production VALUES (?, ?, ?, ?, ?, ?)",
+        "transaction": "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)",
+    }
+    
+    def __init__(self, factory, path: str, batch_size: int = 500):
+        self.factory = factory
+        self.path = path
+        self.batch_size = batch_size  # 每次事务前缓冲的行数
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(self.SCHEMA)
+        self.pending = {name: [] for name in self.STATEMENTS}
+        self.pending_count = 0
+        self.record_orders()
+        self.subscription = factory.events.subscribe(self.on_events, batch=True)
+        
+    def record_orders(self):
+        """以当前时间记录内存中数据库尚未收录的订单"""
+        factory = self.factory
+        time_text = factory.current_time.isoformat()
+        rows = []
+        for order in factory.orders:
+            completion = ((time_text, factory.day, order.product.sale_price * order.quantity) 
+                          if order.is_completed else (None, None, None))
+            rows.append((order.order_id, order.product.name, order.quantity, time_text, factory.day, 
+                         order.deadline.isoformat()) + completion)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO orders (order_id, product, quantity, created_time, created_day, deadline, "
+                "completed_time, completed_day, income) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        
+    def on_events(self, events):
+        """为送达的事件缓冲数据行"""
+        day = self.factory.day
+        for event in events:
+            data = event.data
+            time_text = event.time.isoformat()
+            if event.event_type == SimEvent.PRODUCTION_COMPLETED:
+                self.add("production", (time_text, day, data["product"], 1, "line", data["line_id"]))
+            elif event.event_type == SimEvent.CRAFT_COMPLETED:
+                self.add("production", (time_text, day, data["item"], int(data["is_product"]), 
+                                        "station", data["station_id"]))
+            elif event.event_type == SimEvent.ORDER_CREATED:
+                self.add("order_created", (data["order_id"], data["product"], data["quantity"], 
+                                           time_text, day, data["deadline"].isoformat()))
+            elif event.event_type == SimEvent.ORDER_COMPLETED:
+                self.add("order_completed", (time_text, day, data["income"], data["order_id"]))
+                self.add("transaction", (time_text, day, "order", data["product"], data["quantity"], data["income"]))
+            elif event.event_type == SimEvent.ORDER_OVERDUE:
+                self.add("order_overdue", (data["order_id"],))
+            elif event.event_type == SimEvent.PRODUCT_SOLD:
+                self.add("transaction", (time_text, day, "sale", data["product"], data["quantity"], data["income"]))
+            elif event.event_type == SimEvent.MATERIAL_PURCHASED:
+                self.add("transaction", (time_text, day, "purchase", data["material"], data["quantity"], -data["cost"]))
+            elif event.event_type == SimEvent.PAYROLL_PAID:
+                self.add("transaction", (time_text, day, "payroll", None, None, -data["amount"]))
+                
+        if self.pending_count >= self.batch_size:
+            self.flush()
+            
+    def add(self, statement: str, row: tuple):
+        """缓冲一行数据"""
+        self.pending[statement].append(row)
+        self.pending_count += 1
+        
+    def flush(self):
+        """在一个事务中写入缓冲的数据行"""
+        if self.pending_count == 0:
+            return
+        with self.connection:
+            for name, sql in self.STATEMENTS.items():
+                if self.pending[name]:
+                    self.connection.executemany(sql, self.pending[name])
+        self.pending = {name: [] for name in self.STATEMENTS}
+        self.pending_count = 0
+        
+    def query(self, sql: str, params: tuple = ()):
+        """对已写入和缓冲中的历史执行查询"""
+        self.flush()
+        return self.connection.execute(sql, params).fetchall()
+        
+    def get_revenue_by_product(self, days: int = 30):
+        """获取最近若干天每种产品的收入"""
+        return self.query(
+            "SELECT item, SUM(amount) FROM transactions WHERE kind IN ('order', 'sale') AND day > ? "
+            "GROUP BY item ORDER BY SUM(amount) DESC", (self.factory.day - days,))
+        
+    def get_production_by_item(self, days: int = 30):
+        """获取最近若干天每种物品的产量"""
+        return self.query(
+            "SELECT item, COUNT(*) FROM production WHERE day > ? GROUP BY item ORDER BY COUNT(*) DESC", 
+            (self.factory.day - days,))
+        
+    def get_cash_flow(self, days: int = 30):
+        """获取最近若干天每种交易类型的总金额"""
+        return self.query(
+            "SELECT kind, SUM(amount) FROM transactions WHERE day > ? GROUP BY kind", 
+            (self.factory.day - days,))
+        
+    def get_completed_order_count(self):
+        """获取已完成订单数量"""
+        return self.query("SELECT COUNT(*) FROM orders WHERE completed_day IS NOT NULL")[0][0]
+        
+    def close(self):
+        """写入剩余数据并关闭数据库"""
+        self.factory.events.unsubscribe(self.subscription)
+        self.flush()
+        self.connection.close()
+
+class SaveFile:
+    """存档文件的读取和原子写入"""
+    
+    # 布局: 魔数、头长度(4字节小端)、JSON头、普通或gzip压缩的JSON正文
+    MAGIC = b"FSAV"
+    GZIP_MAGIC = b"\x1f\x8b"
+    
+    @staticmethod
+    def get_header(factory, kind: str):
+        """获取存储在存档正文前的元数据"""
+        return {
+            "name": factory.name,
+            "day": factory.day,
+            "balance": factory.balance,
+            "mod": factory.mod_name,
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+            "engine_version": ENGINE_VERSION,
+            "kind": kind
+        }
+        
+    @staticmethod
+    def write(path: str, game_state: dict, compress: bool = False, header: dict = None):
+        """通过临时文件写入存档，确保不会只写入一半"""
+        body = json.dumps(game_state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if compress:
+            body = gzip.compress(body, compresslevel=6)
+        header_data = json.dumps(dict(header or {}, compressed=compress), ensure_ascii=False, 
+                                 separators=(",", ":")).encode("utf-8")
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(SaveFile.MAGIC + len(header_data).to_bytes(4, "little") + header_data)
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        
+    @staticmethod
+    def read_header(path: str):
+        """读取存档头而不解码正文"""
+        with open(path, 'rb') as f:
+            prefix = f.read(8)
+            if prefix[:4] == SaveFile.MAGIC:
+                return json.loads(f.read(int.from_bytes(prefix[4:], "little")).decode("utf-8"))
+                
+        # 旧版本存档没有头，只汇总一次其正文
+        factory_data = SaveFile.read(path)["factory"]
+        return {
+            "name": factory_data["name"],
+            "day": factory_data["day"],
+            "balance": factory_data["balance"],
+            "mod": factory_data.get("mod_name"),
+            "saved_at": None,
+            "engine_version": None,
+            "kind": "manual"
+        }
+        
+    @staticmethod
+    def read(path: str):
+        """读取普通或压缩的存档文件"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] == SaveFile.MAGIC:
+            header_size = int.from_bytes(data[4:8], "little")
+            data = data[8 + header_size:]
+        if data[:2] == SaveFile.GZIP_MAGIC:
+            data = gzip.decompress(data)
+        return json.loads(data.decode("utf-8"))
+
+class SaveIndex:
+    """目录中存档头的缓存，只为有变化的文件刷新"""
+    
+    INDEX_FILE = "save_index.json"
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, self.INDEX_FILE)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)  # {filename: {"mtime", "size", "header"}}
+        except (OSError, ValueError):
+            self.entries = {}
+            
+    def list_saves(self):
+        """获取目录中所有存档的 (路径, 头)，最新的在前"""
+        entries = {}
+        changed = False
+        for item in os.scandir(self.directory):
+            if not item.name.endswith(".factorysave") or not item.is_file():
+                continue
+            stat = item.stat()
+            cached = self.entries.get(item.name)
+            if cached and cached["mtime"] == stat.st_mtime and cached["size"] == stat.st_size:
+                entries[item.name] = cached
+                continue
+            try:
+                header = SaveFile.read_header(item.path)
+            except (OSError, ValueError, KeyError):
+                continue  # 无法读取或不是存档
+            entries[item.name] = {"mtime": stat.st_mtime, "size": stat.st_size, "header": header}
+            changed = True
+            
+        if changed or len(entries) != len(self.entries):
+            self.entries = entries
+            self.save()
+        names = sorted(entries, key=lambda name: entries[name]["mtime"], reverse=True)
+        return [(os.path.join(self.directory, name), entries[name]["header"]) for name in names]
+        
+    def save(self):
+        """写入索引，目录只读时跳过"""
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+class AutoSaver:
+    """定期自动保存，在后台线程中编码并写入快照"""
+    
+    def __init__(self, factory, directory: str, slots: int = AUTOSAVE_SLOTS, 
+                 interval_hours: float = 24, interval_minutes: float = None):
+        os.makedirs(directory, exist_ok=True)
+        self.factory = factory
+        self.directory = directory
+        self.slots = slots
+        self.interval_hours = interval_hours  # 两次保存之间的模拟小时数
+        self.interval_minutes = interval_minutes  # 两次保存之间的实际分钟数
+        self.last_save_time = factory.current_time
+        self.last_save_clock = perf_counter()
+        self.next_slot = self.find_next_slot()
+        self.pending = None  # 等待写入线程的 (路径, 游戏状态, 头)
+        self.running = True
+        self.saves_written = 0
+        self.last_error = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="autosave", daemon=True)
+        self.thread.start()
+        self.subscription = factory.events.subscribe(self.on_events, batch=True)
+        
+    def get_slot_path(self, slot: int):
+        """获取自动保存槽位的文件路径"""
+        return os.path.join(self.directory, f"autosave_{slot + 1}.factorysave")
+        
+    def find_next_slot(self):
+        """获取最近写入槽位的下一个槽位"""
+        newest_slot, newest_time = -1, -1.0
+        for slot in range(self.slots):
+            path = self.get_slot_path(slot)
+            if os.path.exists(path) and os.path.getmtime(path) > newest_time:
+                newest_slot, newest_time = slot, os.path.getmtime(path)
+        return (newest_slot + 1) % self.slots
+        
+    def on_events(self, events):
+        """间隔到达时保存"""
+        if self.is_due():
+            self.save_now()
+            
+    def is_due(self):
+        """检查是否已到自动保存间隔"""
+        if (self.interval_hours is not None and 
+                self.factory.current_time - self.last_save_time >= timedelta(hours=self.interval_hours)):
+            return True
+        if (self.interval_minutes is not None and 
+                perf_counter() - self.last_save_clock >= self.interval_minutes * 60):
+            return True
+        return False
+        
+    def save_now(self):
+        """捕获当前状态并排队写入，返回槽位路径"""
+        # 捕获开销很小，编码、压缩和磁盘I/O在写入线程中进行
+        game_state = {"factory": self.factory.to_dict()}
+        header = SaveFile.get_header(self.factory, "autosave")
+        self.last_save_time = self.factory.current_time
+        self.last_save_clock = perf_counter()
+        with self.condition:
+            # 仍在等待写入的快照会在其槽位中被替换
+            if self.pending is not None:
+                path = self.pending[0]
+            else:
+                path = self.get_slot_path(self.next_slot)
+                self.next_slot = (self.next_slot + 1) % self.slots
+            self.pending = (path, game_state, header)
+            self.condition.notify()
+        return path
+        
+    def run(self):
+        """写入线程循环"""
+        while True:
+            with self.condition:
+                while self.pending is None and self.running:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                path, game_state, header = self.pending
+                self.pending = None
+            try:
+                SaveFile.write(path, game_state, compress=True, header=header)
+                self.saves_written += 1
+            except (OSError, TypeError, ValueError) as e:
+                self.last_error = str(e)
+                
+    def close(self):
+        """完成排队的保存并停止写入线程"""
+        self.factory.events.unsubscribe(self.subscription)
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+
+class Journal:
+    """只追加的引擎命令日志，配合原子快照用于崩溃恢复"""
+    
+    COMMANDS = set()  # 记录到日志中的工厂方法
+    SNAPSHOT_FILE = "snapshot.json"
+    JOURNAL_FILE = "journal.jsonl"
+    
+    def __init__(self, factory, directory: str, sync_every: int = 32, sync_interval: float = 1.0, 
+                 snapshot_every: int = 500):
+        self.factory = factory
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_path = os.path.join(directory, self.SNAPSHOT_FILE)
+        self.journal_path = os.path.join(directory, self.JOURNAL_FILE)
+        self.sync_every = sync_every  # 每次fsync前写入的条目数
+        self.sync_interval = sync_interval  # 记录时两次fsync之间的最长时间(秒)
+        self.snapshot_every = snapshot_every  # 压缩为快照前写入的条目数
+        self.sequence = 0  # 最后记录的命令序号
+        self.entries = 0  # 上次快照后写入的条目数
+        self.unsynced = 0
+        self.last_sync = perf_counter()
+        self.snapshot_due = False  # 出现无法用命令表示的更改时设置
+        self.file = None
+        self.write_snapshot()
+        
+    @staticmethod
+    def command(method):
+        """将工厂方法调用记录到已连接日志中的装饰器"""
+        Journal.COMMANDS.add(method.__name__)
+        
+        @wraps(method)
+        def run_command(factory, *args, **kwargs):
+            # 由其他命令发出的命令会随调用者一起重放
+            if factory.journal is None or factory.command_depth:
+                return method(factory, *args, **kwargs)
+            # 订阅者在命令记录之后才响应，
+            # 因此它们发出的命令在日志中位于其后
+            with factory.events.batch():
+                factory.command_depth += 1
+                try:
+                    result = method(factory, *args, **kwargs)
+                finally:
+                    factory.command_depth -= 1
+                factory.journal.record(method.__name__, args, kwargs)
+            return result
+        return run_command
+        
+    def record(self, command: str, args: tuple, kwargs: dict):
+        """追加一条已执行的命令"""
+        self.sequence += 1
+        if self.snapshot_due or self.entries >= self.snapshot_every:
+            # 快照已包含此命令的效果
+            self.write_snapshot()
+            return
+            
+        entry = {"seq": self.sequence, "command": command, "args": args}
+        if kwargs:
+            entry["kwargs"] = kwargs
+        self.file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=int) + "\n")
+        self.entries += 1
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every or perf_counter() - self.last_sync >= self.sync_interval:
+            self.sync()
+            
+    def sync(self):
+        """强制将已写入的条目落盘"""
+        if self.unsynced:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+        self.last_sync = perf_counter()
+        
+    def write_snapshot(self):
+        """用当前状态原子地替换快照并开始新的空日志"""
+        SaveFile.write(self.snapshot_path, {"sequence": self.sequence, "factory": self.factory.to_dict()}, 
+                       header=SaveFile.get_header(self.factory, "journal"))
+        
+        # 快照序号之前的条目不再需要
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.journal_path, 'w', encoding='utf-8')
+        self.entries = 0
+        self.unsynced = 0
+        self.snapshot_due = False
+        self.last_sync = perf_counter()
+        
+    def close(self):
+        """将日志压缩为最终快照并关闭"""
+        self.write_snapshot()
+        self.file.close()
+        
+    @staticmethod
+    def recover(factory, directory: str):
+        """恢复最近的快照并重放其后写入的日志，返回重放的条目数"""
+        snapshot = SaveFile.read(os.path.join(directory, Journal.SNAPSHOT_FILE))
+        factory.restore_state(snapshot["factory"])
+        
+        replayed = 0
+        journal_path = os.path.join(directory, Journal.JOURNAL_FILE)
+        if not os.path.exists(journal_path):
+            return replayed
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # 最后一个条目因崩溃而不完整
+                if entry["seq"] <= snapshot["sequence"]:
+                    continue
+                if entry["command"] not in Journal.COMMANDS:
+                    raise ValueError(f"未知的日志命令 {entry['command']}")
+                getattr(factory, entry["command"])(*entry["args"], **entry.get("kwargs", {}))
+                replayed += 1
+        return replayed
+
 class Factory:
     """工厂类"""
-    def __init__(self, name: str, initial_balance: float):
+    def __init__(self, name: str, initial_balance: float, start_time: datetime = None):
         self.name = name
         self.balance = initial_balance
         self.production_lines = []
@@ -415,65 +1746,401 @@ class Factory:
         self.workers = []
         self.products = {}
         self.materials = {}
-        self.material_inventory = {}
-        self.product_inventory = {}
+        self.reset_inventory()
         self.orders = []
-        self.current_time = datetime.now()
+        self.current_time = start_time or datetime.now()
         self.day = 1
         self.daily_costs = 0
         self.daily_income = 0
+        self.tick_minutes = 1  # 引擎精度（每刻度分钟数）
+        self.tick_remainder = 0  # 不足一个完整刻度的分钟数，在下次推进时运行
+        self.events = EventBus()
+        self.low_stock_threshold = 50  # 材料库存低于此值时报告库存不足
+        self.overdue_reported = set()  # 已报告逾期的订单ID
+        self.metrics = MetricsStore(self.current_time)
+        self.exporter = None  # 当前的历史导出器
+        self.history = None  # 已连接的历史数据库
+        self.next_order_id = 1
+        self.completed_order_count = 0  # 不再保留在内存中的已完成订单
+        self.journal = None  # 已连接的崩溃恢复日志
+        self.command_depth = 0  # 正在运行的日志命令嵌套深度
+        self.autosaver = None  # 当前的自动保存
+        self.mod_name = None  # 已加载模组的名称
+        self.catalog_shared = False  # 产品和原材料字典与分叉共享
+        
+    def reset_inventory(self):
+        """重建物品ID注册表并清空所有库存"""
+        self.registry = ItemRegistry()
+        self.inventory = Inventory(self.registry)
+        self.material_inventory = InventoryView(self.inventory, ItemRegistry.MATERIAL)
+        self.product_inventory = InventoryView(self.inventory, ItemRegistry.PRODUCT)
+        self.requirements = {}  # 编译后的配方 {物品ID: RequirementVector}
+        self.recipe_matrix = None  # 全部目录的需求矩阵
+        self.buildable_cache = {}  # {item_id: (stock version, buildable units)}
+        self.reservations = {}  # 已预留投入的单位数 {物品ID: 单位数}
+        
+    def get_requirements(self, recipe, is_product: bool = True):
+        """获取编译为稀疏需求向量的配方需求"""
+        kind = ItemRegistry.PRODUCT if is_product else ItemRegistry.MATERIAL
+        recipe_id = self.inventory.slot(kind, recipe.name)
+        requirements = self.requirements.get(recipe_id)
+        if requirements is None:
+            requirements = RequirementVector(
+                [(self.inventory.slot(ItemRegistry.MATERIAL, name), quantity)
+                 for name, quantity in recipe.materials_required.items()] +
+                [(self.inventory.slot(ItemRegistry.PRODUCT, name), quantity)
+                 for name, quantity in recipe.products_required.items()]
+            )
+            self.requirements[recipe_id] = requirements
+        return requirements
+        
+    def get_recipe_matrix(self):
+        """获取所有产品和可合成原材料的需求矩阵"""
+        if self.recipe_matrix is None:
+            recipes = [(name, True) for name in self.products]
+            recipes += [(name, False) for name, material in self.materials.items() if material.is_craftable]
+            vectors = [self.get_requirements(self.products[name] if is_product else self.materials[name], is_product)
+                       for name, is_product in recipes]
+            if np is not None:
+                matrix = np.zeros((len(recipes), len(self.registry)), dtype=np.int64)
+                for row, vector in enumerate(vectors):
+                    matrix[row, vector.item_ids] = vector.quantities
+            else:
+                matrix = vectors
+            self.recipe_matrix = (recipes, matrix)
+        return self.recipe_matrix
+        
+    def own_catalog(self):
+        """修改前为与分叉共享的目录创建私有副本"""
+        if self.catalog_shared:
+            self.products = dict(self.products)
+            self.materials = dict(self.materials)
+            self.catalog_shared = False
+            
+    def fork(self):
+        """创建独立的模拟副本用于假设分析"""
+        fork = copy.copy(self)
+        
+        # 目录和已编译配方在任一方修改前保持共享
+        self.catalog_shared = fork.catalog_shared = True
+        fork.requirements = dict(self.requirements)
+        fork.buildable_cache = {}
+        
+        # 可变状态被复制
+        fork.registry = self.registry.copy()
+        fork.inventory = self.inventory.copy(fork.registry)
+        fork.material_inventory = self.material_inventory.copy(fork.inventory)
+        fork.product_inventory = self.product_inventory.copy(fork.inventory)
+        fork.reservations = dict(self.reservations)
+        workers = {id(worker): worker.copy() for worker in self.workers}
+        fork.workers = list(workers.values())
+        fork.production_lines = [line.copy(workers.get(id(line.assigned_worker))) 
+                                 for line in self.production_lines]
+        fork.crafting_stations = [station.copy(workers.get(id(station.assigned_worker))) 
+                                  for station in self.crafting_stations]
+        fork.orders = [order.copy() for order in self.orders]
+        fork.overdue_reported = set(self.overdue_reported)
+        fork.metrics = self.metrics.copy()
+        
+        # 分叉静默运行，不做任何记录
+        fork.events = EventBus()
+        fork.exporter = None
+        fork.history = None
+        fork.journal = None
+        fork.autosaver = None
+        fork.command_depth = 0
+        return fork
+        
+    def invalidate_recipes(self):
+        """需求被修改后丢弃已编译的配方"""
+        self.requirements.clear()
+        self.recipe_matrix = None
+        self.buildable_cache.clear()
+        # 目录编辑不记入日志，由下一次快照记录
+        if self.journal is not None:
+            self.journal.snapshot_due = True
+        
+    def can_make(self, name: str, is_product: bool = True):
+        """检查当前库存是否足够制造一个单位"""
+        recipe = self.products.get(name) if is_product else self.materials.get(name)
+        if recipe is None:
+            return False
+        return self.inventory.find_shortage(self.get_requirements(recipe, is_product)) is None
+        
+    def get_buildable_counts(self):
+        """获取当前库存可满足的每个配方的单位数 {(名称, 是否产品): 数量}"""
+        recipes, matrix = self.get_recipe_matrix()
+        if np is not None:
+            stock = self.inventory.counts[:matrix.shape[1]]
+            units = np.where(matrix > 0, stock // np.maximum(matrix, 1), UNLIMITED_UNITS)
+            return dict(zip(recipes, units.min(axis=1, initial=UNLIMITED_UNITS).tolist()))
+        return {recipe: self.inventory.max_units(vector) for recipe, vector in zip(recipes, matrix)}
+        
+    def get_recipe(self, name: str, is_product: bool = True):
+        """按名称获取产品或可合成原材料，不存在时返回None"""
+        if is_product:
+            return self.products.get(name)
+        material = self.materials.get(name)
+        return material if material and material.is_craftable else None
+        
+    def get_build_order(self, item_id: int):
+        """获取从某物品可达的可制造物品，父项排在组件之前"""
+        order, visiting, done = [], set(), set()
+        
+        def visit(current_id):
+            visiting.add(current_id)
+            is_product = self.registry.kinds[current_id] == ItemRegistry.PRODUCT
+            recipe = self.get_recipe(self.registry.get_name(current_id), is_product)
+            if recipe is not None:
+                for component_id, _ in self.get_requirements(recipe, is_product):
+                    # 处于配方循环中的组件视为只能购买
+                    if component_id not in visiting and component_id not in done:
+                        visit(component_id)
+            visiting.discard(current_id)
+            done.add(current_id)
+            if recipe is not None:
+                order.append(current_id)
+                
+        visit(item_id)
+        order.reverse()
+        return order
+        
+    def can_build(self, item_id: int, units: int, build_order):
+        """检查库存能否满足指定数量的物品，缺少的组件通过合成补足"""
+        counts = self.inventory.counts
+        gross = {item_id: units}
+        for current_id in build_order:
+            needed = gross.pop(current_id, 0)
+            if current_id != item_id:
+                needed -= int(counts[current_id])
+            if needed <= 0:
+                continue
+            is_product = self.registry.kinds[current_id] == ItemRegistry.PRODUCT
+            recipe = self.get_recipe(self.registry.get_name(current_id), is_product)
+            for component_id, quantity in self.get_requirements(recipe, is_product):
+                gross[component_id] = gross.get(component_id, 0) + needed * quantity
+        # 剩余需求只能由库存满足
+        return all(int(counts[component_id]) >= needed for component_id, needed in gross.items())
+        
+    def get_max_buildable(self, name: str, is_product: bool = True, include_components: bool = True):
+        """获取当前库存可制造的物品最大数量"""
+        recipe = self.get_recipe(name, is_product)
+        if recipe is None:
+            return 0
+        requirements = self.get_requirements(recipe, is_product)
+        if not include_components:
+            return self.inventory.max_units(requirements)
+            
+        item_id = self.inventory.slot(ItemRegistry.PRODUCT if is_product else ItemRegistry.MATERIAL, name)
+        cached = self.buildable_cache.get(item_id)
+        if cached and cached[0] == self.inventory.version:
+            return cached[1]
+            
+        # 先指数搜索再二分搜索单位数
+        build_order = self.get_build_order(item_id)
+        low, high = 0, 1
+        while high < UNLIMITED_UNITS and self.can_build(item_id, high, build_order):
+            low, high = high, min(high * 2, UNLIMITED_UNITS)
+        if high == UNLIMITED_UNITS and self.can_build(item_id, high, build_order):
+            low = high
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.can_build(item_id, middle, build_order):
+                low = middle
+            else:
+                high = middle
+                
+        self.buildable_cache[item_id] = (self.inventory.version, low)
+        return low
+        
+    @Journal.command
+    def reserve_inputs(self, name: str, quantity: int, is_product: bool = True):
+        """一次性为配方的多个单位预留投入"""
+        recipe = self.get_recipe(name, is_product)
+        if recipe is None:
+            if not is_product and name in self.materials:
+                return False, f"错误: {name} 不可合成!"
+            return False, f"错误: {name} 不存在!"
+        if quantity <= 0:
+            return False, "错误: 数量必须为正数!"
+            
+        requirements = self.get_requirements(recipe, is_product)
+        shortage = self.inventory.find_shortage(requirements, quantity)
+        if shortage:
+            return False, self.get_shortage_message(shortage)
+            
+        self.consume_inputs(requirements, quantity)
+        item_id = self.inventory.slot(ItemRegistry.PRODUCT if is_product else ItemRegistry.MATERIAL, name)
+        self.reservations[item_id] = self.reservations.get(item_id, 0) + quantity
+        return True, f"已为 {quantity} 个 {name} 预留投入"
+        
+    @Journal.command
+    def release_reservation(self, name: str, is_product: bool = True):
+        """将配方已预留的投入退回库存"""
+        kind = ItemRegistry.PRODUCT if is_product else ItemRegistry.MATERIAL
+        item_id = self.registry.get_id(kind, name)
+        units = self.reservations.pop(item_id, 0)
+        if not units:
+            return False, f"错误: {name} 没有预留投入!"
+        self.inventory.restore(self.get_requirements(self.get_recipe(name, is_product), is_product), units)
+        return True, f"已释放 {units} 个 {name} 的预留投入"
+        
+    def take_reserved_unit(self, name: str, is_product: bool = True):
+        """使用配方的一个预留单位，没有预留时返回False"""
+        kind = ItemRegistry.PRODUCT if is_product else ItemRegistry.MATERIAL
+        item_id = self.registry.get_id(kind, name)
+        units = self.reservations.get(item_id, 0)
+        if not units:
+            return False
+        if units == 1:
+            del self.reservations[item_id]
+        else:
+            self.reservations[item_id] = units - 1
+        return True
+        
+    def get_makeable_items(self):
+        """获取所有投入均有库存的配方 (名称, 是否产品)"""
+        recipes, matrix = self.get_recipe_matrix()
+        if np is not None:
+            makeable = (matrix <= self.inventory.counts[:matrix.shape[1]]).all(axis=1)
+            return [recipe for recipe, ok in zip(recipes, makeable.tolist()) if ok]
+        return [recipe for recipe, vector in zip(recipes, matrix) 
+                if self.inventory.find_shortage(vector) is None]
+        
+    def setup_default(self):
+        """设置默认的目录、设备和工人"""
+        # 添加原材料
+        self.add_material("木材", cost=1, unit="单位", initial_quantity=100)
+        self.add_material("金属", cost=2, unit="单位", initial_quantity=50)
+        self.add_material("塑料", cost=0.5, unit="单位", initial_quantity=200)
+        self.add_material("螺丝", cost=0.1, unit="个", initial_quantity=500)
+        
+        # 添加产品
+        chair = Product("木椅", production_time=60, sale_price=20)
+        chair.add_material_requirement("木材", 5)
+        self.add_product(chair)
         
+        table = Product("木桌", production_time=120, sale_price=40)
+        table.add_material_requirement("木材", 10)
+        self.add_product(table)
+        
+        cabinet = Product("木柜", production_time=180, sale_price=60)
+        cabinet.add_material_requirement("木材", 15)
+        cabinet.add_material_requirement("金属", 2)
+        self.add_product(cabinet)
+        
+        # 添加可合成的产品和材料
+        # 合成材料：金属板（由2金属合成）
+        metal_plate = Material("金属板", cost=3, unit="块")
+        metal_plate.add_material_requirement("金属", 2)
+        self.add_material(metal_plate.name, metal_plate.cost, metal_plate.unit, 0)
+        self.materials["金属板"].is_craftable = True
+        self.materials["金属板"].materials_required = metal_plate.materials_required.copy()
+        
+        # 合成产品：高级椅子（由木椅和金属板合成）
+        premium_chair = Product("高级椅子", production_time=90, sale_price=50)
+        premium_chair.add_product_requirement("木椅", 1)
+        premium_chair.add_material_requirement("金属板", 1)
+        premium_chair.add_material_requirement("螺丝", 4)
+        self.add_product(premium_chair)
+        
+        # 添加生产线
+        self.add_production_line(capacity=10)
+        self.add_production_line(capacity=10)
+        
+        # 添加合成站
+        self.add_crafting_station("基础合成台", capacity=5)
+        self.add_crafting_station("高级合成台", capacity=3)
+        
+        # 雇佣工人
+        self.hire_worker("工人A", 3, 100)
+        self.hire_worker("工人B", 2, 80)
+        self.hire_worker("工人C", 4, 120)
+        self.hire_worker("工人D", 3, 100)
+        
+    def run_days(self, days: int, work_hours: int = 8):
+        """运行整天：先工作一个班次再进入下一天，返回每日利润"""
+        profits = []
+        for _ in range(days):
+            self.advance_time(work_hours)
+            success, message, daily_profit = self.next_day()
+            profits.append(daily_profit)
+        return profits
+        
+    @Journal.command
+    def set_tick_resolution(self, minutes: int):
+        """设置引擎时间精度"""
+        if minutes in TICK_RESOLUTIONS.values():
+            self.tick_minutes = minutes
+            return True
+        return False
+        
+    @Journal.command
     def add_production_line(self, capacity: int):
         """添加生产线"""
         line_id = len(self.production_lines) + 1
         new_line = ProductionLine(line_id, capacity)
         self.production_lines.append(new_line)
+        self.events.publish(SimEvent.LINE_ADDED, self.current_time, line_id=line_id)
         return new_line
         
+    @Journal.command
     def add_crafting_station(self, name: str, capacity: int):
         """添加合成站"""
         station_id = len(self.crafting_stations) + 1
         new_station = CraftingStation(station_id, name, capacity)
         self.crafting_stations.append(new_station)
+        self.events.publish(SimEvent.STATION_ADDED, self.current_time, station_id=station_id)
         return new_station
         
+    @Journal.command
     def hire_worker(self, name: str, skill_level: int, salary: float):
         """雇佣工人"""
         new_worker = Worker(name, skill_level, salary)
         self.workers.append(new_worker)
+        self.events.publish(SimEvent.WORKER_HIRED, self.current_time, worker=name)
         return new_worker
         
     def add_product(self, product: Product):
         """添加产品"""
+        self.own_catalog()
         self.products[product.name] = product
         self.product_inventory[product.name] = 0
+        self.invalidate_recipes()
         return product
         
     def remove_product(self, name: str):
         """删除产品"""
+        self.own_catalog()
         if name in self.products:
             del self.products[name]
             if name in self.product_inventory:
                 del self.product_inventory[name]
+            self.invalidate_recipes()
             return True
         return False
         
     def add_material(self, name: str, cost: float, unit: str, initial_quantity: int = 0):
         """添加原材料"""
+        self.own_catalog()
         new_material = Material(name, cost, unit)
         self.materials[name] = new_material
         self.material_inventory[name] = initial_quantity
+        self.invalidate_recipes()
         return new_material
         
     def remove_material(self, name: str):
         """删除原材料"""
+        self.own_catalog()
         if name in self.materials:
             del self.materials[name]
             if name in self.material_inventory:
                 del self.material_inventory[name]
+            self.invalidate_recipes()
             return True
         return False
         
+    @Journal.command
     def purchase_material(self, material_name: str, quantity: int):
         """购买原材料"""
         if material_name not in self.materials:
@@ -488,8 +2155,27 @@ class Factory:
         self.balance -= cost
         self.material_inventory[material_name] += quantity
         self.daily_costs += cost
+        self.events.publish(SimEvent.MATERIAL_PURCHASED, self.current_time, 
+                            material=material_name, quantity=quantity, cost=cost)
         return True, f"购买了 {quantity}{material.unit} {material_name}, 花费 ¥{cost}"
         
+    @Journal.command
+    def purchase_materials(self, purchases: dict):
+        """在一次交易中购买多种原材料"""
+        for material_name in purchases:
+            if material_name not in self.materials:
+                return False, f"错误: 原材料 {material_name} 不存在!"
+                
+        cost = sum(self.materials[name].cost * quantity for name, quantity in purchases.items())
+        if cost > self.balance:
+            return False, f"错误: 资金不足! 需要 ¥{cost}, 当前余额 ¥{self.balance}"
+            
+        with self.events.batch():
+            for material_name, quantity in purchases.items():
+                self.purchase_material(material_name, quantity)
+        return True, f"购买了 {len(purchases)} 种原材料, 花费 ¥{cost}"
+        
+    @Journal.command
     def create_order(self, product_name: str, quantity: int, days_until_deadline: int):
         """创建订单"""
         if product_name not in self.products:
@@ -497,11 +2183,15 @@ class Factory:
             
         product = self.products[product_name]
         deadline = self.current_time + timedelta(days=days_until_deadline)
-        order_id = len(self.orders) + 1
+        order_id = self.next_order_id
+        self.next_order_id += 1
         new_order = Order(order_id, product, quantity, deadline)
         self.orders.append(new_order)
+        self.events.publish(SimEvent.ORDER_CREATED, self.current_time, 
+                            order_id=order_id, product=product_name, quantity=quantity, deadline=deadline)
         return new_order, f"创建了新订单: {new_order}"
         
+    @Journal.command
     def assign_worker_to_line(self, worker_name: str, line_id: int):
         """分配工人到生产线"""
         worker = next((w for w in self.workers if w.name == worker_name), None)
@@ -522,6 +2212,7 @@ class Factory:
         line.assign_worker(worker)
         return True, f"工人 {worker_name} 被分配到生产线 {line_id}"
         
+    @Journal.command
     def assign_worker_to_station(self, worker_name: str, station_id: int):
         """分配工人到合成站"""
         worker = next((w for w in self.workers if w.name == worker_name), None)
@@ -542,6 +2233,31 @@ class Factory:
         station.assign_worker(worker)
         return True, f"工人 {worker_name} 被分配到合成站 {station_id}"
         
+    @Journal.command
+    def unassign_worker(self, worker_name: str):
+        """将工人从所有生产线或合成站撤下"""
+        worker = next((w for w in self.workers if w.name == worker_name), None)
+        if not worker:
+            return False, f"错误: 工人 {worker_name} 不存在!"
+            
+        for slot in self.production_lines + self.crafting_stations:
+            if slot.assigned_worker == worker:
+                slot.assigned_worker = None
+                slot.is_active = False
+        worker.is_working = False
+        return True, f"工人 {worker_name} 已撤下"
+        
+    def get_unit_margin(self, name: str, is_product: bool = True):
+        """获取制造一件的增加值（销售价值减去投入成本）"""
+        recipe = self.get_recipe(name, is_product)
+        if recipe is None:
+            return 0
+        value = recipe.sale_price if is_product else recipe.cost
+        input_cost = sum(self.materials[m].cost * q for m, q in recipe.materials_required.items() if m in self.materials)
+        input_cost += sum(self.products[p].sale_price * q for p, q in recipe.products_required.items() if p in self.products)
+        return max(0, value - input_cost)
+        
+    @Journal.command
     def assign_product_to_line(self, product_name: str, line_id: int):
         """分配产品到生产线"""
         if product_name not in self.products:
@@ -556,27 +2272,22 @@ class Factory:
             
         product = self.products[product_name]
         
-        # 检查所有所需原材料是否足够
-        for material_name, quantity in product.materials_required.items():
-            if self.material_inventory.get(material_name, 0) < quantity:
-                return False, f"错误: {material_name} 不足! 需要 {quantity}, 当前库存 {self.material_inventory.get(material_name, 0)}"
-            
-        # 检查所有所需产品是否足够
-        for product_name_req, quantity in product.products_required.items():
-            if self.product_inventory.get(product_name_req, 0) < quantity:
-                return False, f"错误: {product_name_req} 不足! 需要 {quantity}, 当前库存 {self.product_inventory.get(product_name_req, 0)}"
+        # 批量预留的投入已从库存中扣除
+        if not self.take_reserved_unit(product_name):
+            requirements = self.get_requirements(product)
             
-        # 消耗所有所需原材料
-        for material_name, quantity in product.materials_required.items():
-            self.material_inventory[material_name] -= quantity
-            
-        # 消耗所有所需产品
-        for product_name_req, quantity in product.products_required.items():
-            self.product_inventory[product_name_req] -= quantity
+            # 检查所有所需原材料和产品是否充足
+            shortage = self.inventory.find_shortage(requirements)
+            if shortage:
+                return False, self.get_shortage_message(shortage)
+                
+            # 消耗所有所需原材料和产品
+            self.consume_inputs(requirements)
             
         line.assign_product(product)
         return True, f"生产线 {line_id} 开始生产 {product_name}"
         
+    @Journal.command
     def assign_recipe_to_station(self, recipe_name: str, is_product: bool, station_id: int):
         """分配合成配方到合成站"""
         station = next((s for s in self.crafting_stations if s.station_id == station_id), None)
@@ -600,37 +2311,56 @@ class Factory:
         if not recipe.is_craftable:
             return False, f"错误: {recipe_name} 不可合成!"
             
-        # 检查所有所需原材料是否足够
-        for material_name, quantity in recipe.materials_required.items():
-            if self.material_inventory.get(material_name, 0) < quantity:
-                return False, f"错误: {material_name} 不足! 需要 {quantity}, 当前库存 {self.material_inventory.get(material_name, 0)}"
-            
-        # 检查所有所需产品是否足够
-        for product_name, quantity in recipe.products_required.items():
-            if self.product_inventory.get(product_name, 0) < quantity:
-                return False, f"错误: {product_name} 不足! 需要 {quantity}, 当前库存 {self.product_inventory.get(product_name, 0)}"
-            
-        # 消耗所有所需原材料
-        for material_name, quantity in recipe.materials_required.items():
-            self.material_inventory[material_name] -= quantity
+        # 批量预留的投入已从库存中扣除
+        if not self.take_reserved_unit(recipe_name, is_product):
+            requirements = self.get_requirements(recipe, is_product)
             
-        # 消耗所有所需产品
-        for product_name, quantity in recipe.products_required.items():
-            self.product_inventory[product_name] -= quantity
+            # 检查所有所需原材料和产品是否充足
+            shortage = self.inventory.find_shortage(requirements)
+            if shortage:
+                return False, self.get_shortage_message(shortage)
+                
+            # 消耗所有所需原材料和产品
+            self.consume_inputs(requirements)
             
         station.assign_recipe(recipe_name, is_product)
         return True, f"合成站 {station_id} 开始合成 {recipe_name}"
         
-    def update_production(self):
+    def consume_inputs(self, requirements: RequirementVector, units: int = 1):
+        """消耗配方输入，报告低于库存阈值的材料"""
+        before = [(item_id, self.inventory.get_quantity(item_id)) for item_id, _ in requirements]
+        self.inventory.consume(requirements, units)
+        for item_id, quantity in before:
+            remaining = self.inventory.get_quantity(item_id)
+            if self.registry.kinds[item_id] == ItemRegistry.MATERIAL:
+                self.metrics.count(f"consumed:{self.registry.get_name(item_id)}", quantity - remaining)
+            if (self.registry.kinds[item_id] == ItemRegistry.MATERIAL and 
+                    quantity >= self.low_stock_threshold > remaining):
+                self.events.publish(SimEvent.STOCK_LOW, self.current_time, 
+                                    item=self.registry.get_name(item_id), quantity=remaining, 
+                                    threshold=self.low_stock_threshold)
+        
+    def get_shortage_message(self, shortage):
+        """获取未满足需求的错误信息"""
+        item_id, quantity = shortage
+        return f"错误: {self.registry.get_name(item_id)} 不足! 需要 {quantity}, 当前库存 {self.inventory.get_quantity(item_id)}"
+        
+    def update_production(self, minutes: int = 1):
         """更新所有生产线的生产进度"""
         completed_products = []
         for line in self.production_lines:
-            if line.is_active and line.current_product:
-                completed_product = line.update_production()
+            if not line.current_product:
+                # 生产线空闲一步后结转的工作量即丢失
+                line.production_progress = 0
+            elif line.is_active:
+                completed_product = line.update_production(minutes)
                 if completed_product:
                     # 生产完成，添加到库存
-                    self.product_inventory[completed_product.name] += 1
+                    self.product_inventory.add(completed_product.name, 1)
                     completed_products.append(completed_product.name)
+                    self.metrics.count(f"produced:{completed_product.name}")
+                    self.events.publish(SimEvent.PRODUCTION_COMPLETED, self.current_time, 
+                                        product=completed_product.name, line_id=line.line_id)
                     
                     # 检查是否有订单需要完成
                     for order in self.orders:
@@ -641,23 +2371,46 @@ class Factory:
                                 income = order.product.sale_price * order.quantity
                                 self.balance += income
                                 self.daily_income += income
+                                self.events.publish(SimEvent.ORDER_COMPLETED, self.current_time, 
+                                                    order_id=order.order_id, product=order.product.name, 
+                                                    quantity=order.quantity, income=income)
+                                
+        # 连接历史数据库时，已完成订单保存在数据库中而不留在内存里，
+        # 否则只保留最近的订单，较早的仅计数
+        limit = 0 if self.history is not None else COMPLETED_ORDER_LIMIT
+        completed_orders = [order for order in self.orders if order.is_completed]
+        if len(completed_orders) > limit:
+            evicted = completed_orders[:len(completed_orders) - limit]
+            for order in evicted:
+                self.overdue_reported.discard(order.order_id)
+            self.completed_order_count += len(evicted)
+            evicted_ids = {order.order_id for order in evicted}
+            self.orders = [order for order in self.orders if order.order_id not in evicted_ids]
         return completed_products
         
-    def update_crafting(self):
+    def update_crafting(self, minutes: int = 1):
         """更新所有合成站的合成进度"""
         completed_items = []
         for station in self.crafting_stations:
-            if station.is_active and station.current_recipe:
-                completed_item, is_product = station.update_crafting()
+            if not station.current_recipe:
+                # 合成站空闲一步后结转的工作量即丢失
+                station.crafting_progress = 0
+            elif station.is_active:
+                completed_item, is_product = station.update_crafting(minutes)
                 if completed_item:
                     # 合成完成，添加到库存
                     if is_product:
-                        self.product_inventory[completed_item] += 1
+                        self.product_inventory.add(completed_item, 1)
                     else:
-                        self.material_inventory[completed_item] += 1
+                        self.material_inventory.add(completed_item, 1)
                     completed_items.append((completed_item, is_product))
+                    self.metrics.count(f"crafted:{completed_item}")
+                    self.events.publish(SimEvent.CRAFT_COMPLETED, self.current_time, 
+                                        item=completed_item, is_product=is_product, 
+                                        station_id=station.station_id)
         return completed_items
                             
+    @Journal.command
     def sell_from_inventory(self, product_name: str, quantity: int):
         """从库存销售产品"""
         if product_name not in self.product_inventory:
@@ -671,44 +2424,206 @@ class Factory:
         self.product_inventory[product_name] -= quantity
         self.balance += income
         self.daily_income += income
+        self.events.publish(SimEvent.PRODUCT_SOLD, self.current_time, 
+                            product=product_name, quantity=quantity, income=income)
         return True, f"售出 {quantity} 件 {product_name}, 获得收入 ¥{income}"
         
+    @Journal.command
     def pay_workers(self):
         """支付工人工资"""
         total_salary = sum(worker.salary for worker in self.workers)
         if total_salary > self.balance:
+            self.events.publish(SimEvent.PAYROLL_FAILED, self.current_time, 
+                                amount=total_salary, balance=self.balance)
             return False, f"警告: 资金不足支付工人工资! 需要 ¥{total_salary}, 当前余额 ¥{self.balance}"
             
         self.balance -= total_salary
         self.daily_costs += total_salary
+        self.events.publish(SimEvent.PAYROLL_PAID, self.current_time, amount=total_salary)
         return True, f"支付了工人工资 ¥{total_salary}"
         
+    def ticks_to_next_completion(self, max_ticks: int):
+        """获取下一条生产线或合成站完成前的刻度数"""
+        ticks = max_ticks
+        for line in self.production_lines:
+            if line.is_producing():
+                ticks = min(ticks, line.ticks_to_completion(self.tick_minutes))
+        for station in self.crafting_stations:
+            if station.is_crafting():
+                ticks = min(ticks, station.ticks_to_completion(self.tick_minutes))
+        return ticks
+        
+    def start_journal(self, directory: str):
+        """将命令记录到崩溃恢复日志"""
+        self.stop_journal()
+        try:
+            self.journal = Journal(self, directory)
+        except OSError as e:
+            return False, f"错误: 无法启动日志: {str(e)}"
+        return True, f"正在记录日志到 {directory}"
+        
+    def stop_journal(self):
+        """压缩并关闭崩溃恢复日志"""
+        if self.journal is None:
+            return False, "没有正在运行的日志"
+        self.journal.close()
+        self.journal = None
+        return True, "日志已关闭"
+        
+    def checkpoint(self):
+        """为当前状态写入日志快照"""
+        if self.journal is not None:
+            self.journal.write_snapshot()
+            
+    def recover_journal(self, directory: str):
+        """恢复日志目录中记录的状态"""
+        self.stop_journal()
+        start = perf_counter()
+        # 重放的命令不能再次送达订阅者
+        events = self.events
+        self.events = EventBus()
+        try:
+            replayed = Journal.recover(self, directory)
+        except (OSError, ValueError, KeyError) as e:
+            return False, f"错误: 无法从日志恢复: {str(e)}"
+        finally:
+            self.events = events
+        elapsed = (perf_counter() - start) * 1000
+        return True, f"已在 {elapsed:.1f} 毫秒内恢复快照和 {replayed} 条日志"
+        
+    def start_autosave(self, directory: str, interval_hours: float = 24, interval_minutes: float = None):
+        """定期保存到轮换的自动保存槽位"""
+        self.stop_autosave()
+        try:
+            self.autosaver = AutoSaver(self, directory, AUTOSAVE_SLOTS, interval_hours, interval_minutes)
+        except OSError as e:
+            return False, f"错误: 无法启动自动保存: {str(e)}"
+        return True, f"正在自动保存到 {directory}"
+        
+    def stop_autosave(self):
+        """写完排队的保存后停止自动保存"""
+        if self.autosaver is None:
+            return False, "自动保存未运行"
+        self.autosaver.close()
+        self.autosaver = None
+        return True, "自动保存已停止"
+        
+    def open_history(self, path: str):
+        """将历史记录到SQLite数据库"""
+        self.close_history()
+        try:
+            self.history = HistoryStore(self, path)
+        except sqlite3.Error as e:
+            return False, f"错误: 无法打开历史数据库: {str(e)}"
+        return True, f"正在记录历史到 {path}"
+        
+    def close_history(self):
+        """关闭历史数据库"""
+        if self.history is None:
+            return False, "没有打开的历史数据库"
+        self.history.close()
+        self.history = None
+        return True, "历史数据库已关闭"
+        
+    def start_export(self, path: str, file_format: str = None):
+        """开始将模拟事件流式写入历史文件"""
+        self.stop_export()
+        try:
+            self.exporter = HistoryExporter(self, path, file_format)
+        except (ValueError, OSError) as e:
+            return False, f"错误: 无法导出历史: {str(e)}"
+        return True, f"正在导出历史到 {path}"
+        
+    def stop_export(self):
+        """结束正在进行的历史导出"""
+        if self.exporter is None:
+            return False, "没有正在进行的历史导出"
+        rows = self.exporter.close()
+        self.exporter = None
+        return True, f"历史导出完成，写入了 {rows} 条记录"
+        
+    def get_open_order_count(self):
+        """获取尚未完成的订单数量"""
+        return sum(1 for order in self.orders if not order.is_completed)
+        
+    def get_gauges(self):
+        """获取采样的工厂状态指标的当前值"""
+        lines = self.production_lines
+        busy = sum(1 for line in lines if line.is_producing())
+        backlog = sum(order.quantity - order.completed_quantity for order in self.orders if not order.is_completed)
+        return {
+            "balance": self.balance,
+            "line_utilization": busy / len(lines) if lines else 0.0,
+            "order_backlog": backlog
+        }
+        
     def advance_time(self, hours: int = 1):
         """推进时间"""
-        self.current_time += timedelta(hours=hours)
-        
-        # 每小时更新生产和合成
+        # 时段按完成刻度逐步运行，订阅者在时段其余部分运行之前
+        # 对每次完成作出响应（例如为完成的生产线补充任务）
+        minutes = int(round(hours * 60))
         completed_products = []
         completed_crafting = []
-        for _ in range(hours):
-            completed = self.update_production()
-            completed_products.extend(completed)
-            
-            completed = self.update_crafting()
-            completed_crafting.extend(completed)
+        while True:
+            elapsed, products, crafting, overdue_orders = self.run_ticks(minutes)
+            completed_products.extend(products)
+            completed_crafting.extend(crafting)
+            minutes -= elapsed
+            if minutes <= 0:
+                return completed_products, completed_crafting, overdue_orders
+                
+    @Journal.command
+    def run_ticks(self, minutes: int):
+        """运行模拟刻直到下一个完成刻度或指定分钟数，返回运行的分钟数"""
+        # 订阅者一起接收该步的事件
+        with self.events.batch():
+            start_time = self.current_time
+            # 刻度从上一时段剩余的分钟开始计算
+            tick_start = start_time - timedelta(minutes=self.tick_remainder)
+            available = self.tick_remainder + minutes
+            # 快速路径：在下一个完成刻度之前不会有任何完成事件，
+            # 因此一次更新跳过所有中间刻度
+            total_ticks = available // self.tick_minutes
+            ticks = self.ticks_to_next_completion(total_ticks)
             
-        # 检查逾期订单
-        overdue_orders = []
-        for order in self.orders:
-            if order.is_overdue(self.current_time):
-                overdue_orders.append(order.order_id)
+            completed_products = []
+            completed_crafting = []
+            if ticks > 0:
+                self.current_time = tick_start + timedelta(minutes=ticks * self.tick_minutes)
+                # 跳跃期间经过的小时在其完成事件之前记录
+                self.metrics.close_hours(self.current_time, self.get_gauges)
+                completed_products = self.update_production(ticks * self.tick_minutes)
+                completed_crafting = self.update_crafting(ticks * self.tick_minutes)
+                
+            if ticks == total_ticks:
+                # 不足一个完整刻度的分钟留待下一时段
+                elapsed = minutes
+                self.tick_remainder = available - ticks * self.tick_minutes
+                self.current_time = start_time + timedelta(minutes=minutes)
+                self.metrics.close_hours(self.current_time, self.get_gauges)
+            else:
+                elapsed = ticks * self.tick_minutes - self.tick_remainder
+                self.tick_remainder = 0
                 
-        return completed_products, completed_crafting, overdue_orders
+            # 检查逾期订单
+            overdue_orders = []
+            for order in self.orders:
+                if order.is_overdue(self.current_time):
+                    overdue_orders.append(order.order_id)
+                    if order.order_id not in self.overdue_reported:
+                        self.overdue_reported.add(order.order_id)
+                        self.events.publish(SimEvent.ORDER_OVERDUE, self.current_time, 
+                                            order_id=order.order_id, product=order.product.name)
+        return elapsed, completed_products, completed_crafting, overdue_orders
                 
+    @Journal.command
     def next_day(self):
         """进入下一天"""
         self.day += 1
-        self.current_time = self.current_time.replace(hour=8, minute=0) + timedelta(days=1)
+        new_time = self.current_time.replace(hour=8, minute=0) + timedelta(days=1)
+        # 夜间跳过的小时按当前状态且无生产记录
+        self.metrics.close_hours(new_time, lambda: dict(self.get_gauges(), line_utilization=0.0))
+        self.current_time = new_time
         
         # 支付工人工资
         success, message = self.pay_workers()
@@ -719,6 +2634,7 @@ class Factory:
         self.daily_income = 0
         self.daily_costs = 0
         
+        self.events.publish(SimEvent.DAY_STARTED, self.current_time, day=self.day)
         return success, message, daily_profit
         
     def get_status_text(self):
@@ -748,7 +2664,14 @@ class Factory:
         for product, quantity in self.product_inventory.items():
             status_text += f"  {product}: {quantity}件\n"
             
+        if self.reservations:
+            status_text += "\n--- 预留投入 ---\n"
+            for item_id, units in self.reservations.items():
+                status_text += f"  {self.registry.get_name(item_id)}: {units}件\n"
+            
         status_text += "\n--- 订单 ---\n"
+        if self.completed_order_count:
+            status_text += f"  更早的已完成订单: {self.completed_order_count}\n"
         for order in self.orders:
             status = "已完成" if order.is_completed else "进行中"
             overdue = " (逾期!)" if order.is_overdue(self.current_time) else ""
@@ -758,16 +2681,24 @@ class Factory:
 
     def load_mod(self, mod):
         """加载模组"""
-        # 清空现有数据
+        # 清除现有数据并重建物品ID注册表
+        self.own_catalog()
         self.products.clear()
         self.materials.clear()
-        self.product_inventory.clear()
-        self.material_inventory.clear()
+        self.reset_inventory()
         self.workers.clear()
         self.crafting_stations.clear()
         
+        # 生产线失去其工人以及旧目录中的在制品
+        for line in self.production_lines:
+            line.assigned_worker = None
+            line.is_active = False
+            line.current_product = None
+            line.production_progress = 0
+        
         # 设置初始余额
         self.balance = mod.initial_balance
+        self.mod_name = mod.name
         
         # 添加原材料
         for material in mod.materials:
@@ -787,6 +2718,9 @@ class Factory:
         for product in mod.products:
             self.add_product(product)
             
+        # 模组未定义的产品的订单永远无法完成
+        self.orders = [order for order in self.orders if order.product.name in self.products]
+        
         # 添加工人
         for worker_data in mod.initial_workers:
             self.hire_worker(
@@ -798,308 +2732,2303 @@ class Factory:
         # 添加合成站
         for station_data in mod.crafting_stations:
             self.add_crafting_station(station_data["name"], station_data["capacity"])
+            
+        # 原材料配方在注册后才被复制
+        self.invalidate_recipes()
+        self.checkpoint()
+        
+    def to_dict(self):
+        """将完整模拟状态转换为字典以便JSON序列化"""
+        worker_index = {id(worker): index for index, worker in enumerate(self.workers)}
+        
+        def get_worker_index(worker):
+            # 已不在职的工人保存为未分配
+            return worker_index.get(id(worker)) if worker else None
+            
+        return {
+            "name": self.name,
+            "balance": self.balance,
+            "day": self.day,
+            "current_time": self.current_time.isoformat(),
+            "daily_costs": self.daily_costs,
+            "daily_income": self.daily_income,
+            "tick_minutes": self.tick_minutes,
+            "tick_remainder": self.tick_remainder,
+            "low_stock_threshold": self.low_stock_threshold,
+            "next_order_id": self.next_order_id,
+            "completed_order_count": self.completed_order_count,
+            "mod_name": self.mod_name,
+            "materials": [material.to_dict() for material in self.materials.values()],
+            "products": [product.to_dict() for product in self.products.values()],
+            "material_inventory": dict(self.material_inventory),
+            "product_inventory": dict(self.product_inventory),
+            "reservations": [[self.registry.kinds[item_id] == ItemRegistry.PRODUCT, 
+                              self.registry.get_name(item_id), units]
+                             for item_id, units in self.reservations.items()],
+            "workers": [dict(worker.to_dict(), is_working=worker.is_working) for worker in self.workers],
+            "production_lines": [{
+                "line_id": line.line_id,
+                "capacity": line.capacity,
+                "current_product": line.current_product.name if line.current_product else None,
+                "production_progress": line.production_progress,
+                "assigned_worker": get_worker_index(line.assigned_worker),
+                "is_active": line.is_active
+            } for line in self.production_lines],
+            "crafting_stations": [{
+                "station_id": station.station_id,
+                "name": station.name,
+                "capacity": station.capacity,
+                "current_recipe": station.current_recipe,
+                "is_recipe_product": station.is_recipe_product,
+                "crafting_progress": station.crafting_progress,
+                "assigned_worker": get_worker_index(station.assigned_worker),
+                "is_active": station.is_active
+            } for station in self.crafting_stations],
+            "orders": [{
+                "order_id": order.order_id,
+                "product": order.product.name,
+                "quantity": order.quantity,
+                "deadline": order.deadline.isoformat(),
+                "completed_quantity": order.completed_quantity
+            } for order in self.orders],
+            "overdue_reported": sorted(self.overdue_reported)
+        }
+        
+    def restore_state(self, data):
+        """用to_dict创建的状态替换模拟状态"""
+        self.name = data["name"]
+        self.balance = data["balance"]
+        self.day = data["day"]
+        self.current_time = datetime.fromisoformat(data["current_time"])
+        self.daily_costs = data["daily_costs"]
+        self.daily_income = data["daily_income"]
+        self.tick_minutes = data["tick_minutes"]
+        self.tick_remainder = data.get("tick_remainder", 0)
+        self.low_stock_threshold = data["low_stock_threshold"]
+        self.next_order_id = data["next_order_id"]
+        self.completed_order_count = data["completed_order_count"]
+        self.mod_name = data.get("mod_name")
+        
+        self.materials = {item["name"]: Material.from_dict(item) for item in data["materials"]}
+        self.products = {item["name"]: Product.from_dict(item) for item in data["products"]}
+        self.catalog_shared = False
+        self.reset_inventory()
+        self.material_inventory.replace(data["material_inventory"])
+        self.product_inventory.replace(data["product_inventory"])
+        for is_product, name, units in data["reservations"]:
+            kind = ItemRegistry.PRODUCT if is_product else ItemRegistry.MATERIAL
+            self.reservations[self.inventory.slot(kind, name)] = units
+            
+        self.workers = []
+        for item in data["workers"]:
+            worker = Worker.from_dict(item)
+            worker.is_working = item["is_working"]
+            self.workers.append(worker)
+            
+        self.production_lines = []
+        for item in data["production_lines"]:
+            line = ProductionLine(item["line_id"], item["capacity"])
+            line.current_product = self.products[item["current_product"]] if item["current_product"] else None
+            line.production_progress = item["production_progress"]
+            if item["assigned_worker"] is not None:
+                line.assigned_worker = self.workers[item["assigned_worker"]]
+            line.is_active = item["is_active"]
+            self.production_lines.append(line)
+            
+        self.crafting_stations = []
+        for item in data["crafting_stations"]:
+            station = CraftingStation(item["station_id"], item["name"], item["capacity"])
+            station.current_recipe = item["current_recipe"]
+            station.is_recipe_product = item["is_recipe_product"]
+            station.crafting_progress = item["crafting_progress"]
+            if item["assigned_worker"] is not None:
+                station.assigned_worker = self.workers[item["assigned_worker"]]
+            station.is_active = item["is_active"]
+            self.crafting_stations.append(station)
+            
+        self.orders = []
+        for item in data["orders"]:
+            order = Order(item["order_id"], self.products[item["product"]], item["quantity"], 
+                          datetime.fromisoformat(item["deadline"]))
+            order.complete_quantity(item["completed_quantity"])
+            self.orders.append(order)
+        self.overdue_reported = set(data["overdue_reported"])
+        self.metrics = MetricsStore(self.current_time)
+        
+    @classmethod
+    def from_dict(cls, data):
+        """从字典创建工厂"""
+        factory = cls(data["name"], data["balance"])
+        factory.restore_state(data)
+        return factory
+
+class PurchasingEngine:
+    """基于实测需求、再订货点和经济订货量的原材料采购"""
+    
+    def __init__(self, factory: Factory):
+        self.factory = factory
+        self.order_cost = 5.0  # 每次采购的固定成本（¥）
+        self.holding_rate = 0.02  # 每日持有成本占单位成本的比例
+        self.lead_time_hours = 1  # 从订货到需要库存的小时数
+        self.safety_hours = 8  # 作为安全库存保留的需求小时数
+        self.max_cover_hours = 72  # 采购后库存最多覆盖的需求小时数
+        self.min_demand_hours = 24  # 计算平均需求的最短时间窗口
+            
+    def explode(self, product_name: str, units: float, depth: int = 0):
+        """获取生产一定数量产品（含其组件）所需的原材料"""
+        needs = {}
+        product = self.factory.products.get(product_name)
+        # 深度限制防止配方循环
+        if product is None or depth > len(self.factory.products):
+            return needs
+        for name, quantity in product.materials_required.items():
+            needs[name] = needs.get(name, 0) + quantity * units
+        for name, quantity in product.products_required.items():
+            for material_name, material_quantity in self.explode(name, quantity * units, depth + 1).items():
+                needs[material_name] = needs.get(material_name, 0) + material_quantity
+        return needs
+        
+    def get_demand_rates(self):
+        """获取每小时原材料需求，取已完成工作的用量和未完成订单中的较高者"""
+        now = self.factory.current_time
+        metrics = self.factory.metrics
+        window = self.min_demand_hours
+        # 最近时间窗口内完成的生产和合成所用的原材料；分配时会预先消耗
+        # 一整件的投入，因此按完成计数才能反映实际产出
+        completions = [(product, metrics.get_rate(f"produced:{name}", window) 
+                        + metrics.get_rate(f"crafted:{name}", window)) 
+                       for name, product in self.factory.products.items()]
+        completions += [(material, metrics.get_rate(f"crafted:{name}", window)) 
+                        for name, material in self.factory.materials.items() if material.is_craftable]
+        rates = {}
+        for recipe, completed in completions:
+            if completed:
+                for name, quantity in recipe.materials_required.items():
+                    rates[name] = rates.get(name, 0) + quantity * completed
+        
+        # 未完成订单的物料清单平摊到截止时间前
+        order_rates = {}
+        for order in self.factory.orders:
+            if order.is_completed:
+                continue
+            remaining = order.quantity - order.completed_quantity
+            # 时间窗口过短会让紧急订单夸大需求率
+            hours_left = max(self.min_demand_hours, (order.deadline - now).total_seconds() / 3600)
+            for name, quantity in self.explode(order.product.name, remaining).items():
+                order_rates[name] = order_rates.get(name, 0) + quantity / hours_left
+                
+        for name, rate in order_rates.items():
+            rates[name] = max(rates.get(name, 0), rate)
+        return rates
+        
+    def get_reorder_point(self, rate: float):
+        """获取需要再订货的库存水平"""
+        return rate * (self.lead_time_hours + self.safety_hours)
+        
+    def get_order_quantity(self, material: Material, rate: float):
+        """获取每日需求D下的经济订货量 sqrt(2DS/H)"""
+        holding_cost = max(material.cost * self.holding_rate, 0.0001)
+        return math.ceil(math.sqrt(2 * rate * 24 * self.order_cost / holding_cost))
+        
+    def plan_purchases(self, cash_fraction: float = 0.5):
+        """在余额的一定比例内规划一批采购，最紧急的原材料优先"""
+        candidates = []
+        for name, rate in self.get_demand_rates().items():
+            material = self.factory.materials.get(name)
+            if material is None or rate <= 0:
+                continue
+            stock = self.factory.material_inventory.get(name, 0)
+            reorder_point = self.get_reorder_point(rate)
+            if stock > reorder_point:
+                continue
+            # 经济订货量，受覆盖上限限制，但至少补回再订货点
+            quantity = min(self.get_order_quantity(material, rate), math.floor(rate * self.max_cover_hours - stock))
+            quantity = max(quantity, math.ceil(reorder_point - stock))
+            hours_of_cover = stock / rate
+            candidates.append((hours_of_cover, name, quantity, material.cost))
+            
+        candidates.sort()
+        budget = self.factory.balance * cash_fraction
+        purchases = {}
+        for hours_of_cover, name, quantity, cost in candidates:
+            affordable = min(quantity, int(budget // cost)) if cost > 0 else quantity
+            if affordable > 0:
+                purchases[name] = affordable
+                budget -= affordable * cost
+        return purchases
+
+class PlanNode:
+    """推演规划器搜索树的节点，每个操作序列一个"""
+    __slots__ = ("visits", "total", "children")
+    
+    def __init__(self):
+        self.visits = 0
+        self.total = 0.0  # 经过此节点的推演价值之和
+        self.children = {}  # 操作 -> PlanNode
+        
+    def get_mean(self):
+        """获取平均推演价值"""
+        return self.total / self.visits if self.visits else 0.0
+
+class RolloutPlanner:
+    """使用分叉模拟对每日扩张操作进行蒙特卡洛树搜索"""
+    
+    # 每天开始时考虑的操作：(操作, 参数)
+    ACTIONS = (
+        ("none", None),
+        ("hire_worker", 3),
+        ("add_line", 10),
+        ("add_station", 5),
+        ("buy_stock", 50),
+    )
+    
+    def __init__(self, rollout_budget: int = 48, time_budget: float = 0.25, horizon_days: int = 3, 
+                 seed: int = None):
+        self.rollout_budget = rollout_budget  # 每次决策的最大推演次数
+        self.time_budget = time_budget  # 每次计时决策推演的最长秒数
+        self.horizon_days = horizon_days  # 每次推演模拟的天数
+        self.work_hours = 8  # 进入下一天前每天模拟的小时数
+        self.exploration = 1.4  # UCB1探索权重，以观测到的价值范围为单位
+        self.rng = random.Random(seed)
+        self.root = None
+        self.start_state = None  # 推演起点的分叉工厂
+        self.start_value = 0.0
+        self.low = self.high = None  # 观测到的推演价值范围
+        self.rollouts = 0  # 当前决策的推演次数
+        self.elapsed = 0.0  # 当前决策推演所用秒数
+        self.stats = {"decisions": 0, "rollouts": 0, "reused_visits": 0, "total_time": 0.0}
+        
+    @staticmethod
+    def get_value(factory: Factory):
+        """获取余额加上按成本计算的原材料库存"""
+        return factory.balance + sum(quantity * factory.materials[name].cost 
+                                     for name, quantity in factory.material_inventory.items() 
+                                     if name in factory.materials and not factory.materials[name].is_craftable)
+        
+    @staticmethod
+    def get_legal_actions(factory: Factory):
+        """获取可行且负担得起的操作"""
+        actions = []
+        for action, argument in RolloutPlanner.ACTIONS:
+            if action == "hire_worker" and factory.balance < 40 * argument:
+                continue
+            elif action == "add_line" and len(factory.production_lines) >= len(factory.workers):
+                continue
+            elif action == "add_station" and len(factory.crafting_stations) >= len(factory.workers):
+                continue
+            elif action == "buy_stock":
+                cost = sum(material.cost * argument for material in factory.materials.values() 
+                           if not material.is_craftable)
+                if factory.balance < cost:
+                    continue
+            actions.append((action, argument))
+        return actions
+        
+    @staticmethod
+    def apply_action(factory: Factory, action: str, argument):
+        """执行操作，返回(是否成功, 消息)"""
+        if action == "hire_worker":
+            name = f"AI工人{len(factory.workers) + 1}"
+            factory.hire_worker(name, argument, 40 * argument)
+            return True, f"雇佣了{name}"
+        elif action == "add_line":
+            factory.add_production_line(argument)
+            return True, "添加了生产线"
+        elif action == "add_station":
+            factory.add_crafting_station("AI合成台", argument)
+            return True, "添加了合成站"
+        elif action == "buy_stock":
+            purchases = {name: argument for name, material in factory.materials.items() if not material.is_craftable}
+            return factory.purchase_materials(purchases)
+        return True, "保持当前计划"
+        
+    def begin(self, factory: Factory, last_action=None):
+        """开始一次决策，复用上次执行操作下的子树"""
+        if self.root is not None and last_action in self.root.children:
+            self.root = self.root.children[last_action]
+            self.stats["reused_visits"] += self.root.visits
+        else:
+            self.root = PlanNode()
+        self.start_state = factory.fork()
+        self.start_value = self.get_value(factory)
+        self.rollouts = 0
+        self.elapsed = 0.0
+        
+    def is_done(self, timed: bool = True):
+        """检查本次决策的推演次数预算（计时时还有时间预算）是否用完"""
+        return self.rollouts >= self.rollout_budget or (timed and self.elapsed >= self.time_budget)
+        
+    def abandon(self):
+        """放弃未完成的决策"""
+        self.root = None
+        self.start_state = None
+        
+    def select(self, node: PlanNode, actions):
+        """选择未尝试的操作，否则按UCB1选择最佳操作"""
+        untried = [action for action in actions if action not in node.children]
+        if untried:
+            return self.rng.choice(untried)
+        spread = max(self.high - self.low, 1.0) if self.low is not None else 1.0
+        log_visits = math.log(node.visits)
+        return max(actions, key=lambda action: node.children[action].get_mean() + self.exploration * spread 
+                   * math.sqrt(log_visits / node.children[action].visits))
+        
+    def run_rollout(self):
+        """从决策状态模拟一个操作序列并回传其价值"""
+        start = perf_counter()
+        factory = self.start_state.fork()
+        # 未能支付的工资仍计入计划的成本
+        unpaid = []
+        factory.events.subscribe(lambda event: unpaid.append(event.data["amount"]), 
+                                 event_types=(SimEvent.PAYROLL_FAILED,))
+        ai = FactoryAI(HeadlessApp(factory, log_limit=1))
+        ai.rng = random.Random(self.rng.random())
+        # 没有调度器时，嵌套AI的每轮决策都会执行完毕，不会因计时而中断
+        ai.time_budget = math.inf
+        
+        # 沿有统计数据的树向下，扩展一个节点，之后保持当前计划
+        path = [self.root]
+        node = self.root
+        for day in range(self.horizon_days):
+            if node is not None:
+                action = self.select(node, self.get_legal_actions(factory))
+                if action not in node.children:
+                    node.children[action] = PlanNode()
+                    expanded = True
+                else:
+                    expanded = False
+                node = node.children[action]
+                path.append(node)
+                self.apply_action(factory, *action)
+                if expanded:
+                    node = None
+            if day == 0:
+                ai.start()
+            factory.run_days(1, self.work_hours)
+        ai.stop()
+        
+        value = self.get_value(factory) - sum(unpaid) - self.start_value
+        for visited in path:
+            visited.visits += 1
+            visited.total += value
+        if self.low is None:
+            self.low = self.high = value
+        else:
+            self.low = min(self.low, value)
+            self.high = max(self.high, value)
+        
+        self.rollouts += 1
+        self.elapsed += perf_counter() - start
+        self.stats["rollouts"] += 1
+        self.stats["total_time"] += perf_counter() - start
+        
+    def commit(self):
+        """完成决策，返回访问次数最多的操作"""
+        self.stats["decisions"] += 1
+        self.start_state = None
+        if not self.root.children:
+            return ("none", None)
+        return max(self.root.children, key=lambda action: self.root.children[action].visits)
 
 class FactoryAI:
     """AI玩家类，用于自动管理工厂"""
     
+    # 各策略的子策略，按执行顺序排列
+    STRATEGY_POLICIES = {
+        "balanced": ("line_workers", "products", "station_workers", "recipes", "purchases", "orders"),
+        "aggressive": ("expansion", "line_workers", "products", "station_workers", "recipes", "purchases", "orders"),
+        "conservative": ("line_workers", "products", "critical_purchases"),
+        "planning": ("line_workers", "products", "station_workers", "recipes", "lookahead", "purchases", "orders"),
+    }
+    
+    # 实现各子策略的方法
+    POLICY_METHODS = {
+        "expansion": "expand_factory",
+        "lookahead": "plan_expansion",
+        "line_workers": "assign_workers_to_lines",
+        "products": "assign_products_to_lines",
+        "station_workers": "assign_workers_to_stations",
+        "recipes": "assign_recipes_to_stations",
+        "purchases": "purchase_needed_materials",
+        "critical_purchases": "purchase_critical_materials",
+        "orders": "maintain_orders",
+    }
+    
+    # 各模拟事件影响的子策略
+    EVENT_POLICIES = {
+        SimEvent.PRODUCTION_COMPLETED: {"products", "purchases", "critical_purchases"},  # 生产线变为空闲
+        SimEvent.CRAFT_COMPLETED: {"recipes", "products", "purchases", "critical_purchases"},
+        SimEvent.ORDER_CREATED: {"products", "purchases", "critical_purchases"},
+        SimEvent.ORDER_COMPLETED: {"expansion", "orders"},
+        SimEvent.STOCK_LOW: {"purchases", "critical_purchases"},
+        SimEvent.MATERIAL_PURCHASED: {"products", "recipes"},
+        SimEvent.WORKER_HIRED: {"line_workers", "products", "station_workers", "recipes"},
+        SimEvent.LINE_ADDED: {"line_workers", "products"},
+        SimEvent.STATION_ADDED: {"station_workers", "recipes"},
+    }
+    
+    # 可调的决策参数
+    DEFAULT_PARAMS = {
+        "max_workers": 5,  # 工人数量达到此值后停止扩充
+        "hire_balance": 500,  # 雇佣前的最低余额
+        "hire_skill": 3,  # 雇佣工人的技能等级
+        "max_lines": 4,  # 生产线达到此数量后停止添加
+        "line_balance": 1000,  # 添加生产线前的最低余额
+        "max_stations": 3,  # 合成站达到此数量后停止添加
+        "station_balance": 800,  # 添加合成站前的最低余额
+        "min_open_orders": 2,  # 未完成订单少于此数时创建订单
+        "purchase_cash_fraction": 0.5,  # 一次采购可花费的余额比例
+        "critical_cash_fraction": 0.25,  # 保守策略可花费的余额比例
+        "reassign_threshold": 0.1,  # 调动忙碌工人所需的最小相对利润增益
+        "safety_hours": 8,  # 作为安全库存保留的需求小时数
+        "max_cover_hours": 72,  # 采购后库存最多覆盖的需求小时数
+    }
+    
     def __init__(self, app):
         self.app = app
         self.factory = app.factory
         self.running = False
-        self.strategy = "balanced"  # balanced, aggressive, conservative
+        self.strategy = "balanced"  # balanced（平衡）, aggressive（积极）, conservative（保守）, planning（规划）
         self.last_decision_day = 0
-        self.decision_interval = 1  # 决策间隔（小时）
-        self.last_decision_time = self.factory.current_time
+        self.subscription = None
+        self.purchasing = PurchasingEngine(self.factory)
+        self.params = {}
+        self.set_params(self.DEFAULT_PARAMS)
+        self.rng = random  # 创建订单所用的随机源
+        self.planner = RolloutPlanner()  # 规划策略的扩张规划器
+        self.last_plan_action = None
+        
+        # 有调度器时决策轮次受时间和步数预算限制，并从中断处继续
+        self.time_budget = 0.005  # 每轮最长秒数
+        self.step_budget = 50  # 每轮最多策略步数
+        self.pending_policies = []  # 排队的子策略，按执行顺序排列
+        self.current_task = None  # (policy name, step generator) of the interrupted policy
+        self.scheduler = None  # 可选的 callable(delay_ms, callback)，用于继续未完成的工作
+        self.resume_delay = 10  # 继续未完成工作前的毫秒数
+        self.resume_scheduled = False
+        self.pass_stats = {"passes": 0, "interrupted": 0, "steps": 0, 
+                           "total_time": 0.0, "max_time": 0.0, "last_time": 0.0, "last_steps": 0}
+        
+    def set_params(self, params: dict):
+        """设置决策参数，忽略未知名称"""
+        self.params.update((name, value) for name, value in params.items() if name in self.DEFAULT_PARAMS)
+        self.reassign_threshold = self.params["reassign_threshold"]
+        self.purchasing.safety_hours = self.params["safety_hours"]
+        self.purchasing.max_cover_hours = self.params["max_cover_hours"]
         
     def start(self):
         """启动AI玩家"""
         self.running = True
-        self.last_decision_time = self.factory.current_time
+        self.subscription = self.factory.events.subscribe(
+            self.on_simulation_events,
+            event_types=set(self.EVENT_POLICIES) | {SimEvent.DAY_STARTED},
+            batch=True
+        )
         self.app.log_event("AI玩家已启动")
         # 立即执行一次决策
-        self.make_continuous_decisions()
+        self.make_decisions()
         
     def stop(self):
         """停止AI玩家"""
         self.running = False
+        if self.subscription:
+            self.factory.events.unsubscribe(self.subscription)
+            self.subscription = None
+        self.pending_policies = []
+        self.current_task = None
         self.app.log_event("AI玩家已停止")
         
-    def make_continuous_decisions(self):
-        """持续做出决策"""
+    def on_simulation_events(self, events):
+        """响应模拟事件"""
         if not self.running:
             return
             
-        current_time = self.factory.current_time
-        time_diff = (current_time - self.last_decision_time).total_seconds() / 3600  # 转换为小时
-        
-        # 每过一定时间间隔就做决策
-        if time_diff >= self.decision_interval:
-            self.last_decision_time = current_time
-            self.app.log_event(f"AI玩家在 {current_time.strftime('%H:%M')} 做出决策")
+        if any(event.event_type == SimEvent.DAY_STARTED for event in events):
+            # 新的一天执行完整决策
+            self.make_daily_decisions()
+            return
             
-            try:
-                # 根据策略做出决策
-                if self.strategy == "balanced":
-                    self.balanced_strategy()
-                elif self.strategy == "aggressive":
-                    self.aggressive_strategy()
-                elif self.strategy == "conservative":
-                    self.conservative_strategy()
-                    
-                self.app.update_display()
-            except Exception as e:
-                self.app.log_event(f"AI决策出错: {str(e)}")
-        
-        # 安排下一次决策检查
-        if self.running:
-            # 每5秒检查一次是否需要做决策
-            self.app.root.after(5000, self.make_continuous_decisions)
+        policies = set()
+        for event in events:
+            policies |= self.EVENT_POLICIES.get(event.event_type, set())
+        self.queue_policies(name for name in self.STRATEGY_POLICIES[self.strategy] if name in policies)
+        self.run_pass()
+        
+    def queue_policies(self, policies):
+        """将子策略加入后续决策轮次的队列"""
+        for name in policies:
+            if name not in self.pending_policies:
+                self.pending_policies.append(name)
+                
+    def has_pending_work(self):
+        """检查是否还有排队或中断的决策"""
+        return bool(self.pending_policies) or self.current_task is not None
+        
+    def run_pass(self):
+        """运行排队的子策略，直到本轮预算用完"""
+        self.resume_scheduled = False
+        start = perf_counter()
+        steps = 0
+        # 没有调度器恢复时，决策轮次一直运行到没有剩余工作
+        budgeted = self.running and self.scheduler is not None
+        try:
+            # 这些决策引发的事件在本轮结束后处理
+            with self.factory.events.batch():
+                while self.has_pending_work():
+                    if self.current_task is None:
+                        name = self.pending_policies.pop(0)
+                        self.current_task = (name, getattr(self, self.POLICY_METHODS[name])())
+                    try:
+                        next(self.current_task[1])
+                        steps += 1
+                    except StopIteration:
+                        self.current_task = None
+                        continue
+                    if budgeted and (steps >= self.step_budget or perf_counter() - start >= self.time_budget):
+                        break
+        except Exception as e:
+            self.current_task = None
+            self.app.log_event(f"AI决策出错: {str(e)}")
+            
+        # 记录本轮耗时
+        elapsed = perf_counter() - start
+        stats = self.pass_stats
+        stats["passes"] += 1
+        stats["steps"] += steps
+        stats["total_time"] += elapsed
+        stats["max_time"] = max(stats["max_time"], elapsed)
+        stats["last_time"] = elapsed
+        stats["last_steps"] = steps
+        
+        if self.has_pending_work():
+            stats["interrupted"] += 1
+            if self.running and self.scheduler and not self.resume_scheduled:
+                self.resume_scheduled = True
+                self.scheduler(self.resume_delay, self.run_pass)
+        return steps
+        
+    def get_pass_stats(self):
+        """获取决策轮次耗时统计"""
+        stats = dict(self.pass_stats)
+        stats["avg_time"] = stats["total_time"] / stats["passes"] if stats["passes"] else 0.0
+        stats["pending"] = len(self.pending_policies) + (1 if self.current_task else 0)
+        return stats
+        
+    def make_decisions(self):
+        """按当前策略执行完整决策"""
+        # 根据策略安排决策
+        if self.strategy == "balanced":
+            self.balanced_strategy()
+        elif self.strategy == "aggressive":
+            self.aggressive_strategy()
+        elif self.strategy == "conservative":
+            self.conservative_strategy()
+        elif self.strategy == "planning":
+            self.planning_strategy()
+            
+        self.run_pass()
+        if self.has_pending_work():
+            self.app.log_event("AI决策已暂停，剩余工作将在下一轮继续")
+        else:
+            self.app.log_event("AI决策执行完成")
         
     def make_daily_decisions(self):
         """每天做出决策（兼容原有接口）"""
-        if not self.running or self.factory.day <= self.last_decision_day:
+        if self.factory.day <= self.last_decision_day:
             return
             
         self.last_decision_day = self.factory.day
         self.app.log_event(f"AI玩家在第 {self.factory.day} 天做出决策")
-        
-        try:
-            # 根据策略做出决策
-            if self.strategy == "balanced":
-                self.balanced_strategy()
-            elif self.strategy == "aggressive":
-                self.aggressive_strategy()
-            elif self.strategy == "conservative":
-                self.conservative_strategy()
-                
-            self.app.update_display()
-            self.app.log_event("AI决策执行完成")
-        except Exception as e:
-            self.app.log_event(f"AI决策出错: {str(e)}")
+        self.make_decisions()
         
     def balanced_strategy(self):
         """平衡发展策略"""
         self.app.log_event("执行平衡发展策略")
         
-        # 1. 分配工人到空闲的生产线
-        self.assign_workers_to_lines()
-        
-        # 2. 分配产品到有工人的生产线
-        self.assign_products_to_lines()
-        
-        # 3. 分配工人到空闲的合成站
-        self.assign_workers_to_stations()
-        
-        # 4. 为合成站分配配方
-        self.assign_recipes_to_stations()
-        
-        # 5. 购买必要的原材料
-        self.purchase_needed_materials()
-        
-        # 6. 创建一些订单
-        if len(self.factory.orders) < 2:
-            self.create_random_orders()
+        # 为生产线和合成站配备工人并保持运转，补充库存并创建订单
+        self.queue_policies(self.STRATEGY_POLICIES["balanced"])
             
     def aggressive_strategy(self):
         """积极扩张策略"""
         self.app.log_event("执行积极扩张策略")
         
+        # 扩充人员和设备，然后执行平衡策略的决策
+        self.queue_policies(self.STRATEGY_POLICIES["aggressive"])
+        
+    def expand_factory(self):
+        """在资金允许时扩充人员和设备"""
+        params = self.params
         # 1. 尽可能多地雇佣工人
-        if len(self.factory.workers) < 5 and self.factory.balance > 500:
-            self.hire_worker(f"AI工人{len(self.factory.workers)+1}", 3, 120)
+        if len(self.factory.workers) < params["max_workers"] and self.factory.balance > params["hire_balance"]:
+            self.hire_worker(f"AI工人{len(self.factory.workers)+1}", params["hire_skill"], 40 * params["hire_skill"])
+        yield
             
         # 2. 添加更多生产线
-        if len(self.factory.production_lines) < 4 and self.factory.balance > 1000:
+        if len(self.factory.production_lines) < params["max_lines"] and self.factory.balance > params["line_balance"]:
             self.factory.add_production_line(10)
             self.app.log_event("AI添加了新的生产线")
             self.app.update_progress_bars()
+        yield
             
         # 3. 添加更多合成站
-        if len(self.factory.crafting_stations) < 3 and self.factory.balance > 800:
+        if len(self.factory.crafting_stations) < params["max_stations"] and self.factory.balance > params["station_balance"]:
             self.factory.add_crafting_station("AI合成台", 5)
             self.app.log_event("AI添加了新的合成站")
             self.app.update_progress_bars()
-            
-        # 4. 平衡策略的基础决策
-        self.balanced_strategy()
+        yield
+        
+    def planning_strategy(self):
+        """推演规划策略"""
+        self.app.log_event("执行推演规划策略")
+        
+        # 执行平衡策略的决策，并在补货前通过向前模拟选择当天的扩张
+        self.queue_policies(self.STRATEGY_POLICIES["planning"])
+        
+    def plan_expansion(self):
+        """选择并执行模拟结果最好的扩张操作"""
+        planner = self.planner
+        planner.rng.seed(self.rng.random())
+        planner.begin(self.factory, self.last_plan_action)
+        day = self.factory.day
+        # 有调度器时搜索在时间预算处停止，且每次推演是一步，因此决策轮次
+        # 不超出其预算；无界面运行仅按推演次数搜索，设定种子时结果可重复
+        timed = self.scheduler is not None
+        while not planner.is_done(timed):
+            planner.run_rollout()
+            yield
+            if self.factory.day != day:
+                # 下一天有自己的决策
+                planner.abandon()
+                return
+                
+        action, argument = self.last_plan_action = planner.commit()
+        if action != "none":
+            success, message = planner.apply_action(self.factory, action, argument)
+            if success:
+                self.app.log_event(f"AI规划: {message} ({planner.rollouts} 次推演, {planner.elapsed * 1000:.0f}ms)")
+                self.app.update_progress_bars()
         
     def conservative_strategy(self):
         """保守经营策略"""
         self.app.log_event("执行保守经营策略")
         
-        # 只确保基本运营
-        self.assign_workers_to_lines()
-        self.assign_products_to_lines()
-        
-        # 只购买最必要的原材料
-        critical_materials = ["木材", "金属", "螺丝"]
-        for material in critical_materials:
-            if material in self.factory.materials:
-                current_stock = self.factory.material_inventory.get(material, 0)
-                if current_stock < 50 and self.factory.balance > 100:
-                    # 购买足够的材料
-                    needed = 100 - current_stock
-                    affordable = min(needed, int(self.factory.balance / self.factory.materials[material].cost / 2))
-                    if affordable > 0:
-                        success, message = self.factory.purchase_material(material, affordable)
-                        if success:
-                            self.app.log_event(message)
+        # 只确保基本运营并购买最必要的原材料
+        self.queue_policies(self.STRATEGY_POLICIES["conservative"])
+        
+    def purchase_critical_materials(self):
+        """只购买最必要的原材料"""
+        # 默认最多花费四分之一余额
+        yield from self.purchase_planned_materials(self.params["critical_cash_fraction"])
+        
+    def purchase_planned_materials(self, cash_fraction: float):
+        """一次性购买采购引擎规划的原材料"""
+        purchases = self.purchasing.plan_purchases(cash_fraction)
+        yield
+        if purchases:
+            success, message = self.factory.purchase_materials(purchases)
+            if success:
+                items = ", ".join(f"{quantity} 单位 {name}" for name, quantity in purchases.items())
+                self.app.log_event(f"AI购买了 {items}")
                 
     def assign_workers_to_lines(self):
         """分配工人到生产线"""
-        available_workers = [w for w in self.factory.workers if not w.is_working]
-        unstaffed_lines = [l for l in self.factory.production_lines if not l.assigned_worker]
-        
-        for worker, line in zip(available_workers, unstaffed_lines):
-            success, message = self.factory.assign_worker_to_line(worker.name, line.line_id)
-            if success:
-                self.app.log_event(f"AI将 {worker.name} 分配到生产线 {line.line_id}")
+        yield from self.assign_workers_to_slots(self.factory.production_lines, True)
                 
     def assign_workers_to_stations(self):
         """分配工人到合成站"""
-        available_workers = [w for w in self.factory.workers if not w.is_working]
-        unstaffed_stations = [s for s in self.factory.crafting_stations if not s.assigned_worker]
-        
-        for worker, station in zip(available_workers, unstaffed_stations):
-            success, message = self.factory.assign_worker_to_station(worker.name, station.station_id)
-            if success:
-                self.app.log_event(f"AI将 {worker.name} 分配到合成站 {station.station_id}")
+        yield from self.assign_workers_to_slots(self.factory.crafting_stations, False)
+        
+    def choose_product(self, craftable_only: bool = False):
+        """选择在空闲生产线或合成站上开始的产品"""
+        makeable = self.factory.get_makeable_items()
+        return next((name for name, is_product in makeable 
+                     if is_product and (not craftable_only or self.factory.products[name].is_craftable)), None)
+        
+    def get_slot_value(self, slot, is_line: bool):
+        """获取生产线或合成站正在或将要进行的工作每进度单位的利润"""
+        if is_line:
+            product = slot.current_product
+            if product is None:
+                product = self.factory.products.get(self.choose_product())
+            if product is None:
+                return 0
+            return self.factory.get_unit_margin(product.name) / max(1, product.production_time * PROGRESS_SCALE)
+            
+        if slot.current_recipe:
+            name, is_product = slot.current_recipe, slot.is_recipe_product
+        else:
+            name, is_product = self.choose_product(craftable_only=True), True
+        if name is None:
+            return 0
+        return self.factory.get_unit_margin(name, is_product) / (CRAFTING_TIME * PROGRESS_SCALE)
+        
+    def assign_workers_to_slots(self, slots, is_line: bool):
+        """将工人匹配到生产线或合成站，使每小时利润最大化"""
+        if not slots:
+            return
+            
+        # 候选: 空闲工人和已在此类岗位上的工人
+        current = {slot.assigned_worker.name: index for index, slot in enumerate(slots) if slot.assigned_worker}
+        workers = [w for w in self.factory.workers if not w.is_working or w.name in current]
+        if not workers:
+            return
+            
+        # 每个工人在每个岗位上的预期每小时利润
+        values = [self.get_slot_value(slot, is_line) for slot in slots]
+        profit = [[worker.work_rate() * 60 * value for value in values] for worker in workers]
+        yield
+        
+        assignment = AssignmentSolver.solve(profit)
+        current_profit = sum(profit[i][current[w.name]] for i, w in enumerate(workers) if w.name in current)
+        best_profit = sum(profit[i][j] for i, j in enumerate(assignment) if j >= 0)
+        
+        if best_profit - current_profit <= self.reassign_threshold * current_profit:
+            # 增益太小不值得调动在岗工人: 只将空闲工人匹配到无人岗位
+            idle = [i for i, w in enumerate(workers) if w.name not in current]
+            open_slots = [j for j, slot in enumerate(slots) if not slot.assigned_worker]
+            sub_assignment = AssignmentSolver.solve([[profit[i][j] for j in open_slots] for i in idle])
+            assignment = [current.get(w.name, -1) for w in workers]
+            for i, j in zip(idle, sub_assignment):
+                if j >= 0:
+                    assignment[i] = open_slots[j]
+        yield
+        
+        # 分配前先释放被调动的工人及其接手的岗位
+        moves = [(workers[i], slots[j]) for i, j in enumerate(assignment) 
+                 if j >= 0 and slots[j].assigned_worker is not workers[i]]
+        for i, worker in enumerate(workers):
+            if worker.name in current and assignment[i] != current[worker.name]:
+                self.factory.unassign_worker(worker.name)
+                
+        for worker, slot in moves:
+            if is_line:
+                success, message = self.factory.assign_worker_to_line(worker.name, slot.line_id)
+                if success:
+                    self.app.log_event(f"AI将 {worker.name} 分配到生产线 {slot.line_id}")
+            else:
+                success, message = self.factory.assign_worker_to_station(worker.name, slot.station_id)
+                if success:
+                    self.app.log_event(f"AI将 {worker.name} 分配到合成站 {slot.station_id}")
+            yield
                 
     def assign_products_to_lines(self):
         """分配产品到生产线"""
         staffed_lines = [l for l in self.factory.production_lines if l.assigned_worker and not l.current_product]
         
         for line in staffed_lines:
-            # 尝试分配不同的产品
-            for product_name, product in self.factory.products.items():
-                can_produce = True
-                
-                # 检查原材料是否足够
-                for material, quantity in product.materials_required.items():
-                    if material not in self.factory.material_inventory or self.factory.material_inventory[material] < quantity:
-                        can_produce = False
-                        break
-                        
-                # 检查所需产品是否足够
-                for prod_req, quantity in product.products_required.items():
-                    if prod_req not in self.factory.product_inventory or self.factory.product_inventory[prod_req] < quantity:
-                        can_produce = False
-                        break
-                        
-                if can_produce:
-                    success, message = self.factory.assign_product_to_line(product_name, line.line_id)
-                    if success:
-                        self.app.log_event(f"AI在生产线 {line.line_id} 开始生产 {product_name}")
-                        break
+            if line.current_product or not line.assigned_worker:
+                continue  # 本轮中断后状态已变化
+            # 分配第一个投入均有库存的产品
+            product_name = self.choose_product()
+            if product_name:
+                success, message = self.factory.assign_product_to_line(product_name, line.line_id)
+                if success:
+                    self.app.log_event(f"AI在生产线 {line.line_id} 开始生产 {product_name}")
+            yield
                         
     def assign_recipes_to_stations(self):
         """为合成站分配配方"""
         staffed_stations = [s for s in self.factory.crafting_stations if s.assigned_worker and not s.current_recipe]
         
         for station in staffed_stations:
-            # 尝试分配可合成的产品
-            for product_name, product in self.factory.products.items():
-                if product.is_craftable:
-                    can_craft = True
-                    
-                    # 检查原材料是否足够
-                    for material, quantity in product.materials_required.items():
-                        if material not in self.factory.material_inventory or self.factory.material_inventory[material] < quantity:
-                            can_craft = False
-                            break
-                            
-                    # 检查所需产品是否足够
-                    for prod_req, quantity in product.products_required.items():
-                        if prod_req not in self.factory.product_inventory or self.factory.product_inventory[prod_req] < quantity:
-                            can_craft = False
-                            break
-                            
-                    if can_craft:
-                        success, message = self.factory.assign_recipe_to_station(product_name, True, station.station_id)
-                        if success:
-                            self.app.log_event(f"AI在合成站 {station.station_id} 开始合成 {product_name}")
-                            break
+            if station.current_recipe or not station.assigned_worker:
+                continue  # 本轮中断后状态已变化
+            # 分配第一个投入均有库存的可合成产品
+            product_name = self.choose_product(craftable_only=True)
+            if product_name:
+                success, message = self.factory.assign_recipe_to_station(product_name, True, station.station_id)
+                if success:
+                    self.app.log_event(f"AI在合成站 {station.station_id} 开始合成 {product_name}")
+            yield
                     
     def purchase_needed_materials(self):
         """购买需要的原材料"""
-        for material_name, material in self.factory.materials.items():
-            current_stock = self.factory.material_inventory.get(material_name, 0)
+        # 默认最多花费一半余额
+        yield from self.purchase_planned_materials(self.params["purchase_cash_fraction"])
+                    
+    def maintain_orders(self):
+        """保持一些未完成订单"""
+        if self.factory.get_open_order_count() < self.params["min_open_orders"]:
+            self.create_random_orders()
+        yield
+            
+    def create_random_orders(self):
+        """创建随机订单"""
+        available_products = list(self.factory.products.keys())
+        if available_products:
+            product = self.rng.choice(available_products)
+            quantity = self.rng.randint(3, 10)
+            days = self.rng.randint(2, 5)
+            
+            order, message = self.factory.create_order(product, quantity, days)
+            if order:
+                self.app.log_event(f"AI创建了订单: {product} x{quantity}, {days}天内交货")
+                
+    def hire_worker(self, name, skill_level, salary):
+        """雇佣工人"""
+        if self.factory.balance >= salary:
+            worker = self.factory.hire_worker(name, skill_level, salary)
+            self.app.log_event(f"AI雇佣了工人 {name}")
+            return worker
+        return None
+        
+    def analyze_factory(self):
+        """分析工厂状态"""
+        analysis = "=== AI分析报告 ===\n\n"
+        
+        # 资金分析
+        analysis += f"资金状况: ¥{self.factory.balance}\n"
+        if self.factory.balance < 200:
+            analysis += "警告: 资金不足!\n"
+        elif self.factory.balance > 1000:
+            analysis += "良好: 资金充足\n"
+        else:
+            analysis += "正常: 资金状况良好\n"
+            
+        analysis += "\n"
+        
+        # 生产线分析
+        active_lines = sum(1 for line in self.factory.production_lines if line.is_active)
+        total_lines = len(self.factory.production_lines)
+        analysis += f"生产线: {active_lines}/{total_lines} 运行中\n"
+        
+        if active_lines < total_lines:
+            analysis += "建议: 分配更多工人到生产线\n"
+            
+        analysis += "\n"
+        
+        # 库存分析
+        low_stock_materials = []
+        for material, quantity in self.factory.material_inventory.items():
+            if quantity < 50:
+                low_stock_materials.append(material)
+                
+        if low_stock_materials:
+            analysis += f"低库存原材料: {', '.join(low_stock_materials)}\n"
+            analysis += "建议: 补充库存\n"
+        else:
+            analysis += "原材料库存: 充足\n"
+            
+        analysis += "\n"
+        
+        # 可制造数量分析（包括合成组件）
+        analysis += "当前库存可制造数量:\n"
+        for product_name in self.factory.products:
+            units = self.factory.get_max_buildable(product_name)
+            units_text = "无限制" if units >= UNLIMITED_UNITS else str(units)
+            analysis += f"  {product_name}: {units_text}\n"
+            
+        analysis += "\n"
+        
+        # 订单分析
+        active_orders = self.factory.get_open_order_count()
+        analysis += f"进行中订单: {active_orders}\n"
+        
+        if active_orders < 2:
+            analysis += "建议: 创建更多订单\n"
+            
+        analysis += "\n"
+        
+        # 来自指标存储的近期产量
+        metrics = self.factory.metrics
+        analysis += "最近24小时:\n"
+        for product_name in self.factory.products:
+            rate = metrics.get_rate(f"produced:{product_name}", 24)
+            if rate:
+                analysis += f"  {product_name}: 生产了 {rate * 24:.0f} 件\n"
+        analysis += f"  生产线利用率: {metrics.get_mean('line_utilization', 24):.0%}\n"
+        analysis += f"  订单积压: {metrics.get_mean('order_backlog', 24):.1f} 件\n"
+        
+        analysis += "\n"
+        
+        # 决策轮次开销
+        stats = self.get_pass_stats()
+        analysis += f"决策轮次: {stats['passes']} (中断 {stats['interrupted']} 次)\n"
+        analysis += f"每轮耗时: 平均 {stats['avg_time'] * 1000:.2f}ms, 最长 {stats['max_time'] * 1000:.2f}ms, "
+        analysis += f"预算 {self.time_budget * 1000:.1f}ms / {self.step_budget} 步\n"
+        if self.planner.stats["decisions"]:
+            planner_stats = self.planner.stats
+            analysis += f"规划: {planner_stats['decisions']} 次决策, "
+            analysis += f"每次 {planner_stats['rollouts'] / planner_stats['decisions']:.0f} 次推演 / "
+            analysis += f"耗时 {planner_stats['total_time'] / planner_stats['decisions'] * 1000:.0f}ms, "
+            analysis += f"复用 {planner_stats['reused_visits']} 次推演\n"
+        if stats["pending"]:
+            analysis += f"待执行子策略: {stats['pending']}\n"
+            
+        return analysis
+
+class HeadlessApp:
+    """代替图形界面，使FactoryAI无需显示器即可运行"""
+    def __init__(self, factory: Factory, log_limit: int = 200):
+        self.factory = factory
+        self.logs = deque(maxlen=log_limit)  # 最近的日志消息
+        
+    def log_event(self, message, time=None):
+        """保存日志消息"""
+        self.logs.append(message)
+        
+    def update_display(self):
+        """无需显示"""
+        
+    def update_progress_bars(self):
+        """无需显示"""
+
+class ScenarioAnalyzer:
+    """在进程池中对工厂副本逐一模拟候选操作并排名"""
+    
+    # 默认提供的候选操作：(操作, 参数)
+    DEFAULT_CANDIDATES = (
+        ("none", None),
+        ("hire_worker", 3),
+        ("add_line", 10),
+        ("add_station", 5),
+        ("buy_stock", 100),
+        ("strategy", "aggressive"),
+        ("strategy", "conservative"),
+    )
+    
+    def __init__(self, factory: Factory, strategy: str = "balanced", horizon_days: int = 7, 
+                 runs: int = 4, seed: int = 0, max_workers: int = None):
+        self.factory = factory
+        self.strategy = strategy  # 驱动每个候选的AI策略
+        self.horizon_days = horizon_days
+        self.runs = runs  # 每个候选的模拟次数，每次使用各自的订单种子
+        self.seed = seed
+        self.max_workers = max_workers
+        self.work_hours = 8  # 进入下一天前每天模拟的小时数
+        self.candidates = []
+        self.futures = []
+        self.results = None
+        self.executor = None
+        
+    @staticmethod
+    def describe(action: str, argument):
+        """获取候选操作的显示文本"""
+        if action == "hire_worker":
+            return f"雇佣一名技能{argument}的工人"
+        elif action == "add_line":
+            return f"添加生产线（容量{argument}）"
+        elif action == "add_station":
+            return f"添加合成站（容量{argument}）"
+        elif action == "buy_stock":
+            return f"每种原材料购买{argument}单位"
+        elif action == "strategy":
+            return f"切换到{argument}策略"
+        return "保持当前计划"
+        
+    @staticmethod
+    def apply_action(factory: Factory, action: str, argument, strategy: str):
+        """执行候选操作，返回(是否成功, 要运行的策略)"""
+        success = True
+        if action == "hire_worker":
+            factory.hire_worker(f"候选工人{len(factory.workers) + 1}", argument, 40 * argument)
+        elif action == "add_line":
+            factory.add_production_line(argument)
+        elif action == "add_station":
+            factory.add_crafting_station("候选合成台", argument)
+        elif action == "buy_stock":
+            purchases = {name: argument for name, material in factory.materials.items() if not material.is_craftable}
+            success, message = factory.purchase_materials(purchases)
+        elif action == "strategy":
+            strategy = argument
+        return success, strategy
+        
+    @staticmethod
+    def simulate(state: dict, action: str, argument, strategy: str, horizon_days: int, 
+                 work_hours: int, seed: int):
+        """从工厂状态模拟一个候选，在工作进程中运行"""
+        factory = Factory.from_dict(state)
+        start_balance = factory.balance
+        counts = {SimEvent.PRODUCTION_COMPLETED: 0, SimEvent.CRAFT_COMPLETED: 0, 
+                  SimEvent.ORDER_COMPLETED: 0, SimEvent.ORDER_OVERDUE: 0}
+        
+        def count_events(events):
+            for event in events:
+                counts[event.event_type] += 1
+                
+        factory.events.subscribe(count_events, event_types=tuple(counts), batch=True)
+        success, strategy = ScenarioAnalyzer.apply_action(factory, action, argument, strategy)
+        ai = FactoryAI(HeadlessApp(factory))
+        # AI 是唯一的随机源，使用独立的种子生成器不会影响模块的全局生成器
+        ai.rng = random.Random(seed)
+        ai.strategy = strategy
+        ai.start()
+        factory.run_days(horizon_days, work_hours)
+        ai.stop()
+        return {
+            "applied": success,
+            "balance": factory.balance,
+            "profit": factory.balance - start_balance,
+            "throughput": counts[SimEvent.PRODUCTION_COMPLETED] + counts[SimEvent.CRAFT_COMPLETED],
+            "orders_completed": counts[SimEvent.ORDER_COMPLETED],
+            "late_orders": counts[SimEvent.ORDER_OVERDUE]
+        }
+        
+    def start(self, candidates=None):
+        """开始在工作进程中模拟候选"""
+        self.candidates = list(candidates or self.DEFAULT_CANDIDATES)
+        self.results = None
+        state = self.factory.to_dict()
+        # 每个候选使用相同的订单种子，因此差异来自操作本身
+        tasks = [(state, action, argument, self.strategy, self.horizon_days, self.work_hours, self.seed + run)
+                 for action, argument in self.candidates for run in range(self.runs)]
+        try:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            self.futures = [self.executor.submit(ScenarioAnalyzer.simulate, *task) for task in tasks]
+        except (OSError, NotImplementedError, BrokenProcessPool):
+            # 此平台无法使用进程池，在当前进程中模拟
+            self.close()
+            self.collect([ScenarioAnalyzer.simulate(*task) for task in tasks])
+            
+    def is_done(self):
+        """检查所有模拟是否完成"""
+        return self.results is not None or all(future.done() for future in self.futures)
+        
+    def get_results(self):
+        """等待所有模拟完成，返回按预计余额排名的候选结果"""
+        if self.results is None:
+            try:
+                outcomes = [future.result() for future in self.futures]
+            except BrokenProcessPool:
+                # 工作进程异常退出，在当前进程中重新计算
+                state = self.factory.to_dict()
+                outcomes = [ScenarioAnalyzer.simulate(state, action, argument, self.strategy, self.horizon_days, 
+                                                      self.work_hours, self.seed + run)
+                            for action, argument in self.candidates for run in range(self.runs)]
+            finally:
+                self.close()
+            self.collect(outcomes)
+        return self.results
+        
+    def collect(self, outcomes):
+        """对每个候选的多次运行取平均并排名"""
+        self.results = []
+        for index, (action, argument) in enumerate(self.candidates):
+            runs = outcomes[index * self.runs:(index + 1) * self.runs]
+            result = {key: sum(run[key] for run in runs) / len(runs) 
+                      for key in ("balance", "profit", "throughput", "orders_completed", "late_orders")}
+            result["applied"] = all(run["applied"] for run in runs)
+            result["action"] = action
+            result["argument"] = argument
+            result["description"] = self.describe(action, argument)
+            self.results.append(result)
+        self.results.sort(key=lambda result: (-result["balance"], result["late_orders"]))
+        
+    def run(self, candidates=None):
+        """模拟候选并等待排名结果"""
+        self.start(candidates)
+        return self.get_results()
+        
+    def close(self):
+        """关闭工作进程"""
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+        self.futures = []
+        
+    def format_table(self):
+        """以文本表格获取排名结果"""
+        lines = [f"{'排名':<5}{'候选':<44}{'余额':>12}{'利润':>12}{'产出':>9}{'订单':>8}{'逾期':>7}"]
+        for rank, result in enumerate(self.results or [], 1):
+            note = "" if result["applied"] else "（资金不足）"
+            lines.append(f"{rank:<5}{(result['description'] + note)[:43]:<44}{result['balance']:>12.2f}"
+                         f"{result['profit']:>12.2f}{result['throughput']:>9.1f}"
+                         f"{result['orders_completed']:>8.1f}{result['late_orders']:>7.1f}")
+        return "\n".join(lines)
+
+class ParameterTuner:
+    """在进程池中用带种子的模拟对FactoryAI决策参数进行遗传搜索"""
+    
+    # 每个参数的搜索范围：(下限, 上限, 是否为整数)
+    PARAM_SPACE = {
+        "max_workers": (3, 10, True),
+        "hire_balance": (100, 2000, True),
+        "hire_skill": (1, 5, True),
+        "max_lines": (1, 8, True),
+        "line_balance": (200, 4000, True),
+        "max_stations": (1, 6, True),
+        "station_balance": (200, 4000, True),
+        "min_open_orders": (1, 6, True),
+        "purchase_cash_fraction": (0.1, 0.9, False),
+        "critical_cash_fraction": (0.05, 0.5, False),
+        "reassign_threshold": (0.0, 0.5, False),
+        "safety_hours": (0, 48, True),
+        "max_cover_hours": (24, 168, True),
+    }
+    
+    def __init__(self, factory: Factory, strategy: str = "aggressive", days: int = 14, seeds: int = 4, 
+                 population: int = 16, generations: int = 10, seed: int = 0, max_workers: int = None, 
+                 cache_path: str = None):
+        self.factory = factory
+        self.strategy = strategy
+        self.days = days  # 每次评估模拟的天数
+        self.seeds = seeds  # 每次评估取平均的带种子模拟次数
+        self.population = population
+        self.generations = generations
+        self.max_workers = max_workers
+        self.work_hours = 8  # 进入下一天前每天模拟的小时数
+        self.mutation_rate = 0.2  # 子代每个参数发生变异的概率
+        self.elite = 2  # 原样保留到下一代的最佳候选数
+        self.rng = random.Random(seed)
+        self.cache_path = cache_path
+        self.cache = {}  # 评估键 -> 得分
+        self.history = []  # (代数, 最佳得分, 最佳参数)
+        self.evaluations = 0  # 已运行的模拟次数，不含缓存命中
+        self.state = factory.to_dict()
+        # 仅当起始状态和设置相同时评估结果才可复用
+        self.context = hashlib.sha256(json.dumps([self.state, strategy, days, seeds, self.work_hours], 
+                                                 sort_keys=True, default=str).encode()).hexdigest()
+        self.load_cache()
+        
+    def load_cache(self):
+        """加载缓存的评估结果"""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                self.cache.update(json.load(f))
+        except (OSError, ValueError):
+            pass  # 无法读取的缓存只会增加评估次数
+            
+    def save_cache(self):
+        """保存缓存的评估结果"""
+        if self.cache_path:
+            temp_path = self.cache_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f)
+            os.replace(temp_path, self.cache_path)
+            
+    def get_key(self, params: dict):
+        """获取参数组的缓存键"""
+        return hashlib.sha256((self.context + json.dumps(params, sort_keys=True)).encode()).hexdigest()
+        
+    @staticmethod
+    def evaluate(state: dict, params: dict, strategy: str, days: int, work_hours: int, seed: int):
+        """用一组参数模拟AI，在工作进程中运行"""
+        factory = Factory.from_dict(state)
+        start_value = RolloutPlanner.get_value(factory)
+        unpaid = []
+        factory.events.subscribe(lambda event: unpaid.append(event.data["amount"]), 
+                                 event_types=(SimEvent.PAYROLL_FAILED,))
+        ai = FactoryAI(HeadlessApp(factory, log_limit=1))
+        ai.rng = random.Random(seed)
+        ai.strategy = strategy
+        ai.set_params(params)
+        ai.start()
+        factory.run_days(days, work_hours)
+        ai.stop()
+        return RolloutPlanner.get_value(factory) - sum(unpaid) - start_value
+        
+    def evaluate_all(self, candidates):
+        """为候选评分，只模拟不在缓存中的候选"""
+        missing = {}
+        for params in candidates:
+            key = self.get_key(params)
+            if key not in self.cache:
+                missing[key] = params
+                
+        tasks = [(key, (self.state, params, self.strategy, self.days, self.work_hours, seed)) 
+                 for key, params in missing.items() for seed in range(self.seeds)]
+        scores = {key: 0.0 for key in missing}
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [(key, executor.submit(ParameterTuner.evaluate, *task)) for key, task in tasks]
+                for key, future in futures:
+                    scores[key] += future.result()
+        except (OSError, NotImplementedError, BrokenProcessPool):
+            # 没有可用的进程池，在当前进程中模拟
+            scores = {key: 0.0 for key in missing}
+            for key, task in tasks:
+                scores[key] += ParameterTuner.evaluate(*task)
+                
+        self.evaluations += len(tasks)
+        for key, score in scores.items():
+            self.cache[key] = score / self.seeds
+        return [self.cache[self.get_key(params)] for params in candidates]
+        
+    def random_params(self):
+        """获取随机参数组"""
+        return {name: self.clip(name, self.rng.uniform(low, high)) for name, (low, high, is_int) in self.PARAM_SPACE.items()}
+        
+    def clip(self, name: str, value: float):
+        """将参数限制在其范围内"""
+        low, high, is_int = self.PARAM_SPACE[name]
+        value = min(high, max(low, value))
+        return int(round(value)) if is_int else round(value, 3)
+        
+    def breed(self, ranked):
+        """由锦标赛选出的两个父代经均匀交叉和高斯变异产生子代"""
+        parents = [min(self.rng.sample(range(len(ranked)), min(3, len(ranked)))) for _ in range(2)]
+        child = {}
+        for name, (low, high, is_int) in self.PARAM_SPACE.items():
+            value = ranked[self.rng.choice(parents)][1][name]
+            if self.rng.random() < self.mutation_rate:
+                value += self.rng.gauss(0, 0.15 * (high - low))
+            child[name] = self.clip(name, value)
+        return child
+        
+    def run(self, progress=None):
+        """搜索参数，返回(最佳得分, 最佳参数)"""
+        # 当前默认值与随机参数组一起参与竞争
+        defaults = {name: FactoryAI.DEFAULT_PARAMS[name] for name in self.PARAM_SPACE}
+        candidates = [defaults] + [self.random_params() for _ in range(self.population - 1)]
+        ranked = []
+        for generation in range(self.generations):
+            scores = self.evaluate_all(candidates)
+            ranked = sorted(zip(scores, candidates), key=lambda pair: -pair[0])
+            self.history.append((generation, ranked[0][0], ranked[0][1]))
+            self.save_cache()
+            if progress:
+                progress(generation, ranked[0][0])
+            candidates = [params for score, params in ranked[:self.elite]]
+            candidates += [self.breed(ranked) for _ in range(self.population - len(candidates))]
+        return ranked[0]
+
+class FactoryEnv:
+    """基于工厂分叉、提供reset()/step(action)接口的强化学习环境"""
+    
+    def __init__(self, factory: Factory = None, seed: int = None, step_minutes: int = 30, work_hours: int = 8, 
+                 max_days: int = 30, min_open_orders: int = 2):
+        if factory is None:
+            factory = Factory("高效加工厂", initial_balance=420, start_time=CLI_START_TIME)
+            factory.setup_default()
+        self.template = factory.fork()  # 每个回合的起始状态
+        self.step_minutes = step_minutes  # 每步模拟的分钟数
+        self.steps_per_day = max(1, work_hours * 60 // step_minutes)  # 进入下一天前的步数
+        self.max_days = max_days  # 超过此天数后截断回合
+        self.min_open_orders = min_open_orders  # 未完成订单少于此数时每天创建订单
+        self.purchase_quantity = 50  # 采购操作购买的数量
+        self.sell_quantity = 5  # 出售操作最多出售的数量
+        self.hire_skill = 3  # 雇佣工人的技能等级
+        self.rng = random.Random(seed)
+        
+        # 所有回合的目录和设备保持不变
+        template = self.template
+        self.material_names = list(template.materials)
+        self.product_names = list(template.products)
+        self.recipes = ([(name, True) for name, product in template.products.items() if product.is_craftable] + 
+                        [(name, False) for name, material in template.materials.items() if material.is_craftable])
+        self.product_index = {name: index + 1 for index, name in enumerate(self.product_names)}
+        self.recipe_index = {recipe: index + 1 for index, recipe in enumerate(self.recipes)}
+        stock_ids = ([template.inventory.slot(ItemRegistry.MATERIAL, name) for name in self.material_names] + 
+                     [template.inventory.slot(ItemRegistry.PRODUCT, name) for name in self.product_names])
+        self.stock_ids = np.array(stock_ids, dtype=np.intp) if np is not None else stock_ids
+        self.actions = self.build_actions()
+        
+        # 观测：余额、天数、当天步数、空闲工人数、每种原材料和产品的库存、
+        # 每种产品未完成订单的积压量、每条生产线的(有工人, 产品, 进度)、
+        # 每个合成站的(有工人, 配方, 进度)
+        self.stock_offset = 4
+        self.backlog_offset = self.stock_offset + len(stock_ids)
+        self.line_offset = self.backlog_offset + len(self.product_names)
+        self.station_offset = self.line_offset + 3 * len(template.production_lines)
+        self.observation_size = self.station_offset + 3 * len(template.crafting_stations)
+        # 每步复用，需要保留观测时请复制
+        if np is not None:
+            self.observation = np.zeros(self.observation_size, dtype=np.float32)
+            self.stock_buffer = np.zeros(len(stock_ids), dtype=np.int64)
+        else:
+            self.observation = [0.0] * self.observation_size
+            
+        self.factory = None
+        self.step_of_day = 0
+        self.episode_steps = 0
+        
+    def build_actions(self):
+        """获取离散操作表：(操作, 参数)"""
+        template = self.template
+        actions = [("wait", ())]
+        actions += [("staff_line", (line.line_id,)) for line in template.production_lines]
+        actions += [("staff_station", (station.station_id,)) for station in template.crafting_stations]
+        actions += [("produce", (name, line.line_id)) 
+                    for line in template.production_lines for name in self.product_names]
+        actions += [("craft", (name, is_product, station.station_id)) 
+                    for station in template.crafting_stations for name, is_product in self.recipes]
+        actions += [("purchase", (name,)) for name in self.material_names if not template.materials[name].is_craftable]
+        actions += [("hire", ())]
+        actions += [("sell", (name,)) for name in self.product_names]
+        return actions
+        
+    def describe_action(self, action: int):
+        """获取操作的显示文本"""
+        name, arguments = self.actions[action]
+        return f"{name}({', '.join(str(argument) for argument in arguments)})"
+        
+    def reset(self, seed: int = None):
+        """开始新回合，返回(观测, 信息)"""
+        if seed is not None:
+            self.rng.seed(seed)
+        self.factory = self.template.fork()
+        self.step_of_day = 0
+        self.episode_steps = 0
+        self.create_orders()
+        return self.encode(), {}
+        
+    def create_orders(self):
+        """未完成订单过少时创建随机订单"""
+        factory = self.factory
+        while factory.get_open_order_count() < self.min_open_orders and self.product_names:
+            factory.create_order(self.rng.choice(self.product_names), self.rng.randint(3, 10), self.rng.randint(2, 5))
+            
+    def apply_action(self, action: int):
+        """执行操作，返回是否成功"""
+        name, arguments = self.actions[action]
+        factory = self.factory
+        if name == "wait":
+            return True
+        elif name == "staff_line" or name == "staff_station":
+            worker = next((w for w in factory.workers if not w.is_working), None)
+            if worker is None:
+                return False
+            if name == "staff_line":
+                return factory.assign_worker_to_line(worker.name, *arguments)[0]
+            return factory.assign_worker_to_station(worker.name, *arguments)[0]
+        elif name == "produce":
+            return factory.assign_product_to_line(*arguments)[0]
+        elif name == "craft":
+            return factory.assign_recipe_to_station(*arguments)[0]
+        elif name == "purchase":
+            return factory.purchase_material(arguments[0], self.purchase_quantity)[0]
+        elif name == "hire":
+            salary = 40 * self.hire_skill
+            if factory.balance < salary:
+                return False
+            factory.hire_worker(f"AI工人{len(factory.workers) + 1}", self.hire_skill, salary)
+            return True
+        elif name == "sell":
+            quantity = min(self.sell_quantity, factory.product_inventory[arguments[0]])
+            return quantity > 0 and factory.sell_from_inventory(arguments[0], quantity)[0]
+        return False
+        
+    def step(self, action: int):
+        """执行操作并推进模拟，返回(观测, 奖励, 是否终止, 是否截断, 信息)"""
+        factory = self.factory
+        start_balance = factory.balance
+        valid = self.apply_action(action)
+        factory.advance_time(self.step_minutes / 60)
+        self.episode_steps += 1
+        self.step_of_day += 1
+        
+        terminated = False
+        reward = 0.0
+        if self.step_of_day >= self.steps_per_day:
+            self.step_of_day = 0
+            success, message, daily_profit = factory.next_day()
+            if not success:
+                # 破产：无法支付工资
+                terminated = True
+                reward -= sum(worker.salary for worker in factory.workers)
+            self.create_orders()
+        reward += factory.balance - start_balance
+        truncated = not terminated and factory.day > self.max_days
+        return self.encode(), reward, terminated, truncated, {"action_valid": valid}
+        
+    def encode(self):
+        """将工厂状态写入观测缓冲区"""
+        factory = self.factory
+        observation = self.observation
+        observation[0] = factory.balance
+        observation[1] = factory.day
+        observation[2] = self.step_of_day
+        observation[3] = sum(1 for worker in factory.workers if not worker.is_working)
+        
+        # 直接从库存向量读取库存
+        offset = self.stock_offset
+        if np is not None:
+            np.take(factory.inventory.counts, self.stock_ids, out=self.stock_buffer)
+            observation[offset:self.backlog_offset] = self.stock_buffer
+        else:
+            counts = factory.inventory.counts
+            for index, item_id in enumerate(self.stock_ids):
+                observation[offset + index] = counts[item_id]
+                
+        offset = self.backlog_offset
+        for index in range(len(self.product_names)):
+            observation[offset + index] = 0
+        for order in factory.orders:
+            if not order.is_completed:
+                observation[offset + self.product_index[order.product.name] - 1] += order.quantity - order.completed_quantity
+                
+        offset = self.line_offset
+        for line in factory.production_lines:
+            product = line.current_product
+            observation[offset] = 1.0 if line.assigned_worker else 0.0
+            observation[offset + 1] = self.product_index.get(product.name, 0) if product else 0
+            observation[offset + 2] = line.production_progress / line.work_required() if product else 0.0
+            offset += 3
+            
+        work = CRAFTING_TIME * PROGRESS_SCALE
+        for station in factory.crafting_stations:
+            recipe = station.current_recipe
+            observation[offset] = 1.0 if station.assigned_worker else 0.0
+            observation[offset + 1] = self.recipe_index.get((recipe, station.is_recipe_product), 0) if recipe else 0
+            observation[offset + 2] = station.crafting_progress / work
+            offset += 3
+        return observation
+
+class BatchFactoryEnv(FactoryEnv):
+    """在堆叠的NumPy数组上同步步进的一批独立工厂环境"""
+    
+    # 离散操作表的操作种类，按数组编码顺序排列
+    ACTION_KINDS = ("wait", "staff_line", "staff_station", "produce", "craft", "purchase", "hire", "sell")
+    
+    def __init__(self, factory: Factory = None, num_envs: int = 64, seed: int = None, step_minutes: int = 30, 
+                 work_hours: int = 8, max_days: int = 30, min_open_orders: int = 2, max_workers: int = 16, 
+                 max_orders: int = 8):
+        if np is None:
+            raise ValueError("批量环境需要 numpy")
+        super().__init__(factory, seed, step_minutes, work_hours, max_days, min_open_orders)
+        self.num_envs = num_envs
+        self.max_workers = max_workers  # 每个工厂的工人槽位数，满后停止雇佣
+        self.max_orders = max(max_orders, min_open_orders)  # 每个工厂的订单槽位数
+        self.np_rng = np.random.default_rng(seed)
+        self.rows = np.arange(num_envs)
+        self.compile_catalog()
+        self.compile_actions()
+        self.compile_template()
+        
+        # 所有工厂的观测，每步复用
+        self.observations = np.zeros((num_envs, self.observation_size), dtype=np.float32)
+        self.final_observations = np.zeros((num_envs, self.observation_size), dtype=np.float32)
+        
+    def compile_catalog(self):
+        """在库存向量上构建配方矩阵：先原材料，后产品"""
+        template = self.template
+        material_count = len(self.material_names)
+        self.stock_index = {(ItemRegistry.MATERIAL, name): index for index, name in enumerate(self.material_names)}
+        self.stock_index.update({(ItemRegistry.PRODUCT, name): material_count + index 
+                                 for index, name in enumerate(self.product_names)})
+        
+        def compile_recipe(recipe):
+            vector = np.zeros(len(self.stock_index), dtype=np.int64)
+            for name, quantity in recipe.materials_required.items():
+                vector[self.stock_index[(ItemRegistry.MATERIAL, name)]] += quantity
+            for name, quantity in recipe.products_required.items():
+                vector[self.stock_index[(ItemRegistry.PRODUCT, name)]] += quantity
+            return vector
+            
+        products = [template.products[name] for name in self.product_names]
+        self.requirements = np.array([compile_recipe(product) for product in products], dtype=np.int64)
+        self.work = np.array([max(1, product.production_time * PROGRESS_SCALE) for product in products], dtype=np.int64)
+        self.prices = np.array([product.sale_price for product in products], dtype=np.float64)
+        self.costs = np.array([template.materials[name].cost for name in self.material_names] + [0.0] * len(products))
+        recipes = [template.products[name] if is_product else template.materials[name] for name, is_product in self.recipes]
+        self.craft_requirements = np.array([compile_recipe(recipe) for recipe in recipes], 
+                                           dtype=np.int64).reshape(len(recipes), len(self.stock_index))
+        kinds = {True: ItemRegistry.PRODUCT, False: ItemRegistry.MATERIAL}
+        self.craft_outputs = np.array([self.stock_index[(kinds[is_product], name)] for name, is_product in self.recipes], 
+                                      dtype=np.intp)
+        
+    def compile_actions(self):
+        """将操作表编码为(种类, 目标槽位, 物品)数组"""
+        line_index = {line.line_id: index for index, line in enumerate(self.template.production_lines)}
+        station_index = {station.station_id: index for index, station in enumerate(self.template.crafting_stations)}
+        product_index = {name: index for index, name in enumerate(self.product_names)}
+        recipe_index = {recipe: index for index, recipe in enumerate(self.recipes)}
+        kinds, targets, items = [], [], []
+        for name, arguments in self.actions:
+            target = item = 0
+            if name == "staff_line":
+                target = line_index[arguments[0]]
+            elif name == "staff_station":
+                target = station_index[arguments[0]]
+            elif name == "produce":
+                item, target = product_index[arguments[0]], line_index[arguments[1]]
+            elif name == "craft":
+                item, target = recipe_index[(arguments[0], arguments[1])], station_index[arguments[2]]
+            elif name == "purchase":
+                item = self.stock_index[(ItemRegistry.MATERIAL, arguments[0])]
+            elif name == "sell":
+                item = product_index[arguments[0]]
+            kinds.append(self.ACTION_KINDS.index(name))
+            targets.append(target)
+            items.append(item)
+        self.action_kinds = np.array(kinds, dtype=np.int64)
+        self.action_targets = np.array(targets, dtype=np.intp)
+        self.action_items = np.array(items, dtype=np.intp)
+        
+    def compile_template(self):
+        """将模板工厂转换为每个状态数组的初始行"""
+        template = self.template
+        if len(template.workers) > self.max_workers:
+            raise ValueError(f"工厂的工人超过 {self.max_workers} 名")
+        workers = {id(worker): index for index, worker in enumerate(template.workers)}
+        product_index = {name: index for index, name in enumerate(self.product_names)}
+        recipe_index = {recipe: index for index, recipe in enumerate(self.recipes)}
+        
+        def worker_slot(slot):
+            return workers.get(id(slot.assigned_worker), -1) if slot.is_active else -1
+            
+        rates = [worker.work_rate() for worker in template.workers]
+        padding = [0] * (self.max_workers - len(rates))
+        orders = [order for order in template.orders if not order.is_completed][:self.max_orders]
+        order_padding = [0] * (self.max_orders - len(orders))
+        self.initial_state = {
+            "balance": np.float64(template.balance),
+            "day": template.day,
+            "step_of_day": 0,
+            "stock": np.array([template.inventory.get_quantity(template.inventory.slot(kind, name)) 
+                               for (kind, name) in self.stock_index], dtype=np.int64),
+            "worker_count": len(rates),
+            "worker_rate": np.array(rates + padding, dtype=np.int64),
+            "worker_salary": np.array([worker.salary for worker in template.workers] + padding, dtype=np.float64),
+            "worker_working": np.array([worker.is_working for worker in template.workers] + padding, dtype=bool),
+            "line_worker": np.array([worker_slot(line) for line in template.production_lines], dtype=np.intp),
+            "line_product": np.array([product_index[line.current_product.name] if line.current_product else -1 
+                                      for line in template.production_lines], dtype=np.intp),
+            "line_progress": np.array([line.production_progress for line in template.production_lines], dtype=np.int64),
+            "station_worker": np.array([worker_slot(station) for station in template.crafting_stations], dtype=np.intp),
+            "station_recipe": np.array([recipe_index.get((station.current_recipe, station.is_recipe_product), -1) 
+                                        for station in template.crafting_stations], dtype=np.intp),
+            "station_progress": np.array([station.crafting_progress for station in template.crafting_stations], 
+                                         dtype=np.int64),
+            "order_product": np.array([product_index[order.product.name] for order in orders] + order_padding, 
+                                      dtype=np.intp),
+            "order_quantity": np.array([order.quantity for order in orders] + order_padding, dtype=np.int64),
+            "order_done": np.array([order.completed_quantity for order in orders] + order_padding, dtype=np.int64),
+            "order_active": np.array([True] * len(orders) + order_padding, dtype=bool),
+        }
+        # 每个状态字段一个堆叠数组，第一维为工厂
+        self.state = {name: np.zeros((self.num_envs,) + np.shape(value), dtype=np.asarray(value).dtype) 
+                      for name, value in self.initial_state.items()}
+        
+    def reset(self, seed: int = None):
+        """重置所有工厂，返回(观测, 信息)"""
+        if seed is not None:
+            self.rng.seed(seed)
+            self.np_rng = np.random.default_rng(seed)
+        self.reset_envs(np.ones(self.num_envs, dtype=bool))
+        return self.encode(), {}
+        
+    def reset_envs(self, mask):
+        """重置布尔掩码选中的工厂"""
+        for name, value in self.initial_state.items():
+            self.state[name][mask] = value
+        self.create_orders(mask)
+        
+    def create_orders(self, mask):
+        """选中工厂的未完成订单过少时创建随机订单"""
+        state = self.state
+        active = state["order_active"]
+        for _ in range(self.min_open_orders):
+            needed = mask & (active.sum(axis=1) < self.min_open_orders) & ~active.all(axis=1)
+            count = int(needed.sum())
+            if not count or not self.product_names:
+                return
+            rows = self.rows[needed]
+            slots = (~active[rows]).argmax(axis=1)
+            state["order_product"][rows, slots] = self.np_rng.integers(0, len(self.product_names), count)
+            state["order_quantity"][rows, slots] = self.np_rng.integers(3, 11, count)
+            state["order_done"][rows, slots] = 0
+            active[rows, slots] = True
+            
+    def step(self, actions):
+        """用各自的操作步进每个工厂并重置已结束的工厂，返回堆叠的(观测, 奖励, 是否终止, 是否截断, 信息)"""
+        state = self.state
+        rows = self.rows
+        actions = np.asarray(actions, dtype=np.intp)
+        kinds = self.action_kinds[actions]
+        targets = self.action_targets[actions]
+        items = self.action_items[actions]
+        balance = state["balance"]
+        start_balance = balance.copy()
+        valid = kinds == 0
+        
+        valid |= self.apply_staffing(kinds == 1, targets, state["line_worker"])
+        valid |= self.apply_staffing(kinds == 2, targets, state["station_worker"])
+        valid |= self.apply_assignment(kinds == 3, targets, items, self.requirements, 
+                                       state["line_worker"], state["line_product"], state["line_progress"])
+        valid |= self.apply_assignment(kinds == 4, targets, items, self.craft_requirements, 
+                                       state["station_worker"], state["station_recipe"], state["station_progress"])
+        
+        # 采购
+        cost = self.costs[items] * self.purchase_quantity
+        bought = (kinds == 5) & (balance >= cost)
+        balance[bought] -= cost[bought]
+        state["stock"][rows[bought], items[bought]] += self.purchase_quantity
+        valid |= bought
+        
+        # 雇佣到下一个空闲工人槽位
+        count = state["worker_count"]
+        salary = 40 * self.hire_skill
+        hired = (kinds == 6) & (balance >= salary) & (count < self.max_workers)
+        hired_rows = rows[hired]
+        state["worker_rate"][hired_rows, count[hired]] = max(1, PROGRESS_SCALE + self.hire_skill - 1)
+        state["worker_salary"][hired_rows, count[hired]] = salary
+        state["worker_working"][hired_rows, count[hired]] = False
+        count[hired] += 1
+        valid |= hired
+        
+        # 从库存出售
+        stock_items = items + len(self.material_names)
+        quantity = np.minimum(self.sell_quantity, state["stock"][rows, np.minimum(stock_items, state["stock"].shape[1] - 1)])
+        sold = (kinds == 7) & (quantity > 0)
+        state["stock"][rows[sold], stock_items[sold]] -= quantity[sold]
+        balance[sold] += self.prices[items[sold]] * quantity[sold]
+        valid |= sold
+        
+        self.advance(self.step_minutes)
+        
+        # 工作班次结束：支付工资并创建订单
+        state["step_of_day"] += 1
+        day_end = state["step_of_day"] >= self.steps_per_day
+        rewards = np.zeros(self.num_envs)
+        terminated = np.zeros(self.num_envs, dtype=bool)
+        if day_end.any():
+            state["step_of_day"][day_end] = 0
+            state["day"][day_end] += 1
+            payroll = state["worker_salary"].sum(axis=1)
+            paid = day_end & (balance >= payroll)
+            balance[paid] -= payroll[paid]
+            # 破产：无法支付工资
+            terminated = day_end & ~paid
+            rewards[terminated] -= payroll[terminated]
+            self.create_orders(day_end)
+        rewards += balance - start_balance
+        truncated = ~terminated & (state["day"] > self.max_days)
+        
+        observations = self.encode()
+        done = terminated | truncated
+        if done.any():
+            self.final_observations[done] = observations[done]
+            self.reset_envs(done)
+            observations = self.encode()
+        info = {"action_valid": valid, "final_observation": self.final_observations, "_final_observation": done}
+        return observations, rewards, terminated, truncated, info
+        
+    def apply_staffing(self, selected, targets, slot_workers):
+        """将第一个空闲工人分配到目标生产线或合成站，返回已执行的掩码"""
+        state = self.state
+        idle = ~state["worker_working"] & (np.arange(self.max_workers) < state["worker_count"][:, None])
+        applied = selected & idle.any(axis=1)
+        rows = self.rows[applied]
+        workers = idle[rows].argmax(axis=1)
+        slot_workers[rows, targets[applied]] = workers
+        state["worker_working"][rows, workers] = True
+        return applied
+        
+    def apply_assignment(self, selected, targets, items, requirements, slot_workers, slot_recipes, slot_progress):
+        """若目标生产线或合成站有工人且库存充足则开始配方，返回已执行的掩码"""
+        if not selected.any() or not len(requirements):
+            return selected & False
+        rows = self.rows[selected]
+        targets = targets[selected]
+        needed = requirements[items[selected]]
+        stock = self.state["stock"]
+        ok = (slot_workers[rows, targets] >= 0) & (stock[rows] >= needed).all(axis=1)
+        rows, targets = rows[ok], targets[ok]
+        stock[rows] -= needed[ok]
+        # 空闲的槽位保留上次完成时结转的工作量
+        switched = slot_recipes[rows, targets] >= 0
+        slot_progress[rows[switched], targets[switched]] = 0
+        slot_recipes[rows, targets] = items[selected][ok]
+        applied = np.zeros(self.num_envs, dtype=bool)
+        applied[rows] = True
+        return applied
+        
+    def advance(self, minutes: int):
+        """推进所有工厂的生产和合成"""
+        state = self.state
+        rows = self.rows[:, None]
+        stock = state["stock"]
+        rates = state["worker_rate"]
+        
+        # 生产线，完成的产品会计入该产品的每个未完成订单
+        workers, products, progress = state["line_worker"], state["line_product"], state["line_progress"]
+        producing = (workers >= 0) & (products >= 0)
+        # 空闲生产线上结转的工作量会丢失
+        progress[products < 0] = 0
+        line_rates = rates[rows, np.maximum(workers, 0)]
+        progress += np.where(producing, line_rates * minutes, 0)
+        # 仅当最后一分钟完成时才结转超出的工作量，与一分钟刻度一致
+        work = self.work[np.maximum(products, 0)]
+        overflow = progress - work
+        done = producing & (overflow >= 0)
+        if done.any():
+            material_count = len(self.material_names)
+            order_product, order_active = state["order_product"], state["order_active"]
+            for line in range(products.shape[1]):
+                completed = done[:, line]
+                if not completed.any():
+                    continue
+                product = products[:, line]
+                np.add.at(stock, (self.rows[completed], material_count + product[completed]), 1)
+                matched = order_active & (order_product == product[:, None]) & completed[:, None]
+                state["order_done"] += matched
+                finished = matched & (state["order_done"] >= state["order_quantity"])
+                state["balance"] += (self.prices[order_product] * state["order_quantity"] * finished).sum(axis=1)
+                order_active &= ~finished
+            products[done] = -1
+            progress[done] = np.where(overflow < line_rates, np.minimum(overflow, work - 1), 0)[done]
+            
+        # 合成站
+        workers, recipes, progress = state["station_worker"], state["station_recipe"], state["station_progress"]
+        crafting = (workers >= 0) & (recipes >= 0)
+        progress[recipes < 0] = 0
+        station_rates = rates[rows, np.maximum(workers, 0)]
+        progress += np.where(crafting, station_rates * minutes, 0)
+        overflow = progress - CRAFTING_TIME * PROGRESS_SCALE
+        done = crafting & (overflow >= 0)
+        if done.any():
+            env_rows, stations = np.nonzero(done)
+            np.add.at(stock, (env_rows, self.craft_outputs[recipes[env_rows, stations]]), 1)
+            recipes[done] = -1
+            progress[done] = np.where(overflow < station_rates, 
+                                      np.minimum(overflow, CRAFTING_TIME * PROGRESS_SCALE - 1), 0)[done]
+            
+    def encode(self):
+        """将所有工厂的状态写入观测缓冲区"""
+        state = self.state
+        observations = self.observations
+        observations[:, 0] = state["balance"]
+        observations[:, 1] = state["day"]
+        observations[:, 2] = state["step_of_day"]
+        observations[:, 3] = (~state["worker_working"] & 
+                              (np.arange(self.max_workers) < state["worker_count"][:, None])).sum(axis=1)
+        observations[:, self.stock_offset:self.backlog_offset] = state["stock"]
+        
+        remaining = (state["order_quantity"] - state["order_done"]) * state["order_active"]
+        for index in range(len(self.product_names)):
+            observations[:, self.backlog_offset + index] = (remaining * (state["order_product"] == index)).sum(axis=1)
             
-            # 如果库存低于阈值且资金充足，就购买
-            if current_stock < 100 and self.factory.balance > material.cost * 50:
-                quantity = min(200, int(self.factory.balance / material.cost / 2))
-                success, message = self.factory.purchase_material(material_name, quantity)
-                if success:
-                    self.app.log_event(f"AI购买了 {quantity} 单位 {material_name}")
-                    
-    def create_random_orders(self):
-        """创建随机订单"""
-        import random
-        available_products = list(self.factory.products.keys())
-        if available_products:
-            product = random.choice(available_products)
-            quantity = random.randint(3, 10)
-            days = random.randint(2, 5)
+        for offset, end, workers, recipes, progress, work in (
+                (self.line_offset, self.station_offset, state["line_worker"], state["line_product"], 
+                 state["line_progress"], self.work[np.maximum(state["line_product"], 0)]),
+                (self.station_offset, self.observation_size, state["station_worker"], state["station_recipe"], 
+                 state["station_progress"], CRAFTING_TIME * PROGRESS_SCALE)):
+            observations[:, offset:end:3] = workers >= 0
+            observations[:, offset + 1:end:3] = recipes + 1
+            observations[:, offset + 2:end:3] = np.where(recipes >= 0, progress / work, 0.0)
+        return observations
+
+class SweepRunner:
+    """在进程池中运行实验网格的每个单元，按内容哈希缓存每个结果"""
+    
+    # 网格维度及网格未指定时的取值
+    DEFAULTS = {"mod": None, "strategy": "balanced", "initial_balance": None, "workers": None, "seed": 0, "days": 30}
+    
+    # 每个单元的结果列
+    METRICS = ("balance", "profit", "produced", "orders_completed", "late_orders", "payroll_failures")
+    
+    def __init__(self, grid: dict, cache_directory: str = SWEEP_CACHE_DIRECTORY, max_workers: int = None):
+        unknown = set(grid) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"未知的网格维度: {', '.join(sorted(unknown))}")
+        # 每个维度都是取值列表
+        self.grid = {name: grid.get(name, default) for name, default in self.DEFAULTS.items()}
+        self.grid = {name: values if isinstance(values, list) else [values] for name, values in self.grid.items()}
+        self.cache_directory = cache_directory
+        self.max_workers = max_workers
+        self.mod_hashes = {}  # 模组路径 -> 内容哈希
+        self.computed = 0  # 已模拟的单元数，不含缓存命中
+        
+    @staticmethod
+    def load_grid(path: str):
+        """从JSON文件加载网格，模组路径相对于该文件"""
+        with open(path, "r", encoding="utf-8") as f:
+            grid = json.load(f)
+        if not isinstance(grid, dict):
+            raise ValueError("网格文件必须包含一个JSON对象")
+        mods = grid.get("mod")
+        if mods is not None:
+            base = os.path.dirname(os.path.abspath(path))
+            resolve = lambda mod: os.path.join(base, mod) if mod else None
+            grid["mod"] = [resolve(mod) for mod in mods] if isinstance(mods, list) else resolve(mods)
+        return grid
+        
+    def get_cells(self):
+        """获取网格取值的所有组合"""
+        names = list(self.grid)
+        return [dict(zip(names, values)) for values in itertools.product(*(self.grid[name] for name in names))]
+        
+    def get_key(self, cell: dict):
+        """由单元设置、模组文件内容和引擎版本获取缓存键"""
+        mod = cell["mod"]
+        if mod and mod not in self.mod_hashes:
+            with open(mod, "rb") as f:
+                self.mod_hashes[mod] = hashlib.sha256(f.read()).hexdigest()
+        scenario = dict(cell, mod=self.mod_hashes.get(mod), engine_version=ENGINE_VERSION)
+        return hashlib.sha256(json.dumps(scenario, sort_keys=True).encode()).hexdigest()
+        
+    def get_cache_path(self, key: str):
+        """获取结果的缓存文件"""
+        return os.path.join(self.cache_directory, f"{key}.json")
+        
+    def read_cached(self, key: str):
+        """获取缓存的结果，不存在时返回None"""
+        try:
+            with open(self.get_cache_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
             
-            order, message = self.factory.create_order(product, quantity, days)
-            if order:
-                self.app.log_event(f"AI创建了订单: {product} x{quantity}, {days}天内交货")
+    def write_cached(self, key: str, result: dict):
+        """缓存结果，以原子方式写入，使并行扫描不会读到不完整的文件"""
+        os.makedirs(self.cache_directory, exist_ok=True)
+        path = self.get_cache_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        os.replace(temp_path, path)
+        
+    @staticmethod
+    def run_cell(cell: dict):
+        """模拟一个单元，在工作进程中运行"""
+        factory = create_cli_factory(mod_path=cell["mod"])
+        if cell["initial_balance"] is not None:
+            factory.balance = cell["initial_balance"]
+        workers = cell["workers"]
+        if workers is not None:
+            while len(factory.workers) < workers:
+                factory.hire_worker(f"工人{len(factory.workers) + 1}", 3, 100)
+            for worker in factory.workers[workers:]:
+                factory.unassign_worker(worker.name)
+            del factory.workers[workers:]
+            
+        summary = simulate_headless(factory, cell["strategy"], cell["days"], cell["seed"])
+        return {metric: summary[metric] for metric in SweepRunner.METRICS + ("seconds",)}
+        
+    def run(self, progress=None):
+        """运行扫描，只模拟缓存中缺少的单元，每个单元返回一行"""
+        cells = self.get_cells()
+        keys = [self.get_key(cell) for cell in cells]
+        results = {key: self.read_cached(key) for key in set(keys)}
+        missing = {key: cell for key, cell in zip(keys, cells) if results[key] is None}
+        
+        def store(key, result):
+            results[key] = result
+            self.write_cached(key, result)
+            self.computed += 1
+            if progress:
+                progress(self.computed, len(missing))
                 
-    def hire_worker(self, name, skill_level, salary):
-        """雇佣工人"""
-        if self.factory.balance >= salary:
-            worker = self.factory.hire_worker(name, skill_level, salary)
-            self.app.log_event(f"AI雇佣了工人 {name}")
-            return worker
-        return None
-        
-    def analyze_factory(self):
-        """分析工厂状态"""
-        analysis = "=== AI分析报告 ===\n\n"
-        
-        # 资金分析
-        analysis += f"资金状况: ¥{self.factory.balance}\n"
-        if self.factory.balance < 200:
-            analysis += "警告: 资金不足!\n"
-        elif self.factory.balance > 1000:
-            analysis += "良好: 资金充足\n"
-        else:
-            analysis += "正常: 资金状况良好\n"
+        if missing:
+            try:
+                with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = {executor.submit(SweepRunner.run_cell, cell): key for key, cell in missing.items()}
+                    for future, key in futures.items():
+                        store(key, future.result())
+            except (OSError, NotImplementedError, BrokenProcessPool):
+                # 没有可用的进程池，在当前进程中模拟剩余单元
+                for key, cell in missing.items():
+                    if results[key] is None:
+                        store(key, SweepRunner.run_cell(cell))
+                        
+        return [dict(cell, **results[key], cached=key not in missing) for key, cell in zip(keys, cells)]
+        
+    def aggregate(self, rows):
+        """按种子对行取平均，其他维度的每种组合返回一行"""
+        dimensions = [name for name in self.grid if name != "seed"]
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row[name] for name in dimensions), []).append(row)
+        table = []
+        for values, group in groups.items():
+            entry = dict(zip(dimensions, values))
+            entry.update({metric: sum(row[metric] for row in group) / len(group) for metric in self.METRICS})
+            entry["runs"] = len(group)
+            table.append(entry)
+        return table
+        
+    def format_table(self, rows):
+        """以文本表格获取汇总行，只显示有多个取值的维度"""
+        dimensions = [name for name in self.grid if name != "seed" and len(self.grid[name]) > 1]
+        columns = dimensions + list(self.METRICS) + ["runs"]
+        
+        def format_value(name, value):
+            if name == "mod":
+                return os.path.basename(value) if value else "默认"
+            return f"{value:.2f}" if isinstance(value, float) else str(value)
             
-        analysis += "\n"
+        cells = [[format_value(name, row[name]) for name in columns] for row in self.aggregate(rows)]
+        widths = [max([len(name)] + [len(cell[index]) for cell in cells]) for index, name in enumerate(columns)]
+        lines = ["  ".join(name.rjust(width) for name, width in zip(columns, widths))]
+        lines += ["  ".join(value.rjust(width) for value, width in zip(cell, widths)) for cell in cells]
+        return "\n".join(lines)
+        
+    @staticmethod
+    def write_csv(path: str, rows):
+        """将每个单元一行写入CSV文件"""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else [])
+            writer.writeheader()
+            writer.writerows(rows)
+
+class SimulationSession:
+    """由模拟服务器托管的工厂"""
+    def __init__(self, session_id: int, factory: Factory, strategy: str = None, seed: int = 0):
+        self.session_id = session_id
+        self.factory = factory
+        self.strategy = strategy
+        self.ai = None
+        if strategy:
+            self.ai = FactoryAI(HeadlessApp(factory, log_limit=50))
+            self.ai.rng = random.Random(seed)
+            self.ai.strategy = strategy
+            self.ai.start()
+        self.steps = deque()  # 排队的推进请求: (future, 工作)
+        self.queued = False  # 会话是否在服务器的运行队列中等待
+        
+    def run_step(self, hours: int, days: int, work_hours: int):
+        """每次推进工厂一小时，每小时后让出以便其他会话运行"""
+        for _ in range(hours):
+            self.factory.advance_time(1)
+            yield True
+        for _ in range(days):
+            for _ in range(work_hours):
+                self.factory.advance_time(1)
+                yield True
+            self.factory.next_day()
+            yield True
+            
+    def run_slice(self, deadline: float):
+        """运行排队的推进直到截止时间，返回是否仍有工作"""
+        while self.steps:
+            future, work = self.steps[0]
+            try:
+                finished = not next(work, False)
+            except Exception as e:
+                finished = True
+                if not future.done():
+                    future.set_exception(RuntimeError(f"推进失败: {str(e)}"))
+            if finished:
+                self.steps.popleft()
+                if not future.done():
+                    future.set_result(self.get_summary())
+            if perf_counter() >= deadline:
+                break
+        return bool(self.steps)
+        
+    def close(self):
+        """停止AI并使排队的推进失败"""
+        if self.ai:
+            self.ai.stop()
+        for future, work in self.steps:
+            if not future.done():
+                future.set_exception(RuntimeError(f"会话 {self.session_id} 已关闭"))
+        self.steps.clear()
+        
+    def get_summary(self):
+        """获取会话摘要"""
+        return {
+            "session": self.session_id,
+            "day": self.factory.day,
+            "time": self.factory.current_time.isoformat(),
+            "balance": self.factory.balance,
+            "strategy": self.strategy,
+            "orders": self.factory.get_open_order_count(),
+            "queued_steps": len(self.steps)
+        }
+
+class SimulationServer:
+    """在本地JSON-RPC 2.0端点后托管多个独立工厂，每行一条消息"""
+    
+    # 调用方可运行的工厂命令，时间只能通过step推进
+    COMMANDS = frozenset(Journal.COMMANDS - {"run_ticks", "next_day"})
+    
+    # JSON-RPC错误码
+    PARSE_ERROR = -32700
+    INVALID_REQUEST = -32600
+    METHOD_NOT_FOUND = -32601
+    INVALID_PARAMS = -32602
+    SERVER_ERROR = -32000
+    
+    # 消息行的最大字节数
+    LINE_LIMIT = 16 * 1024 * 1024
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = SIMULATION_SERVER_PORT, max_sessions: int = 10000, 
+                 slice_seconds: float = 0.002):
+        self.host = host
+        self.port = port  # 启动后的实际端口，为0时使用任意空闲端口
+        self.max_sessions = max_sessions
+        self.slice_seconds = slice_seconds  # 会话运行多久后轮到下一个会话
+        self.sessions = {}  # 会话ID -> SimulationSession
+        self.next_session_id = 1
+        self.ready = deque()  # 有排队推进的会话，按轮转顺序
+        self.wakeup = None  # 会话加入运行队列时设置
+        self.server = None
+        self.scheduler = None
+        self.connections = {}  # 写入器 -> 应答该连接的任务
+        self.methods = {
+            "create": self.create_session,
+            "step": self.step_session,
+            "query": self.query_session,
+            "command": self.run_command,
+            "close": self.close_session,
+            "list": self.list_sessions
+        }
         
-        # 生产线分析
-        active_lines = sum(1 for line in self.factory.production_lines if line.is_active)
-        total_lines = len(self.factory.production_lines)
-        analysis += f"生产线: {active_lines}/{total_lines} 运行中\n"
+    async def start(self):
+        """开始监听和调度"""
+        self.wakeup = asyncio.Event()
+        self.scheduler = asyncio.create_task(self.run_scheduler())
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port, limit=self.LINE_LIMIT)
+        self.port = self.server.sockets[0].getsockname()[1]
         
-        if active_lines < total_lines:
-            analysis += "建议: 分配更多工人到生产线\n"
+    async def serve_forever(self):
+        """持续服务直到被取消"""
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
             
-        analysis += "\n"
-        
-        # 库存分析
-        low_stock_materials = []
-        for material, quantity in self.factory.material_inventory.items():
-            if quantity < 50:
-                low_stock_materials.append(material)
-                
-        if low_stock_materials:
-            analysis += f"低库存原材料: {', '.join(low_stock_materials)}\n"
-            analysis += "建议: 补充库存\n"
+    async def stop(self):
+        """停止监听并关闭所有会话"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.scheduler:
+            self.scheduler.cancel()
+            self.scheduler = None
+        for session in self.sessions.values():
+            session.close()
+        self.sessions.clear()
+        self.ready.clear()
+        for writer in self.connections:
+            writer.close()
+        if self.connections:
+            await asyncio.gather(*self.connections.values(), return_exceptions=True)
+        
+    async def run_scheduler(self):
+        """轮流给每个有排队推进的会话一个时间片"""
+        while True:
+            if not self.ready:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            session = self.ready.popleft()
+            if session.run_slice(perf_counter() + self.slice_seconds):
+                self.ready.append(session)
+            else:
+                session.queued = False
+            # 在时间片之间让连接读取请求并发送响应
+            await asyncio.sleep(0)
+            
+    async def handle_connection(self, reader, writer):
+        """应答一个连接的请求，每个请求在独立任务中运行，长时间推进不会阻塞其他请求"""
+        self.connections[writer] = asyncio.current_task()
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(self.handle_line(line, writer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            del self.connections[writer]
+            writer.close()
+            
+    async def handle_line(self, line: bytes, writer):
+        """应答一行请求"""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            response = self.get_error(None, self.PARSE_ERROR, "解析错误")
         else:
-            analysis += "原材料库存: 充足\n"
+            response = await self.handle_request(request)
+        if response is None or writer.is_closing():
+            return
+        writer.write(json.dumps(response, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8") + b"\n")
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
             
-        analysis += "\n"
-        
-        # 订单分析
-        active_orders = sum(1 for order in self.factory.orders if not order.is_completed)
-        analysis += f"进行中订单: {active_orders}\n"
-        
-        if active_orders < 2:
-            analysis += "建议: 创建更多订单\n"
+    async def handle_request(self, request):
+        """运行一个JSON-RPC请求，返回响应，通知返回None"""
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or not isinstance(request.get("method"), str):
+            return self.get_error(None, self.INVALID_REQUEST, "无效请求")
+        request_id = request.get("id")
+        method = self.methods.get(request["method"])
+        params = request.get("params", {})
+        if method is None:
+            response = self.get_error(request_id, self.METHOD_NOT_FOUND, f"方法不存在: {request['method']}")
+        elif not isinstance(params, dict):
+            response = self.get_error(request_id, self.INVALID_PARAMS, "参数必须为命名参数")
+        else:
+            try:
+                response = {"jsonrpc": "2.0", "id": request_id, "result": await method(params)}
+            except ValueError as e:
+                response = self.get_error(request_id, self.INVALID_PARAMS, str(e))
+            except Exception as e:
+                response = self.get_error(request_id, self.SERVER_ERROR, str(e))
+        return response if "id" in request else None
+        
+    @staticmethod
+    def get_error(request_id, code: int, message: str):
+        """创建错误响应"""
+        return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+        
+    @staticmethod
+    def check_params(params: dict, allowed):
+        """拒绝未知参数"""
+        unknown = set(params) - set(allowed)
+        if unknown:
+            raise ValueError(f"未知参数: {', '.join(sorted(unknown))}")
             
-        return analysis
+    @staticmethod
+    def get_count(params: dict, name: str, default: int = 0):
+        """获取非负整数参数"""
+        value = params.get(name, default)
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"{name} 必须是非负整数")
+        return value
+        
+    def get_session(self, params: dict):
+        """获取参数指定的会话"""
+        session = self.sessions.get(params.get("session"))
+        if session is None:
+            raise ValueError(f"未知会话: {params.get('session')}")
+        return session
+        
+    async def create_session(self, params: dict):
+        """创建新工厂或从存档、模组创建工厂，可选由AI运行"""
+        self.check_params(params, ("save", "mod", "strategy", "seed", "initial_balance"))
+        if len(self.sessions) >= self.max_sessions:
+            raise RuntimeError(f"已达到 {self.max_sessions} 个会话的上限")
+        strategy = params.get("strategy")
+        if strategy is not None and strategy not in FactoryAI.STRATEGY_POLICIES:
+            raise ValueError(f"未知策略: {strategy}")
+        try:
+            factory = create_cli_factory(params.get("save"), params.get("mod"))
+        except (OSError, KeyError) as e:
+            raise ValueError(f"无法创建工厂: {str(e)}")
+        if params.get("initial_balance") is not None:
+            factory.balance = params["initial_balance"]
+        session = SimulationSession(self.next_session_id, factory, strategy, self.get_count(params, "seed"))
+        self.sessions[session.session_id] = session
+        self.next_session_id += 1
+        return session.get_summary()
+        
+    async def step_session(self, params: dict):
+        """按小时和整天推进工厂，时间推进完成后应答"""
+        self.check_params(params, ("session", "hours", "days", "work_hours"))
+        session = self.get_session(params)
+        work = session.run_step(self.get_count(params, "hours"), self.get_count(params, "days"), 
+                                self.get_count(params, "work_hours", 8))
+        future = asyncio.get_running_loop().create_future()
+        session.steps.append((future, work))
+        if not session.queued:
+            session.queued = True
+            self.ready.append(session)
+            self.wakeup.set()
+        return await future
+        
+    async def query_session(self, params: dict):
+        """获取工厂状态，全部或指定字段"""
+        self.check_params(params, ("session", "fields"))
+        state = self.get_session(params).factory.to_dict()
+        fields = params.get("fields")
+        if fields is None:
+            return state
+        if not isinstance(fields, list):
+            raise ValueError("fields 必须是列表")
+        unknown = [field for field in fields if field not in state]
+        if unknown:
+            raise ValueError(f"未知字段: {', '.join(map(str, unknown))}")
+        return {field: state[field] for field in fields}
+        
+    async def run_command(self, params: dict):
+        """运行工厂命令，如hire_worker或purchase_material"""
+        self.check_params(params, ("session", "name", "args", "kwargs"))
+        session = self.get_session(params)
+        name = params.get("name")
+        if name not in self.COMMANDS:
+            raise ValueError(f"未知命令: {name}")
+        args, kwargs = params.get("args", []), params.get("kwargs", {})
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            raise ValueError("args 必须是列表，kwargs 必须是对象")
+        try:
+            return getattr(session.factory, name)(*args, **kwargs)
+        except TypeError as e:
+            raise ValueError(f"{name} 的参数无效: {str(e)}")
+            
+    async def close_session(self, params: dict):
+        """关闭会话"""
+        self.check_params(params, ("session",))
+        session = self.get_session(params)
+        del self.sessions[session.session_id]
+        if session.queued:
+            self.ready.remove(session)
+        session.close()
+        return True
+        
+    async def list_sessions(self, params: dict):
+        """获取所有会话的摘要"""
+        self.check_params(params, ())
+        return [session.get_summary() for session in self.sessions.values()]
+
+class SimulationClient:
+    """模拟服务器的asyncio客户端，调用可以并发进行"""
+    def __init__(self, host: str = "127.0.0.1", port: int = SIMULATION_SERVER_PORT):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.receiver = None
+        self.next_id = 1
+        self.pending = {}  # 请求ID -> 响应的future
+        
+    async def __aenter__(self):
+        await self.connect()
+        return self
+        
+    async def __aexit__(self, *exc_info):
+        await self.close()
+        
+    async def connect(self):
+        """连接到服务器"""
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, 
+                                                                 limit=SimulationServer.LINE_LIMIT)
+        self.receiver = asyncio.create_task(self.receive())
+        
+    async def close(self):
+        """关闭连接"""
+        if self.writer:
+            self.writer.close()
+            await self.receiver
+            self.writer = None
+            
+    async def receive(self):
+        """将响应交付给对应的调用"""
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self.pending.pop(response.get("id"), None)
+                if future and not future.done():
+                    future.set_result(response)
+        except (ValueError, ConnectionError):
+            pass
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("与模拟服务器的连接已断开"))
+        self.pending.clear()
+        
+    async def call(self, method: str, **params):
+        """调用服务器方法，返回其结果"""
+        request_id = self.next_id
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        request = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+        self.writer.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        await self.writer.drain()
+        response = await future
+        if "error" in response:
+            raise RuntimeError(f"{response['error']['message']}（错误码 {response['error']['code']}）")
+        return response["result"]
 
 class SettingsDialog:
     """设置对话框"""
@@ -1107,7 +5036,7 @@ class SettingsDialog:
         self.app = app
         self.window = tk.Toplevel(parent)
         self.window.title("设置")
-        self.window.geometry("400x410")
+        self.window.geometry("400x560")
         self.window.transient(parent)
         self.window.grab_set()
         self.window.resizable(False, False)
@@ -1187,6 +5116,34 @@ class SettingsDialog:
         
         self.scale_var.trace('w', update_scale_label)
         
+        # 模拟精度
+        tick_frame = ttk.LabelFrame(main_frame, text="模拟精度", padding="10")
+        tick_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        current_tick = next((name for name, minutes in TICK_RESOLUTIONS.items() 
+                             if minutes == self.app.factory.tick_minutes), "1分钟")
+        self.tick_var = tk.StringVar(value=current_tick)
+        tick_combo = ttk.Combobox(
+            tick_frame,
+            textvariable=self.tick_var,
+            values=list(TICK_RESOLUTIONS.keys()),
+            state="readonly"
+        )
+        tick_combo.pack(fill=tk.X, pady=5)
+        
+        # 自动保存
+        autosave_frame = ttk.LabelFrame(main_frame, text="自动保存", padding="10")
+        autosave_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        self.autosave_var = tk.StringVar(value=self.app.autosave_interval)
+        autosave_combo = ttk.Combobox(
+            autosave_frame,
+            textvariable=self.autosave_var,
+            values=list(AUTOSAVE_INTERVALS.keys()),
+            state="readonly"
+        )
+        autosave_combo.pack(fill=tk.X, pady=5)
+        
         # 按钮框架
         button_frame = ttk.Frame(main_frame)
         button_frame.pack(fill=tk.X, pady=(10, 0))
@@ -1227,6 +5184,16 @@ class SettingsDialog:
         if new_scale != self.app.scale_factor:
             self.app.set_scale_factor(new_scale)
         
+        # 更新模拟精度
+        new_tick = TICK_RESOLUTIONS[self.tick_var.get()]
+        if new_tick != self.app.factory.tick_minutes:
+            self.app.factory.set_tick_resolution(new_tick)
+            self.app.log_event(f"模拟精度已设置为: {self.tick_var.get()}")
+            
+        # 更新自动保存
+        if self.autosave_var.get() != self.app.autosave_interval:
+            self.app.set_autosave_interval(self.autosave_var.get())
+        
         messagebox.showinfo("成功", "设置已应用，部分设置需要重启程序才能完全生效。")
         self.window.destroy()
         
@@ -1235,6 +5202,172 @@ class SettingsDialog:
         self.resolution_var.set("1920x1080")
         self.window_mode_var.set("windowed")
         self.scale_var.set(1.0)
+        self.tick_var.set("1分钟")
+        self.autosave_var.set("关闭")
+
+class ScenarioDialog:
+    """比较候选操作的假设分析"""
+    def __init__(self, parent, app):
+        self.app = app
+        self.analyzer = None
+        self.window = tk.Toplevel(parent)
+        self.window.title("假设分析")
+        self.window.geometry("860x520")
+        self.window.transient(parent)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        self.create_widgets()
+        
+    def create_widgets(self):
+        """创建假设分析界面"""
+        main_frame = ttk.Frame(self.window, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        candidate_frame = ttk.LabelFrame(main_frame, text="候选操作", padding="10")
+        candidate_frame.pack(fill=tk.X, pady=(0, 10))
+        self.candidate_vars = []
+        for index, (action, argument) in enumerate(ScenarioAnalyzer.DEFAULT_CANDIDATES):
+            var = tk.BooleanVar(value=True)
+            ttk.Checkbutton(candidate_frame, text=ScenarioAnalyzer.describe(action, argument), 
+                            variable=var).grid(row=index // 2, column=index % 2, sticky=tk.W, padx=5)
+            self.candidate_vars.append(((action, argument), var))
+            
+        option_frame = ttk.Frame(main_frame)
+        option_frame.pack(fill=tk.X, pady=(0, 10))
+        ttk.Label(option_frame, text="模拟天数:").pack(side=tk.LEFT)
+        self.days_var = tk.IntVar(value=7)
+        ttk.Spinbox(option_frame, from_=1, to=60, textvariable=self.days_var, width=5).pack(side=tk.LEFT, padx=5)
+        ttk.Label(option_frame, text="每个候选运行次数:").pack(side=tk.LEFT, padx=(10, 0))
+        self.runs_var = tk.IntVar(value=4)
+        ttk.Spinbox(option_frame, from_=1, to=20, textvariable=self.runs_var, width=5).pack(side=tk.LEFT, padx=5)
+        self.run_button = ttk.Button(option_frame, text="运行分析", command=self.run_analysis)
+        self.run_button.pack(side=tk.LEFT, padx=10)
+        self.status_label = ttk.Label(option_frame, text="")
+        self.status_label.pack(side=tk.LEFT)
+        
+        columns = ("rank", "candidate", "balance", "profit", "throughput", "orders", "late")
+        headings = ("排名", "候选", "余额", "利润", "产出", "订单", "逾期订单")
+        self.tree = ttk.Treeview(main_frame, columns=columns, show="headings")
+        for column, heading in zip(columns, headings):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=300 if column == "candidate" else 80)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        
+    def run_analysis(self):
+        """开始模拟选中的候选"""
+        candidates = [candidate for candidate, var in self.candidate_vars if var.get()]
+        if not candidates:
+            messagebox.showwarning("警告", "请至少选择一个候选操作!")
+            return
+            
+        self.analyzer = ScenarioAnalyzer(self.app.factory, self.app.ai_strategy_var.get(), 
+                                         self.days_var.get(), self.runs_var.get())
+        self.run_button.config(state=tk.DISABLED)
+        self.status_label.config(text="模拟中...")
+        self.analyzer.start(candidates)
+        self.poll_results()
+        
+    def poll_results(self):
+        """所有模拟完成后显示结果"""
+        if self.analyzer is None:
+            return
+        if not self.analyzer.is_done():
+            self.window.after(100, self.poll_results)
+            return
+            
+        self.tree.delete(*self.tree.get_children())
+        for rank, result in enumerate(self.analyzer.get_results(), 1):
+            note = "" if result["applied"] else "（资金不足）"
+            self.tree.insert("", tk.END, values=(
+                rank, result["description"] + note, f"¥{result['balance']:.2f}", f"¥{result['profit']:.2f}",
+                f"{result['throughput']:.1f}", f"{result['orders_completed']:.1f}", f"{result['late_orders']:.1f}"
+            ))
+        self.run_button.config(state=tk.NORMAL)
+        self.status_label.config(text="完成")
+        
+    def close(self):
+        """停止正在运行的模拟并关闭"""
+        if self.analyzer is not None:
+            self.analyzer.close()
+            self.analyzer = None
+        self.window.destroy()
+
+class SaveBrowserDialog:
+    """根据存档头列出存档的存档浏览器"""
+    def __init__(self, parent, app):
+        self.app = app
+        self.directory = AUTOSAVE_DIRECTORY
+        self.saves = []
+        self.window = tk.Toplevel(parent)
+        self.window.title("浏览存档")
+        self.window.geometry("820x460")
+        self.window.transient(parent)
+        
+        self.create_widgets()
+        self.refresh()
+        
+    def create_widgets(self):
+        """创建存档浏览器界面"""
+        main_frame = ttk.Frame(self.window, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        directory_frame = ttk.Frame(main_frame)
+        directory_frame.pack(fill=tk.X, pady=(0, 5))
+        self.directory_label = ttk.Label(directory_frame, text="")
+        self.directory_label.pack(side=tk.LEFT)
+        ttk.Button(directory_frame, text="更改文件夹", command=self.change_directory).pack(side=tk.RIGHT)
+        
+        columns = ("factory", "day", "balance", "mod", "saved_at", "kind", "version")
+        headings = ("工厂", "天数", "余额", "模组", "保存时间", "类型", "版本")
+        self.tree = ttk.Treeview(main_frame, columns=columns, show="headings")
+        for column, heading in zip(columns, headings):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=150 if column in ("factory", "saved_at", "mod") else 70)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.tree.bind("<Double-1>", lambda e: self.load_selected())
+        
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill=tk.X, pady=(10, 0))
+        ttk.Button(button_frame, text="加载", command=self.load_selected).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="刷新", command=self.refresh).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="关闭", command=self.window.destroy).pack(side=tk.RIGHT)
+        
+    def change_directory(self):
+        """选择要浏览的文件夹"""
+        directory = filedialog.askdirectory(title="选择存档文件夹")
+        if directory:
+            self.directory = directory
+            self.refresh()
+            
+    def refresh(self):
+        """列出当前文件夹的存档"""
+        self.directory_label.config(text=f"文件夹: {self.directory}")
+        self.tree.delete(*self.tree.get_children())
+        if not os.path.isdir(self.directory):
+            self.saves = []
+            return
+            
+        self.saves = SaveIndex(self.directory).list_saves()
+        for index, (path, header) in enumerate(self.saves):
+            self.tree.insert("", tk.END, iid=str(index), values=(
+                header.get("name", ""),
+                header.get("day", ""),
+                f"¥{header.get('balance', 0):.2f}",
+                header.get("mod") or "",
+                header.get("saved_at") or "",
+                header.get("kind", ""),
+                header.get("engine_version") or ""
+            ))
+            
+    def load_selected(self):
+        """加载选中的存档"""
+        selection = self.tree.selection()
+        if not selection:
+            messagebox.showwarning("警告", "请先选择一个存档!")
+            return
+        path, header = self.saves[int(selection[0])]
+        self.window.destroy()
+        self.app.load_game_file(path)
 
 class FactorySimulatorGUI:
     """工厂模拟器GUI"""
@@ -1246,6 +5379,7 @@ class FactorySimulatorGUI:
         self.resolution_config = ResolutionConfig()
         self.window_mode = "windowed"  # windowed 或 fullscreen
         self.scale_factor = 1.0
+        self.autosave_interval = "关闭"
         
         # 设置窗口初始大小和位置
         self.setup_window()
@@ -1254,14 +5388,26 @@ class FactorySimulatorGUI:
         self.factory = Factory("高效加工厂", initial_balance=420)
         self.setup_factory()
         
+        # 记录模拟事件
+        self.factory.events.subscribe(
+            self.on_simulation_events,
+            event_types=(SimEvent.PRODUCTION_COMPLETED, SimEvent.CRAFT_COMPLETED, 
+                         SimEvent.ORDER_COMPLETED, SimEvent.ORDER_OVERDUE, SimEvent.STOCK_LOW),
+            batch=True
+        )
+        
         # 当前模组
         self.current_mod = None
         
         # 是否正在运行模拟
         self.simulation_running = False
+        
+        # 从启动到绘制第一帧的秒数，绘制后设置
+        self.startup_time = None
 
         # 创建AI玩家
         self.ai_player = FactoryAI(self)
+        self.ai_player.scheduler = self.root.after
         
         # 创建GUI
         self.create_widgets()
@@ -1269,11 +5415,6 @@ class FactorySimulatorGUI:
         # 启动定时更新
         self.update_display()
 
-    def check_ai_decision(self):
-        """检查并执行AI决策"""
-        if hasattr(self, 'ai_player') and self.ai_player.running:
-            self.ai_player.make_daily_decisions()
-
     def toggle_ai_player(self):
         """切换AI玩家运行状态"""
         if self.ai_player.running:
@@ -1283,6 +5424,7 @@ class FactorySimulatorGUI:
         else:
             self.ai_player.strategy = self.ai_strategy_var.get()
             self.ai_player.start()
+            self.update_display()
             self.ai_start_button.config(text="停止AI玩家")
             self.ai_status_label.config(text="AI状态: 运行中", foreground="green")
 
@@ -1296,10 +5438,21 @@ class FactorySimulatorGUI:
         """AI单步执行"""
         if not self.ai_player.running:
             self.ai_player.strategy = self.ai_strategy_var.get()
-            self.ai_player.make_daily_decisions()
+            self.ai_player.make_decisions()
             self.update_display()
             self.log_event("AI执行了单步决策")
 
+    def report_startup_time(self, start: float):
+        """记录从启动到绘制第一帧的时间"""
+        self.startup_time = perf_counter() - start
+        self.log_event(f"启动用时 {self.startup_time:.2f} 秒")
+        if self.startup_time > STARTUP_TIME_BUDGET:
+            self.log_event(f"警告: 启动时间超出 {STARTUP_TIME_BUDGET:.1f} 秒的预算")
+
+    def show_scenario_analysis(self):
+        """打开假设分析"""
+        ScenarioDialog(self.root, self)
+        
     def show_ai_analysis(self):
         """显示AI分析"""
         analysis = self.ai_player.analyze_factory()
@@ -1369,54 +5522,7 @@ class FactorySimulatorGUI:
 
     def setup_factory(self):
         """初始化工厂数据"""
-        # 添加原材料
-        self.factory.add_material("木材", cost=1, unit="单位", initial_quantity=100)
-        self.factory.add_material("金属", cost=2, unit="单位", initial_quantity=50)
-        self.factory.add_material("塑料", cost=0.5, unit="单位", initial_quantity=200)
-        self.factory.add_material("螺丝", cost=0.1, unit="个", initial_quantity=500)
-        
-        # 添加产品
-        chair = Product("木椅", production_time=60, sale_price=20)
-        chair.add_material_requirement("木材", 5)
-        self.factory.add_product(chair)
-        
-        table = Product("木桌", production_time=120, sale_price=40)
-        table.add_material_requirement("木材", 10)
-        self.factory.add_product(table)
-        
-        cabinet = Product("木柜", production_time=180, sale_price=60)
-        cabinet.add_material_requirement("木材", 15)
-        cabinet.add_material_requirement("金属", 2)
-        self.factory.add_product(cabinet)
-        
-        # 添加可合成的产品和材料
-        # 合成材料：金属板（由2金属合成）
-        metal_plate = Material("金属板", cost=3, unit="块")
-        metal_plate.add_material_requirement("金属", 2)
-        self.factory.add_material(metal_plate.name, metal_plate.cost, metal_plate.unit, 0)
-        self.factory.materials["金属板"].is_craftable = True
-        self.factory.materials["金属板"].materials_required = metal_plate.materials_required.copy()
-        
-        # 合成产品：高级椅子（由木椅和金属板合成）
-        premium_chair = Product("高级椅子", production_time=90, sale_price=50)
-        premium_chair.add_product_requirement("木椅", 1)
-        premium_chair.add_material_requirement("金属板", 1)
-        premium_chair.add_material_requirement("螺丝", 4)
-        self.factory.add_product(premium_chair)
-        
-        # 添加生产线
-        self.factory.add_production_line(capacity=10)
-        self.factory.add_production_line(capacity=10)
-        
-        # 添加合成站
-        self.factory.add_crafting_station("基础合成台", capacity=5)
-        self.factory.add_crafting_station("高级合成台", capacity=3)
-        
-        # 雇佣工人
-        self.factory.hire_worker("工人A", 3, 100)
-        self.factory.hire_worker("工人B", 2, 80)
-        self.factory.hire_worker("工人C", 4, 120)
-        self.factory.hire_worker("工人D", 3, 100)
+        self.factory.setup_default()
         
         # 分配工人到生产线和合成站
         
@@ -1435,6 +5541,7 @@ class FactorySimulatorGUI:
         """创建GUI组件"""
         # 创建菜单栏
         self.create_menu()
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_app)
         
         # 创建主框架
         main_frame = ttk.Frame(self.root, padding="10")
@@ -1487,8 +5594,16 @@ class FactorySimulatorGUI:
         menubar.add_cascade(label="文件", menu=file_menu)
         file_menu.add_command(label="保存游戏", command=self.save_game)
         file_menu.add_command(label="加载游戏", command=self.load_game)
+        file_menu.add_command(label="浏览存档", command=self.browse_saves)
+        file_menu.add_command(label="启动崩溃日志", command=self.start_crash_journal)
+        file_menu.add_command(label="从日志恢复", command=self.recover_from_journal)
+        file_menu.add_separator()
+        file_menu.add_command(label="开始导出历史", command=self.start_history_export)
+        file_menu.add_command(label="停止导出历史", command=self.stop_history_export)
+        file_menu.add_command(label="打开历史数据库", command=self.open_history_database)
+        file_menu.add_command(label="历史报告", command=self.show_history_report)
         file_menu.add_separator()
-        file_menu.add_command(label="退出", command=self.root.quit)
+        file_menu.add_command(label="退出", command=self.exit_app)
         
         # 设置菜单
         settings_menu = tk.Menu(menubar, tearoff=0)
@@ -1548,25 +5663,16 @@ class FactorySimulatorGUI:
             try:
                 # 保存游戏状态到文件
                 game_state = {
-                    "factory": {
-                        "name": self.factory.name,
-                        "balance": self.factory.balance,
-                        "day": self.factory.day,
-                        "current_time": self.factory.current_time.isoformat(),
-                        "material_inventory": self.factory.material_inventory,
-                        "product_inventory": self.factory.product_inventory,
-                        "daily_costs": self.factory.daily_costs,
-                        "daily_income": self.factory.daily_income
-                    },
+                    "factory": self.factory.to_dict(),
                     "settings": {
                         "resolution": self.resolution_config.current_resolution,
                         "window_mode": self.window_mode,
-                        "scale_factor": self.scale_factor
+                        "scale_factor": self.scale_factor,
+                        "tick_minutes": self.factory.tick_minutes
                     }
                 }
                 
-                with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(game_state, f, indent=4, ensure_ascii=False)
+                SaveFile.write(filename, game_state, header=SaveFile.get_header(self.factory, "manual"))
                     
                 messagebox.showinfo("成功", f"游戏已保存到: {filename}")
             except Exception as e:
@@ -1580,31 +5686,146 @@ class FactorySimulatorGUI:
         )
         
         if filename:
-            try:
-                with open(filename, 'r', encoding='utf-8') as f:
-                    game_state = json.load(f)
-                
-                # 恢复工厂状态
-                factory_data = game_state["factory"]
+            self.load_game_file(filename)
+            
+    def browse_saves(self):
+        """打开存档浏览器"""
+        SaveBrowserDialog(self.root, self)
+        
+    def load_game_file(self, filename):
+        """从存档文件加载游戏"""
+        try:
+            game_state = SaveFile.read(filename)
+            
+            # 恢复工厂状态
+            factory_data = game_state["factory"]
+            if "production_lines" in factory_data:
+                self.factory.restore_state(factory_data)
+            else:
+                # 旧版本存档只包含余额、时间和库存
                 self.factory.name = factory_data["name"]
                 self.factory.balance = factory_data["balance"]
                 self.factory.day = factory_data["day"]
                 self.factory.current_time = datetime.fromisoformat(factory_data["current_time"])
-                self.factory.material_inventory = factory_data["material_inventory"]
-                self.factory.product_inventory = factory_data["product_inventory"]
+                self.factory.material_inventory.replace(factory_data["material_inventory"])
+                self.factory.product_inventory.replace(factory_data["product_inventory"])
                 self.factory.daily_costs = factory_data["daily_costs"]
                 self.factory.daily_income = factory_data["daily_income"]
-                
-                # 恢复设置
-                settings_data = game_state["settings"]
+            
+            # 恢复设置，自动保存没有设置
+            settings_data = game_state.get("settings")
+            if settings_data:
                 self.resolution_config.set_resolution(settings_data["resolution"])
                 self.set_window_mode(settings_data["window_mode"])
                 self.set_scale_factor(settings_data["scale_factor"])
+                self.factory.set_tick_resolution(settings_data.get("tick_minutes", 1))
+            self.factory.checkpoint()
+            
+            self.update_display()
+            messagebox.showinfo("成功", f"游戏已从 {filename} 加载")
+        except Exception as e:
+            messagebox.showerror("错误", f"加载游戏失败: {str(e)}")
+            
+    def set_autosave_interval(self, interval_name):
+        """设置自动保存间隔"""
+        self.autosave_interval = interval_name
+        interval = AUTOSAVE_INTERVALS[interval_name]
+        if interval is None:
+            success, message = self.factory.stop_autosave()
+        else:
+            success, message = self.factory.start_autosave(AUTOSAVE_DIRECTORY, *interval)
+        self.log_event(message)
+        
+    def start_crash_journal(self):
+        """记录所有命令以便崩溃后恢复游戏"""
+        directory = filedialog.askdirectory(title="选择日志目录")
+        if directory:
+            success, message = self.factory.start_journal(directory)
+            if success:
+                self.log_event(message)
+            else:
+                messagebox.showerror("错误", message)
                 
+    def recover_from_journal(self):
+        """恢复日志目录中记录的游戏"""
+        directory = filedialog.askdirectory(title="选择日志目录")
+        if directory:
+            success, message = self.factory.recover_journal(directory)
+            if success:
                 self.update_display()
-                messagebox.showinfo("成功", f"游戏已从 {filename} 加载")
-            except Exception as e:
-                messagebox.showerror("错误", f"加载游戏失败: {str(e)}")
+                self.log_event(message)
+            else:
+                messagebox.showerror("错误", message)
+                
+    def start_history_export(self):
+        """开始将模拟历史流式写入文件"""
+        filetypes = [("CSV Files", "*.csv")]
+        if import_pyarrow():
+            filetypes += [("Parquet Files", "*.parquet"), ("Arrow Stream Files", "*.arrow")]
+        filename = filedialog.asksaveasfilename(
+            title="导出历史",
+            defaultextension=".csv",
+            filetypes=filetypes
+        )
+        
+        if filename:
+            success, message = self.factory.start_export(filename)
+            if success:
+                self.log_event(message)
+            else:
+                messagebox.showerror("错误", message)
+                
+    def stop_history_export(self):
+        """停止流式写入模拟历史"""
+        success, message = self.factory.stop_export()
+        self.log_event(message)
+        
+    def open_history_database(self):
+        """将历史记录到SQLite数据库"""
+        filename = filedialog.asksaveasfilename(
+            title="打开历史数据库",
+            defaultextension=".db",
+            filetypes=[("SQLite Database", "*.db")],
+            confirmoverwrite=False
+        )
+        
+        if filename:
+            success, message = self.factory.open_history(filename)
+            if success:
+                self.log_event(message)
+            else:
+                messagebox.showerror("错误", message)
+                
+    def show_history_report(self):
+        """显示最近30天的收入和生产情况"""
+        history = self.factory.history
+        if history is None:
+            messagebox.showwarning("警告", "没有打开的历史数据库!")
+            return
+            
+        report = "=== 最近30天 ===\n\n各产品收入:\n"
+        for product, revenue in history.get_revenue_by_product(30):
+            report += f"  {product}: ¥{revenue:.2f}\n"
+        report += "\n产量:\n"
+        for item, units in history.get_production_by_item(30):
+            report += f"  {item}: {units}件\n"
+        report += "\n现金流:\n"
+        for kind, amount in history.get_cash_flow(30):
+            report += f"  {kind}: ¥{amount:.2f}\n"
+        report += f"\n已完成订单 (全部): {history.get_completed_order_count()}\n"
+        messagebox.showinfo("历史报告", report)
+        
+    def exit_app(self):
+        """完成待写入的输出并退出"""
+        if self.factory.exporter is not None:
+            self.factory.stop_export()
+        if self.factory.history is not None:
+            self.factory.close_history()
+        if self.factory.journal is not None:
+            self.factory.stop_journal()
+        if self.factory.autosaver is not None:
+            self.factory.stop_autosave()
+        self.root.quit()
     
     def create_control_panel(self, parent):
         """创建控制面板"""
@@ -1638,7 +5859,8 @@ class FactorySimulatorGUI:
         ttk.Label(strategy_frame, text="AI策略:").pack(side=tk.LEFT)
         
         self.ai_strategy_var = tk.StringVar(value="balanced")
-        strategies = [("平衡发展", "balanced"), ("积极扩张", "aggressive"), ("保守经营", "conservative")]
+        strategies = [("平衡发展", "balanced"), ("积极扩张", "aggressive"), ("保守经营", "conservative"), 
+                      ("推演规划", "planning")]
         
         for text, value in strategies:
             ttk.Radiobutton(strategy_frame, text=text, variable=self.ai_strategy_var, 
@@ -1653,6 +5875,7 @@ class FactorySimulatorGUI:
         
         ttk.Button(button_frame, text="单步执行", command=self.ai_single_step).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="AI分析", command=self.show_ai_analysis).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="假设分析", command=self.show_scenario_analysis).pack(side=tk.LEFT, padx=5)
     
         # 状态显示
         status_frame = ttk.Frame(ai_frame)
@@ -1788,48 +6011,36 @@ class FactorySimulatorGUI:
             delay = int(1000 / speed)  # 转换为毫秒
             self.root.after(delay, self.auto_advance_time)
     
-    def log_event(self, message):
+    def log_event(self, message, time=None):
         """记录事件到日志"""
-        self.log_text.insert(tk.END, f"{self.factory.current_time.strftime('%H:%M')} - {message}\n")
+        time = time or self.factory.current_time
+        self.log_text.insert(tk.END, f"{time.strftime('%H:%M')} - {message}\n")
         self.log_text.see(tk.END)
+        
+    def on_simulation_events(self, events):
+        """记录一批模拟事件"""
+        for event in events:
+            data = event.data
+            if event.event_type == SimEvent.PRODUCTION_COMPLETED:
+                self.log_event(f"完成了 {data['product']} 的生产!", event.time)
+            elif event.event_type == SimEvent.CRAFT_COMPLETED:
+                item_type = "产品" if data["is_product"] else "材料"
+                self.log_event(f"合成了 {data['item']} {item_type}!", event.time)
+            elif event.event_type == SimEvent.ORDER_COMPLETED:
+                self.log_event(f"订单 {data['order_id']} 已完成，收入 ¥{data['income']}", event.time)
+            elif event.event_type == SimEvent.ORDER_OVERDUE:
+                self.log_event(f"警告: 订单 {data['order_id']} 已逾期!", event.time)
+            elif event.event_type == SimEvent.STOCK_LOW:
+                self.log_event(f"警告: {data['item']} 库存不足，剩余 {data['quantity']} 件", event.time)
     
     def advance_one_hour(self):
         """推进1小时"""
-        completed_products, completed_crafting, overdue_orders = self.factory.advance_time(1)
-        
-        for product in completed_products:
-            self.log_event(f"完成了 {product} 的生产!")
-            
-        for item, is_product in completed_crafting:
-            item_type = "产品" if is_product else "材料"
-            self.log_event(f"合成了 {item} {item_type}!")
-            
-        for order_id in overdue_orders:
-            self.log_event(f"警告: 订单 {order_id} 已逾期!")
-            
-        # 检查AI决策
-        self.check_ai_decision()
-            
+        self.factory.advance_time(1)
         self.update_display()
     
     def advance_eight_hours(self):
         """推进8小时"""
-        for _ in range(8):
-            completed_products, completed_crafting, overdue_orders = self.factory.advance_time(1)
-            
-            for product in completed_products:
-                self.log_event(f"完成了 {product} 的生产!")
-                
-            for item, is_product in completed_crafting:
-                item_type = "产品" if is_product else "材料"
-                self.log_event(f"合成了 {item} {item_type}!")
-                
-            for order_id in overdue_orders:
-                self.log_event(f"警告: 订单 {order_id} 已逾期!")
-                
-        # 检查AI决策
-        self.check_ai_decision()
-                
+        self.factory.advance_time(8)
         self.update_display()
     
     def next_day(self):
@@ -1837,10 +6048,6 @@ class FactorySimulatorGUI:
         success, message, daily_profit = self.factory.next_day()
         self.log_event(message)
         self.log_event(f"昨日利润: ¥{daily_profit}")
-        
-        # 触发AI决策
-        self.check_ai_decision()
-        
         self.update_display()
     
     def toggle_auto_simulation(self):
@@ -2307,25 +6514,15 @@ class ModCreator:
         notebook.add(info_tab, text="基本信息")
         self.create_info_tab(info_tab)
         
-        # 原材料标签页
-        material_tab = ttk.Frame(notebook)
-        notebook.add(material_tab, text="原材料")
-        self.create_material_tab(material_tab)
-        
-        # 产品标签页
-        product_tab = ttk.Frame(notebook)
-        notebook.add(product_tab, text="产品")
-        self.create_product_tab(product_tab)
-        
-        # 合成配方标签页
-        recipe_tab = ttk.Frame(notebook)
-        notebook.add(recipe_tab, text="合成配方")
-        self.create_recipe_tab(recipe_tab)
-        
-        # 工人标签页
-        worker_tab = ttk.Frame(notebook)
-        notebook.add(worker_tab, text="工人")
-        self.create_worker_tab(worker_tab)
+        # 原材料、产品、合成配方和工人标签页在首次显示时才创建
+        self.material_listbox = self.product_listbox = self.recipe_tree = self.worker_listbox = None
+        self.pending_tabs = {}  # 标签页控件名 -> (创建方法, 标签页)
+        for text, builder in (("原材料", self.create_material_tab), ("产品", self.create_product_tab), 
+                              ("合成配方", self.create_recipe_tab), ("工人", self.create_worker_tab)):
+            tab = ttk.Frame(notebook)
+            notebook.add(tab, text=text)
+            self.pending_tabs[str(tab)] = (builder, tab)
+        notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         
         # 操作按钮
         action_frame = ttk.Frame(self.window)
@@ -2336,6 +6533,13 @@ class ModCreator:
         ttk.Button(action_frame, text="应用模组", command=self.apply_mod).pack(side=tk.LEFT, padx=5)
         ttk.Button(action_frame, text="关闭", command=self.window.destroy).pack(side=tk.RIGHT, padx=5)
         
+    def on_tab_changed(self, event):
+        """标签页首次被选中时创建其内容"""
+        pending = self.pending_tabs.pop(event.widget.select(), None)
+        if pending:
+            builder, tab = pending
+            builder(tab)
+            
     def create_info_tab(self, parent):
         """创建基本信息标签页"""
         info_frame = ttk.LabelFrame(parent, text="模组基本信息", padding="10")
@@ -2492,24 +6696,32 @@ class ModCreator:
     
     def update_material_list(self):
         """更新原材料列表"""
+        if self.material_listbox is None:  # 标签页尚未创建
+            return
         self.material_listbox.delete(0, tk.END)
         for material in self.mod.materials:
             self.material_listbox.insert(tk.END, str(material))
     
     def update_product_list(self):
         """更新产品列表"""
+        if self.product_listbox is None:  # 标签页尚未创建
+            return
         self.product_listbox.delete(0, tk.END)
         for product in self.mod.products:
             self.product_listbox.insert(tk.END, str(product))
     
     def update_worker_list(self):
         """更新工人列表"""
+        if self.worker_listbox is None:  # 标签页尚未创建
+            return
         self.worker_listbox.delete(0, tk.END)
         for worker in self.mod.initial_workers:
             self.worker_listbox.insert(tk.END, str(worker))
     
     def update_recipe_list(self):
         """更新配方列表"""
+        if self.recipe_tree is None:  # 标签页尚未创建
+            return
         self.recipe_tree.delete(*self.recipe_tree.get_children())
         
         # 添加可合成的材料
@@ -3172,11 +7384,225 @@ class ModCreator:
         messagebox.showinfo("成功", "模组已应用到游戏!")
         self.window.destroy()
 
+def create_cli_factory(save_path: str = None, mod_path: str = None):
+    """创建命令的起始工厂"""
+    factory = Factory("高效加工厂", initial_balance=420, start_time=CLI_START_TIME)
+    if save_path:
+        factory.restore_state(SaveFile.read(save_path)["factory"])
+    else:
+        factory.setup_default()
+    if mod_path:
+        factory.load_mod(Mod.load_from_file(mod_path))
+    return factory
+
+def simulate_headless(factory: Factory, strategy: str, days: int, seed: int = 0):
+    """在无显示的情况下让AI按整天运行工厂，返回汇总指标"""
+    start = perf_counter()
+    start_balance = factory.balance
+    counts = {SimEvent.PRODUCTION_COMPLETED: 0, SimEvent.ORDER_COMPLETED: 0, 
+              SimEvent.ORDER_OVERDUE: 0, SimEvent.PAYROLL_FAILED: 0}
+    produced = {}  # 每种产品完成的数量
+    
+    def count_events(events):
+        for event in events:
+            counts[event.event_type] += 1
+            if event.event_type == SimEvent.PRODUCTION_COMPLETED:
+                produced[event.data["product"]] = produced.get(event.data["product"], 0) + 1
+                
+    subscription = factory.events.subscribe(count_events, event_types=tuple(counts), batch=True)
+    ai = FactoryAI(HeadlessApp(factory, log_limit=1))
+    ai.rng = random.Random(seed)
+    ai.strategy = strategy
+    ai.start()
+    daily_profits = factory.run_days(days)
+    ai.stop()
+    factory.events.unsubscribe(subscription)
+    return {
+        "balance": factory.balance,
+        "profit": factory.balance - start_balance,
+        "produced": counts[SimEvent.PRODUCTION_COMPLETED],
+        "produced_by_product": produced,
+        "orders_completed": counts[SimEvent.ORDER_COMPLETED],
+        "late_orders": counts[SimEvent.ORDER_OVERDUE],
+        "payroll_failures": counts[SimEvent.PAYROLL_FAILED],
+        "workers": len(factory.workers),
+        "production_lines": len(factory.production_lines),
+        "daily_profits": daily_profits,
+        "seconds": perf_counter() - start
+    }
+
+def run_what_if(args):
+    """从命令行运行假设分析"""
+    factory = create_cli_factory(args.save)
+    analyzer = ScenarioAnalyzer(factory, args.strategy, args.days, args.runs, args.seed, args.workers)
+    start = perf_counter()
+    analyzer.run()
+    print(analyzer.format_table())
+    print(f"\n{len(analyzer.candidates) * analyzer.runs}次{args.days}天的模拟，用时{perf_counter() - start:.2f}秒")
+
+def run_tune(args):
+    """从命令行调优AI参数"""
+    factory = create_cli_factory(args.save)
+    tuner = ParameterTuner(factory, args.strategy, args.days, args.seeds, args.population, args.generations, 
+                           args.seed, args.workers, args.cache)
+    start = perf_counter()
+    score, params = tuner.run(lambda generation, best: print(f"第{generation + 1}代: 最佳得分 {best:.2f}"))
+    print(f"\n最佳参数（{tuner.evaluations}次模拟，用时{perf_counter() - start:.2f}秒）:")
+    for name, value in params.items():
+        print(f"  {name}: {value}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(params, f, indent=2)
+
+def run_simulate(args):
+    """从命令行运行一次无界面模拟"""
+    factory = create_cli_factory(args.save, args.mod)
+    summary = simulate_headless(factory, args.strategy, args.days, args.seed)
+    days_per_second = args.days / summary["seconds"] if summary["seconds"] else float("inf")
+    print(f"使用{args.strategy}策略模拟了{args.days}天，用时{summary['seconds']:.2f}秒"
+          f"（每秒{days_per_second:.1f}天）")
+    print(f"  最终余额：{summary['balance']:.2f}")
+    print(f"  利润：{summary['profit']:.2f}")
+    print(f"  生产数量：{summary['produced']}")
+    print(f"  完成订单：{summary['orders_completed']}")
+    print(f"  逾期订单：{summary['late_orders']}")
+    print(f"  工资发放失败：{summary['payroll_failures']}")
+    print(f"  工人：{summary['workers']}，生产线：{summary['production_lines']}")
+    if args.out:
+        settings = {"save": args.save, "mod": args.mod, "strategy": args.strategy, "days": args.days, "seed": args.seed}
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "engine_version": ENGINE_VERSION, **summary}, f, indent=2)
+
+def run_serve(args):
+    """从命令行提供模拟会话服务"""
+    async def serve():
+        server = SimulationServer(args.host, args.port, args.max_sessions)
+        await server.start()
+        print(f"模拟服务运行于 {server.host}:{server.port}，按 Ctrl+C 停止", flush=True)
+        await server.serve_forever()
+        
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+def run_call(args):
+    """从命令行调用模拟服务器方法"""
+    async def call():
+        async with SimulationClient(args.host, args.port) as client:
+            return await client.call(args.method, **params)
+            
+    params = json.loads(args.params) if args.params else {}
+    if not isinstance(params, dict):
+        raise SystemExit("错误: 参数必须是JSON对象")
+    try:
+        result = asyncio.run(call())
+    except (RuntimeError, OSError) as e:
+        raise SystemExit(f"错误: {str(e)}")
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+def run_sweep(args):
+    """从命令行运行参数扫描"""
+    runner = SweepRunner(SweepRunner.load_grid(args.grid), args.cache, args.workers)
+    start = perf_counter()
+    rows = runner.run(lambda done, total: print(f"已模拟 {done}/{total}", end="\r"))
+    if runner.computed:
+        print()
+    print(runner.format_table(rows))
+    print(f"\n{len(rows)}个单元，模拟{runner.computed}个，缓存{len(rows) - runner.computed}个，"
+          f"用时{perf_counter() - start:.2f}秒")
+    if args.out:
+        SweepRunner.write_csv(args.out, rows)
+
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="工厂模拟器")
+    parser.add_argument("--measure-startup", action="store_true", 
+                        help="打开图形界面，输出冷启动时间后退出，超出预算时返回失败")
+    subparsers = parser.add_subparsers(dest="command")
+    what_if_parser = subparsers.add_parser("what-if", help="并行模拟并比较候选操作")
+    what_if_parser.add_argument("--save", help="作为起点的存档文件（默认：新工厂）")
+    what_if_parser.add_argument("--days", type=int, default=7, help="每个候选模拟的天数")
+    what_if_parser.add_argument("--strategy", default="balanced", choices=list(FactoryAI.STRATEGY_POLICIES), 
+                                help="驱动模拟的AI策略")
+    what_if_parser.add_argument("--runs", type=int, default=4, help="每个候选的模拟次数")
+    what_if_parser.add_argument("--seed", type=int, default=0, help="第一个随机种子")
+    what_if_parser.add_argument("--workers", type=int, default=None, help="工作进程数")
+    tune_parser = subparsers.add_parser("tune", help="用遗传算法搜索AI决策参数")
+    tune_parser.add_argument("--save", help="作为起点的存档文件（默认：新工厂）")
+    tune_parser.add_argument("--days", type=int, default=14, help="每次评估模拟的天数")
+    tune_parser.add_argument("--strategy", default="aggressive", choices=list(FactoryAI.STRATEGY_POLICIES), 
+                             help="要调优的AI策略")
+    tune_parser.add_argument("--seeds", type=int, default=4, help="每次评估的带种子模拟次数")
+    tune_parser.add_argument("--population", type=int, default=16, help="每代的参数组数量")
+    tune_parser.add_argument("--generations", type=int, default=10, help="搜索的代数")
+    tune_parser.add_argument("--seed", type=int, default=0, help="搜索的随机种子")
+    tune_parser.add_argument("--workers", type=int, default=None, help="工作进程数")
+    tune_parser.add_argument("--cache", help="在多次运行之间缓存评估结果的JSON文件")
+    tune_parser.add_argument("--out", help="写入最佳参数的JSON文件")
+    sweep_parser = subparsers.add_parser("sweep", help="运行JSON实验网格的每个单元")
+    sweep_parser.add_argument("grid", help="将mod、strategy、initial_balance、workers、seed和days映射到取值的JSON文件")
+    sweep_parser.add_argument("--cache", default=SWEEP_CACHE_DIRECTORY, help="缓存单元结果的目录")
+    sweep_parser.add_argument("--workers", type=int, default=None, help="工作进程数")
+    sweep_parser.add_argument("--out", help="每个单元写入一行的CSV文件")
+    simulate_parser = subparsers.add_parser("simulate", help="不启动图形界面，让AI运行一个工厂")
+    simulate_parser.add_argument("--save", help="作为起点的存档文件（默认：新工厂）")
+    simulate_parser.add_argument("--mod", help="加载到工厂的模组文件")
+    simulate_parser.add_argument("--days", type=int, default=30, help="模拟天数")
+    simulate_parser.add_argument("--strategy", default="balanced", choices=list(FactoryAI.STRATEGY_POLICIES), 
+                                 help="运行工厂的AI策略")
+    simulate_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    simulate_parser.add_argument("--out", help="写入结果的JSON文件")
+    serve_parser = subparsers.add_parser("serve", help="在本地JSON-RPC服务器中托管多个工厂")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    serve_parser.add_argument("--port", type=int, default=SIMULATION_SERVER_PORT, help="监听端口")
+    serve_parser.add_argument("--max-sessions", type=int, default=10000, help="同时托管的最大工厂数")
+    call_parser = subparsers.add_parser("call", help="调用运行中的模拟服务器的方法")
+    call_parser.add_argument("method", choices=["create", "step", "query", "command", "close", "list"], 
+                             help="服务器方法")
+    call_parser.add_argument("params", nargs="?", help='参数的JSON对象，例如 \'{"session": 1, "days": 7}\'')
+    call_parser.add_argument("--host", default="127.0.0.1", help="服务器地址")
+    call_parser.add_argument("--port", type=int, default=SIMULATION_SERVER_PORT, help="服务器端口")
+    args = parser.parse_args()
+    
+    if args.command == "what-if":
+        run_what_if(args)
+        return
+    if args.command == "tune":
+        run_tune(args)
+        return
+    if args.command == "sweep":
+        run_sweep(args)
+        return
+    if args.command == "simulate":
+        run_simulate(args)
+        return
+    if args.command == "serve":
+        run_serve(args)
+        return
+    if args.command == "call":
+        run_call(args)
+        return
+        
+    import_tkinter()
     root = tk.Tk()
     app = FactorySimulatorGUI(root)
+    
+    def on_map(event):
+        # 主窗口映射且待处理的重绘完成后，第一帧即已绘制
+        if event.widget is not root or app.startup_time is not None:
+            return
+        root.update_idletasks()
+        app.report_startup_time(LAUNCH_TIME)
+        if args.measure_startup:
+            root.quit()
+            
+    root.bind("<Map>", on_map, add="+")
     root.mainloop()
+    if args.measure_startup:
+        root.destroy()
+        parser.exit(int(app.startup_time > STARTUP_TIME_BUDGET), 
+                    f"冷启动: {app.startup_time:.3f} 秒（预算 {STARTUP_TIME_BUDGET:.1f} 秒）\n")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,33 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+CODE_DIR = Path(__file__).resolve().parent.parent / "Code"
+
+
+def load_simulator(language: str = "En"):
+    """Import a simulator script, whose file name is not a valid module name"""
+    name = "factory_simulator_" + language.replace("-", "_").lower()
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, CODE_DIR / f"Factory-Simulator_{language}.py")
+        module = importlib.util.module_from_spec(spec)
+        # Registered before running, so pickled classes resolve in worker processes
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+@pytest.fixture(scope="session")
+def fs():
+    """English simulator module"""
+    return load_simulator("En")
+
+
+@pytest.fixture
+def factory(fs):
+    """Default factory at the CLI start time"""
+    factory = fs.Factory("Test Factory", initial_balance=1000, start_time=fs.CLI_START_TIME)
+    factory.setup_default()
+    return factory
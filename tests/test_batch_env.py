@@ -0,0 +1,96 @@
+import pytest
+
+
+@pytest.fixture
+def np(fs):
+    if fs.np is None:
+        pytest.skip("NumPy is not installed")
+    return fs.np
+
+
+def action(env, text):
+    """Find an action by its display text"""
+    return next(index for index in range(len(env.actions)) if env.describe_action(index) == text)
+
+
+@pytest.fixture
+def batch(fs, np):
+    return fs.BatchFactoryEnv(num_envs=4, seed=1)
+
+
+def test_reset_returns_stacked_observations(batch):
+    observations, info = batch.reset()
+    assert observations.shape == (4, batch.observation_size)
+    assert info == {}
+    assert (observations[:, 0] == 420).all() and (observations[:, 1] == 1).all()
+
+
+def test_step_returns_stacked_results(np, batch):
+    batch.reset()
+    observations, rewards, terminated, truncated, info = batch.step(np.zeros(4, dtype=np.intp))
+    assert observations.shape == (4, batch.observation_size)
+    assert rewards.shape == terminated.shape == truncated.shape == (4,)
+    assert terminated.dtype == truncated.dtype == bool
+    assert info["action_valid"].shape == info["_final_observation"].shape == (4,)
+    assert info["final_observation"].shape == (4, batch.observation_size)
+
+
+def test_each_factory_takes_its_own_action(batch):
+    batch.reset()
+    purchase = action(batch, "purchase(Wood)")
+    produce = action(batch, "produce(Wooden Chair, 1)")
+    _, rewards, _, _, info = batch.step([0, purchase, produce, purchase])
+    assert list(rewards) == [0, -50, 0, -50]
+    assert list(info["action_valid"]) == [True, True, False, True]
+
+
+def test_matches_the_single_environment(fs, np):
+    single = fs.FactoryEnv(seed=1)
+    batch = fs.BatchFactoryEnv(num_envs=2, seed=1)
+    single.reset()
+    batch.reset()
+    # Orders are random, so the backlog columns are left out
+    columns = np.ones(single.observation_size, dtype=bool)
+    columns[single.backlog_offset:single.line_offset] = False
+    plan = ["staff_line(1)", "staff_line(2)", "produce(Wooden Chair, 1)", "staff_station(1)",
+            "craft(Metal Plate, False, 1)", "purchase(Wood)", "hire()"] + ["wait()"] * 4 + ["sell(Wooden Chair)"]
+    for text in plan:
+        index = action(single, text)
+        observation, reward, terminated, _, info = single.step(index)
+        observations, rewards, batch_terminated, _, batch_info = batch.step([index, index])
+        assert rewards[0] == reward and batch_info["action_valid"][0] == info["action_valid"], text
+        assert (observations[0][columns] == np.asarray(observation)[columns]).all(), text
+        assert not terminated and not batch_terminated.any()
+
+
+def test_finished_factories_reset_automatically(np, batch):
+    batch.reset()
+    batch.state["balance"][1] = 10
+    for _ in range(batch.steps_per_day):
+        observations, rewards, terminated, truncated, info = batch.step(np.zeros(4, dtype=np.intp))
+    assert list(terminated) == [False, True, False, False]
+    assert list(info["_final_observation"]) == [False, True, False, False]
+    assert info["final_observation"][1][1] == 2
+    # The bankrupt factory starts over, the others continue on day 2
+    assert list(observations[:, 1]) == [2, 1, 2, 2]
+    assert observations[1][0] == 420
+
+
+def test_truncated_factories_reset(fs, np):
+    batch = fs.BatchFactoryEnv(num_envs=2, seed=1, max_days=1, step_minutes=240)
+    batch.reset()
+    batch.state["balance"][:] = 10 ** 6
+    results = [batch.step([0, 0]) for _ in range(batch.steps_per_day)]
+    assert results[-1][3].all() and not results[-1][2].any()
+    assert (results[-1][0][:, 1] == 1).all()
+
+
+def test_reset_with_seed_repeats_orders(np, batch):
+    first = batch.reset(seed=3)[0].copy()
+    batch.step(np.full(4, action(batch, "hire()")))
+    assert (batch.reset(seed=3)[0] == first).all()
+
+
+def test_too_many_workers_for_the_slots(fs, factory):
+    with pytest.raises(ValueError):
+        fs.BatchFactoryEnv(factory, num_envs=2, max_workers=2)
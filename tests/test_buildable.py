@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+
+def build_unit(factory, stock, name, is_product, quantity=1, top=True):
+    """Take one recipe's inputs from stock, crafting missing components, returns success"""
+    key = ("product" if is_product else "material", name)
+    if not top:
+        used = min(stock.get(key, 0), quantity)
+        stock[key] = stock.get(key, 0) - used
+        quantity -= used
+        if quantity == 0:
+            return True
+    recipe = factory.get_recipe(name, is_product)
+    if recipe is None:
+        return False
+    components = [(material, False, amount) for material, amount in recipe.materials_required.items()]
+    components += [(product, True, amount) for product, amount in getattr(recipe, "products_required", {}).items()]
+    for _ in range(quantity):
+        for component, component_is_product, amount in components:
+            if not build_unit(factory, stock, component, component_is_product, amount, top=False):
+                return False
+    return True
+
+
+def brute_force_max(factory, name, is_product=True, limit=500):
+    """Count units by building them one at a time from a copy of the stock"""
+    stock = {("material", material): quantity for material, quantity in factory.material_inventory.items()}
+    stock.update((("product", product), quantity) for product, quantity in factory.product_inventory.items())
+    units = 0
+    while units < limit:
+        trial = dict(stock)
+        if not build_unit(factory, trial, name, is_product):
+            break
+        stock = trial
+        units += 1
+    return units
+
+
+def randomize_stock(factory, rng):
+    for material in list(factory.material_inventory):
+        factory.material_inventory[material] = rng.randint(0, 60)
+    for product in list(factory.product_inventory):
+        factory.product_inventory[product] = rng.randint(0, 4)
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_max_buildable_matches_brute_force(factory, seed):
+    randomize_stock(factory, random.Random(seed))
+    for name in factory.products:
+        assert factory.get_max_buildable(name) == brute_force_max(factory, name), name
+    assert factory.get_max_buildable("Metal Plate", is_product=False) == \
+        brute_force_max(factory, "Metal Plate", is_product=False)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_direct_inputs_only(factory, seed):
+    randomize_stock(factory, random.Random(seed))
+    premium = factory.products["Premium Chair"]
+    expected = min(factory.product_inventory["Wooden Chair"],
+                   factory.material_inventory["Metal Plate"],
+                   factory.material_inventory["Screws"] // premium.materials_required["Screws"])
+    assert factory.get_max_buildable("Premium Chair", include_components=False) == expected
+
+
+def test_cached_result_follows_stock_changes(factory):
+    before = factory.get_max_buildable("Wooden Chair")
+    assert before == factory.material_inventory["Wood"] // 5
+    factory.material_inventory["Wood"] += 5
+    assert factory.get_max_buildable("Wooden Chair") == before + 1
+
+
+def test_unknown_or_purchased_items_are_not_buildable(factory):
+    assert factory.get_max_buildable("Unknown") == 0
+    assert factory.get_max_buildable("Wood", is_product=False) == 0
+
+
+def test_reserve_inputs_takes_stock_for_all_units(factory):
+    wood = factory.material_inventory["Wood"]
+    success, _ = factory.reserve_inputs("Wooden Chair", 3)
+    assert success
+    assert factory.material_inventory["Wood"] == wood - 15
+    assert factory.take_reserved_unit("Wooden Chair")
+    success, _ = factory.release_reservation("Wooden Chair")
+    assert success
+    assert factory.material_inventory["Wood"] == wood - 5
+    assert not factory.reserve_inputs("Wooden Chair", 1000)[0]
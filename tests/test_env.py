@@ -0,0 +1,93 @@
+import pytest
+
+
+def action(env, text):
+    """Find an action by its display text"""
+    return next(index for index in range(len(env.actions)) if env.describe_action(index) == text)
+
+
+@pytest.fixture
+def env(fs):
+    return fs.FactoryEnv(seed=1)
+
+
+def test_reset_returns_observation_and_info(env):
+    observation, info = env.reset()
+    assert len(observation) == env.observation_size
+    assert info == {}
+    assert observation[0] == env.factory.balance == 420
+    assert observation[1] == 1 and observation[2] == 0
+    # Orders are created up to the minimum
+    assert sum(observation[env.backlog_offset:env.line_offset]) > 0
+    assert env.factory.get_open_order_count() == env.min_open_orders
+
+
+def test_step_returns_five_values(env):
+    env.reset()
+    observation, reward, terminated, truncated, info = env.step(0)
+    assert len(observation) == env.observation_size
+    assert isinstance(reward, float)
+    assert terminated is False and truncated is False
+    assert info == {"action_valid": True}
+    assert env.factory.current_time.minute == env.step_minutes
+
+
+def test_reward_is_the_balance_change(env):
+    env.reset()
+    _, reward, _, _, info = env.step(action(env, "purchase(Wood)"))
+    assert info["action_valid"]
+    assert reward == -env.purchase_quantity * env.factory.materials["Wood"].cost
+    assert env.step(0)[1] == 0
+
+
+def test_invalid_actions_are_reported(env):
+    env.reset()
+    # Line 1 has no worker yet
+    assert not env.step(action(env, "produce(Wooden Chair, 1)"))[4]["action_valid"]
+    assert env.step(action(env, "staff_line(1)"))[4]["action_valid"]
+    observation, _, _, _, info = env.step(action(env, "produce(Wooden Chair, 1)"))
+    assert info["action_valid"]
+    assert observation[env.line_offset] == 1 and observation[env.line_offset + 1] == env.product_index["Wooden Chair"]
+
+
+def test_day_ends_after_the_work_shift(env):
+    env.reset()
+    for _ in range(env.steps_per_day - 1):
+        observation, *_ = env.step(0)
+    assert observation[1] == 1 and observation[2] == env.steps_per_day - 1
+    observation, reward, terminated, _, _ = env.step(0)
+    assert observation[1] == 2 and observation[2] == 0
+    assert terminated is False
+    assert reward == -sum(worker.salary for worker in env.factory.workers)
+
+
+def test_bankruptcy_terminates(env):
+    env.reset()
+    env.factory.balance = 10
+    for _ in range(env.steps_per_day):
+        _, reward, terminated, truncated, _ = env.step(0)
+    assert terminated and not truncated
+    assert reward < 0
+
+
+def test_truncated_after_max_days(fs):
+    env = fs.FactoryEnv(seed=1, max_days=1, step_minutes=240)
+    env.reset()
+    env.factory.balance = 10 ** 6
+    results = [env.step(0) for _ in range(env.steps_per_day)]
+    assert [result[3] for result in results] == [False] * (env.steps_per_day - 1) + [True]
+
+
+def test_reset_starts_each_episode_from_the_template(env):
+    first, _ = env.reset(seed=5)
+    first = list(first)
+    for index in (action(env, "staff_line(1)"), action(env, "purchase(Metal)"), action(env, "hire()")):
+        env.step(index)
+    second, _ = env.reset(seed=5)
+    assert list(second) == first
+    assert len(env.template.workers) == 4
+
+
+def test_observation_buffer_is_reused(env):
+    observation, _ = env.reset()
+    assert env.step(0)[0] is observation
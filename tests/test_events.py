@@ -0,0 +1,109 @@
+from datetime import datetime
+
+import pytest
+
+TIME = datetime(2024, 1, 1, 8, 0)
+
+
+@pytest.fixture
+def bus(fs):
+    return fs.EventBus()
+
+
+def test_events_are_delivered_immediately_outside_a_batch(fs, bus):
+    received = []
+    bus.subscribe(received.append)
+    bus.publish(fs.SimEvent.STOCK_LOW, TIME, material="Wood")
+    assert [(event.event_type, event.data) for event in received] == [(fs.SimEvent.STOCK_LOW, {"material": "Wood"})]
+
+
+def test_batch_delivers_events_together_at_the_end(fs, bus):
+    single, batches = [], []
+    bus.subscribe(single.append)
+    bus.subscribe(batches.append, batch=True)
+    with bus.batch():
+        bus.publish(fs.SimEvent.LINE_ADDED, TIME, line_id=1)
+        bus.publish(fs.SimEvent.STATION_ADDED, TIME, station_id=1)
+        assert single == [] and batches == []
+    assert [event.event_type for event in single] == [fs.SimEvent.LINE_ADDED, fs.SimEvent.STATION_ADDED]
+    assert len(batches) == 1 and len(batches[0]) == 2
+
+
+def test_nested_batches_flush_once_at_the_outermost(fs, bus):
+    batches = []
+    bus.subscribe(batches.append, batch=True)
+    with bus.batch():
+        with bus.batch():
+            bus.publish(fs.SimEvent.LINE_ADDED, TIME, line_id=1)
+        assert batches == []
+        bus.publish(fs.SimEvent.LINE_ADDED, TIME, line_id=2)
+    assert [[event.data["line_id"] for event in batch] for batch in batches] == [[1, 2]]
+
+
+def test_batch_flushes_when_the_block_raises(fs, bus):
+    received = []
+    bus.subscribe(received.append)
+    with pytest.raises(RuntimeError):
+        with bus.batch():
+            bus.publish(fs.SimEvent.LINE_ADDED, TIME, line_id=1)
+            raise RuntimeError
+    assert len(received) == 1 and bus.batch_depth == 0
+
+
+def test_subscriptions_filter_by_type_and_predicate(fs, bus):
+    typed, filtered = [], []
+    bus.subscribe(typed.append, event_types=(fs.SimEvent.ORDER_CREATED,))
+    bus.subscribe(filtered.append, event_filter=lambda event: event.data.get("quantity", 0) > 5)
+    bus.publish(fs.SimEvent.ORDER_CREATED, TIME, quantity=3)
+    bus.publish(fs.SimEvent.MATERIAL_PURCHASED, TIME, quantity=10)
+    assert [event.data["quantity"] for event in typed] == [3]
+    assert [event.data["quantity"] for event in filtered] == [10]
+
+
+def test_events_published_by_subscribers_follow_the_current_delivery(fs, bus):
+    order = []
+
+    def react(event):
+        order.append(("first", event.event_type))
+        if event.event_type == fs.SimEvent.LINE_ADDED:
+            bus.publish(fs.SimEvent.STATION_ADDED, TIME)
+
+    bus.subscribe(react)
+    bus.subscribe(lambda event: order.append(("second", event.event_type)))
+    bus.publish(fs.SimEvent.LINE_ADDED, TIME)
+    assert order == [("first", fs.SimEvent.LINE_ADDED), ("second", fs.SimEvent.LINE_ADDED),
+                     ("first", fs.SimEvent.STATION_ADDED), ("second", fs.SimEvent.STATION_ADDED)]
+
+
+def test_unsubscribed_callbacks_stop_receiving(fs, bus):
+    received = []
+    subscription = bus.subscribe(received.append)
+    bus.unsubscribe(subscription)
+    bus.publish(fs.SimEvent.LINE_ADDED, TIME)
+    assert received == []
+
+
+def test_advance_time_delivers_each_completion_tick(fs, factory):
+    batches = []
+    factory.events.subscribe(batches.append, event_types=(fs.SimEvent.PRODUCTION_COMPLETED,), batch=True)
+    factory.assign_worker_to_line("Worker A", 1)
+    factory.assign_worker_to_line("Worker B", 2)
+    factory.assign_product_to_line("Wooden Chair", 1)
+    factory.assign_product_to_line("Wooden Chair", 2)
+    factory.advance_time(2)
+    # The lines finish at different ticks, each delivered before the period goes on
+    assert [[event.data["line_id"] for event in batch] for batch in batches] == [[1], [2]]
+    assert batches[0][0].time < batches[1][0].time
+
+
+def test_ai_refills_a_line_within_one_shift(fs, factory):
+    factory.purchase_materials({"Wood": 20})
+    ai = fs.FactoryAI(fs.HeadlessApp(factory))
+    ai.rng = fs.random.Random(1)
+    ai.strategy = "conservative"
+    ai.start()
+    completions = []
+    factory.events.subscribe(completions.append, event_types=(fs.SimEvent.PRODUCTION_COMPLETED,))
+    factory.advance_time(8)
+    line_completions = [event for event in completions if event.data["line_id"] == 1]
+    assert len(line_completions) > 1
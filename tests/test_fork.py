@@ -0,0 +1,81 @@
+import copy
+
+import pytest
+
+
+def start_production(factory):
+    assert factory.assign_worker_to_line("Worker C", 1)[0]
+    assert factory.assign_worker_to_line("Worker A", 2)[0]
+    assert factory.assign_product_to_line("Wooden Chair", 1)[0]
+    assert factory.assign_product_to_line("Wooden Table", 2)[0]
+    assert factory.assign_worker_to_station("Worker D", 1)[0]
+    assert factory.assign_recipe_to_station("Metal Plate", False, 1)[0]
+    factory.create_order("Wooden Chair", 2, 3)
+
+
+@pytest.fixture
+def busy_factory(factory):
+    start_production(factory)
+    return factory
+
+
+def test_fork_starts_equal(busy_factory):
+    assert busy_factory.fork().to_dict() == busy_factory.to_dict()
+
+
+def test_running_the_fork_leaves_the_original_unchanged(busy_factory):
+    before = copy.deepcopy(busy_factory.to_dict())
+    fork = busy_factory.fork()
+    fork.run_days(3)
+    fork.hire_worker("Worker E", 2, 80)
+    fork.purchase_materials({"Wood": 10})
+    fork.material_inventory["Metal"] = 0
+    assert busy_factory.to_dict() == before
+    assert fork.to_dict() != before
+
+
+def test_running_the_original_leaves_the_fork_unchanged(busy_factory):
+    fork = busy_factory.fork()
+    before = copy.deepcopy(fork.to_dict())
+    busy_factory.run_days(2)
+    busy_factory.production_lines[0].assigned_worker.skill_level = 5
+    assert fork.to_dict() == before
+
+
+def test_fork_and_original_evolve_identically(busy_factory):
+    fork = busy_factory.fork()
+    busy_factory.run_days(3)
+    fork.run_days(3)
+    assert fork.to_dict() == busy_factory.to_dict()
+    assert fork.metrics.get_rate("produced:Wooden Chair") == busy_factory.metrics.get_rate("produced:Wooden Chair")
+
+
+def test_fork_has_its_own_workers(busy_factory):
+    fork = busy_factory.fork()
+    fork_workers = {id(worker) for worker in fork.workers}
+    assert not fork_workers & {id(worker) for worker in busy_factory.workers}
+    assert all(id(line.assigned_worker) in fork_workers for line in fork.production_lines)
+    assert all(id(station.assigned_worker) in fork_workers
+               for station in fork.crafting_stations if station.assigned_worker)
+
+
+def test_catalog_changes_stay_on_their_side(fs, busy_factory):
+    fork = busy_factory.fork()
+    fork.add_product(fs.Product("Stool", production_time=30, sale_price=10))
+    fork.add_material("Glue", cost=1, unit="tube")
+    assert "Stool" not in busy_factory.products and "Glue" not in busy_factory.materials
+    busy_factory.remove_product("Wooden Cabinet")
+    assert "Wooden Cabinet" in fork.products
+
+
+def test_fork_publishes_and_records_nothing(fs, busy_factory, tmp_path):
+    received = []
+    busy_factory.events.subscribe(received.append)
+    assert busy_factory.start_journal(str(tmp_path))[0]
+    fork = busy_factory.fork()
+    assert fork.journal is None and fork.history is None and fork.autosaver is None
+    fork.run_days(2)
+    assert received == []
+    busy_factory.journal.sync()
+    assert (tmp_path / fs.Journal.JOURNAL_FILE).read_text(encoding="utf-8") == ""
+    busy_factory.stop_journal()
@@ -0,0 +1,61 @@
+import pytest
+
+
+@pytest.fixture
+def order(factory):
+    order, _ = factory.create_order("Wooden Chair", 1, 3)
+    factory.assign_worker_to_line("Worker C", 1)
+    factory.assign_product_to_line("Wooden Chair", 1)
+    return order
+
+
+def test_completed_orders_stay_in_memory_without_history(factory, order):
+    factory.advance_time(1)
+    assert order.is_completed
+    assert factory.orders == [order]
+    assert factory.get_open_order_count() == 0
+    assert factory.completed_order_count == 0
+    assert "Wooden Chair" in factory.get_status_text()
+
+
+def test_only_recent_completed_orders_stay_in_memory_without_history(fs, factory, order, monkeypatch):
+    monkeypatch.setattr(fs, "COMPLETED_ORDER_LIMIT", 1)
+    later, _ = factory.create_order("Wooden Chair", 1, 3)
+    factory.advance_time(1)
+    factory.assign_product_to_line("Wooden Chair", 1)
+    factory.advance_time(1)
+    assert order.is_completed and later.is_completed
+    assert factory.orders == [later]
+    assert factory.completed_order_count == 1
+    assert "Earlier completed orders: 1" in factory.get_status_text()
+
+
+def test_completed_orders_move_to_the_history_database(factory, order, tmp_path):
+    assert factory.open_history(str(tmp_path / "history.db"))[0]
+    factory.advance_time(1)
+    assert order.is_completed
+    assert factory.orders == []
+    assert factory.completed_order_count == 1
+    assert factory.history.get_completed_order_count() == 1
+    factory.close_history()
+
+
+def test_open_orders_are_kept_with_history(factory, tmp_path):
+    assert factory.open_history(str(tmp_path / "history.db"))[0]
+    factory.create_order("Wooden Table", 2, 3)
+    factory.advance_time(1)
+    assert factory.get_open_order_count() == len(factory.orders) == 1
+    factory.close_history()
+
+
+def test_orders_kept_in_memory_are_recorded_when_history_opens(factory, order, tmp_path):
+    factory.advance_time(1)
+    factory.create_order("Wooden Table", 2, 3)
+    assert factory.open_history(str(tmp_path / "history.db"))[0]
+    # The completed order leaves memory at the next production update
+    factory.assign_product_to_line("Wooden Chair", 1)
+    factory.advance_time(1)
+    assert [kept.product.name for kept in factory.orders] == ["Wooden Table"]
+    assert factory.history.get_completed_order_count() == 1
+    assert factory.history.query("SELECT COUNT(*) FROM orders")[0][0] == 2
+    factory.close_history()
@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+
+def run_commands(factory):
+    factory.hire_worker("Worker E", 2, 80)
+    factory.assign_worker_to_line("Worker C", 1)
+    factory.assign_product_to_line("Wooden Chair", 1)
+    factory.create_order("Wooden Table", 3, 4)
+    factory.purchase_materials({"Wood": 20, "Metal": 5})
+    factory.advance_time(3)
+    factory.next_day()
+    factory.add_crafting_station("Extra Station", 4)
+    factory.advance_time(2)
+
+
+def recovered(fs, directory):
+    factory = fs.Factory("Recovered", initial_balance=0, start_time=fs.CLI_START_TIME)
+    success, message = factory.recover_journal(str(directory))
+    assert success, message
+    return factory
+
+
+@pytest.fixture
+def journaled(factory, tmp_path):
+    assert factory.start_journal(str(tmp_path))[0]
+    yield factory
+    if factory.journal is not None:
+        factory.journal.file.close()
+
+
+def test_recover_replays_commands_after_a_crash(fs, journaled, tmp_path):
+    run_commands(journaled)
+    # Crash: entries reached the disk, no final snapshot was written
+    journaled.journal.sync()
+    assert recovered(fs, tmp_path).to_dict() == journaled.to_dict()
+
+
+def test_recover_after_clean_stop_uses_the_snapshot(fs, journaled, tmp_path):
+    run_commands(journaled)
+    journaled.stop_journal()
+    assert os.path.getsize(tmp_path / fs.Journal.JOURNAL_FILE) == 0
+    assert recovered(fs, tmp_path).to_dict() == journaled.to_dict()
+
+
+def test_compaction_keeps_state(fs, journaled, tmp_path):
+    journaled.journal.snapshot_every = 3
+    run_commands(journaled)
+    journaled.journal.sync()
+    with open(tmp_path / fs.Journal.JOURNAL_FILE, encoding="utf-8") as f:
+        assert len(f.readlines()) < 3
+    assert recovered(fs, tmp_path).to_dict() == journaled.to_dict()
+
+
+def test_torn_last_entry_is_ignored(fs, journaled, tmp_path):
+    journaled.hire_worker("Worker E", 2, 80)
+    expected = journaled.to_dict()
+    journaled.journal.sync()
+    with open(tmp_path / fs.Journal.JOURNAL_FILE, "a", encoding="utf-8") as f:
+        f.write('{"seq": 99, "command": "hire_wor')
+    assert recovered(fs, tmp_path).to_dict() == expected
+
+
+def test_nested_commands_are_recorded_once(fs, journaled, tmp_path):
+    journaled.advance_time(1)
+    journaled.journal.sync()
+    with open(tmp_path / fs.Journal.JOURNAL_FILE, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry["command"] for entry in entries] == ["run_ticks"]
+
+
+def test_unknown_command_fails_recovery(fs, journaled, tmp_path):
+    journaled.journal.sync()
+    with open(tmp_path / fs.Journal.JOURNAL_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"seq": 1, "command": "delete_everything", "args": []}) + "\n")
+    factory = fs.Factory("Recovered", initial_balance=0, start_time=fs.CLI_START_TIME)
+    success, message = factory.recover_journal(str(tmp_path))
+    assert not success and "delete_everything" in message
+
+
+def test_recovery_does_not_publish_events(fs, journaled, tmp_path):
+    run_commands(journaled)
+    journaled.journal.sync()
+    factory = fs.Factory("Recovered", initial_balance=0, start_time=fs.CLI_START_TIME)
+    received = []
+    factory.events.subscribe(received.append)
+    assert factory.recover_journal(str(tmp_path))[0]
+    assert received == []
+
+
+def test_ai_reactions_within_a_period_replay(fs, journaled, tmp_path):
+    ai = fs.FactoryAI(fs.HeadlessApp(journaled))
+    ai.rng = fs.random.Random(1)
+    ai.strategy = "balanced"
+    ai.start()
+    journaled.run_days(2)
+    journaled.journal.sync()
+    assert recovered(fs, tmp_path).to_dict() == journaled.to_dict()
@@ -0,0 +1,66 @@
+import itertools
+import random
+
+import pytest
+
+
+def brute_force_best(profit):
+    """Best total profit over every way to match min(rows, cols) workers to distinct slots"""
+    rows, cols = len(profit), len(profit[0])
+    if rows <= cols:
+        return max(sum(profit[i][slot] for i, slot in enumerate(slots))
+                   for slots in itertools.permutations(range(cols), rows))
+    return max(sum(profit[worker][j] for j, worker in enumerate(workers))
+               for workers in itertools.permutations(range(rows), cols))
+
+
+def check_assignment(profit, assignment):
+    """Check assignment shape and distinct slots, returns its total profit"""
+    rows, cols = len(profit), len(profit[0])
+    assert len(assignment) == rows
+    slots = [slot for slot in assignment if slot >= 0]
+    assert len(slots) == len(set(slots)) == min(rows, cols)
+    assert all(0 <= slot < cols for slot in slots)
+    return sum(profit[worker][slot] for worker, slot in enumerate(assignment) if slot >= 0)
+
+
+def random_matrix(rng, rows, cols):
+    return [[rng.choice([rng.randint(-20, 50), rng.uniform(-5, 5)]) for _ in range(cols)] for _ in range(rows)]
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_solve_matches_brute_force(fs, seed):
+    rng = random.Random(seed)
+    profit = random_matrix(rng, rng.randint(1, 5), rng.randint(1, 5))
+    total = check_assignment(profit, fs.AssignmentSolver.solve(profit))
+    assert total == pytest.approx(brute_force_best(profit))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_list_and_numpy_solvers_agree(fs, seed):
+    if fs.np is None:
+        pytest.skip("NumPy is not installed")
+    rng = random.Random(seed)
+    rows = rng.randint(1, 5)
+    profit = random_matrix(rng, rows, rng.randint(rows, 6))
+    best = brute_force_best(profit)
+    assert check_assignment(profit, fs.AssignmentSolver.solve_lists(profit, rows, len(profit[0]))) == pytest.approx(best)
+    assert check_assignment(profit, fs.AssignmentSolver.solve_numpy(profit, rows, len(profit[0]))) == pytest.approx(best)
+
+
+def test_ties_still_give_a_full_matching(fs):
+    profit = [[1, 1, 1], [1, 1, 1], [1, 1, 1]]
+    assert check_assignment(profit, fs.AssignmentSolver.solve(profit)) == 3
+
+
+def test_empty_matrices(fs):
+    assert fs.AssignmentSolver.solve([]) == []
+    assert fs.AssignmentSolver.solve([[], []]) == [-1, -1]
+
+
+def test_ai_staffs_lines_with_the_most_skilled_workers(fs, factory):
+    ai = fs.FactoryAI(fs.HeadlessApp(factory))
+    for _ in ai.assign_workers_to_lines():
+        pass
+    staffed = {line.assigned_worker.name for line in factory.production_lines}
+    assert "Worker C" in staffed and "Worker B" not in staffed
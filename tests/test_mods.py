@@ -0,0 +1,46 @@
+import pytest
+
+
+@pytest.fixture
+def mod(fs, factory):
+    mod = fs.Mod("Test Mod", "Two workers, one station", "Tester")
+    mod.products = [product for product in factory.products.values() if product.name != "Wooden Table"]
+    mod.materials = list(factory.materials.values())
+    mod.initial_workers = [fs.Worker("Mod Worker 1", 4, 90), fs.Worker("Mod Worker 2", 2, 60)]
+    mod.initial_balance = 800
+    mod.initial_materials = {"Wood": 300}
+    mod.crafting_stations = [{"name": "Mod Station", "capacity": 5}]
+    return mod
+
+
+@pytest.fixture
+def busy_factory(factory):
+    factory.assign_worker_to_line("Worker C", 1)
+    factory.assign_product_to_line("Wooden Chair", 1)
+    factory.create_order("Wooden Chair", 2, 3)
+    factory.create_order("Wooden Table", 1, 3)
+    return factory
+
+
+def test_load_mod_releases_lines(busy_factory, mod):
+    busy_factory.load_mod(mod)
+    assert [worker.name for worker in busy_factory.workers] == ["Mod Worker 1", "Mod Worker 2"]
+    for line in busy_factory.production_lines:
+        assert line.assigned_worker is None and line.current_product is None and not line.is_active
+    # The order for a product the mod dropped is gone
+    assert [order.product.name for order in busy_factory.orders] == ["Wooden Chair"]
+
+
+def test_state_round_trips_after_load_mod(fs, busy_factory, mod):
+    busy_factory.load_mod(mod)
+    restored = fs.Factory("Other", initial_balance=0)
+    restored.restore_state(busy_factory.to_dict())
+    assert restored.to_dict() == busy_factory.to_dict()
+
+
+def test_lines_can_be_staffed_after_load_mod(busy_factory, mod):
+    busy_factory.load_mod(mod)
+    assert busy_factory.assign_worker_to_line("Mod Worker 1", 1)[0]
+    assert busy_factory.assign_product_to_line("Wooden Chair", 1)[0]
+    busy_factory.advance_time(2)
+    assert busy_factory.product_inventory["Wooden Chair"] == 1
@@ -0,0 +1,77 @@
+import pytest
+
+
+def run_planning(fs, days=3, seed=3):
+    summary = fs.simulate_headless(fs.create_cli_factory(), "planning", days, seed)
+    summary.pop("seconds")
+    return summary
+
+
+def test_seeded_planning_runs_repeat(fs):
+    first = run_planning(fs)
+    assert first["produced"] > 0
+    assert run_planning(fs) == first
+
+
+@pytest.fixture
+def planning_ai(fs, factory):
+    ai = fs.FactoryAI(fs.HeadlessApp(factory))
+    ai.rng = fs.random.Random(1)
+    ai.strategy = "planning"
+    ai.planner.rollout_budget = 6
+    return ai
+
+
+def test_scheduled_search_is_spread_over_passes(planning_ai, factory):
+    resumes = []
+    planning_ai.scheduler = lambda delay, callback: resumes.append(callback)
+    planning_ai.step_budget = 2
+    planning_ai.start()
+    passes = 1
+    while resumes:
+        resumes.pop()()
+        passes += 1
+    assert planning_ai.pass_stats["last_steps"] <= 2
+    assert passes > 3
+    assert planning_ai.planner.stats["decisions"] == 1
+    assert planning_ai.planner.stats["rollouts"] == 6
+    assert all(line.assigned_worker for line in factory.production_lines)
+
+
+def test_scheduled_search_stops_at_the_time_budget(planning_ai):
+    resumes = []
+    planning_ai.scheduler = lambda delay, callback: resumes.append(callback)
+    # Any rollout uses up the budget
+    planning_ai.planner.time_budget = 1e-9
+    planning_ai.start()
+    while resumes:
+        resumes.pop()()
+    assert planning_ai.planner.stats["decisions"] == 1
+    assert planning_ai.planner.stats["rollouts"] == 1
+
+
+def test_headless_search_ignores_the_time_budget(planning_ai):
+    planning_ai.planner.time_budget = 1e-9
+    planning_ai.start()
+    assert planning_ai.planner.stats["decisions"] == 1
+    assert planning_ai.planner.stats["rollouts"] == 6
+
+
+def test_stale_search_is_dropped_at_the_next_day(planning_ai, factory):
+    resumes = []
+    planning_ai.scheduler = lambda delay, callback: resumes.append(callback)
+    planning_ai.step_budget = 1
+    planning_ai.start()
+    while planning_ai.planner.rollouts == 0:
+        resumes.pop()()
+    factory.next_day()
+    while resumes:
+        resumes.pop()()
+    # Only the new day's search finishes
+    assert planning_ai.planner.stats["decisions"] == 1
+    assert planning_ai.planner.stats["rollouts"] > 6
+
+
+def test_staffing_comes_before_lookahead(fs):
+    policies = fs.FactoryAI.STRATEGY_POLICIES["planning"]
+    assert policies.index("lookahead") > max(policies.index(name) for name in ("line_workers", "products"))
@@ -0,0 +1,88 @@
+import math
+from datetime import timedelta
+
+import pytest
+
+
+@pytest.fixture
+def engine(fs, factory):
+    return fs.PurchasingEngine(factory)
+
+
+def test_explode_expands_product_components(engine):
+    # Premium Chair = Wooden Chair (5 Wood) + Metal Plate + 4 Screws
+    assert engine.explode("Premium Chair", 3) == {"Wood": 15, "Metal Plate": 3, "Screws": 12}
+    assert engine.explode("Unknown", 3) == {}
+
+
+def test_economic_order_quantity(engine, factory):
+    wood = factory.materials["Wood"]
+    # Daily demand 48, order cost 5, holding cost 0.02 a day: sqrt(2 * 48 * 5 / 0.02) = 154.9
+    assert engine.get_order_quantity(wood, 2) == 155
+    cheap = factory.materials["Screws"]
+    assert engine.get_order_quantity(cheap, 2) == math.ceil(math.sqrt(2 * 48 * 5 / (0.1 * 0.02)))
+
+
+def test_reorder_point_covers_lead_time_and_safety_stock(engine):
+    engine.lead_time_hours = 2
+    engine.safety_hours = 6
+    assert engine.get_reorder_point(1.5) == pytest.approx(12)
+
+
+def test_open_orders_spread_demand_to_their_deadline(engine, factory):
+    factory.create_order("Wooden Table", 6, 5)
+    # 60 Wood over 120 hours
+    assert engine.get_demand_rates() == {"Wood": pytest.approx(0.5)}
+    # Urgent orders are averaged over at least min_demand_hours
+    factory.create_order("Wooden Chair", 2, 0)
+    assert engine.get_demand_rates()["Wood"] == pytest.approx(0.5 + 10 / engine.min_demand_hours)
+
+
+def test_completed_production_drives_demand(fs, engine, factory):
+    factory.assign_worker_to_line("Worker C", 1)
+    for _ in range(4):
+        assert factory.assign_product_to_line("Wooden Chair", 1)[0]
+        factory.advance_time(1)
+    # Four chairs in the last day, 5 Wood each
+    assert factory.metrics.get_rate("produced:Wooden Chair", engine.min_demand_hours) == pytest.approx(4 / 24)
+    assert engine.get_demand_rates() == {"Wood": pytest.approx(20 / 24)}
+
+
+def test_higher_of_production_and_order_demand_is_used(engine, factory):
+    factory.metrics.count("produced:Wooden Chair", 48)
+    factory.advance_time(1)
+    factory.create_order("Wooden Chair", 24, 5)
+    # Completed work: 240 Wood a day, orders: 120 Wood over 120 hours
+    assert engine.get_demand_rates()["Wood"] == pytest.approx(10)
+
+
+def test_no_purchase_above_reorder_point(engine, factory):
+    factory.create_order("Wooden Table", 6, 5)
+    assert factory.material_inventory["Wood"] > engine.get_reorder_point(0.5)
+    assert engine.plan_purchases() == {}
+
+
+def test_purchase_limited_by_cover_and_restores_reorder_point(engine, factory):
+    factory.create_order("Wooden Table", 24, 5)
+    factory.material_inventory["Wood"] = 10
+    rate = 2.0
+    purchases = engine.plan_purchases(cash_fraction=1.0)
+    expected = min(engine.get_order_quantity(factory.materials["Wood"], rate), math.floor(rate * engine.max_cover_hours - 10))
+    assert purchases == {"Wood": max(expected, math.ceil(engine.get_reorder_point(rate) - 10))}
+
+
+def test_most_urgent_material_is_bought_first_within_budget(engine, factory):
+    factory.create_order("Wooden Cabinet", 8, 5)
+    factory.material_inventory["Wood"] = 0
+    factory.material_inventory["Metal"] = 1
+    factory.balance = 100
+    purchases = engine.plan_purchases(cash_fraction=0.5)
+    # Wood has no cover left, so it takes the whole 50 budget
+    assert purchases == {"Wood": 50}
+
+
+def test_order_deadline_uses_simulation_time(engine, factory):
+    order, _ = factory.create_order("Wooden Chair", 10, 2)
+    assert order.deadline == factory.current_time + timedelta(days=2)
+    factory.advance_time(24)
+    assert engine.get_demand_rates()["Wood"] == pytest.approx(50 / 24)
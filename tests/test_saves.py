@@ -0,0 +1,106 @@
+import json
+import os
+
+import pytest
+
+
+def write_save(fs, factory, path, mtime, compress=False):
+    fs.SaveFile.write(str(path), {"factory": factory.to_dict()}, compress=compress,
+                      header=fs.SaveFile.get_header(factory, "manual"))
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_write_read_round_trip(fs, factory, tmp_path, compress):
+    path = tmp_path / "game.factorysave"
+    write_save(fs, factory, path, 1000, compress)
+    assert fs.SaveFile.read(str(path)) == json.loads(json.dumps({"factory": factory.to_dict()}))
+    restored = fs.Factory("Other", initial_balance=0)
+    restored.restore_state(fs.SaveFile.read(str(path))["factory"])
+    assert restored.to_dict() == factory.to_dict()
+    assert not os.path.exists(str(path) + ".tmp")
+
+
+def test_header_is_read_without_the_body(fs, factory, tmp_path):
+    factory.balance = 1234
+    path = tmp_path / "game.factorysave"
+    write_save(fs, factory, path, 1000, compress=True)
+    # A damaged body does not affect the header
+    with open(path, "r+b") as f:
+        f.seek(-8, os.SEEK_END)
+        f.write(b"\0" * 8)
+    header = fs.SaveFile.read_header(str(path))
+    assert header["name"] == "Test Factory" and header["balance"] == 1234 and header["day"] == 1
+    assert header["compressed"] is True and header["kind"] == "manual"
+    assert header["engine_version"] == fs.ENGINE_VERSION
+
+
+def test_headerless_saves_are_summarized(fs, factory, tmp_path):
+    path = tmp_path / "old.factorysave"
+    path.write_text(json.dumps({"factory": factory.to_dict()}), encoding="utf-8")
+    header = fs.SaveFile.read_header(str(path))
+    assert header["name"] == "Test Factory" and header["saved_at"] is None
+    assert fs.SaveFile.read(str(path))["factory"]["name"] == "Test Factory"
+
+
+def test_index_lists_saves_newest_first(fs, factory, tmp_path):
+    write_save(fs, factory, tmp_path / "a.factorysave", 1000)
+    factory.next_day()
+    write_save(fs, factory, tmp_path / "b.factorysave", 2000)
+    (tmp_path / "notes.txt").write_text("not a save")
+    (tmp_path / "broken.factorysave").write_bytes(b"garbage")
+    saves = fs.SaveIndex(str(tmp_path)).list_saves()
+    assert [(os.path.basename(path), header["day"]) for path, header in saves] == \
+        [("b.factorysave", 2), ("a.factorysave", 1)]
+
+
+def test_index_reads_only_changed_files(fs, factory, tmp_path, monkeypatch):
+    write_save(fs, factory, tmp_path / "a.factorysave", 1000)
+    write_save(fs, factory, tmp_path / "b.factorysave", 2000)
+    fs.SaveIndex(str(tmp_path)).list_saves()
+    assert os.path.exists(tmp_path / fs.SaveIndex.INDEX_FILE)
+
+    read_header = fs.SaveFile.read_header
+    reads = []
+    monkeypatch.setattr(fs.SaveFile, "read_header", lambda path: reads.append(path) or read_header(path))
+    # A new index instance starts from the cached headers
+    assert len(fs.SaveIndex(str(tmp_path)).list_saves()) == 2
+    assert reads == []
+
+    factory.balance = 77
+    write_save(fs, factory, tmp_path / "a.factorysave", 3000)
+    saves = fs.SaveIndex(str(tmp_path)).list_saves()
+    assert reads == [str(tmp_path / "a.factorysave")]
+    assert saves[0][1]["balance"] == 77
+
+
+def test_index_forgets_deleted_saves(fs, factory, tmp_path):
+    write_save(fs, factory, tmp_path / "a.factorysave", 1000)
+    write_save(fs, factory, tmp_path / "b.factorysave", 2000)
+    index = fs.SaveIndex(str(tmp_path))
+    index.list_saves()
+    os.remove(tmp_path / "b.factorysave")
+    assert [os.path.basename(path) for path, _ in index.list_saves()] == ["a.factorysave"]
+    with open(tmp_path / fs.SaveIndex.INDEX_FILE, encoding="utf-8") as f:
+        assert list(json.load(f)) == ["a.factorysave"]
+
+
+def test_save_after_load_mod(fs, factory, tmp_path):
+    factory.assign_worker_to_line("Worker C", 1)
+    mod = fs.Mod("Test Mod")
+    mod.products = list(factory.products.values())
+    mod.materials = list(factory.materials.values())
+    mod.initial_workers = [fs.Worker("Mod Worker", 3, 90)]
+    factory.load_mod(mod)
+    path = tmp_path / "game.factorysave"
+    write_save(fs, factory, path, 1000, compress=True)
+    restored = fs.Factory("Other", initial_balance=0)
+    restored.restore_state(fs.SaveFile.read(str(path))["factory"])
+    assert restored.to_dict() == factory.to_dict()
+
+
+def test_dangling_workers_are_saved_unassigned(fs, factory):
+    factory.assign_worker_to_line("Worker C", 1)
+    factory.workers = [worker for worker in factory.workers if worker.name != "Worker C"]
+    lines = factory.to_dict()["production_lines"]
+    assert lines[0]["assigned_worker"] is None
@@ -0,0 +1,18 @@
+import random
+
+
+def simulate(fs, seed):
+    state = fs.create_cli_factory().to_dict()
+    return fs.ScenarioAnalyzer.simulate(state, "hire_worker", 3, "balanced", 2, 8, seed)
+
+
+def test_simulate_repeats_with_a_seed(fs):
+    assert simulate(fs, 5) == simulate(fs, 5)
+
+
+def test_simulate_leaves_the_global_random_state_alone(fs):
+    random.seed(1)
+    expected = random.random()
+    random.seed(1)
+    simulate(fs, 5)
+    assert random.random() == expected
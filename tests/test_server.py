@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+import pytest
+
+
+def serve(fs, scenario):
+    """Run a scenario coroutine against a server on a free local port"""
+    async def main():
+        server = fs.SimulationServer(port=0)
+        await server.start()
+        try:
+            async with fs.SimulationClient(port=server.port) as client:
+                return await scenario(server, client)
+        finally:
+            await server.stop()
+    return asyncio.run(asyncio.wait_for(main(), 60))
+
+
+def test_create_step_query_close(fs):
+    async def scenario(server, client):
+        created = await client.call("create")
+        session = created["session"]
+        assert created["day"] == 1 and created["balance"] == 420 and created["strategy"] is None
+
+        stepped = await client.call("step", session=session, hours=2)
+        assert stepped["time"] == "2024-01-01T10:00:00"
+        stepped = await client.call("step", session=session, days=2)
+        assert stepped["day"] == 3
+
+        state = await client.call("query", session=session)
+        assert state["day"] == 3 and state["name"] == "Efficient Factory"
+        assert await client.call("query", session=session, fields=["day", "balance"]) == \
+            {"day": 3, "balance": stepped["balance"]}
+
+        assert await client.call("close", session=session) is True
+        assert await client.call("list") == []
+        assert server.sessions == {}
+    serve(fs, scenario)
+
+
+def test_commands_change_the_session_factory(fs):
+    async def scenario(server, client):
+        session = (await client.call("create"))["session"]
+        other = (await client.call("create"))["session"]
+        assert (await client.call("command", session=session, name="hire_worker", args=["Extra", 3, 100]))[0]
+        result = await client.call("command", session=session, name="purchase_material",
+                                   kwargs={"material_name": "Wood", "quantity": 5})
+        assert result[0] is True
+        workers = await client.call("query", session=session, fields=["workers"])
+        other_workers = await client.call("query", session=other, fields=["workers"])
+        assert len(workers["workers"]) == len(other_workers["workers"]) + 1
+        assert [summary["session"] for summary in await client.call("list")] == [session, other]
+    serve(fs, scenario)
+
+
+def test_ai_sessions_match_in_process_runs(fs):
+    async def scenario(server, client):
+        sessions = [(await client.call("create", strategy="aggressive", seed=7))["session"] for _ in range(3)]
+        results = await asyncio.gather(*(client.call("step", session=session, days=5) for session in sessions))
+        return [result["balance"] for result in results]
+    balances = serve(fs, scenario)
+
+    # Sessions advance an hour at a time, so the AI reacts after every hour
+    session = fs.SimulationSession(1, fs.create_cli_factory(), "aggressive", 7)
+    for _ in session.run_step(0, 5, 8):
+        pass
+    assert balances == [session.factory.balance] * 3
+
+
+def test_small_steps_are_not_held_up_by_long_ones(fs):
+    async def scenario(server, client):
+        busy = (await client.call("create"))["session"]
+        idle = (await client.call("create"))["session"]
+        long_step = asyncio.ensure_future(client.call("step", session=busy, days=2000))
+        await asyncio.sleep(0.01)
+        assert (await client.call("step", session=idle, days=1))["day"] == 2
+        assert not long_step.done()
+        await client.call("close", session=busy)
+        with pytest.raises(RuntimeError, match="closed"):
+            await long_step
+    serve(fs, scenario)
+
+
+@pytest.mark.parametrize("method, params, code", [
+    ("frobnicate", {}, -32601),
+    ("create", {"strategy": "unknown"}, -32602),
+    ("create", {"mod": "/nonexistent/file.launmod"}, -32602),
+    ("step", {"session": 999}, -32602),
+    ("step", {"session": 1, "days": -1}, -32602),
+    ("step", {"session": 1, "speed": 2}, -32602),
+    ("query", {"session": 1, "fields": ["nope"]}, -32602),
+    ("command", {"session": 1, "name": "advance_time", "args": [3]}, -32602),
+    ("command", {"session": 1, "name": "hire_worker", "args": [1]}, -32602),
+])
+def test_invalid_calls_return_errors(fs, method, params, code):
+    async def scenario(server, client):
+        await client.call("create")
+        with pytest.raises(RuntimeError, match=f"code {code}"):
+            await client.call(method, **params)
+        # The connection stays usable
+        assert len(await client.call("list")) == 1
+    serve(fs, scenario)
+
+
+def test_protocol_errors_on_a_raw_connection(fs):
+    async def scenario(server, client):
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        lines = [b"not json\n", b"[1, 2]\n",
+                 b'{"jsonrpc": "2.0", "id": 5, "method": "list", "params": [1]}\n',
+                 b'{"jsonrpc": "2.0", "method": "list"}\n',
+                 b'{"jsonrpc": "2.0", "id": 6, "method": "list"}\n']
+        responses = []
+        for line in lines:
+            writer.write(line)
+            await writer.drain()
+            # Notifications get no response
+            if b'"id"' in line or not line.startswith(b"{"):
+                responses.append(json.loads(await reader.readline()))
+        writer.close()
+        await writer.wait_closed()
+        return responses
+    responses = serve(fs, scenario)
+    assert [response.get("error", {}).get("code") for response in responses] == [-32700, -32600, -32602, None]
+    assert responses[-1] == {"jsonrpc": "2.0", "id": 6, "result": []}
+
+
+def test_session_limit(fs):
+    async def scenario(server, client):
+        server.max_sessions = 2
+        await client.call("create")
+        await client.call("create")
+        with pytest.raises(RuntimeError, match="code -32000"):
+            await client.call("create")
+    serve(fs, scenario)
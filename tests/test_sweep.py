@@ -0,0 +1,94 @@
+import json
+import os
+
+import pytest
+
+
+@pytest.fixture
+def grid():
+    return {"strategy": ["balanced", "conservative"], "seed": [0, 1], "days": 2}
+
+
+def test_cells_cover_the_grid_with_defaults(fs, grid):
+    cells = fs.SweepRunner(grid).get_cells()
+    assert len(cells) == 4
+    assert all(cell["days"] == 2 and cell["mod"] is None and cell["workers"] is None for cell in cells)
+    assert {(cell["strategy"], cell["seed"]) for cell in cells} == \
+        {("balanced", 0), ("balanced", 1), ("conservative", 0), ("conservative", 1)}
+
+
+def test_unknown_dimensions_are_rejected(fs):
+    with pytest.raises(ValueError):
+        fs.SweepRunner({"speed": [1, 2]})
+
+
+def test_second_run_is_served_from_the_cache(fs, grid, tmp_path):
+    runner = fs.SweepRunner(grid, cache_directory=str(tmp_path), max_workers=2)
+    rows = runner.run()
+    assert runner.computed == 4 and not any(row["cached"] for row in rows)
+    assert len(os.listdir(tmp_path)) == 4
+
+    again = fs.SweepRunner(grid, cache_directory=str(tmp_path), max_workers=2)
+    cached_rows = again.run()
+    assert again.computed == 0 and all(row["cached"] for row in cached_rows)
+    assert [dict(row, cached=False) for row in cached_rows] == rows
+
+
+def test_only_new_cells_are_simulated(fs, grid, tmp_path):
+    fs.SweepRunner(grid, cache_directory=str(tmp_path)).run()
+    grid["seed"] = [0, 1, 2]
+    runner = fs.SweepRunner(grid, cache_directory=str(tmp_path))
+    rows = runner.run()
+    assert runner.computed == 2
+    assert [row["seed"] for row in rows if not row["cached"]] == [2, 2]
+
+
+def test_cached_results_match_direct_runs(fs, grid, tmp_path):
+    runner = fs.SweepRunner(grid, cache_directory=str(tmp_path))
+    row = runner.run()[0]
+    cell = runner.get_cells()[0]
+    direct = fs.SweepRunner.run_cell(cell)
+    assert {metric: row[metric] for metric in fs.SweepRunner.METRICS} == \
+        {metric: direct[metric] for metric in fs.SweepRunner.METRICS}
+
+
+def test_key_follows_mod_content(fs, tmp_path):
+    mod = tmp_path / "test.launmod"
+    mod.write_text('{"name": "one"}')
+    cell = dict(fs.SweepRunner.DEFAULTS, mod=str(mod))
+    key = fs.SweepRunner({}).get_key(cell)
+    # Same content in another runner hashes the same, changed content does not
+    assert fs.SweepRunner({}).get_key(cell) == key
+    mod.write_text('{"name": "two"}')
+    assert fs.SweepRunner({}).get_key(cell) != key
+    assert fs.SweepRunner({}).get_key(dict(cell, seed=1)) != fs.SweepRunner({}).get_key(cell)
+
+
+def test_corrupt_cache_entries_are_recomputed(fs, grid, tmp_path):
+    grid["strategy"] = "balanced"
+    grid["seed"] = 0
+    runner = fs.SweepRunner(grid, cache_directory=str(tmp_path))
+    runner.run()
+    key = runner.get_key(runner.get_cells()[0])
+    with open(runner.get_cache_path(key), "w", encoding="utf-8") as f:
+        f.write("{")
+    again = fs.SweepRunner(grid, cache_directory=str(tmp_path))
+    again.run()
+    assert again.computed == 1
+
+
+def test_load_grid_resolves_mods_next_to_the_file(fs, tmp_path):
+    path = tmp_path / "grid.json"
+    path.write_text(json.dumps({"mod": ["a.launmod", None], "days": 5}))
+    grid = fs.SweepRunner.load_grid(str(path))
+    assert grid["mod"] == [str(tmp_path / "a.launmod"), None]
+
+
+def test_aggregate_averages_over_seeds(fs, grid, tmp_path):
+    runner = fs.SweepRunner(grid, cache_directory=str(tmp_path))
+    rows = runner.run()
+    table = runner.aggregate(rows)
+    assert [(entry["strategy"], entry["runs"]) for entry in table] == [("balanced", 2), ("conservative", 2)]
+    balanced = [row["profit"] for row in rows if row["strategy"] == "balanced"]
+    assert table[0]["profit"] == pytest.approx(sum(balanced) / 2)
+    assert "strategy" in runner.format_table(rows).splitlines()[0]
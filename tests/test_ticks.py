@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+import pytest
+
+
+def start_line(fs, factory, product_time, skill=1):
+    """Staff line 1 with a new worker and start a product taking product_time minutes at skill 1"""
+    product = fs.Product("Test Part", production_time=product_time, sale_price=5)
+    factory.add_product(product)
+    factory.hire_worker("Tester", skill, 40 * skill)
+    assert factory.assign_worker_to_line("Tester", 1)[0]
+    assert factory.assign_product_to_line("Test Part", 1)[0]
+    return factory.production_lines[0]
+
+
+def completion_times(fs, factory):
+    """Collect the simulation time of every production completion"""
+    times = []
+    factory.events.subscribe(lambda event: times.append(event.time),
+                             event_types=(fs.SimEvent.PRODUCTION_COMPLETED,))
+    return times
+
+
+def test_worker_rate_is_fixed_point_efficiency(fs):
+    for skill in range(1, 6):
+        worker = fs.Worker("W", skill, 40)
+        assert worker.work_rate() == pytest.approx(fs.PROGRESS_SCALE * (1 + (skill - 1) * 0.2))
+
+
+@pytest.mark.parametrize("tick_minutes", [1, 5])
+def test_product_completes_after_its_production_time(fs, factory, tick_minutes):
+    factory.set_tick_resolution(tick_minutes)
+    start = factory.current_time
+    times = completion_times(fs, factory)
+    start_line(fs, factory, 60)
+    factory.advance_time((60 - tick_minutes) / 60)
+    assert times == []
+    factory.advance_time(1)
+    assert times == [start + timedelta(minutes=60)]
+    assert factory.product_inventory["Test Part"] == 1
+
+
+def test_progress_carries_over_between_calls(fs, factory):
+    start = factory.current_time
+    times = completion_times(fs, factory)
+    line = start_line(fs, factory, 90)
+    factory.advance_time(1)
+    assert times == []
+    assert line.production_progress == 60 * fs.PROGRESS_SCALE
+    assert line.get_progress_percentage() == 66
+    factory.advance_time(1)
+    assert times == [start + timedelta(minutes=90)]
+    assert line.current_product is None and line.production_progress == 0
+
+
+def test_skill_shortens_production(fs, factory):
+    start = factory.current_time
+    times = completion_times(fs, factory)
+    # Skill 3 works 7 units a minute, 300 units take 43 minutes
+    start_line(fs, factory, 60, skill=3)
+    factory.advance_time(1)
+    assert times == [start + timedelta(minutes=43)]
+
+
+def test_coarse_ticks_round_completion_up(fs, factory):
+    assert factory.set_tick_resolution(60)
+    start = factory.current_time
+    times = completion_times(fs, factory)
+    start_line(fs, factory, 90)
+    factory.advance_time(1)
+    assert times == []
+    factory.advance_time(1)
+    assert times == [start + timedelta(hours=2)]
+
+
+def test_unknown_tick_resolution_is_rejected(factory):
+    assert not factory.set_tick_resolution(7)
+    assert factory.tick_minutes == 1
+
+
+def test_time_advances_by_whole_period(fs, factory):
+    start_line(fs, factory, 30)
+    start = factory.current_time
+    factory.advance_time(3)
+    assert factory.current_time == start + timedelta(hours=3)
+    assert factory.product_inventory["Test Part"] == 1
+
+
+def test_partial_ticks_carry_to_the_next_advance(fs, factory):
+    assert factory.set_tick_resolution(60)
+    start = factory.current_time
+    times = completion_times(fs, factory)
+    start_line(fs, factory, 60)
+    factory.advance_time(0.5)
+    assert times == [] and factory.current_time == start + timedelta(minutes=30)
+    assert factory.tick_remainder == 30
+    factory.advance_time(0.5)
+    assert times == [start + timedelta(hours=1)]
+    assert factory.tick_remainder == 0
+
+
+def test_overflow_carries_to_the_next_product(fs, factory):
+    assert factory.set_tick_resolution(60)
+    start = factory.current_time
+    times = completion_times(fs, factory)
+    start_line(fs, factory, 90)
+    factory.events.subscribe(lambda event: factory.assign_product_to_line("Test Part", 1),
+                             event_types=(fs.SimEvent.PRODUCTION_COMPLETED,))
+    factory.advance_time(8)
+    # Two hours make 600 of the 450 units of work, the 150 left over shorten the next product
+    assert times == [start + timedelta(hours=hours) for hours in (2, 3, 5, 6, 8)]
+
+
+def test_overflow_is_lost_on_an_idle_line(fs, factory):
+    line = start_line(fs, factory, 50)
+    factory.advance_time(1)
+    assert line.current_product is None and line.production_progress == 0
+
+
+def test_tick_remainder_is_saved(fs, factory):
+    factory.set_tick_resolution(60)
+    factory.advance_time(0.25)
+    restored = fs.Factory("Other", initial_balance=0)
+    restored.restore_state(factory.to_dict())
+    assert restored.tick_remainder == 15
+    assert factory.fork().tick_remainder == 15
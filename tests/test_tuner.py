@@ -0,0 +1,76 @@
+import pytest
+
+
+def make_tuner(fs, factory, **options):
+    settings = dict(strategy="balanced", days=1, seeds=2, population=4, generations=2, seed=1, max_workers=2)
+    settings.update(options)
+    return fs.ParameterTuner(factory, **settings)
+
+
+@pytest.fixture
+def defaults(fs):
+    return {name: fs.FactoryAI.DEFAULT_PARAMS[name] for name in fs.ParameterTuner.PARAM_SPACE}
+
+
+def test_evaluation_is_deterministic_per_seed(fs, factory, defaults):
+    state = factory.to_dict()
+    first = fs.ParameterTuner.evaluate(state, defaults, "balanced", 2, 8, 3)
+    assert fs.ParameterTuner.evaluate(state, defaults, "balanced", 2, 8, 3) == first
+
+
+def test_repeated_candidates_are_cache_hits(fs, factory, defaults):
+    tuner = make_tuner(fs, factory)
+    candidates = [defaults, tuner.random_params()]
+    scores = tuner.evaluate_all(candidates)
+    assert tuner.evaluations == 2 * tuner.seeds
+    # Same parameters in another order hash to the same key
+    reordered = dict(reversed(list(defaults.items())))
+    assert tuner.evaluate_all([reordered, candidates[1], defaults]) == [scores[0], scores[1], scores[0]]
+    assert tuner.evaluations == 2 * tuner.seeds
+
+
+def test_cache_file_is_reused_for_the_same_context(fs, factory, defaults, tmp_path):
+    cache_path = str(tmp_path / "tuner.json")
+    tuner = make_tuner(fs, factory, cache_path=cache_path)
+    score = tuner.evaluate_all([defaults])[0]
+    tuner.save_cache()
+
+    reloaded = make_tuner(fs, factory, cache_path=cache_path)
+    assert reloaded.evaluate_all([defaults]) == [score]
+    assert reloaded.evaluations == 0
+
+    # A different starting state or setting is a different context
+    other_days = make_tuner(fs, factory, cache_path=cache_path, days=2)
+    other_days.evaluate_all([defaults])
+    assert other_days.evaluations == other_days.seeds
+    factory.balance += 100
+    other_state = make_tuner(fs, factory, cache_path=cache_path)
+    other_state.evaluate_all([defaults])
+    assert other_state.evaluations == other_state.seeds
+
+
+def test_unreadable_cache_is_ignored(fs, factory, tmp_path):
+    cache_path = tmp_path / "tuner.json"
+    cache_path.write_text("{not json")
+    assert make_tuner(fs, factory, cache_path=str(cache_path)).cache == {}
+
+
+def test_run_keeps_the_best_candidates(fs, factory):
+    tuner = make_tuner(fs, factory, generations=3)
+    best_score, best_params = tuner.run()
+    assert [generation for generation, _, _ in tuner.history] == [0, 1, 2]
+    # Elites survive, so the best score never gets worse
+    best_scores = [score for _, score, _ in tuner.history]
+    assert best_scores == sorted(best_scores)
+    assert best_score == best_scores[-1] == tuner.cache[tuner.get_key(best_params)]
+    # Elites are not simulated again
+    assert tuner.evaluations < 3 * tuner.population * tuner.seeds
+
+
+def test_random_params_stay_in_range(fs, factory):
+    tuner = make_tuner(fs, factory)
+    for _ in range(20):
+        for name, value in tuner.breed([(0, tuner.random_params()) for _ in range(4)]).items():
+            low, high, is_int = fs.ParameterTuner.PARAM_SPACE[name]
+            assert low <= value <= high
+            assert isinstance(value, int) == is_int